@@ -1,22 +1,72 @@
 package tech.edgx.cms_demo_indexer.controller
 
 import org.springframework.data.domain.Limit
+import org.springframework.http.HttpStatus
+import org.springframework.http.MediaType
 import org.springframework.http.ResponseEntity
 import org.springframework.web.bind.annotation.GetMapping
+import org.springframework.web.bind.annotation.PathVariable
+import org.springframework.web.bind.annotation.RequestHeader
 import org.springframework.web.bind.annotation.RequestMapping
 import org.springframework.web.bind.annotation.RequestParam
 import org.springframework.web.bind.annotation.RestController
+import org.springframework.web.servlet.mvc.method.annotation.SseEmitter
 import tech.edgx.cms_demo_indexer.domain.entity.ConsignmentEntity
 import tech.edgx.cms_demo_indexer.repository.ConsignmentRepository
+import tech.edgx.cms_demo_indexer.service.ConsignmentChangeFeed
+import tech.edgx.cms_demo_indexer.service.ConsignmentService
 
 @RestController
 @RequestMapping("/api/v1/consignments")
 class ConsignmentController(
-    private val consignmentRepository: ConsignmentRepository
+    private val consignmentRepository: ConsignmentRepository,
+    private val consignmentService: ConsignmentService,
+    private val consignmentChangeFeed: ConsignmentChangeFeed
 ) {
+    /**
+     * Consignments in (slot, transaction hash) order. With afterSlot the page starts after the
+     * given cursor, afterTxHash defaults to the start of that slot.
+     */
     @GetMapping
-    fun getConsignments(@RequestParam(defaultValue = "1000") limit: Int): ResponseEntity<List<ConsignmentEntity>> {
-        val consignments = consignmentRepository.findAllByOrderByL1AbsoluteSlotAsc(Limit.of(limit))
+    fun getConsignments(
+        @RequestParam(defaultValue = "1000") limit: Int,
+        @RequestParam(required = false) afterSlot: Long?,
+        @RequestParam(required = false) afterTxHash: String?
+    ): ResponseEntity<List<ConsignmentEntity>> {
+        val consignments = if (afterSlot == null) {
+            consignmentRepository.findAllByOrderByL1AbsoluteSlotAsc(Limit.of(limit))
+        } else {
+            consignmentRepository.findAfter(afterSlot, afterTxHash ?: "", Limit.of(limit))
+        }
         return ResponseEntity.ok(consignments)
     }
-}
\ No newline at end of file
+
+    /**
+     * Server-sent events of newly stored consignments, one "consignments" event per transaction,
+     * and "rollback" events. Resumes after afterSlot/afterTxHash, or after the Last-Event-ID a
+     * reconnecting client sends; without either only live events are sent.
+     */
+    @GetMapping("/stream", produces = [MediaType.TEXT_EVENT_STREAM_VALUE])
+    fun streamConsignments(
+        @RequestParam(required = false) afterSlot: Long?,
+        @RequestParam(required = false) afterTxHash: String?,
+        @RequestHeader(name = "Last-Event-ID", required = false) lastEventId: String?
+    ): ResponseEntity<SseEmitter> {
+        val lastEvent = lastEventId?.split(":", limit = 2)?.takeIf { it.size == 2 }
+        val emitter = if (lastEvent != null) {
+            consignmentChangeFeed.subscribe(lastEvent[0].toLongOrNull() ?: return ResponseEntity.badRequest().body(null), lastEvent[1])
+        } else {
+            consignmentChangeFeed.subscribe(afterSlot, afterTxHash)
+        }
+        return emitter
+            ?.let { ResponseEntity.ok(it) }
+            ?: ResponseEntity.status(HttpStatus.SERVICE_UNAVAILABLE).body(null)
+    }
+
+    @GetMapping("/{id}")
+    fun getConsignment(@PathVariable id: String): ResponseEntity<ConsignmentEntity> {
+        return consignmentService.find(id)
+            .map { ResponseEntity.ok(it) }
+            .orElseGet { ResponseEntity.status(HttpStatus.NOT_FOUND).body(null) }
+    }
+}
@@ -0,0 +1,62 @@
+package tech.edgx.cms_demo_indexer.controller
+
+import com.bloxbean.cardano.yaci.store.events.EventMetadata
+import com.bloxbean.cardano.yaci.store.metadata.domain.TxMetadataEvent
+import com.bloxbean.cardano.yaci.store.metadata.domain.TxMetadataLabel
+import org.slf4j.LoggerFactory
+import org.springframework.boot.autoconfigure.condition.ConditionalOnProperty
+import org.springframework.http.ResponseEntity
+import org.springframework.web.bind.annotation.PostMapping
+import org.springframework.web.bind.annotation.RequestBody
+import org.springframework.web.bind.annotation.RequestMapping
+import org.springframework.web.bind.annotation.RequestParam
+import org.springframework.web.bind.annotation.RestController
+import tech.edgx.cms_demo_indexer.domain.ConsignmentRollback
+import tech.edgx.cms_demo_indexer.domain.RecordedMetadataEvent
+import tech.edgx.cms_demo_indexer.domain.ReplayResult
+import tech.edgx.cms_demo_indexer.service.ConsignmentOnChainBatchProcessor
+
+/**
+ * Feeds recorded metadata events through the consignment processor as chain sync would, one
+ * event (block) at a time, to measure sync throughput without a node. Only registered with
+ * lob.replay.enabled=true, as it writes whatever it is given.
+ */
+@RestController
+@RequestMapping("/api/v1/replay")
+@ConditionalOnProperty(name = ["lob.replay.enabled"], havingValue = "true")
+class ReplayController(
+    private val consignmentOnChainBatchProcessor: ConsignmentOnChainBatchProcessor
+) {
+    private val log = LoggerFactory.getLogger(this::class.java)
+
+    @PostMapping("/metadata-events")
+    fun replayMetadataEvents(@RequestBody events: List<RecordedMetadataEvent>): ResponseEntity<ReplayResult> {
+        val started = System.nanoTime()
+        var transactions = 0
+        var stored = 0
+        for (recorded in events) {
+            val event = TxMetadataEvent(
+                EventMetadata.builder().slot(recorded.slot).block(recorded.blockNumber ?: 0).build(),
+                recorded.entries.map {
+                    TxMetadataLabel.builder().slot(recorded.slot).txHash(it.txHash).label(it.label).cbor(it.cbor).build()
+                }
+            )
+            stored += consignmentOnChainBatchProcessor.process(event)
+            transactions += recorded.entries.size
+        }
+        val elapsedMs = (System.nanoTime() - started) / 1_000_000
+        log.info("Replayed {} metadata events in {} ms, stored {} consignments", events.size, elapsedMs, stored)
+        return ResponseEntity.ok(ReplayResult(events.size, transactions, stored, elapsedMs))
+    }
+
+    /** Applies a rollback to slot as a RollbackEvent would, for scripts/chaos_rollbacks.py. */
+    @PostMapping("/rollback")
+    fun replayRollback(
+        @RequestParam slot: Long,
+        @RequestParam(required = false) blockHash: String?
+    ): ResponseEntity<ConsignmentRollback> {
+        val rollback = consignmentOnChainBatchProcessor.rollback(slot, blockHash)
+            ?: return ResponseEntity.noContent().build()
+        return ResponseEntity.ok(rollback)
+    }
+}
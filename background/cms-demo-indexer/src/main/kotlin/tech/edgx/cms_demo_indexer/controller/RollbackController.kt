@@ -0,0 +1,35 @@
+package tech.edgx.cms_demo_indexer.controller
+
+import org.springframework.http.HttpStatus
+import org.springframework.http.ResponseEntity
+import org.springframework.web.bind.annotation.GetMapping
+import org.springframework.web.bind.annotation.RequestMapping
+import org.springframework.web.bind.annotation.RequestParam
+import org.springframework.web.bind.annotation.RestController
+import tech.edgx.cms_demo_indexer.domain.ConsignmentRollback
+import tech.edgx.cms_demo_indexer.service.ConsignmentService
+
+@RestController
+@RequestMapping("/api/v1/rollbacks")
+class RollbackController(
+    private val consignmentService: ConsignmentService
+) {
+    /**
+     * Rollbacks that removed consignments, in the order they were applied. Readers page with
+     * afterId set to the last id they reverted.
+     */
+    @GetMapping
+    fun getRollbacks(
+        @RequestParam(defaultValue = "0") afterId: Long,
+        @RequestParam(defaultValue = "100") limit: Int
+    ): ResponseEntity<List<ConsignmentRollback>> {
+        return ResponseEntity.ok(consignmentService.findRollbacksAfter(afterId, limit))
+    }
+
+    @GetMapping("/latest")
+    fun getLatestRollback(): ResponseEntity<ConsignmentRollback> {
+        return consignmentService.findLatestRollback()
+            ?.let { ResponseEntity.ok(it) }
+            ?: ResponseEntity.status(HttpStatus.NOT_FOUND).body(null)
+    }
+}
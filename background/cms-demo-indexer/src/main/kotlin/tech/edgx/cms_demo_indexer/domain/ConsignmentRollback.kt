@@ -0,0 +1,13 @@
+package tech.edgx.cms_demo_indexer.domain
+
+import java.time.LocalDateTime
+
+/** A chain rollback to rollbackSlot and the consignments it removed from the index. */
+data class ConsignmentRollback(
+    val id: Long,
+    val rollbackSlot: Long,
+    val blockHash: String?,
+    val consignmentIds: List<String>,
+    val fastPath: Boolean,
+    val createdAt: LocalDateTime
+)
@@ -5,6 +5,16 @@ data class LOBOnChainBatch(
     val consignments: Set<LOBOnChainConsignment> = emptySet()
 )
 
+/** A full item, with the id key its id is derived from, or a delta item whose id has to be derived from its base. */
 data class LOBOnChainConsignment(
-    val id: String
+    val id: String,
+    val idKey: String? = null,
+    val delta: LOBOnChainDelta? = null
+)
+
+/** Where a delta item builds on: the id prefix of the previous version in baseTxHash, and the ver it publishes. */
+data class LOBOnChainDelta(
+    val baseTxHash: String,
+    val baseIdPrefix: String,
+    val ver: Long
 )
\ No newline at end of file
@@ -0,0 +1,22 @@
+package tech.edgx.cms_demo_indexer.domain
+
+/** A TxMetadataEvent as recorded by scripts/replay_metadata_events.py: the metadata of one block. */
+data class RecordedMetadataEvent(
+    val slot: Long,
+    val blockNumber: Long? = null,
+    val entries: List<RecordedTxMetadata> = emptyList()
+)
+
+/** One transaction's metadata under one label, cbor being the hex of the whole metadata map. */
+data class RecordedTxMetadata(
+    val txHash: String,
+    val label: String,
+    val cbor: String
+)
+
+data class ReplayResult(
+    val events: Int,
+    val transactions: Int,
+    val stored: Int,
+    val elapsedMs: Long
+)
@@ -23,7 +23,10 @@ data class ConsignmentEntity(
     val l1AbsoluteSlot: Long,
 
     @Column(name = "l1_transaction_hash", nullable = false)
-    val l1TransactionHash: String
+    val l1TransactionHash: String,
+
+    @Column(name = "id_key")
+    val idKey: String? = null
 ) : Persistable<String> {
     override fun getId(): String = consignmentId
     override fun isNew(): Boolean = true // Adjust based on auditing logic
@@ -0,0 +1,106 @@
+package tech.edgx.cms_demo_indexer.repository
+
+import org.springframework.jdbc.core.JdbcTemplate
+import org.springframework.jdbc.core.PreparedStatementCreator
+import org.springframework.jdbc.core.RowMapper
+import org.springframework.stereotype.Repository
+import tech.edgx.cms_demo_indexer.domain.entity.ConsignmentEntity
+
+/**
+ * Multi-row inserts for chain sync, where going through the entity manager costs a select and an
+ * insert per consignment.
+ */
+@Repository
+class ConsignmentJdbcRepository(
+    private val jdbcTemplate: JdbcTemplate
+) {
+
+    companion object {
+        // Postgres takes at most 65535 bind parameters per statement, 5 per row
+        const val MAX_ROWS_PER_STATEMENT = 1000
+    }
+
+    // CHAR(64) pads, ids are compared trimmed everywhere else
+    private val idMapper = RowMapper { rs, _ -> rs.getString(1).trim() }
+
+    /**
+     * Inserts the consignments with one statement per MAX_ROWS_PER_STATEMENT rows, skipping ids
+     * already stored. The table is partitioned on created_at, so consignment_id alone has no unique
+     * constraint and ON CONFLICT only guards the primary key; NOT EXISTS does the skipping, after
+     * the ids are locked as the V1.0_100_106 insert trigger locks them, so it cannot race another
+     * writer. Ids are cast to the column's CHAR(64), a text comparison could not use the primary
+     * key index. Returns the rows inserted.
+     */
+    fun insertIgnoringExisting(consignments: Collection<ConsignmentEntity>): Int {
+        lockConsignmentIds(consignments.map { it.consignmentId })
+        return consignments
+            .distinctBy { it.consignmentId }
+            .chunked(MAX_ROWS_PER_STATEMENT)
+            .sumOf { chunk ->
+                val args = chunk.flatMap { listOf(it.consignmentId, it.organisationId, it.l1AbsoluteSlot, it.l1TransactionHash, it.idKey) }
+                jdbcTemplate.update(insertStatement(chunk.size), *args.toTypedArray())
+            }
+    }
+
+    /** The id keys of the consignments stored from txHash whose id starts with idPrefix, one unless the prefix collides. */
+    fun findIdKeys(txHash: String, idPrefix: String): List<String?> {
+        return jdbcTemplate.query(
+            "SELECT id_key FROM blockchain_reader_consignment WHERE l1_transaction_hash = CAST(? AS CHAR(64)) AND consignment_id LIKE ?",
+            { rs, _ -> rs.getString(1) }, txHash, "$idPrefix%"
+        )
+    }
+
+    /**
+     * Deletes those of the given consignments stored after the slot, the fast path of a rollback;
+     * an id seen again in a rolled back block keeps its earlier row. Returns the ids deleted.
+     */
+    fun deleteByIdsAfterSlot(consignmentIds: Collection<String>, absoluteSlot: Long): List<String> {
+        if (consignmentIds.isEmpty()) {
+            return emptyList()
+        }
+        return jdbcTemplate.query(PreparedStatementCreator { connection ->
+            connection.prepareStatement("""
+                DELETE FROM blockchain_reader_consignment
+                WHERE consignment_id = ANY(CAST(? AS CHAR(64)[])) AND l1_absolute_slot > ?
+                RETURNING consignment_id
+            """).apply {
+                setArray(1, connection.createArrayOf("text", consignmentIds.toTypedArray()))
+                setLong(2, absoluteSlot)
+            }
+        }, idMapper)
+    }
+
+    /** Deletes every consignment after the slot through idx_consignment_l1_absolute_slot. Returns the ids deleted. */
+    fun deleteAfterSlot(absoluteSlot: Long): List<String> {
+        return jdbcTemplate.query(
+            "DELETE FROM blockchain_reader_consignment WHERE l1_absolute_slot > ? RETURNING consignment_id",
+            idMapper, absoluteSlot
+        )
+    }
+
+    // Held until the transaction ends, taken in key order so two writers never deadlock
+    private fun lockConsignmentIds(consignmentIds: Collection<String>) {
+        if (consignmentIds.isEmpty()) {
+            return
+        }
+        jdbcTemplate.query(PreparedStatementCreator { connection ->
+            connection.prepareStatement("""
+                SELECT COUNT(pg_advisory_xact_lock(1449, k))
+                FROM (SELECT DISTINCT hashtext(id) AS k FROM unnest(CAST(? AS TEXT[])) AS id ORDER BY k) AS keys
+            """).apply {
+                setArray(1, connection.createArrayOf("text", consignmentIds.toTypedArray()))
+            }
+        }, RowMapper { rs, _ -> rs.getLong(1) })
+    }
+
+    private fun insertStatement(rows: Int): String {
+        return """
+            INSERT INTO blockchain_reader_consignment (consignment_id, organisation_id, l1_absolute_slot, l1_transaction_hash, id_key)
+            SELECT v.consignment_id, v.organisation_id, v.l1_absolute_slot, v.l1_transaction_hash, v.id_key
+            FROM (VALUES ${List(rows) { "(CAST(? AS CHAR(64)), ?, CAST(? AS BIGINT), ?, CAST(? AS TEXT))" }.joinToString(", ")})
+                AS v (consignment_id, organisation_id, l1_absolute_slot, l1_transaction_hash, id_key)
+            WHERE NOT EXISTS (SELECT 1 FROM blockchain_reader_consignment c WHERE c.consignment_id = v.consignment_id)
+            ON CONFLICT DO NOTHING
+        """
+    }
+}
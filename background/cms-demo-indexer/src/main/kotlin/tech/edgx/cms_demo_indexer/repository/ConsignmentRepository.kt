@@ -2,15 +2,24 @@ package tech.edgx.cms_demo_indexer.repository
 
 import org.springframework.data.domain.Limit
 import org.springframework.data.jpa.repository.JpaRepository
-import org.springframework.data.jpa.repository.Modifying
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.repository.query.Param
 import tech.edgx.cms_demo_indexer.domain.entity.ConsignmentEntity
 
 interface ConsignmentRepository : JpaRepository<ConsignmentEntity, String> {
-    @Modifying
-    @Query("DELETE FROM ConsignmentEntity c WHERE c.l1AbsoluteSlot > :absoluteSlot")
-    fun deleteBySlotGreaterThan(absoluteSlot: Long)
-
-    @Query("SELECT c FROM ConsignmentEntity c ORDER BY c.l1AbsoluteSlot ASC")
+    @Query("SELECT c FROM ConsignmentEntity c ORDER BY c.l1AbsoluteSlot ASC, c.l1TransactionHash ASC, c.consignmentId ASC")
     fun findAllByOrderByL1AbsoluteSlotAsc(limit: Limit): List<ConsignmentEntity>
+
+    // Keyset page after a (slot, tx hash) cursor, the order is stable so a reader never skips or repeats a transaction
+    @Query("""
+        SELECT c FROM ConsignmentEntity c
+        WHERE c.l1AbsoluteSlot > :absoluteSlot
+        OR (c.l1AbsoluteSlot = :absoluteSlot AND c.l1TransactionHash > :transactionHash)
+        ORDER BY c.l1AbsoluteSlot ASC, c.l1TransactionHash ASC, c.consignmentId ASC
+    """)
+    fun findAfter(
+        @Param("absoluteSlot") absoluteSlot: Long,
+        @Param("transactionHash") transactionHash: String,
+        limit: Limit
+    ): List<ConsignmentEntity>
 }
\ No newline at end of file
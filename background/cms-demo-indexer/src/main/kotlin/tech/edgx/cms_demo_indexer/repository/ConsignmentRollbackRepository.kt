@@ -0,0 +1,52 @@
+package tech.edgx.cms_demo_indexer.repository
+
+import org.springframework.jdbc.core.JdbcTemplate
+import org.springframework.jdbc.core.PreparedStatementCreator
+import org.springframework.jdbc.core.RowMapper
+import org.springframework.stereotype.Repository
+import tech.edgx.cms_demo_indexer.domain.ConsignmentRollback
+
+@Repository
+class ConsignmentRollbackRepository(
+    private val jdbcTemplate: JdbcTemplate
+) {
+
+    private val rowMapper = RowMapper { rs, _ ->
+        @Suppress("UNCHECKED_CAST")
+        ConsignmentRollback(
+            id = rs.getLong("id"),
+            rollbackSlot = rs.getLong("rollback_slot"),
+            blockHash = rs.getString("block_hash"),
+            consignmentIds = (rs.getArray("consignment_ids").array as Array<String>).toList(),
+            fastPath = rs.getBoolean("fast_path"),
+            createdAt = rs.getTimestamp("created_at").toLocalDateTime()
+        )
+    }
+
+    fun insert(rollbackSlot: Long, blockHash: String?, consignmentIds: Collection<String>, fastPath: Boolean): ConsignmentRollback {
+        return jdbcTemplate.query(PreparedStatementCreator { connection ->
+            connection.prepareStatement("""
+                INSERT INTO blockchain_reader_rollback (rollback_slot, block_hash, consignment_ids, fast_path)
+                VALUES (?, ?, ?, ?)
+                RETURNING *
+            """).apply {
+                setLong(1, rollbackSlot)
+                setString(2, blockHash)
+                setArray(3, connection.createArrayOf("text", consignmentIds.toTypedArray()))
+                setBoolean(4, fastPath)
+            }
+        }, rowMapper).single()
+    }
+
+    fun findAfter(afterId: Long, limit: Int): List<ConsignmentRollback> {
+        return jdbcTemplate.query(
+            "SELECT * FROM blockchain_reader_rollback WHERE id > ? ORDER BY id LIMIT ?",
+            rowMapper, afterId, limit
+        )
+    }
+
+    fun findLatest(): ConsignmentRollback? {
+        return jdbcTemplate.query("SELECT * FROM blockchain_reader_rollback ORDER BY id DESC LIMIT 1", rowMapper)
+            .firstOrNull()
+    }
+}
@@ -0,0 +1,187 @@
+package tech.edgx.cms_demo_indexer.service
+
+import jakarta.annotation.PreDestroy
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.data.domain.Limit
+import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.scheduling.concurrent.CustomizableThreadFactory
+import org.springframework.stereotype.Service
+import org.springframework.web.servlet.mvc.method.annotation.SseEmitter
+import tech.edgx.cms_demo_indexer.domain.ConsignmentRollback
+import tech.edgx.cms_demo_indexer.domain.entity.ConsignmentEntity
+import tech.edgx.cms_demo_indexer.repository.ConsignmentRepository
+import java.time.Duration
+import java.util.concurrent.CopyOnWriteArrayList
+import java.util.concurrent.ExecutorService
+import java.util.concurrent.Executors
+
+/**
+ * Server-sent events for every transaction whose consignments were stored and every rollback, so
+ * readers learn about new rows without polling. Event ids are the (slot, transaction hash) cursor
+ * of the transaction, "slot:txHash"; a subscriber resuming from one first gets the stored rows
+ * after it, then the live events.
+ */
+@Service
+class ConsignmentChangeFeed(
+    private val consignmentRepository: ConsignmentRepository,
+    @Value("\${lob.consignment.feed.timeout:PT30M}") private val timeout: Duration,
+    @Value("\${lob.consignment.feed.max_subscribers:100}") private val maxSubscribers: Int,
+    @Value("\${lob.consignment.feed.catch_up_page_size:1000}") private val catchUpPageSize: Int
+) {
+    private val log = LoggerFactory.getLogger(this::class.java)
+
+    companion object {
+        const val CONSIGNMENTS_EVENT = "consignments"
+        const val ROLLBACK_EVENT = "rollback"
+    }
+
+    private data class Cursor(val slot: Long, val txHash: String) : Comparable<Cursor> {
+        override fun compareTo(other: Cursor): Int = compareValuesBy(this, other, { it.slot }, { it.txHash })
+        override fun toString(): String = "$slot:$txHash"
+    }
+
+    // cursor is set for consignment events, rollbackSlot for rollbacks
+    private class Event(val name: String, val data: Any, val cursor: Cursor? = null, val rollbackSlot: Long? = null)
+
+    private class Subscriber(val emitter: SseEmitter, var cursor: Cursor?) {
+        // Live events published while the stored rows are still being sent, delivered once caught up
+        private var pending: MutableList<Event>? = mutableListOf()
+
+        @Synchronized
+        fun offer(event: Event) {
+            pending?.add(event) ?: send(event)
+        }
+
+        @Synchronized
+        fun caughtUp() {
+            val queued = pending ?: return
+            pending = null
+            queued.forEach(::send)
+        }
+
+        @Synchronized
+        fun send(event: Event) {
+            val current = cursor
+            if (event.cursor != null && current != null && event.cursor <= current) {
+                // Sent by the catch up already
+                return
+            }
+            val builder = SseEmitter.event().name(event.name).data(event.data)
+            event.cursor?.let { builder.id(it.toString()) }
+            emitter.send(builder)
+            event.cursor?.let { cursor = it }
+            // The rows after the rollback are gone, their replacements come after an earlier cursor
+            if (event.rollbackSlot != null && current != null && current.slot > event.rollbackSlot) {
+                cursor = Cursor(event.rollbackSlot, "")
+            }
+        }
+
+        @Synchronized
+        fun heartbeat() {
+            emitter.send(SseEmitter.event().comment("heartbeat"))
+        }
+    }
+
+    private val subscribers = CopyOnWriteArrayList<Subscriber>()
+    private val catchUpExecutor: ExecutorService = Executors.newCachedThreadPool(CustomizableThreadFactory("consignment-feed-"))
+
+    @PreDestroy
+    fun shutdown() {
+        catchUpExecutor.shutdownNow()
+        subscribers.forEach { it.emitter.complete() }
+    }
+
+    /**
+     * Subscribes after the given cursor, or to live events only when afterSlot is null. Returns
+     * null when max_subscribers are connected already.
+     */
+    fun subscribe(afterSlot: Long?, afterTxHash: String?): SseEmitter? {
+        if (subscribers.size >= maxSubscribers) {
+            log.warn("Refusing consignment feed subscriber, {} connected already", subscribers.size)
+            return null
+        }
+        val emitter = SseEmitter(timeout.toMillis())
+        val subscriber = Subscriber(emitter, afterSlot?.let { Cursor(it, afterTxHash ?: "") })
+        emitter.onCompletion { subscribers.remove(subscriber) }
+        emitter.onTimeout { emitter.complete() }
+        emitter.onError { subscribers.remove(subscriber) }
+        subscribers.add(subscriber)
+        // Off the request thread, so the stored rows are streamed rather than buffered until the handler returns
+        catchUpExecutor.execute {
+            try {
+                subscriber.cursor?.let { catchUp(subscriber, it) }
+                subscriber.caughtUp()
+            } catch (e: Exception) {
+                drop(subscriber, e)
+            }
+        }
+        log.info("Consignment feed subscriber connected after {}, {} connected", subscriber.cursor ?: "live", subscribers.size)
+        return emitter
+    }
+
+    /** Publishes the stored rows of one block, call once they are committed. */
+    fun publishConsignments(rows: Collection<ConsignmentEntity>) {
+        if (subscribers.isEmpty()) {
+            return
+        }
+        transactionEvents(rows).forEach(::publish)
+    }
+
+    fun publishRollback(rollback: ConsignmentRollback) {
+        if (subscribers.isEmpty()) {
+            return
+        }
+        publish(Event(ROLLBACK_EVENT, rollback, rollbackSlot = rollback.rollbackSlot))
+    }
+
+    // A comment line, so proxies keep idle connections open and dead ones are noticed
+    @Scheduled(fixedDelayString = "\${lob.consignment.feed.heartbeat:PT15S}")
+    fun heartbeat() {
+        for (subscriber in subscribers) {
+            try {
+                subscriber.heartbeat()
+            } catch (e: Exception) {
+                drop(subscriber, e)
+            }
+        }
+    }
+
+    private fun catchUp(subscriber: Subscriber, from: Cursor) {
+        var cursor = from
+        while (true) {
+            val page = consignmentRepository.findAfter(cursor.slot, cursor.txHash, Limit.of(catchUpPageSize))
+            val full = page.size == catchUpPageSize
+            // A full page may end part way through a transaction, the next page starts with the rest of it
+            val rows = if (full) page.dropLastWhile { it.l1TransactionHash == page.last().l1TransactionHash }.ifEmpty { page } else page
+            transactionEvents(rows).forEach(subscriber::send)
+            if (!full) {
+                return
+            }
+            cursor = Cursor(rows.last().l1AbsoluteSlot, rows.last().l1TransactionHash)
+        }
+    }
+
+    private fun transactionEvents(rows: Collection<ConsignmentEntity>): List<Event> {
+        return rows
+            .groupBy { Cursor(it.l1AbsoluteSlot, it.l1TransactionHash) }
+            .toSortedMap()
+            .map { (cursor, txRows) -> Event(CONSIGNMENTS_EVENT, txRows.sortedBy { it.consignmentId }, cursor) }
+    }
+
+    private fun publish(event: Event) {
+        for (subscriber in subscribers) {
+            try {
+                subscriber.offer(event)
+            } catch (e: Exception) {
+                drop(subscriber, e)
+            }
+        }
+    }
+
+    private fun drop(subscriber: Subscriber, e: Exception) {
+        log.debug("Consignment feed subscriber dropped: {}", e.message)
+        subscribers.remove(subscriber)
+        subscriber.emitter.completeWithError(e)
+    }
+}
@@ -6,18 +6,39 @@ import org.slf4j.LoggerFactory
 import org.springframework.stereotype.Service
 import tech.edgx.cms_demo_indexer.domain.LOBOnChainBatch
 import tech.edgx.cms_demo_indexer.domain.LOBOnChainConsignment
+import tech.edgx.cms_demo_indexer.domain.LOBOnChainDelta
+import java.math.BigInteger
+import java.time.LocalDateTime
+import java.time.ZoneOffset
+import java.time.format.DateTimeFormatter
 
+/**
+ * Reads the organisation and consignment ids of label metadata in the app's "1.0" schema or its
+ * compact schema 2 (top level "v": 2, ids as 32 bytes, organisations in "o" with the batch
+ * organisation first; see the app's CompactConsignmentMetadata), with the id key
+ * (sender::receiver::dispatchedAt) of each. Schema 2 delta items publish only an id prefix and
+ * their ver, ConsignmentOnChainBatchProcessor derives their id from the version they build on.
+ */
 @Service
 class ConsignmentMetadataDeserialiser {
     private val log = LoggerFactory.getLogger(this::class.java)
 
+    companion object {
+        private val COMPACT_VERSION = BigInteger.valueOf(2)
+        private val TYPE_CONSIGNMENTS = BigInteger.ONE
+        private val TYPE_MERKLE_ROOT = BigInteger.TWO
+    }
+
     fun decode(payload: CBORMetadataMap): LOBOnChainBatch {
+        if (payload.get("v") == COMPACT_VERSION) {
+            return decodeCompact(payload)
+        }
         val org = payload.get("org") as? CBORMetadataMap
         val orgId = org?.get("id") as? String
         val type = payload.get("type") as? String
 
         val consignments = if (type == "CONSIGNMENTS") {
-            readConsignments(payload.get("data") as? CBORMetadataList)
+            readConsignments(payload.get("data") as? CBORMetadataList, orgId)
         } else {
             log.warn("Skipping unsupported metadata type: {}", type)
             emptySet()
@@ -29,16 +50,73 @@ class ConsignmentMetadataDeserialiser {
         )
     }
 
-    private fun readConsignment(cborMetadataMap: CBORMetadataMap): LOBOnChainConsignment {
+    private fun decodeCompact(payload: CBORMetadataMap): LOBOnChainBatch {
+        val organisations = payload.get("o") as? CBORMetadataList
+        val orgId = organisations?.takeIf { it.size() > 0 }?.let { (it.getValueAt(0) as? CBORMetadataMap)?.get("i") as? String }
+        if (payload.get("t") == TYPE_MERKLE_ROOT) {
+            // Anchored batch: only the Merkle root is on chain, the consignments are served off chain
+            log.debug("Skipping anchored batch of {} consignments of organisation {}", payload.get("n"), orgId)
+            return LOBOnChainBatch(organisationId = orgId)
+        }
+        if (payload.get("t") != TYPE_CONSIGNMENTS) {
+            log.warn("Skipping unsupported compact metadata type code: {}", payload.get("t"))
+            return LOBOnChainBatch(organisationId = orgId)
+        }
+        val organisationIds = organisations?.let { list ->
+            (0 until list.size()).map { (list.getValueAt(it) as? CBORMetadataMap)?.get("i") as? String }
+        }.orEmpty()
+        val baseTxHashes = payload.get("h") as? CBORMetadataList
+        val epochMillis = (payload.get("e") as? BigInteger)?.toLong()?.times(1000)
+        val data = payload.get("d") as? CBORMetadataList
+        val consignments = if (data == null) emptySet() else (0 until data.size())
+            .map { index ->
+                val item = data.getValueAt(index) as CBORMetadataMap
+                val id = hex(item.get("i") as ByteArray)
+                val baseTxIndex = item.get("p") as? BigInteger
+                if (baseTxIndex != null) {
+                    LOBOnChainConsignment(id = id, delta = LOBOnChainDelta(
+                        baseTxHash = hex(baseTxHashes?.getValueAt(baseTxIndex.toInt()) as ByteArray),
+                        baseIdPrefix = hex(item.get("b") as ByteArray),
+                        ver = (item.get("n") as BigInteger).toLong()
+                    ))
+                } else {
+                    val sender = organisationIds.getOrNull((item.get("s") as? BigInteger)?.toInt() ?: 0)
+                    val receiver = organisationIds.getOrNull((item.get("r") as BigInteger).toInt())
+                    val dispatchedAt = epochMillis?.let { it + (item.get("t") as BigInteger).toLong() }?.let {
+                        LocalDateTime.ofEpochSecond(Math.floorDiv(it, 1000L), (Math.floorMod(it, 1000L) * 1_000_000).toInt(), ZoneOffset.UTC)
+                    }
+                    LOBOnChainConsignment(id = id, idKey = idKey(sender, receiver, dispatchedAt))
+                }
+            }
+            .toSet()
+        return LOBOnChainBatch(organisationId = orgId, consignments = consignments)
+    }
+
+    private fun readConsignment(cborMetadataMap: CBORMetadataMap, orgId: String?): LOBOnChainConsignment {
+        val senderId = (cborMetadataMap.get("sender") as? CBORMetadataMap)?.get("id") as? String ?: orgId
+        val receiverId = (cborMetadataMap.get("receiver") as? CBORMetadataMap)?.get("id") as? String
+        val dispatchedAt = (cborMetadataMap.get("dispatched_at") as? String)
+            ?.let { LocalDateTime.parse(it, DateTimeFormatter.ISO_LOCAL_DATE_TIME) }
         return LOBOnChainConsignment(
-            id = cborMetadataMap.get("id") as String
+            id = cborMetadataMap.get("id") as String,
+            idKey = idKey(senderId, receiverId, dispatchedAt)
         )
     }
 
-    private fun readConsignments(cborMetadataList: CBORMetadataList?): Set<LOBOnChainConsignment> {
+    private fun readConsignments(cborMetadataList: CBORMetadataList?, orgId: String?): Set<LOBOnChainConsignment> {
         if (cborMetadataList == null) return emptySet()
         return (0 until cborMetadataList.size())
-            .map { readConsignment(cborMetadataList.getValueAt(it) as CBORMetadataMap) }
+            .map { readConsignment(cborMetadataList.getValueAt(it) as CBORMetadataMap, orgId) }
             .toSet()
     }
+
+    // The input of the app's ConsignmentEntity.idControl, LocalDateTime.toString() included
+    private fun idKey(senderId: String?, receiverId: String?, dispatchedAt: LocalDateTime?): String? {
+        if (senderId == null || receiverId == null || dispatchedAt == null) {
+            return null
+        }
+        return "$senderId::$receiverId::$dispatchedAt"
+    }
+
+    private fun hex(bytes: ByteArray): String = bytes.joinToString("") { "%02x".format(it) }
 }
\ No newline at end of file
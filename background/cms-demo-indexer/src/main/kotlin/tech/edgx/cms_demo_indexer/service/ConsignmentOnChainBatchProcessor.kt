@@ -4,46 +4,128 @@ import com.bloxbean.cardano.client.metadata.cbor.CBORMetadata
 import com.bloxbean.cardano.client.metadata.cbor.CBORMetadataMap
 import tech.edgx.cms_demo_indexer.domain.entity.ConsignmentEntity
 import com.bloxbean.cardano.client.util.HexUtil
+import com.bloxbean.cardano.yaci.store.events.RollbackEvent
 import com.bloxbean.cardano.yaci.store.metadata.domain.TxMetadataEvent
+import io.micrometer.core.instrument.MeterRegistry
+import io.micrometer.core.instrument.Timer
 import org.slf4j.LoggerFactory
 import org.springframework.beans.factory.annotation.Value
 import org.springframework.context.event.EventListener
 import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_indexer.domain.ConsignmentRollback
+import tech.edgx.cms_demo_indexer.domain.LOBOnChainDelta
 import java.math.BigInteger
+import java.security.MessageDigest
+import java.util.concurrent.TimeUnit
 
 @Service("consignment.lOBOnChainBatchProcessor")
 class ConsignmentOnChainBatchProcessor(
     private val consignmentService: ConsignmentService,
     private val consignmentMetadataDeserialiser: ConsignmentMetadataDeserialiser,
+    private val recentBlockWindow: RecentBlockWindow,
+    private val consignmentChangeFeed: ConsignmentChangeFeed,
+    private val meterRegistry: MeterRegistry,
     @Value("\${lob.transaction.metadata_label:1448}") private val metadataLabel: Int
 ) {
     private val log = LoggerFactory.getLogger(this::class.java)
 
+    private val label = metadataLabel.toString()
+    private val labelKey = BigInteger.valueOf(metadataLabel.toLong())
+
+    private val blockTimer = Timer.builder("cms.indexer.block.duration")
+        .description("Decoding and storing the consignments of one block with consignment metadata")
+        .register(meterRegistry)
+    private val storedCounter = meterRegistry.counter("cms.indexer.consignments.stored")
+    private val unresolvedDeltaCounter = meterRegistry.counter("cms.indexer.deltas.unresolved")
+
     @EventListener
     fun metadataEvent(event: TxMetadataEvent) {
-        val txMetadataList = event.txMetadataList
-        for (txEvent in txMetadataList) {
-            log.debug("txEvent: {}", txEvent)
-            if (txEvent.label.equals(metadataLabel.toString(), ignoreCase = true)) {
-                log.debug("Processing TxMetadataEvent for metadata label: {}, event: {}", metadataLabel, event)
-                val cborBytes = HexUtil.decodeHexString(txEvent.cbor.replace("\\x", ""))
-                val cborMetadata = CBORMetadata.deserialize(cborBytes)
-                val envelopeCborMap = cborMetadata.get(BigInteger.valueOf(metadataLabel.toLong())) as? CBORMetadataMap
-                    ?: throw IllegalStateException("Invalid metadata structure for label $metadataLabel")
-
-                val lobBatch = consignmentMetadataDeserialiser.decode(envelopeCborMap)
-
-                for (lobConsignment in lobBatch.consignments) {
-                    val consignment = ConsignmentEntity(
-                        consignmentId = lobConsignment.id,
-                        organisationId = lobBatch.organisationId, // Nullable
-                        l1TransactionHash = txEvent.txHash,
-                        l1AbsoluteSlot = txEvent.slot
-                    )
-                    log.info("Processing TxMetadataEvent for metadata label: {}, Storing: {}", metadataLabel, consignment)
-                    consignmentService.storeIfNew(consignment)
+        process(event)
+    }
+
+    @EventListener
+    fun rollbackEvent(event: RollbackEvent) {
+        rollback(event.rollbackTo.slot, event.rollbackTo.hash)
+    }
+
+    /**
+     * Removes the consignments of the blocks after slot, by id when they are all in the recent
+     * block window and by slot otherwise. Returns the recorded rollback, null if nothing was removed.
+     */
+    fun rollback(slot: Long, blockHash: String?): ConsignmentRollback? {
+        val started = System.nanoTime()
+        val windowIds = recentBlockWindow.rollbackTo(slot)
+        val rollback = consignmentService.rollbackTo(slot, blockHash, windowIds)
+        rollback?.let(consignmentChangeFeed::publishRollback)
+        val path = if (windowIds != null) "window" else "slot"
+        meterRegistry.counter("cms.indexer.rollbacks", "path", path).increment()
+        meterRegistry.counter("cms.indexer.consignments.rolled_back", "path", path)
+            .increment((rollback?.consignmentIds?.size ?: 0).toDouble())
+        log.info("Rolled back to slot {} ({}): removed {} consignments in {} ms", slot,
+            if (path == "window") "within window" else "by slot", rollback?.consignmentIds?.size ?: 0,
+            (System.nanoTime() - started) / 1_000_000)
+        return rollback
+    }
+
+    /**
+     * Decodes every consignment of the event (one block) and stores them with a single insert,
+     * returns how many were new. Consignments repeated within the block are stored once.
+     */
+    fun process(event: TxMetadataEvent): Int {
+        val started = System.nanoTime()
+        val consignments = mutableListOf<ConsignmentEntity>()
+        for (txEvent in event.txMetadataList.filter { it.label.equals(label, ignoreCase = true) }) {
+            log.debug("Decoding consignment metadata of tx: {}", txEvent.txHash)
+            val cborBytes = HexUtil.decodeHexString(txEvent.cbor.removePrefix("\\x"))
+            val envelopeCborMap = CBORMetadata.deserialize(cborBytes).get(labelKey) as? CBORMetadataMap
+                ?: throw IllegalStateException("Invalid metadata structure for label $metadataLabel")
+            val lobBatch = consignmentMetadataDeserialiser.decode(envelopeCborMap)
+            for (lobConsignment in lobBatch.consignments) {
+                val delta = lobConsignment.delta
+                val (consignmentId, idKey) = if (delta == null) {
+                    Pair(lobConsignment.id, lobConsignment.idKey)
+                } else {
+                    deltaId(txEvent.txHash, lobConsignment.id, delta, consignments) ?: continue
                 }
+                consignments.add(ConsignmentEntity(
+                    consignmentId = consignmentId,
+                    organisationId = lobBatch.organisationId, // Nullable
+                    l1TransactionHash = txEvent.txHash,
+                    l1AbsoluteSlot = txEvent.slot,
+                    idKey = idKey
+                ))
             }
         }
+        if (consignments.isEmpty()) {
+            return 0
+        }
+        val stored = consignmentService.storeAllIfNew(consignments)
+        storedCounter.increment(stored.toDouble())
+        recentBlockWindow.record(consignments.first().l1AbsoluteSlot, consignments.map { it.consignmentId })
+        // Committed by now; rows stored by an earlier block are sent again, readers skip what they have
+        consignmentChangeFeed.publishConsignments(consignments.distinctBy { it.consignmentId })
+        log.info("Stored {} new of {} consignments from {} txs at slot {}", stored, consignments.size,
+            consignments.distinctBy { it.l1TransactionHash }.size, consignments.first().l1AbsoluteSlot)
+        blockTimer.record(System.nanoTime() - started, TimeUnit.NANOSECONDS)
+        return stored
+    }
+
+    /**
+     * The id and id key of a delta item: the id key of the version it builds on, from this block or
+     * stored, with its ver appended and hashed as the app's ConsignmentEntity.id does. Null, and
+     * the item left out, when that version was not indexed with its id key or the id derived does
+     * not start with the published prefix.
+     */
+    private fun deltaId(txHash: String, idPrefix: String, delta: LOBOnChainDelta, inBlock: List<ConsignmentEntity>): Pair<String, String>? {
+        val idKey = inBlock.singleOrNull { it.l1TransactionHash == delta.baseTxHash && it.consignmentId.startsWith(delta.baseIdPrefix) }?.idKey
+            ?: consignmentService.findIdKey(delta.baseTxHash, delta.baseIdPrefix)
+        val id = idKey?.let { HexUtil.encodeHexString(MessageDigest.getInstance("SHA-256").digest("$it::${delta.ver}".toByteArray())) }
+        if (idKey == null || id == null || !id.startsWith(idPrefix)) {
+            unresolvedDeltaCounter.increment()
+            log.warn("Skipping delta consignment {} of tx {}: base {} in tx {} {}", idPrefix, txHash, delta.baseIdPrefix,
+                delta.baseTxHash, if (idKey == null) "is not indexed with its id key" else "gives id $id")
+            return null
+        }
+        return Pair(id, idKey)
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,69 @@
+package tech.edgx.cms_demo_indexer.service
+
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.jdbc.core.JdbcTemplate
+import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.stereotype.Service
+import java.time.YearMonth
+import java.time.format.DateTimeFormatter
+
+/**
+ * Keeps the monthly created_at partitions of blockchain_reader_consignment: creates them ahead of
+ * time and detaches those older than the retention period, as standalone tables named
+ * blockchain_reader_consignment_pYYYY_MM for scripts/archive_partitions.py to export.
+ * A retention of 0 months keeps everything attached.
+ */
+@Service
+class ConsignmentPartitionService(
+    private val jdbcTemplate: JdbcTemplate,
+    @Value("\${lob.consignment.partitions.months_ahead:2}") private val monthsAhead: Long,
+    @Value("\${lob.consignment.partitions.retention_months:0}") private val retentionMonths: Long
+) {
+    private val log = LoggerFactory.getLogger(this::class.java)
+
+    companion object {
+        private const val TABLE = "blockchain_reader_consignment"
+        private val SUFFIX = DateTimeFormatter.ofPattern("'_p'yyyy_MM")
+        private val PARTITION_NAME = Regex("^${TABLE}_p(\\d{4})_(\\d{2})$")
+    }
+
+    @Scheduled(
+        fixedDelayString = "\${lob.consignment.partitions.fixed_delay:PT6H}",
+        initialDelayString = "\${lob.consignment.partitions.initial_delay:PT1M}"
+    )
+    fun maintainPartitions() {
+        val currentMonth = YearMonth.now()
+        for (ahead in 0..monthsAhead) {
+            val month = currentMonth.plusMonths(ahead)
+            try {
+                jdbcTemplate.execute("""
+                    CREATE TABLE IF NOT EXISTS ${TABLE}${month.format(SUFFIX)} PARTITION OF $TABLE
+                    FOR VALUES FROM ('${month.atDay(1)}') TO ('${month.plusMonths(1).atDay(1)}')
+                """)
+            } catch (e: Exception) {
+                // Typically rows of that month already sit in the default partition
+                log.error("Failed to create consignment partition for {}", month, e)
+            }
+        }
+        if (retentionMonths > 0) {
+            val oldestKept = currentMonth.minusMonths(retentionMonths)
+            attachedPartitions().filterKeys { it < oldestKept }.forEach { (month, partition) ->
+                // Readers no longer see these rows, they are archived rather than rolled back
+                jdbcTemplate.execute("ALTER TABLE $TABLE DETACH PARTITION $partition")
+                log.info("Detached consignment partition {} ({}) for archiving", partition, month)
+            }
+        }
+    }
+
+    private fun attachedPartitions(): Map<YearMonth, String> {
+        val names = jdbcTemplate.queryForList("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(? AS regclass)
+        """, String::class.java, TABLE)
+        return names.mapNotNull { name ->
+            PARTITION_NAME.find(name)?.let { YearMonth.of(it.groupValues[1].toInt(), it.groupValues[2].toInt()) to name }
+        }.toMap().toSortedMap()
+    }
+}
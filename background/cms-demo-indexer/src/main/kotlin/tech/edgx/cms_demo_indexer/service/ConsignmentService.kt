@@ -3,13 +3,18 @@ package tech.edgx.cms_demo_indexer.service
 import org.slf4j.LoggerFactory
 import org.springframework.stereotype.Service
 import org.springframework.transaction.annotation.Transactional
+import tech.edgx.cms_demo_indexer.domain.ConsignmentRollback
+import tech.edgx.cms_demo_indexer.repository.ConsignmentJdbcRepository
+import tech.edgx.cms_demo_indexer.repository.ConsignmentRollbackRepository
 import tech.edgx.cms_demo_indexer.repository.ConsignmentRepository
 import tech.edgx.cms_demo_indexer.domain.entity.ConsignmentEntity
 import java.util.Optional
 
 @Service
 class ConsignmentService(
-    private val consignmentRepository: ConsignmentRepository
+    private val consignmentRepository: ConsignmentRepository,
+    private val consignmentJdbcRepository: ConsignmentJdbcRepository,
+    private val consignmentRollbackRepository: ConsignmentRollbackRepository
 ) {
     private val log = LoggerFactory.getLogger(this::class.java)
 
@@ -19,9 +24,35 @@ class ConsignmentService(
     }
 
     @Transactional
-    fun deleteAfterSlot(absoluteSlot: Long) {
+    fun deleteAfterSlot(absoluteSlot: Long): List<String> {
         log.info("Deleting consignments after slot: {}", absoluteSlot)
-        consignmentRepository.deleteBySlotGreaterThan(absoluteSlot)
+        return consignmentJdbcRepository.deleteAfterSlot(absoluteSlot)
+    }
+
+    /**
+     * Removes the consignments a rollback to absoluteSlot undid: the ones in windowIds when the
+     * rollback stayed within the recent block window, otherwise everything after the slot. A
+     * rollback that removed anything is recorded for readers to revert their copies.
+     */
+    @Transactional
+    fun rollbackTo(absoluteSlot: Long, blockHash: String?, windowIds: Collection<String>?): ConsignmentRollback? {
+        val deleted = if (windowIds != null) {
+            consignmentJdbcRepository.deleteByIdsAfterSlot(windowIds, absoluteSlot)
+        } else {
+            deleteAfterSlot(absoluteSlot)
+        }
+        if (deleted.isEmpty()) {
+            return null
+        }
+        return consignmentRollbackRepository.insert(absoluteSlot, blockHash, deleted, windowIds != null)
+    }
+
+    fun findRollbacksAfter(afterId: Long, limit: Int): List<ConsignmentRollback> {
+        return consignmentRollbackRepository.findAfter(afterId, limit)
+    }
+
+    fun findLatestRollback(): ConsignmentRollback? {
+        return consignmentRollbackRepository.findLatest()
     }
 
     @Transactional
@@ -33,6 +64,20 @@ class ConsignmentService(
             )
     }
 
+    /** Stores the consignments not stored yet in one multi-row insert, returns how many were new. */
+    @Transactional
+    fun storeAllIfNew(consignmentEntities: Collection<ConsignmentEntity>): Int {
+        if (consignmentEntities.isEmpty()) {
+            return 0
+        }
+        return consignmentJdbcRepository.insertIgnoringExisting(consignmentEntities)
+    }
+
+    /** The id key of the consignment stored from txHash whose id starts with idPrefix, null when there is not exactly one. */
+    fun findIdKey(txHash: String, idPrefix: String): String? {
+        return consignmentJdbcRepository.findIdKeys(txHash, idPrefix).singleOrNull()
+    }
+
     fun exists(consignmentId: String): Boolean {
         return consignmentRepository.existsById(consignmentId)
     }
@@ -0,0 +1,43 @@
+package tech.edgx.cms_demo_indexer.service
+
+import com.bloxbean.cardano.yaci.store.events.BlockHeaderEvent
+import io.micrometer.core.instrument.Gauge
+import io.micrometer.core.instrument.MeterRegistry
+import org.springframework.context.event.EventListener
+import org.springframework.stereotype.Service
+import java.time.Instant
+import java.util.concurrent.atomic.AtomicLong
+
+/**
+ * Tracks the last block chain sync processed, for cms.indexer.sync.slot and cms.indexer.sync.lag:
+ * the seconds between that block's time and now, i.e. slots behind the tip. The lag keeps growing
+ * while sync is stalled, which a gauge of the last event alone would not show.
+ */
+@Service
+class IndexerSyncMetrics(meterRegistry: MeterRegistry) {
+    private val lastSlot = AtomicLong(-1)
+    private val lastBlockTime = AtomicLong(-1)
+
+    init {
+        Gauge.builder("cms.indexer.sync.slot", lastSlot) { it.get().toDouble() }
+            .description("Slot of the last block processed by chain sync")
+            .register(meterRegistry)
+        Gauge.builder("cms.indexer.sync.lag", lastBlockTime) { syncLagSeconds(it.get()) }
+            .description("Seconds between the last block processed by chain sync and now")
+            .baseUnit("seconds")
+            .register(meterRegistry)
+    }
+
+    @EventListener
+    fun blockHeaderEvent(event: BlockHeaderEvent) {
+        lastSlot.set(event.metadata.slot)
+        lastBlockTime.set(event.metadata.blockTime)
+    }
+
+    private fun syncLagSeconds(blockTime: Long): Double {
+        if (blockTime < 0) {
+            return Double.NaN
+        }
+        return maxOf(0L, Instant.now().epochSecond - blockTime).toDouble()
+    }
+}
@@ -0,0 +1,50 @@
+package tech.edgx.cms_demo_indexer.service
+
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.stereotype.Component
+
+/**
+ * The consignments of the last windowBlocks blocks that carried any, in memory, so a rollback
+ * within the window knows which rows to delete without scanning by slot. Only blocks processed
+ * since startup are known; a rollback to before the oldest of them is not covered.
+ */
+@Component
+class RecentBlockWindow(
+    @Value("\${lob.consignment.rollback.window_blocks:200}") private val windowBlocks: Int
+) {
+    private class Block(val slot: Long, val consignmentIds: List<String>)
+
+    private val blocks = ArrayDeque<Block>()
+    // Rollbacks to this slot or later are covered, everything stored after it is in the window
+    private var coveredFromSlot = Long.MAX_VALUE
+
+    @Synchronized
+    fun record(slot: Long, consignmentIds: Collection<String>) {
+        if (coveredFromSlot == Long.MAX_VALUE) {
+            coveredFromSlot = slot
+        }
+        blocks.addLast(Block(slot, consignmentIds.toList()))
+        while (blocks.size > windowBlocks) {
+            coveredFromSlot = blocks.removeFirst().slot
+        }
+    }
+
+    /**
+     * Drops the blocks after slot and returns their consignment ids, or null when the rollback
+     * reaches past the window and the caller has to delete by slot.
+     */
+    @Synchronized
+    fun rollbackTo(slot: Long): List<String>? {
+        if (slot < coveredFromSlot) {
+            // Whatever is left would be stale once the caller deletes by slot
+            blocks.clear()
+            coveredFromSlot = Long.MAX_VALUE
+            return null
+        }
+        val removed = mutableListOf<String>()
+        while (blocks.isNotEmpty() && blocks.last().slot > slot) {
+            removed.addAll(blocks.removeLast().consignmentIds)
+        }
+        return removed
+    }
+}
@@ -0,0 +1,2 @@
+-- Backs the keyset pages readers request with afterSlot/afterTxHash
+CREATE INDEX idx_consignment_slot_tx_hash ON blockchain_reader_consignment (l1_absolute_slot, l1_transaction_hash, consignment_id);
@@ -0,0 +1,47 @@
+-- Monthly range partitions on created_at, see ConsignmentPartitionService. created_at is not mapped by
+-- the entity, the column default fills it in. The primary key has to include the partition key.
+ALTER TABLE blockchain_reader_consignment RENAME TO blockchain_reader_consignment_unpartitioned;
+
+CREATE TABLE blockchain_reader_consignment (
+   consignment_id CHAR(64) NOT NULL,
+   organisation_id CHAR(64) NOT NULL,
+   l1_absolute_slot BIGINT NOT NULL,
+   l1_transaction_hash CHAR(64) NOT NULL,
+
+   created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+   updated_at TIMESTAMP WITHOUT TIME ZONE,
+
+   PRIMARY KEY (consignment_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside the monthly partitions, ConsignmentPartitionService keeps it empty by creating months ahead
+CREATE TABLE blockchain_reader_consignment_default PARTITION OF blockchain_reader_consignment DEFAULT;
+
+DO $$
+DECLARE
+    partition_month TIMESTAMP;
+BEGIN
+    FOR partition_month IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(oldest, now()), now())),
+            date_trunc('month', now()) + INTERVAL '2 months',
+            INTERVAL '1 month')
+        FROM (SELECT MIN(created_at) AS oldest FROM blockchain_reader_consignment_unpartitioned) AS existing
+    LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF blockchain_reader_consignment FOR VALUES FROM (%L) TO (%L)',
+            'blockchain_reader_consignment_p' || to_char(partition_month, 'YYYY_MM'),
+            partition_month, partition_month + INTERVAL '1 month');
+    END LOOP;
+END;
+$$;
+
+-- Rows stored before this migration have no created_at
+INSERT INTO blockchain_reader_consignment
+SELECT consignment_id, organisation_id, l1_absolute_slot, l1_transaction_hash, COALESCE(created_at, now()), updated_at
+FROM blockchain_reader_consignment_unpartitioned;
+
+DROP TABLE blockchain_reader_consignment_unpartitioned;
+
+CREATE INDEX idx_consignment_l1_absolute_slot ON blockchain_reader_consignment (l1_absolute_slot);
+-- Backs the keyset pages readers request with afterSlot/afterTxHash
+CREATE INDEX idx_consignment_slot_tx_hash ON blockchain_reader_consignment (l1_absolute_slot, l1_transaction_hash, consignment_id);
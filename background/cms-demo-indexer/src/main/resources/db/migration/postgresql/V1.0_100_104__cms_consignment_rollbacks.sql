@@ -0,0 +1,12 @@
+-- One row per chain rollback that removed consignments, the feed readers revert their copies from.
+-- consignment_ids are the rows deleted, fast_path tells whether they came from the in-memory block window
+CREATE TABLE blockchain_reader_rollback (
+   id BIGSERIAL NOT NULL,
+   rollback_slot BIGINT NOT NULL,
+   block_hash VARCHAR(64),
+   consignment_ids TEXT[] NOT NULL,
+   fast_path BOOLEAN NOT NULL,
+   created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+
+   PRIMARY KEY (id)
+);
@@ -0,0 +1,7 @@
+-- sender::receiver::dispatchedAt of each consignment version, what ids are derived from. Delta items
+-- publish no id, theirs is the id key of the version they build on with their ver appended.
+-- Rows indexed before this migration have none, deltas building on them cannot be indexed.
+ALTER TABLE blockchain_reader_consignment ADD COLUMN id_key TEXT;
+
+-- Delta items name the transaction of the version they build on
+CREATE INDEX idx_consignment_l1_transaction_hash ON blockchain_reader_consignment (l1_transaction_hash);
@@ -0,0 +1,17 @@
+-- Since V1.0_100_103 the primary key is (consignment_id, created_at), so nothing in the schema kept two
+-- rows from sharing a consignment id. Every insert now takes a transaction advisory lock on its id and
+-- fails like a primary key would when the id is already stored. ConsignmentJdbcRepository takes the
+-- same locks before its NOT EXISTS check. Key: (1449, hashtext(consignment_id)).
+CREATE FUNCTION blockchain_reader_consignment_unique_id() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(1449, hashtext(NEW.consignment_id));
+    IF EXISTS (SELECT 1 FROM blockchain_reader_consignment WHERE consignment_id = NEW.consignment_id) THEN
+        RAISE unique_violation USING MESSAGE = format('consignment_id %s already exists', NEW.consignment_id);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blockchain_reader_consignment_unique_id
+    BEFORE INSERT ON blockchain_reader_consignment
+    FOR EACH ROW EXECUTE FUNCTION blockchain_reader_consignment_unique_id();
@@ -0,0 +1,79 @@
+package tech.edgx.cms_demo_indexer
+
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertNull
+import org.junit.jupiter.api.Test
+import tech.edgx.cms_demo_indexer.service.RecentBlockWindow
+
+class RecentBlockWindowTest {
+
+    @Test
+    fun `test a rollback within the window returns the ids of the later blocks`() {
+        // Given
+        val window = RecentBlockWindow(10)
+        window.record(100, listOf("a"))
+        window.record(110, listOf("b", "c"))
+        window.record(120, listOf("d"))
+
+        // When
+        val removed = window.rollbackTo(110)
+
+        // Then
+        assertEquals(listOf("d"), removed)
+        assertEquals(listOf("b", "c"), window.rollbackTo(105))
+    }
+
+    @Test
+    fun `test a rollback to the oldest recorded block is covered, one before it is not`() {
+        // Given
+        val window = RecentBlockWindow(10)
+        window.record(100, listOf("a"))
+        window.record(110, listOf("b"))
+
+        // When
+        val toOldest = window.rollbackTo(100)
+        val beforeOldest = window.rollbackTo(99)
+
+        // Then
+        assertEquals(listOf("b"), toOldest)
+        assertNull(beforeOldest)
+    }
+
+    @Test
+    fun `test blocks pushed out of the window move its coverage forward`() {
+        // Given
+        fun fullWindow() = RecentBlockWindow(2).apply {
+            record(100, listOf("a"))
+            record(110, listOf("b"))
+            record(120, listOf("c"))
+        }
+
+        // When
+        val toEvicted = fullWindow().rollbackTo(100)
+        val beforeEvicted = fullWindow().rollbackTo(99)
+
+        // Then
+        assertEquals(listOf("c", "b"), toEvicted, "Everything after the evicted block is still in the window")
+        assertNull(beforeEvicted, "The evicted block's consignments are no longer known")
+    }
+
+    @Test
+    fun `test a rollback past the window forgets everything until blocks are recorded again`() {
+        // Given
+        val window = RecentBlockWindow(10)
+        window.record(100, listOf("a"))
+        window.record(110, listOf("b"))
+
+        // When
+        val pastWindow = window.rollbackTo(50)
+        val afterReset = window.rollbackTo(105)
+        window.record(130, listOf("c"))
+        window.record(140, listOf("d"))
+
+        // Then
+        assertNull(pastWindow)
+        assertNull(afterReset)
+        assertEquals(listOf("d"), window.rollbackTo(130))
+        assertNull(window.rollbackTo(129))
+    }
+}
@@ -40,6 +40,8 @@ dependencies {
 	testRuntimeOnly("org.junit.platform:junit-platform-launcher")
 
 	implementation("org.springframework.boot:spring-boot-starter-web")
+	implementation("org.springframework.boot:spring-boot-starter-actuator") // /actuator/prometheus
+	runtimeOnly("io.micrometer:micrometer-registry-prometheus")
 	implementation("com.fasterxml.jackson.module:jackson-module-kotlin")
 	implementation("org.springframework.boot:spring-boot-starter-validation") // Add for Validator
 	implementation("org.springframework.boot:spring-boot-starter-oauth2-client") // Add for Keycloak
@@ -0,0 +1,155 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+
+from dotenv import load_dotenv
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Partitioned tables whose detached monthly partitions (<table>_pYYYY_MM) are archived
+TABLES = ["public.blockchain_publisher_consignment", "lob_follower_service.blockchain_reader_consignment"]
+
+
+def arrow_type(data_type):
+    """Parquet column type for an information_schema data_type; enums and jsonb are stored as text."""
+    return {
+        "bigint": pa.int64(),
+        "integer": pa.int32(),
+        "smallint": pa.int16(),
+        "double precision": pa.float64(),
+        "real": pa.float32(),
+        "boolean": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp without time zone": pa.timestamp("us"),
+        "timestamp with time zone": pa.timestamp("us", tz="UTC"),
+    }.get(data_type, pa.string())
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Export detached monthly consignment partitions to zstd compressed Parquet files, one per month, "
+                    "for scripts/query_archive.py. Needs psycopg2 and pyarrow (pip install psycopg2-binary pyarrow).")
+    parser.add_argument("--dsn", default=None,
+                        help="libpq connection string (default: localhost:5433 with DATABASE_NAME, DATABASE_USERNAME "
+                             "and DATABASE_PASSWORD from the environment)")
+    parser.add_argument("--table", action="append", default=None,
+                        help=f"schema.table whose detached partitions to archive, repeatable (default: {', '.join(TABLES)})")
+    parser.add_argument("--out-dir", default="archive", help="Archive root, files go to <out-dir>/<table>/ (default: archive)")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows per fetch and Parquet row group (default: 50000)")
+    parser.add_argument("--compression", default="zstd", help="Parquet compression codec (default: zstd)")
+    parser.add_argument("--drop", action="store_true", help="Drop each partition once its export is verified")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the partitions that would be archived")
+    return parser.parse_args()
+
+
+def default_dsn():
+    return (f"host=localhost port=5433 dbname={os.environ.get('DATABASE_NAME', 'cmsdemo')} "
+            f"user={os.environ.get('DATABASE_USERNAME', '')} password={os.environ.get('DATABASE_PASSWORD', '')}")
+
+
+def detached_partitions(conn, schema, table):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relkind = 'r' AND c.relname ~ %s
+            AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+            ORDER BY c.relname
+        """, (schema, f"^{re.escape(table)}_p[0-9]{{4}}_[0-9]{{2}}$"))
+        return [row[0] for row in cur.fetchall()]
+
+
+def export_partition(conn, schema, partition, path, batch_size, compression):
+    """Streams the partition in created_at order into a Parquet file; returns the rows written."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position
+        """, (schema, partition))
+        columns = cur.fetchall()
+    arrow_schema = pa.schema([(name, arrow_type(data_type)) for name, data_type in columns])
+    json_columns = {i for i, (_, data_type) in enumerate(columns) if data_type in ("json", "jsonb")}
+
+    tmp_path = path + ".tmp"
+    rows_written = 0
+    # A named cursor keeps the partition on the server side, only batch_size rows are in memory at a time
+    with conn.cursor(name=f"archive_{partition}") as cur, \
+            pq.ParquetWriter(tmp_path, arrow_schema, compression=compression) as writer:
+        cur.itersize = batch_size
+        cur.execute(f'SELECT * FROM "{schema}"."{partition}" ORDER BY created_at')
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            arrays = [pa.array([json.dumps(row[i]) if i in json_columns and row[i] is not None else row[i]
+                                for row in rows], type=field.type)
+                      for i, field in enumerate(arrow_schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=arrow_schema))
+            rows_written += len(rows)
+    os.replace(tmp_path, path)
+    return rows_written
+
+
+def main():
+    args = parse_arguments()
+    if psycopg2 is None or pa is None:
+        logger.error("Error: psycopg2 and pyarrow are required, pip install psycopg2-binary pyarrow")
+        sys.exit(1)
+
+    conn = psycopg2.connect(args.dsn or default_dsn())
+    failures = 0
+    try:
+        for qualified in args.table or TABLES:
+            schema, table = qualified.split(".", 1)
+            partitions = detached_partitions(conn, schema, table)
+            logger.info(f"{qualified}: {len(partitions)} detached partitions {partitions}")
+            if args.dry_run or not partitions:
+                continue
+            table_dir = os.path.join(args.out_dir, table)
+            os.makedirs(table_dir, exist_ok=True)
+            for partition in partitions:
+                path = os.path.join(table_dir, partition[len(table) + 2:] + ".parquet")
+                with conn.cursor() as cur:
+                    cur.execute(f'SELECT count(*) FROM "{schema}"."{partition}"')
+                    expected = cur.fetchone()[0]
+                written = export_partition(conn, schema, partition, path, args.batch_size, args.compression)
+                conn.commit()
+                stored = pq.ParquetFile(path).metadata.num_rows
+                if written != expected or stored != expected:
+                    logger.error(f"{partition}: {expected} rows in the table but {stored} in {path}, keeping the table")
+                    failures += 1
+                    continue
+                logger.info(f"{partition}: archived {stored} rows to {path} ({os.path.getsize(path)} bytes)")
+                if args.drop:
+                    with conn.cursor() as cur:
+                        cur.execute(f'DROP TABLE "{schema}"."{partition}"')
+                    conn.commit()
+                    logger.info(f"{partition}: dropped")
+    finally:
+        conn.close()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+MIGRATIONS_DIR = os.path.join(SCRIPT_DIR, "..", "src", "main", "resources", "db", "migration")
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TABLE_MIGRATION = "V1_3__add_consignment_entity.sql"
+INDEX_MIGRATION = "V1_5__add_consignment_indexes.sql"
+
+# Created by the Reeve blockchain publisher migrations in a real database
+ENUM_TYPES = """
+    CREATE TYPE blockchain_publisher_finality_score_type AS ENUM
+        ('VERY_LOW', 'LOW', 'MEDIUM', 'HIGH', 'VERY_HIGH', 'ULTRA_HIGH', 'FINAL');
+    CREATE TYPE blockchain_publisher_blockchain_publish_status_type AS ENUM
+        ('STORED', 'ROLLBACKED', 'SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED', 'FINALIZED');
+"""
+
+# Most consignments are final, a few wait dispatch or finality, spread across orgs and versions
+SEED = """
+    SELECT setseed(0.42);
+    INSERT INTO blockchain_publisher_consignment (
+        consignment_id, id_control, ver, goods, sender_id, receiver_id,
+        l1_transaction_hash, l1_absolute_slot, l1_finality_score, l1_publish_status,
+        tracking_status, dispatched_at, created_at, updated_at
+    )
+    SELECT md5(g::text) || md5('c' || g),
+           md5((g / %(versions)s)::text) || md5('i' || (g / %(versions)s)),
+           g %% %(versions)s + 1,
+           jsonb_build_object('item1', g),
+           'org-' || (g %% %(orgs)s),
+           'org-' || ((g + 1) %% %(orgs)s),
+           CASE WHEN s.status IN ('STORED', 'ROLLBACKED') THEN NULL ELSE md5('t' || (g / 50)) || md5('h' || (g / 50)) END,
+           CASE WHEN s.status IN ('STORED', 'ROLLBACKED') THEN NULL ELSE 80000000 + g END,
+           CASE WHEN s.status = 'FINALIZED' THEN 'FINAL' END::blockchain_publisher_finality_score_type,
+           s.status::blockchain_publisher_blockchain_publish_status_type,
+           'IN_TRANSIT',
+           now() - (%(rows)s - g) * interval '1 second',
+           now() - (%(rows)s - g) * interval '1 second',
+           now() - (%(rows)s - g) * interval '1 second'
+    FROM generate_series(1, %(rows)s) AS g
+    CROSS JOIN LATERAL (
+        SELECT CASE
+            WHEN r < %(pending)s / 2 THEN 'STORED'
+            WHEN r < %(pending)s THEN 'ROLLBACKED'
+            WHEN r < %(pending)s + %(in_flight)s / 3 THEN 'SUBMITTED'
+            WHEN r < %(pending)s + 2 * %(in_flight)s / 3 THEN 'VISIBLE_ON_CHAIN'
+            WHEN r < %(pending)s + %(in_flight)s THEN 'COMPLETED'
+            ELSE 'FINALIZED'
+        END AS status
+        FROM (SELECT random() + g * 0 AS r) AS draw
+    ) AS s
+"""
+
+# The SQL Hibernate generates for the ConsignmentEntityRepository queries, with the gateway's status sets
+QUERIES = {
+    "findConsignmentsByStatus": """
+        SELECT * FROM blockchain_publisher_consignment
+        WHERE sender_id = %(org)s AND l1_publish_status IN ('STORED', 'ROLLBACKED')
+        ORDER BY created_at ASC, consignment_id ASC LIMIT %(limit)s
+    """,
+    "findLatestByIdControl": """
+        SELECT * FROM blockchain_publisher_consignment
+        WHERE id_control = %(id_control)s
+        ORDER BY ver DESC LIMIT 1
+    """,
+    "findDispatchedConsignmentsThatAreNotFinalizedYet": """
+        SELECT * FROM blockchain_publisher_consignment
+        WHERE sender_id = %(org)s AND l1_publish_status IN ('SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED')
+        AND l1_transaction_hash IS NOT NULL
+        ORDER BY created_at ASC, consignment_id ASC LIMIT %(limit)s
+    """,
+    "findAllDispatchedConsignmentsThatAreNotFinalizedYet": """
+        SELECT * FROM blockchain_publisher_consignment
+        WHERE l1_publish_status IN ('SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED')
+        AND l1_transaction_hash IS NOT NULL
+        ORDER BY created_at ASC, consignment_id ASC LIMIT %(limit)s
+    """,
+    "findAllSubmittedConsignments": """
+        SELECT * FROM blockchain_publisher_consignment
+        WHERE l1_publish_status IN ('SUBMITTED')
+        AND l1_transaction_hash IS NOT NULL
+        ORDER BY created_at ASC, consignment_id ASC LIMIT %(limit)s
+    """
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Seed blockchain_publisher_consignment in a scratch schema of a local Postgres and compare EXPLAIN "
+                    f"plans and latency of the dispatcher and WatchDog queries before and after {INDEX_MIGRATION}. "
+                    "Needs psycopg2 (pip install psycopg2-binary).")
+    parser.add_argument("--dsn", default=None,
+                        help="libpq connection string (default: localhost:5433 with DATABASE_NAME, DATABASE_USERNAME "
+                             "and DATABASE_PASSWORD from the environment)")
+    parser.add_argument("--schema", default="bench_indexes", help="Scratch schema, dropped first (default: bench_indexes)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Consignments to seed (default: 1000000)")
+    parser.add_argument("--orgs", type=int, default=10, help="Sending organisations (default: 10)")
+    parser.add_argument("--versions", type=int, default=3, help="Versions per consignment (default: 3)")
+    parser.add_argument("--pending", type=float, default=0.01,
+                        help="Share of consignments waiting dispatch (default: 0.01)")
+    parser.add_argument("--in-flight", type=float, default=0.02,
+                        help="Share of consignments on chain but not final (default: 0.02)")
+    parser.add_argument("--limit", type=int, default=100, help="Query LIMIT, as the batch sizes (default: 100)")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed runs per query (default: 50)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema afterwards")
+    parser.add_argument("--json-out", default=None, help="Optional file to write plans and latencies to as JSON")
+    return parser.parse_args()
+
+
+def default_dsn():
+    return (f"host=localhost port=5433 dbname={os.environ.get('DATABASE_NAME', 'cmsdemo')} "
+            f"user={os.environ.get('DATABASE_USERNAME', '')} password={os.environ.get('DATABASE_PASSWORD', '')}")
+
+
+def read_migration(name):
+    with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+        return f.read()
+
+
+def plan_summary(plan_lines):
+    """The plan's node lines without the costs, e.g. 'Limit > Index Scan using idx_... on ...'."""
+    nodes = [line.strip().lstrip("-> ").split("  (")[0] for line in plan_lines if "(cost=" in line]
+    return " > ".join(nodes)
+
+
+def measure(cur, params, repeat):
+    results = {}
+    for name, sql in QUERIES.items():
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+        plan = [row[0] for row in cur.fetchall()]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = {
+            "plan": plan,
+            "median_ms": statistics.median(timings),
+            "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        }
+        logger.info(f"  {name}: median {results[name]['median_ms']:.2f} ms, p95 {results[name]['p95_ms']:.2f} ms, "
+                    f"{plan_summary(plan)}")
+    return results
+
+
+def main():
+    args = parse_arguments()
+    if psycopg2 is None:
+        logger.error("Error: psycopg2 is not installed, pip install psycopg2-binary")
+        sys.exit(1)
+
+    conn = psycopg2.connect(args.dsn or default_dsn())
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {args.schema}")
+        cur.execute(f"SET search_path TO {args.schema}")
+        cur.execute(ENUM_TYPES)
+        cur.execute(read_migration(TABLE_MIGRATION))
+
+        logger.info(f"Seeding {args.rows} consignments into {args.schema}.blockchain_publisher_consignment ...")
+        started = time.time()
+        cur.execute(SEED, {"rows": args.rows, "orgs": args.orgs, "versions": args.versions,
+                           "pending": args.pending, "in_flight": args.in_flight})
+        cur.execute("VACUUM ANALYZE blockchain_publisher_consignment")
+        logger.info(f"Seeded in {time.time() - started:.1f}s")
+
+        cur.execute("SELECT id_control FROM blockchain_publisher_consignment ORDER BY created_at DESC LIMIT 1")
+        params = {"org": "org-0", "id_control": cur.fetchone()[0], "limit": args.limit}
+
+        logger.info("Before indexes:")
+        before = measure(cur, params, args.repeat)
+
+        started = time.time()
+        cur.execute(read_migration(INDEX_MIGRATION))
+        cur.execute("ANALYZE blockchain_publisher_consignment")
+        cur.execute("""
+            SELECT indexrelname, pg_size_pretty(pg_relation_size(indexrelid)) FROM pg_stat_user_indexes
+            WHERE schemaname = %s ORDER BY indexrelname
+        """, (args.schema,))
+        index_sizes = dict(cur.fetchall())
+        logger.info(f"Applied {INDEX_MIGRATION} in {time.time() - started:.1f}s, index sizes: {index_sizes}")
+
+        logger.info("After indexes:")
+        after = measure(cur, params, args.repeat)
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        conn.close()
+
+    logger.info(f"{'query':<52} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in QUERIES:
+        b, a = before[name]["median_ms"], after[name]["median_ms"]
+        logger.info(f"{name:<52} {b:>10.2f} {a:>10.2f} {b / a if a else float('inf'):>7.1f}x")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"rows": args.rows, "index_sizes": index_sizes, "before": before, "after": after}, f, indent=2)
+        logger.info(f"Wrote plans and latencies to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
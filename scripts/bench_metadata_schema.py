@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import logging
+import random
+import sys
+from datetime import datetime, timedelta
+
+from consignment_metadata import (CHECKPOINT_INTERVAL, VERSION_1, VERSION_2, cbor, cbor_decode, consignment_id, decode,
+                                  encode, encode_leaf, encode_merkle_root, leaf_hash, merkle_proof, merkle_root,
+                                  root_from_proof, to_json)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TRACKING_STATUSES = ["CREATED", "IN_TRANSIT", "IN_TRANSIT", "IN_TRANSIT", "DELIVERED", "AT_PORT"]
+CREATION_SLOT = 80_000_000
+# Preprod min_fee_a / min_fee_b, as in scripts/chain_standin.py
+MIN_FEE_A = 44
+MIN_FEE_B = 155381
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compare the consignment metadata schemas offline: bytes per consignment and how many "
+                    "consignments fit one transaction under the packer's metadata budget for schema 1.0 and the "
+                    "compact schema 2, with the resulting fee per consignment. With --updates, every consignment "
+                    "then gets that many new versions (moved, now and then a new status or goods) published as full "
+                    "schema 2 items and as deltas with checkpoints. With --max-leaves, the consignments are also "
+                    "published as anchored batches, a Merkle root on chain and the leaves off chain. Checks that "
+                    "schema 2, deltas included, decodes back to the consignments it encoded, and that every anchored "
+                    "leaf's proof leads to its root.")
+    parser.add_argument("--consignments", type=int, default=2000, help="Synthetic consignments to pack (default: 2000)")
+    parser.add_argument("--receivers", type=int, default=5, help="Distinct receiving organisations (default: 5)")
+    parser.add_argument("--max-tx-bytes", type=int, default=16000,
+                        help="lob.l1.transaction.max_size_bytes (default: 16000)")
+    parser.add_argument("--overhead-bytes", type=int, default=1200,
+                        help="lob.l1.transaction.overhead_bytes, the non-metadata part of a tx (default: 1200)")
+    parser.add_argument("--updates", type=int, default=7, help="New versions per consignment for the delta "
+                                                                "comparison, 0 to skip it (default: 7)")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL,
+                        help=f"lob.l1.transaction.delta.checkpoint_interval (default: {CHECKPOINT_INTERVAL})")
+    parser.add_argument("--max-leaves", type=int, default=4096,
+                        help="lob.l1.transaction.merkle.max_leaves, 0 to skip anchored batches. Caps the consignments per "
+                             "anchored tx, as does the remainder of --consignments left for the last batch (default: 4096)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the results to as JSON")
+    return parser.parse_args()
+
+
+def organisation(org_id):
+    return {"id": org_id, "name": f"Organisation {org_id[:8]}", "tax_id_number": f"TAX-{org_id[:10]}",
+            "currency_id": "ISO_4217:AUD", "country_code": "AU"}
+
+
+def synthetic_consignments(count, receivers, rng):
+    sender = organisation(hashlib.sha256(b"sender").hexdigest())
+    receiver_orgs = [organisation(hashlib.sha256(f"receiver{i}".encode()).hexdigest()) for i in range(receivers)]
+    base = datetime(2025, 7, 31, 11)
+    consignments = []
+    for index in range(count):
+        receiver = rng.choice(receiver_orgs)
+        dispatched_at = base + timedelta(milliseconds=index * rng.randint(1, 5000))
+        consignments.append({
+            "id": consignment_id(sender["id"], receiver["id"], dispatched_at, 1),
+            "ver": 1,
+            "goods": {f"item{i}": rng.randint(1, 500) for i in range(1, rng.randint(2, 4))},
+            "sender": sender,
+            "receiver": receiver,
+            "tracking_status": rng.choice(TRACKING_STATUSES),
+            "latitude": round(rng.uniform(-60, 60), rng.choice((4, 6, 7))),
+            "longitude": round(rng.uniform(-180, 180), rng.choice((4, 6, 7))),
+            "dispatched_at": dispatched_at,
+        })
+    return sender["id"], consignments
+
+
+def updated_versions(consignments, updates, rng):
+    """Rounds of versions: the consignments, then updates rounds in which every one of them moves and now and then
+    changes status or goods."""
+    rounds = [consignments]
+    for _ in range(updates):
+        current = []
+        for c in rounds[-1]:
+            ver = c["ver"] + 1
+            updated = {**c, "ver": ver, "id": consignment_id(c["sender"]["id"], c["receiver"]["id"], c["dispatched_at"], ver),
+                       "latitude": round(c["latitude"] + rng.uniform(-0.05, 0.05), 6),
+                       "longitude": round(c["longitude"] + rng.uniform(-0.05, 0.05), 6)}
+            if rng.random() < 0.2:
+                updated["tracking_status"] = rng.choice(TRACKING_STATUSES)
+            if rng.random() < 0.05:
+                updated["goods"] = {**c["goods"], "item1": rng.randint(1, 500)}
+            current.append(updated)
+        rounds.append(current)
+    return rounds
+
+
+def metadata_size(schema, org_id, consignments, now, **options):
+    return len(cbor(encode(schema, org_id, consignments, CREATION_SLOT, now, **options)))
+
+
+def pack(schema, org_id, consignments, budget, now, **options):
+    """Largest prefix under the budget, binary searched like ConsignmentTxPacker."""
+    low, high = 0, len(consignments)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if metadata_size(schema, org_id, consignments[:mid], now, **options) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return max(low, 1)
+
+
+def run_schema(schema, org_id, consignments, budget, overhead, now):
+    per_tx, sizes, fees = [], [], []
+    remaining = consignments
+    while remaining:
+        n = pack(schema, org_id, remaining, budget, now)
+        size = metadata_size(schema, org_id, remaining[:n], now)
+        per_tx.append(n)
+        sizes.append(size)
+        fees.append(MIN_FEE_A * (size + overhead) + MIN_FEE_B)
+        remaining = remaining[n:]
+    total = sum(per_tx)
+    return {
+        "transactions": len(per_tx),
+        "consignments_per_tx_mean": total / len(per_tx),
+        "consignments_per_tx_max": max(per_tx),
+        "bytes_per_consignment": sum(sizes) / total,
+        "fee_lovelace_per_consignment": sum(fees) / total,
+    }
+
+
+def publish_versions(rounds, org_id, budget, overhead, now, checkpoint_interval):
+    """Publishes the rounds in order, each version's previous one already on chain. Returns the chain (tx hash to
+    metadata as the indexer serves it) and the cost of the updates, the rounds after the first."""
+    chain, published = {}, {}
+    per_tx, sizes, fees, deltas = [], [], [], 0
+    for round_index, consignments in enumerate(rounds):
+        bases = {c["id"]: published[consignment_id(c["sender"]["id"], c["receiver"]["id"], c["dispatched_at"], c["ver"] - 1)]
+                 for c in consignments if c["ver"] > 1}
+        options = {"bases": bases, "checkpoint_interval": checkpoint_interval}
+        remaining = consignments
+        while remaining:
+            n = pack(VERSION_2, org_id, remaining, budget, now, **options)
+            metadata = encode(VERSION_2, org_id, remaining[:n], CREATION_SLOT, now, **options)
+            data = cbor(metadata)
+            tx_hash = hashlib.sha256(data).hexdigest()
+            chain[tx_hash] = json.loads(json.dumps(to_json(metadata)))
+            for c in remaining[:n]:
+                published[c["id"]] = {"tx_hash": tx_hash, "consignment": c}
+            if round_index > 0:
+                per_tx.append(n)
+                sizes.append(len(data))
+                fees.append(MIN_FEE_A * (len(data) + overhead) + MIN_FEE_B)
+                deltas += sum(1 for item in metadata["d"] if "p" in item)
+            remaining = remaining[n:]
+    total = sum(per_tx)
+    return chain, {
+        "transactions": len(per_tx),
+        "updates_per_tx_mean": total / len(per_tx),
+        "bytes_per_update": sum(sizes) / total,
+        "fee_lovelace_per_update": sum(fees) / total,
+        "delta_share": deltas / total,
+    }
+
+
+def run_anchored(org_id, consignments, max_leaves, overhead, now):
+    """Anchored batches of up to max_leaves: what goes on chain per consignment, and what a counterpart fetches off
+    chain to check one (its leaf and proof). Returns the results and the first leaf whose proof fails, if any."""
+    on_chain, leaf_sizes, proof_sizes, fees, per_tx = [], [], [], [], []
+    failed = None
+    for start in range(0, len(consignments), max_leaves):
+        batch = consignments[start:start + max_leaves]
+        leaves = [cbor(encode_leaf(c, CREATION_SLOT, now)) for c in batch]
+        hashes = [leaf_hash(leaf) for leaf in leaves]
+        root = merkle_root(hashes)
+        size = len(cbor(encode_merkle_root(org_id, root, len(batch), (0, 0), CREATION_SLOT, now)))
+        for index in range(len(batch)):
+            path = merkle_proof(hashes, index)
+            proof_sizes.append(32 * len(path))
+            if failed is None and root_from_proof(hashes[index], index, len(batch), path) != root:
+                failed = batch[index]["id"]
+        on_chain.append(size)
+        leaf_sizes.extend(len(leaf) for leaf in leaves)
+        fees.append(MIN_FEE_A * (size + overhead) + MIN_FEE_B)
+        per_tx.append(len(batch))
+    total = sum(per_tx)
+    return {
+        "transactions": len(per_tx),
+        "consignments_per_tx_mean": total / len(per_tx),
+        "on_chain_bytes_per_consignment": sum(on_chain) / total,
+        "fee_lovelace_per_consignment": sum(fees) / total,
+        "leaf_bytes_mean": sum(leaf_sizes) / total,
+        "proof_bytes_max": max(proof_sizes),
+    }, failed
+
+
+def mismatch(expected, actual):
+    for field in ("id", "goods", "tracking_status", "dispatched_at"):
+        if expected[field] != actual[field]:
+            return f"{expected['id']} {field}: {expected[field]!r} != {actual[field]!r}"
+    if expected["receiver"]["id"] != actual["receiver"]["id"]:
+        return f"{expected['id']} receiver differs"
+    for field in ("latitude", "longitude"):
+        if abs(expected[field] - actual[field]) > 0.5e-7:
+            return f"{expected['id']} {field}: {expected[field]} != {actual[field]}"
+    return None
+
+
+def check_chain(chain, rounds):
+    """Every version decoded from the chain, deltas rebuilt through their bases, against what was published."""
+    expected = {c["id"]: c for consignments in rounds for c in consignments}
+    decoded = 0
+    for metadata in chain.values():
+        for actual in decode(metadata, chain.get):
+            problem = mismatch(expected[actual["id"]], actual)
+            if problem:
+                return problem
+            decoded += 1
+    return None if decoded == len(expected) else f"decoded {decoded} of {len(expected)} versions"
+
+
+def check_round_trip(org_id, consignments, now):
+    """Schema 2 through CBOR and through the indexer's JSON rendering, against the input."""
+    metadata = cbor_decode(cbor(encode(VERSION_2, org_id, consignments, CREATION_SLOT, now)))
+    for rendered in (metadata, json.loads(json.dumps(to_json(metadata)))):
+        for expected, actual in zip(consignments, decode(rendered), strict=True):
+            problem = mismatch(expected, actual)
+            if problem:
+                return problem
+    return None
+
+
+def main():
+    args = parse_arguments()
+    rng = random.Random(args.seed)
+    now = datetime(2025, 7, 31, 12)
+    org_id, consignments = synthetic_consignments(args.consignments, args.receivers, rng)
+    budget = args.max_tx_bytes - args.overhead_bytes
+
+    mismatch = check_round_trip(org_id, consignments, now)
+    if mismatch:
+        logger.error(f"Error: schema 2 does not round trip: {mismatch}")
+        sys.exit(1)
+
+    results = {"consignments": args.consignments, "receivers": args.receivers, "updates": args.updates,
+               "checkpoint_interval": args.checkpoint_interval, "max_leaves": args.max_leaves,
+               "metadata_budget_bytes": budget}
+    for name, schema in (("1.0", VERSION_1), ("2", VERSION_2)):
+        results[name] = run_schema(schema, org_id, consignments, budget, args.overhead_bytes, now)
+        r = results[name]
+        logger.info(f"schema {name:3}: {r['bytes_per_consignment']:6.1f} bytes/consignment, "
+                    f"{r['consignments_per_tx_mean']:6.1f} consignments/tx (max {r['consignments_per_tx_max']}), "
+                    f"{r['transactions']} txs, {r['fee_lovelace_per_consignment'] / 1e6:.5f} ADA/consignment")
+    v1, v2 = results["1.0"], results["2"]
+    results["bytes_ratio"] = v2["bytes_per_consignment"] / v1["bytes_per_consignment"]
+    results["consignments_per_tx_gain"] = v2["consignments_per_tx_mean"] / v1["consignments_per_tx_mean"]
+    logger.info(f"Schema 2 takes {100 * results['bytes_ratio']:.0f}% of the bytes, fits "
+                f"{results['consignments_per_tx_gain']:.1f}x the consignments per tx, and round trips")
+
+    if args.updates > 0:
+        rounds = updated_versions(consignments, args.updates, rng)
+        for name, interval in (("full", 1), ("delta", args.checkpoint_interval)):
+            chain, results[f"updates_{name}"] = publish_versions(rounds, org_id, budget, args.overhead_bytes, now, interval)
+            problem = check_chain(chain, rounds)
+            if problem:
+                logger.error(f"Error: {name} updates do not round trip: {problem}")
+                sys.exit(1)
+            r = results[f"updates_{name}"]
+            logger.info(f"updates {name:5}: {r['bytes_per_update']:6.1f} bytes/update, {r['updates_per_tx_mean']:6.1f} "
+                        f"updates/tx, {r['transactions']} txs, {r['fee_lovelace_per_update'] / 1e6:.5f} ADA/update, "
+                        f"{100 * r['delta_share']:.0f}% deltas")
+        full, delta = results["updates_full"], results["updates_delta"]
+        results["update_bytes_ratio"] = delta["bytes_per_update"] / full["bytes_per_update"]
+        logger.info(f"Deltas take {100 * results['update_bytes_ratio']:.0f}% of the bytes of full updates, rebuilding "
+                    f"a version replays at most {args.checkpoint_interval - 1} earlier transactions, and round trip")
+    if args.max_leaves > 0:
+        results["anchored"], failed = run_anchored(org_id, consignments, args.max_leaves, args.overhead_bytes, now)
+        if failed:
+            logger.error(f"Error: the proof of anchored leaf {failed} does not lead to its root")
+            sys.exit(1)
+        r = results["anchored"]
+        logger.info(f"anchored : {r['on_chain_bytes_per_consignment']:6.2f} on-chain bytes/consignment, "
+                    f"{r['consignments_per_tx_mean']:6.1f} consignments/tx, {r['transactions']} txs, "
+                    f"{r['fee_lovelace_per_consignment'] / 1e6:.5f} ADA/consignment; off chain "
+                    f"{r['leaf_bytes_mean']:.0f} bytes/leaf and proofs of up to {r['proof_bytes_max']} bytes")
+        results["anchored_consignments_per_tx_gain"] = r["consignments_per_tx_mean"] / v2["consignments_per_tx_mean"]
+        # A batch holds at most max_leaves and the last one only the remainder, so the gain is capped by both
+        logger.info(f"Anchored batches carry {results['anchored_consignments_per_tx_gain']:.1f}x the consignments per tx "
+                    f"of schema 2 (capped by --max-leaves {args.max_leaves} and the last batch's remainder), and every "
+                    f"proof leads to its root")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote results to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org, format_histogram, percentile
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Stages in the order a consignment passes through them, each timestamped on first observation
+STAGES = ["accepted", "tx_hash", "visible_org2", "finalized"]
+
+# Which part of the pipeline each stage-to-stage interval is bounded by
+STAGE_DRIVERS = {
+    "tx_hash": "org1 dispatcher (lob.blockchain_publisher.dispatcher.consignment.fixed_delay)",
+    "visible_org2": "chain inclusion + indexer + org2 reader (lob.blockchain_reader.rate.ms)",
+    "finalized": "org1 watchdog (lob.blockchain_publisher.watchdog.transaction.fixed_delay)"
+}
+
+CITY_COORDINATES = [
+    (51.5074, -0.1278),
+    (-33.8688, 151.2093),
+    (40.7128, -74.0060),
+    (-22.9068, -43.1729),
+    (35.6762, 139.6503)
+]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark org1 publish to org2 visibility latency, per pipeline stage")
+    parser.add_argument("--count", type=int, default=20,
+                        help="Number of consignments to drive concurrently (default: 20)")
+    parser.add_argument("--spread", type=float, default=0.0,
+                        help="Spread the creates evenly over this many seconds, so samples land at different "
+                             "points of the dispatcher/reader cycles (default: 0, all at once)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between polling rounds, i.e. the timing resolution (default: 1.0)")
+    parser.add_argument("--timeout", type=float, default=900,
+                        help="Give up on consignments that have not finalized after this many seconds (default: 900)")
+    parser.add_argument("--workers", type=int, default=20,
+                        help="Concurrent HTTP requests per polling round (default: 20)")
+    parser.add_argument("--bins", type=int, default=10,
+                        help="Histogram buckets per stage (default: 10)")
+    parser.add_argument("--json-out", default=None,
+                        help="Optional file to write the raw per-consignment timings and summary to as JSON")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Keep per-request client logging")
+    return parser.parse_args()
+
+
+class Sample:
+    """Stage timestamps (time.time()) of one consignment version as observed by the benchmark."""
+
+    def __init__(self, id_control, ver):
+        self.id_control = id_control
+        self.ver = ver
+        self.tx_hash = None
+        self.stages = {}
+
+    def mark(self, stage, at):
+        if stage not in self.stages:
+            self.stages[stage] = at
+            logger.debug(f"{self.id_control} ver={self.ver} reached {stage} after "
+                         f"{at - self.stages['accepted']:.1f}s")
+
+    @property
+    def done(self):
+        return "finalized" in self.stages and "visible_org2" in self.stages
+
+
+def create_sample(cms, index, args, sender_id, receiver_id, started):
+    if args.spread and args.count > 1:
+        time.sleep(max(0.0, started + index * args.spread / (args.count - 1) - time.time()))
+    lat, lon = random.choice(CITY_COORDINATES)
+    try:
+        created = cms.create_consignment({"item1": index + 1}, sender_id, receiver_id, "CREATED", lat, lon)
+    except requests.exceptions.RequestException:
+        return None
+    sample = Sample(created["idControl"], created.get("ver", 1))
+    sample.mark("accepted", time.time())
+    return sample
+
+
+def observe_org1(cms, sample):
+    """Stages visible on the sender side: tx hash assigned and publish status FINALIZED."""
+    state = cms.get_consignment(sample.id_control)
+    seen_at = time.time()
+    if not state or state.get("ver") != sample.ver:
+        return
+    l1 = state.get("l1SubmissionData") or {}
+    if l1.get("transactionHash"):
+        sample.tx_hash = l1["transactionHash"]
+        sample.mark("tx_hash", seen_at)
+    if l1.get("publishStatus") == "FINALIZED":
+        # Finality implies a hash even if both changed between two polling rounds
+        sample.mark("tx_hash", seen_at)
+        sample.mark("finalized", seen_at)
+
+
+def observe_org2(cms, sample):
+    state = cms.get_consignment(sample.id_control)
+    if state and state.get("ver") == sample.ver:
+        sample.mark("visible_org2", time.time())
+
+
+def poll_round(pool, cms_org1, cms_org2, pending):
+    futures = []
+    for sample in pending:
+        if "finalized" not in sample.stages:
+            futures.append(pool.submit(observe_org1, cms_org1, sample))
+        if "visible_org2" not in sample.stages:
+            futures.append(pool.submit(observe_org2, cms_org2, sample))
+    for future in futures:
+        try:
+            future.result()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Polling request failed, will retry next round: {e}")
+
+
+def stage_durations(samples):
+    """Cumulative (since accepted) and incremental (since previous stage) seconds per stage."""
+    cumulative = {stage: [] for stage in STAGES[1:]}
+    incremental = {stage: [] for stage in STAGES[1:]}
+    for sample in samples:
+        accepted = sample.stages["accepted"]
+        previous = accepted
+        for stage in STAGES[1:]:
+            at = sample.stages.get(stage)
+            if at is None:
+                break
+            cumulative[stage].append(at - accepted)
+            # visible_org2 can be observed before org1 sees finality, so increments are clamped at zero
+            incremental[stage].append(max(0.0, at - previous))
+            previous = max(previous, at)
+    return cumulative, incremental
+
+
+def describe(values):
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "p50_s": percentile(ordered, 50),
+        "p95_s": percentile(ordered, 95),
+        "p99_s": percentile(ordered, 99),
+        "max_s": ordered[-1] if ordered else None
+    }
+
+
+def build_report(samples, args):
+    cumulative, incremental = stage_durations(samples)
+    return {
+        "count": len(samples),
+        "poll_interval_s": args.poll_interval,
+        "incomplete": [s.id_control for s in samples if not s.done],
+        "cumulative": {stage: describe(values) for stage, values in cumulative.items()},
+        "incremental": {stage: describe(values) for stage, values in incremental.items()},
+        "samples": [{"idControl": s.id_control, "ver": s.ver, "txHash": s.tx_hash, "stages": s.stages} for s in samples]
+    }
+
+
+def log_report(report, samples, args):
+    _, incremental = stage_durations(samples)
+    logger.info(f"Propagation benchmark: {report['count']} consignments, resolution +/-{args.poll_interval}s, "
+                f"{len(report['incomplete'])} incomplete")
+    for stage in STAGES[1:]:
+        c, i = report["cumulative"][stage], report["incremental"][stage]
+        if not c["count"]:
+            logger.info(f"{stage}: no samples reached this stage")
+            continue
+        logger.info(f"{stage}: since accepted p50={c['p50_s']:.1f}s p95={c['p95_s']:.1f}s max={c['max_s']:.1f}s | "
+                    f"stage only p50={i['p50_s']:.1f}s p95={i['p95_s']:.1f}s ({STAGE_DRIVERS[stage]})")
+        for line in format_histogram(incremental[stage], bins=args.bins):
+            logger.info(f"    {line}")
+    medians = {stage: report["incremental"][stage]["p50_s"] for stage in STAGES[1:]
+               if report["incremental"][stage]["count"]}
+    if medians:
+        dominant = max(medians, key=medians.get)
+        logger.info(f"Dominant stage by median: {dominant} ({STAGE_DRIVERS[dominant]})")
+
+
+def main():
+    args = parse_arguments()
+    if not args.verbose:
+        logging.getLogger("cms_client").setLevel(logging.WARNING)
+
+    required_env_vars = ["CMS_AUTH_TOKEN_ORG1", "ORG1_ID", "CMS_AUTH_TOKEN_ORG2", "ORG2_ID", "CMS_BASE_URL_ORG1", "CMS_BASE_URL_ORG2"]
+    for var in required_env_vars:
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+
+    cms_org1 = client_for_org("ORG1", pool_size=args.workers)
+    cms_org2 = client_for_org("ORG2", pool_size=args.workers)
+    org1_id = os.environ.get("ORG1_ID")
+    org2_id = os.environ.get("ORG2_ID")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        started = time.time()
+        futures = [pool.submit(create_sample, cms_org1, i, args, org1_id, org2_id, started) for i in range(args.count)]
+        samples = [s for s in (f.result() for f in futures) if s is not None]
+        logger.info(f"Created {len(samples)}/{args.count} consignments in {time.time() - started:.1f}s, polling...")
+
+        deadline = time.time() + args.timeout
+        try:
+            while time.time() < deadline:
+                pending = [s for s in samples if not s.done]
+                if not pending:
+                    break
+                round_started = time.time()
+                poll_round(pool, cms_org1, cms_org2, pending)
+                time.sleep(max(0.0, args.poll_interval - (time.time() - round_started)))
+        except KeyboardInterrupt:
+            logger.info("Polling interrupted, reporting what was observed so far")
+
+    report = build_report(samples, args)
+    log_report(report, samples, args)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote report to {args.json_out}")
+    if report["incomplete"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from cms_client import client_for_org, percentile
+from cms_waiter import ConsignmentWaiter, WaitTimeout, expect
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure the CMS read cache: hit ratio and latency of GET /consignments/{id} over a hot set, "
+                    "the share of conditional GETs answered 304, and how soon an update is visible through the cache")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env that sends the consignments (default: ORG1)")
+    parser.add_argument("--id-control", action="append", default=None,
+                        help="Existing consignment to read, repeatable (default: create --consignments new ones)")
+    parser.add_argument("--consignments", type=int, default=20, help="Consignments to create for the hot set (default: 20)")
+    parser.add_argument("--reads", type=int, default=2000, help="Timed GETs per phase (default: 2000)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent readers (default: 8)")
+    parser.add_argument("--updates", type=int, default=5,
+                        help="Updates pushed at the end to time their visibility through the cache (default: 5)")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a write to be stored (default: 60)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the results to as JSON")
+    return parser.parse_args()
+
+
+def timed_get(cms, id_control, etag=None):
+    """One GET /consignments/{id}, as cms_client.get_consignment sends it; returns (status, X-Cache, ETag, ms)."""
+    extra = {"If-None-Match": etag} if etag else None
+    started = time.perf_counter()
+    response = cms.request("GET", f"/consignments/{id_control}", "/consignments/{id}", headers=extra)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return response.status_code, response.headers.get("X-Cache"), response.headers.get("ETag"), elapsed_ms
+
+
+def run_phase(cms, id_controls, reads, workers, etags=None):
+    picks = [random.choice(id_controls) for _ in range(reads)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: timed_get(cms, i, etags.get(i) if etags else None), picks))
+    by_cache = {}
+    for status, cache, _, elapsed_ms in results:
+        by_cache.setdefault(cache or "NONE", []).append(elapsed_ms)
+    all_ms = sorted(r[3] for r in results)
+    summary = {
+        "reads": len(results),
+        "errors": sum(1 for r in results if r[0] not in (200, 304)),
+        "not_modified": sum(1 for r in results if r[0] == 304),
+        "hit_ratio": len(by_cache.get("HIT", [])) / len(results) if results else 0.0,
+        "p50_ms": percentile(all_ms, 50),
+        "p95_ms": percentile(all_ms, 95),
+        "by_cache": {}
+    }
+    for cache, timings in sorted(by_cache.items()):
+        timings.sort()
+        summary["by_cache"][cache] = {"count": len(timings), "p50_ms": percentile(timings, 50),
+                                      "p95_ms": percentile(timings, 95)}
+    return summary
+
+
+def log_phase(name, summary):
+    logger.info(f"{name}: {summary['reads']} reads, hit ratio {summary['hit_ratio']:.1%}, "
+                f"304s {summary['not_modified']}, errors {summary['errors']}, "
+                f"p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms")
+    for cache, stats in summary["by_cache"].items():
+        logger.info(f"  {cache}: {stats['count']} reads, p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms")
+
+
+def main():
+    args = parse_arguments()
+    for var in (f"CMS_BASE_URL_{args.org}", f"CMS_AUTH_TOKEN_{args.org}", f"{args.org}_ID"):
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+    logging.getLogger("cms_waiter").setLevel(logging.WARNING)
+
+    cms = client_for_org(args.org)
+    sender_id = os.environ.get(f"{args.org}_ID")
+    receiver_id = str(uuid.uuid4())
+    goods = {"item1": 10, "item2": 20}
+
+    with ConsignmentWaiter(cms, max_interval=1) as waiter:
+        id_controls = args.id_control
+        if not id_controls:
+            created = [cms.create_consignment(goods, sender_id, receiver_id, "CREATED") for _ in range(args.consignments)]
+            id_controls = [c["idControl"] for c in created]
+            try:
+                for future in [waiter.submit(i, expect(ver=1), args.timeout) for i in id_controls]:
+                    future.result()
+            except WaitTimeout as e:
+                logger.error(f"Consignment not stored in time: {e}")
+                sys.exit(1)
+        logger.info(f"Hot set of {len(id_controls)} consignments, {args.reads} reads per phase, {args.workers} workers")
+
+        results = {"id_controls": id_controls}
+        # Every consignment once, so the hot phase measures a warm cache; a TTL shorter than the run shows up as MISSes
+        cold = [timed_get(cms, i) for i in id_controls]
+        if any(status != 200 for status, _, _, _ in cold):
+            logger.error(f"Error: not every consignment could be read: {[c[0] for c in cold]}")
+            sys.exit(1)
+        etags = {i: c[2] for i, c in zip(id_controls, cold)}
+        if not all(etags.values()):
+            logger.error("Error: responses carry no ETag, is the read cache deployed?")
+            sys.exit(1)
+        results["hot"] = run_phase(cms, id_controls, args.reads, args.workers)
+        log_phase("Hot reads", results["hot"])
+        results["conditional"] = run_phase(cms, id_controls, args.reads, args.workers, etags)
+        log_phase("Conditional reads", results["conditional"])
+
+        # An update must evict the cached version, or expect(ver=) would wait out the TTL
+        visibility_ms = []
+        try:
+            for n in range(args.updates):
+                id_control = id_controls[n % len(id_controls)]
+                state = cms.get_consignment(id_control)
+                if state is None:
+                    raise RuntimeError(f"Consignment {id_control} not found")
+                started = time.perf_counter()
+                cms.update_consignment(id_control, goods, state["sender"]["id"], state["receiver"]["id"], "IN_TRANSIT")
+                waiter.notify(id_control)
+                waiter.wait_for(id_control, expect(ver=state["ver"] + 1), args.timeout)
+                visibility_ms.append((time.perf_counter() - started) * 1000)
+        except WaitTimeout as e:
+            logger.error(f"Update not visible in time: {e}")
+            sys.exit(1)
+        if visibility_ms:
+            visibility_ms.sort()
+            results["update_visible_ms"] = {"p50_ms": percentile(visibility_ms, 50), "max_ms": visibility_ms[-1]}
+            logger.info(f"Updates visible after p50 {results['update_visible_ms']['p50_ms']:.0f} ms, "
+                        f"max {visibility_ms[-1]:.0f} ms")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote results to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org
+from indexer_standin import IndexerStandIn, SyntheticChain
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Seed a local indexer stand-in with synthetic consignments and time how long one reader cycle "
+                    "of the app takes to ingest them. Start the app with FOLLOWER_APP_BASE_URL and "
+                    "FOLLOWER_APP_INDEXER_URL pointing at the stand-in and lob.blockchain_reader.consignment_batch_size "
+                    "at least --count.")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env whose app runs the reader (default: ORG1)")
+    parser.add_argument("--host", default="127.0.0.1", help="Stand-in bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9096, help="Stand-in port (default: 9096)")
+    parser.add_argument("--count", type=int, default=10_000, help="Consignments to seed (default: 10000)")
+    parser.add_argument("--per-tx", type=int, default=50, help="Consignments per transaction (default: 50)")
+    parser.add_argument("--updates", type=int, default=0,
+                        help="Also seed later versions of this many consignments (default: 0)")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="Seconds to wait for the reader to poll and store everything (default: 600)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between stored count checks (default: 1.0)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the result to as JSON")
+    return parser.parse_args()
+
+
+def stored_count(cms, tx_hashes):
+    return sum(1 for c in cms.list_consignments()
+               if ((c.get("l1SubmissionData") or {}).get("transactionHash")) in tx_hashes)
+
+
+def main():
+    args = parse_arguments()
+    for var in (f"CMS_BASE_URL_{args.org}", f"CMS_AUTH_TOKEN_{args.org}"):
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+
+    cms = client_for_org(args.org)
+    chain = SyntheticChain().seed(args.count, args.per_tx, args.updates)
+    tx_hashes = {tx["hash"] for tx in chain.txs}
+    expected = chain.consignment_count
+    standin = IndexerStandIn(chain, args.host, args.port).start()
+    logger.info(f"Waiting for the reader to poll {standin.base_url}/api/v1/consignments ...")
+
+    deadline = time.time() + args.timeout
+    try:
+        while standin.snapshot()["consignment_requests"] == 0:
+            if time.time() > deadline:
+                logger.error("The reader did not poll the stand-in, check FOLLOWER_APP_BASE_URL")
+                sys.exit(1)
+            time.sleep(0.2)
+        cycle_started = standin.snapshot()["first_request_at"]
+        logger.info("Reader cycle started, waiting for consignments to be stored...")
+
+        stored = 0
+        while stored < expected and time.time() < deadline:
+            time.sleep(args.poll_interval)
+            try:
+                stored = stored_count(cms, tx_hashes)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Could not list consignments: {e}")
+        finished = time.time()
+        stats = standin.snapshot()
+    finally:
+        standin.stop()
+
+    result = {
+        "seeded": expected,
+        "transactions": len(tx_hashes),
+        "stored": stored,
+        "cycle_seconds": finished - cycle_started,
+        "http_phase_seconds": stats["last_request_at"] - stats["first_request_at"],
+        "consignment_requests": stats["consignment_requests"],
+        "metadata_requests": stats["metadata_requests"],
+        "metadata_requests_per_tx": stats["metadata_requests"] / len(tx_hashes) if tx_hashes else None
+    }
+    logger.info(f"Stored {stored}/{expected} consignments from {len(tx_hashes)} txs in {result['cycle_seconds']:.1f}s "
+                f"(indexer HTTP {result['http_phase_seconds']:.1f}s, stored count polled every {args.poll_interval}s)")
+    logger.info(f"Indexer requests: {stats['consignment_requests']} consignment pages, {stats['metadata_requests']} "
+                f"metadata lookups for {stats['metadata_hashes']} distinct txs")
+    if stored < expected:
+        logger.warning("Not everything was stored in time; a batch size below --count needs several reader cycles")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Wrote result to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
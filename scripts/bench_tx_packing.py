@@ -0,0 +1,161 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from cms_client import build_session, client_for_org, format_histogram, percentile
+from cms_waiter import ConsignmentWaiter, WaitTimeout
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LOVELACE_PER_ADA = 1_000_000
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure consignments per L1 transaction and fee per consignment; compare two runs with --compare")
+    parser.add_argument("--count", type=int, default=100,
+                        help="Consignments to create at org1 for the run (default: 100)")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="Seconds to wait for every consignment to get a transaction hash (default: 600)")
+    parser.add_argument("--chain-api", default=os.environ.get("BLOCKFROST_URL"),
+                        help="Blockfrost compatible API used to read tx fees and sizes (default: $BLOCKFROST_URL)")
+    parser.add_argument("--chain-api-key", default=os.environ.get("BLOCKFROST_API_KEY"),
+                        help="Blockfrost project id, if the API needs one (default: $BLOCKFROST_API_KEY)")
+    parser.add_argument("--label", default=None,
+                        help="Name of this run in the report, e.g. before/after")
+    parser.add_argument("--json-out", default=None,
+                        help="Write the run report to this file, to compare later")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two JSON reports instead of running")
+    return parser.parse_args()
+
+
+def has_transaction_hash(state):
+    return bool(state and (state.get("l1SubmissionData") or {}).get("transactionHash"))
+
+
+has_transaction_hash.description = "a transaction hash"
+
+
+def fetch_tx_details(session, chain_api, tx_hash):
+    response = session.get(f"{chain_api.rstrip('/')}/txs/{tx_hash}", timeout=30)
+    response.raise_for_status()
+    tx = response.json()
+    return {"fees": int(tx.get("fees", 0)), "size": int(tx.get("size", 0))}
+
+
+def run(args):
+    for var in ("CMS_BASE_URL_ORG1", "CMS_AUTH_TOKEN_ORG1", "ORG1_ID", "ORG2_ID"):
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+    if not args.chain_api:
+        logger.error("Error: --chain-api or BLOCKFROST_URL must be set to read transaction fees")
+        sys.exit(1)
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+
+    cms = client_for_org("ORG1")
+    org1_id, org2_id = os.environ.get("ORG1_ID"), os.environ.get("ORG2_ID")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        created = list(pool.map(lambda i: cms.create_consignment({"item1": i + 1}, org1_id, org2_id, "CREATED", 51.5074, -0.1278),
+                                range(args.count)))
+    logger.info(f"Created {len(created)} consignments in {time.time() - started:.1f}s, waiting for transaction hashes...")
+
+    tx_by_consignment = {}
+    with ConsignmentWaiter(cms, max_interval=10) as waiter:
+        futures = {c["idControl"]: waiter.submit(c["idControl"], has_transaction_hash, args.timeout) for c in created}
+        for id_control, future in futures.items():
+            try:
+                tx_by_consignment[id_control] = future.result()["l1SubmissionData"]["transactionHash"]
+            except WaitTimeout as e:
+                logger.warning(str(e))
+
+    consignments_per_tx = {}
+    for tx_hash in tx_by_consignment.values():
+        consignments_per_tx[tx_hash] = consignments_per_tx.get(tx_hash, 0) + 1
+
+    session = build_session()
+    if args.chain_api_key:
+        session.headers["project_id"] = args.chain_api_key
+    txs = {}
+    for tx_hash, count in consignments_per_tx.items():
+        try:
+            txs[tx_hash] = {"consignments": count, **fetch_tx_details(session, args.chain_api, tx_hash)}
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Could not read tx {tx_hash}: {e}")
+
+    return summarise(args.label or time.strftime("%Y-%m-%dT%H:%M:%S"), args.count, len(tx_by_consignment), txs)
+
+
+def summarise(label, created, with_tx, txs):
+    per_tx = sorted(tx["consignments"] for tx in txs.values())
+    total_fees = sum(tx["fees"] for tx in txs.values())
+    counted = sum(per_tx)
+    return {
+        "label": label,
+        "created": created,
+        "with_tx": with_tx,
+        "transactions": len(txs),
+        "consignments_per_tx": {
+            "mean": counted / len(per_tx) if per_tx else None,
+            "p50": percentile(per_tx, 50),
+            "max": per_tx[-1] if per_tx else None
+        },
+        "total_fees_ada": total_fees / LOVELACE_PER_ADA,
+        "fee_per_consignment_ada": total_fees / counted / LOVELACE_PER_ADA if counted else None,
+        "mean_tx_size_bytes": sum(tx["size"] for tx in txs.values()) / len(txs) if txs else None,
+        "txs": txs
+    }
+
+
+def log_report(report):
+    per_tx = report["consignments_per_tx"]
+    logger.info(f"[{report['label']}] {report['with_tx']}/{report['created']} consignments in {report['transactions']} txs, "
+                f"consignments/tx mean={per_tx['mean']} p50={per_tx['p50']} max={per_tx['max']}, "
+                f"fees total={report['total_fees_ada']:.6f} ADA, per consignment={report['fee_per_consignment_ada']} ADA, "
+                f"mean tx size={report['mean_tx_size_bytes']} bytes")
+    for line in format_histogram([tx["consignments"] for tx in report["txs"].values()], bins=5, unit=""):
+        logger.info(f"    consignments/tx {line}")
+
+
+def compare(before, after):
+    log_report(before)
+    log_report(after)
+    for key, name in (("fee_per_consignment_ada", "fee per consignment"), ("transactions", "transactions")):
+        b, a = before.get(key), after.get(key)
+        if b and a is not None:
+            logger.info(f"{name}: {b} -> {a} ({(a - b) / b * 100:+.1f}%)")
+    b, a = before["consignments_per_tx"]["mean"], after["consignments_per_tx"]["mean"]
+    if b and a:
+        logger.info(f"consignments per tx: {b:.2f} -> {a:.2f} (x{a / b:.1f})")
+
+
+def main():
+    args = parse_arguments()
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            compare(json.load(f_before), json.load(f_after))
+        return
+    report = run(args)
+    log_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote report to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from dotenv import load_dotenv
+from cms_client import client_for_org, percentile
+from cms_waiter import ConsignmentWaiter, WaitTimeout, expect
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+START = (51.5074, -0.1278)  # London
+END = (-33.8688, 151.2093)  # Sydney
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Push many location updates to a consignment and check that reading its latest version stays "
+                    "as fast at the last version as at the first")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env that sends the consignment (default: ORG1)")
+    parser.add_argument("--updates", type=int, default=500, help="Location updates to push (default: 500)")
+    parser.add_argument("--sample-every", type=int, default=50,
+                        help="Measure read latency after every this many updates (default: 50)")
+    parser.add_argument("--reads", type=int, default=50, help="Timed GETs per sample (default: 50)")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="Largest allowed ratio of the last sample's median read to the first's (default: 2.0)")
+    parser.add_argument("--update-timeout", type=float, default=60,
+                        help="Seconds to wait for each update to be stored (default: 60)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the samples to as JSON")
+    return parser.parse_args()
+
+
+def sample_reads(cms, id_control, reads):
+    timings = []
+    for _ in range(reads):
+        started = time.perf_counter()
+        state = cms.get_consignment(id_control)
+        timings.append((time.perf_counter() - started) * 1000)
+        if state is None:
+            raise RuntimeError(f"Consignment {id_control} disappeared")
+    timings.sort()
+    return {"median_ms": statistics.median(timings), "p95_ms": percentile(timings, 95)}
+
+
+def main():
+    args = parse_arguments()
+    for var in (f"CMS_BASE_URL_{args.org}", f"CMS_AUTH_TOKEN_{args.org}", f"{args.org}_ID"):
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+    logging.getLogger("cms_waiter").setLevel(logging.WARNING)
+
+    cms = client_for_org(args.org)
+    sender_id = os.environ.get(f"{args.org}_ID")
+    receiver_id = str(uuid.uuid4())
+    goods = {"item1": 10, "item2": 20}
+    created = cms.create_consignment(goods, sender_id, receiver_id, "CREATED", *START)
+    id_control = created["idControl"]
+    logger.info(f"Created consignment {id_control}, pushing {args.updates} location updates...")
+
+    samples = []
+    with ConsignmentWaiter(cms, max_interval=1) as waiter:
+        try:
+            waiter.wait_for(id_control, expect(ver=1), args.update_timeout)
+            samples.append({"versions": 1, **sample_reads(cms, id_control, args.reads)})
+            for ver in range(2, args.updates + 2):
+                progress = (ver - 1) / args.updates
+                latitude = START[0] + (END[0] - START[0]) * progress
+                longitude = START[1] + (END[1] - START[1]) * progress
+                cms.update_consignment(id_control, goods, sender_id, receiver_id, "IN_TRANSIT", latitude, longitude)
+                waiter.notify(id_control)
+                waiter.wait_for(id_control, expect(ver=ver), args.update_timeout)
+                if (ver - 1) % args.sample_every == 0:
+                    samples.append({"versions": ver, **sample_reads(cms, id_control, args.reads)})
+                    logger.info(f"{ver} versions: median read {samples[-1]['median_ms']:.1f} ms, "
+                                f"p95 {samples[-1]['p95_ms']:.1f} ms")
+        except WaitTimeout as e:
+            logger.error(f"Update not stored in time: {e}")
+            sys.exit(1)
+
+    first, last = samples[0]["median_ms"], samples[-1]["median_ms"]
+    ratio = last / first if first else float("inf")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"id_control": id_control, "samples": samples, "ratio": ratio}, f, indent=2)
+        logger.info(f"Wrote samples to {args.json_out}")
+    if ratio > args.tolerance:
+        logger.error(f"FAIL: median read went from {first:.1f} ms at 1 version to {last:.1f} ms at "
+                     f"{samples[-1]['versions']} versions ({ratio:.1f}x)")
+        sys.exit(1)
+    logger.info(f"PASS: median read {first:.1f} ms at 1 version, {last:.1f} ms at {samples[-1]['versions']} versions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org, consignment_payload, percentile
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Count the WatchDog's tx-details lookups per pass against scripts/chain_standin.py. Start the app "
+                    "with BLOCKFROST_URL and FOLLOWER_APP_BASE_URL pointing at the stand-in; a pass is counted from "
+                    "one follower tip lookup to the next. Reports lookups per pass, distinct transactions per pass "
+                    "and repeats, i.e. lookups of a transaction already looked up at the same tip.")
+    parser.add_argument("--standin-url", default="http://localhost:9095/api/v1",
+                        help="Chain stand-in follower base URL (default: http://localhost:9095/api/v1)")
+    parser.add_argument("--consignments", type=int, default=500,
+                        help="Consignments to create at org1 before watching, 0 to only watch (default: 500)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Consignments per bulk request (default: 100)")
+    parser.add_argument("--duration", type=float, default=300,
+                        help="Seconds to watch the passes for, long enough for transactions to reach a few blocks "
+                             "of depth (default: 300)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the report to as JSON")
+    return parser.parse_args()
+
+
+def create_consignments(count, batch_size):
+    cms = client_for_org("ORG1")
+    org1_id, org2_id = os.environ.get("ORG1_ID"), os.environ.get("ORG2_ID")
+    created = 0
+    while created < count:
+        batch = [consignment_payload({"item1": created + i + 1, "item2": 20}, org1_id, org2_id, "CREATED", 51.5074, -0.1278)
+                 for i in range(min(batch_size, count - created))]
+        results = cms.create_consignments_bulk(batch)
+        rejected = [r for r in results if r.get("status") != "ACCEPTED"]
+        if rejected:
+            raise ValueError(f"{len(rejected)} of {len(batch)} consignments not accepted, e.g. {rejected[0]}")
+        created += len(batch)
+    return created
+
+
+def report(passes, stats_before, stats_after):
+    lookups = [p["tx_details"] for p in passes]
+    with_lookups = sorted(n for n in lookups if n)
+    total = sum(lookups)
+    repeated = sum(p["repeated"] for p in passes)
+    submitted = stats_after["submitted"] - stats_before["submitted"]
+    return {
+        "passes": len(passes),
+        "passes_with_lookups": len(with_lookups),
+        "tx_details_lookups": total,
+        "lookups_per_pass_mean": total / len(with_lookups) if with_lookups else 0,
+        "lookups_per_pass_p95": percentile(with_lookups, 95) or 0,
+        "lookups_per_pass_max": max(with_lookups, default=0),
+        "distinct_per_pass_mean": sum(p["distinct"] for p in passes) / len(with_lookups) if with_lookups else 0,
+        "repeated_lookups": repeated,
+        "repeated_share": repeated / total if total else 0,
+        "submitted_txs": submitted,
+        "lookups_per_submitted_tx": total / submitted if submitted else None,
+    }
+
+
+def main():
+    args = parse_arguments()
+    if args.consignments:
+        for var in ("CMS_BASE_URL_ORG1", "CMS_AUTH_TOKEN_ORG1", "ORG1_ID", "ORG2_ID"):
+            if not os.environ.get(var):
+                logger.error(f"Error: Environment variable {var} is not set")
+                sys.exit(1)
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+    standin = args.standin_url.rstrip("/")
+    session = requests.Session()
+
+    try:
+        stats_before = session.get(f"{standin}/standin/stats", timeout=10).json()
+        started = time.time()
+        if args.consignments:
+            created = create_consignments(args.consignments, args.batch_size)
+            logger.info(f"Created {created} consignments, watching watchdog passes for {args.duration:.0f}s")
+        time.sleep(args.duration)
+        passes = [p for p in session.get(f"{standin}/standin/passes", timeout=10).json() if p["at"] >= started]
+        stats_after = session.get(f"{standin}/standin/stats", timeout=10).json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+
+    summary = report(passes, stats_before, stats_after)
+    logger.info(f"{summary['passes']} passes, {summary['passes_with_lookups']} with tx-details lookups, "
+                f"{summary['submitted_txs']} transactions submitted")
+    logger.info(f"tx-details lookups per pass: mean {summary['lookups_per_pass_mean']:.1f}, "
+                f"p95 {summary['lookups_per_pass_p95']}, max {summary['lookups_per_pass_max']}; "
+                f"distinct transactions per pass: mean {summary['distinct_per_pass_mean']:.1f}")
+    logger.info(f"Repeated lookups at an unchanged tip: {summary['repeated_lookups']} "
+                f"({100 * summary['repeated_share']:.1f}%), lookups per submitted tx: "
+                + (f"{summary['lookups_per_submitted_tx']:.1f}" if summary["lookups_per_submitted_tx"] is not None else "n/a"))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Wrote report to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org, consignment_payload, log_latency_summary
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Stream a CSV or NDJSON consignment manifest to POST /api/consignments/bulk in chunks")
+    parser.add_argument("manifest",
+                        help="Manifest file (.csv, .ndjson or .jsonl); '-' reads NDJSON from stdin")
+    parser.add_argument("--org", default="ORG1",
+                        help="Org from scripts/.env to upload as; also the default sender (default: ORG1)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None,
+                        help="Manifest format, guessed from the file extension when omitted")
+    parser.add_argument("--chunk-size", type=int, default=500,
+                        help="Consignments per bulk request, keep at or below lob.consignments.bulk.max_items (default: 500)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Bulk requests in flight at once (default: 2)")
+    parser.add_argument("--results-out", default=None,
+                        help="Optional NDJSON file receiving the per-item result of every manifest line")
+    return parser.parse_args()
+
+
+def read_csv(stream, default_sender):
+    """CSV columns: receiver_id, goods (JSON object), and optionally sender_id, tracking_status, latitude, longitude."""
+    for row in csv.DictReader(stream):
+        yield consignment_payload(
+            goods=json.loads(row["goods"]),
+            sender_id=row.get("sender_id") or default_sender,
+            receiver_id=row["receiver_id"],
+            tracking_status=row.get("tracking_status") or "CREATED",
+            latitude=float(row["latitude"]) if row.get("latitude") else None,
+            longitude=float(row["longitude"]) if row.get("longitude") else None
+        )
+
+
+def read_ndjson(stream, default_sender):
+    """One consignment per line, either in API form ({"sender": {"id": ...}, ...}) or flat like the CSV columns."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if "receiver" in item:
+            item.setdefault("sender", {"id": default_sender})
+            item.setdefault("organisationId", item["sender"]["id"])
+            yield item
+        else:
+            yield consignment_payload(item["goods"], item.get("sender_id") or default_sender, item["receiver_id"],
+                                      item.get("tracking_status", "CREATED"), item.get("latitude"), item.get("longitude"))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class UploadStats:
+    def __init__(self, results_out):
+        self.counts = {}
+        self.failed_chunks = 0
+        self.lock = threading.Lock()
+        self.results_out = results_out
+
+    def record(self, offset, results):
+        with self.lock:
+            for result in results:
+                status = result.get("status", "UNKNOWN")
+                self.counts[status] = self.counts.get(status, 0) + 1
+                if self.results_out:
+                    self.results_out.write(json.dumps({**result, "line": offset + result["index"]}) + "\n")
+
+    def record_failed_chunk(self, offset, size, error):
+        with self.lock:
+            self.failed_chunks += 1
+            self.counts["FAILED"] = self.counts.get("FAILED", 0) + size
+            if self.results_out:
+                for index in range(size):
+                    self.results_out.write(json.dumps({"line": offset + index, "status": "FAILED", "error": str(error)}) + "\n")
+
+
+def upload_chunk(cms, stats, offset, chunk):
+    try:
+        stats.record(offset, cms.create_consignments_bulk(chunk))
+    except requests.exceptions.RequestException as e:
+        # Bulk creates are not retried (a replay would duplicate the batch), the results file lists the lines
+        stats.record_failed_chunk(offset, len(chunk), e)
+
+
+def main():
+    args = parse_arguments()
+    for var in (f"CMS_BASE_URL_{args.org}", f"CMS_AUTH_TOKEN_{args.org}", f"{args.org}_ID"):
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+
+    fmt = args.format or ("csv" if args.manifest.endswith(".csv") else "ndjson")
+    cms = client_for_org(args.org, pool_size=args.workers)
+    default_sender = os.environ.get(f"{args.org}_ID")
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+
+    stream = sys.stdin if args.manifest == "-" else open(args.manifest, newline="")
+    results_out = open(args.results_out, "w") if args.results_out else None
+    stats = UploadStats(results_out)
+    # At most workers chunks are uploading and one more is being read, memory stays bounded by chunk size
+    in_flight = threading.BoundedSemaphore(args.workers + 1)
+    started = time.monotonic()
+    total = 0
+    try:
+        reader = read_csv if fmt == "csv" else read_ndjson
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for chunk in chunked(reader(stream, default_sender), args.chunk_size):
+                in_flight.acquire()
+                future = pool.submit(upload_chunk, cms, stats, total, chunk)
+                future.add_done_callback(lambda _: in_flight.release())
+                total += len(chunk)
+                logger.info(f"Queued consignments {total - len(chunk)}..{total - 1}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if results_out:
+            results_out.close()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Uploaded {total} consignments in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): "
+                f"{', '.join(f'{k}={v}' for k, v in sorted(stats.counts.items()))}")
+    log_latency_summary(cms.latencies, logger)
+    if stats.failed_chunks or stats.counts.get("REJECTED"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
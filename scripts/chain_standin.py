@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FINALITY_BY_DEPTH = [(0, "VERY_LOW"), (3, "LOW"), (6, "MEDIUM"), (12, "HIGH"), (36, "VERY_HIGH"), (72, "ULTRA_HIGH"),
+                     (2160, "FINAL")]
+START_SLOT = 80_000_000
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jnkc6u4mhel7"
+
+# Preprod-like values, enough for cardano-client-lib to balance and fee a simple payment with metadata
+PROTOCOL_PARAMETERS = {
+    "epoch": 200, "min_fee_a": 44, "min_fee_b": 155381, "max_block_size": 90112, "max_tx_size": 16384,
+    "max_block_header_size": 1100, "key_deposit": "2000000", "pool_deposit": "500000000", "e_max": 18,
+    "n_opt": 500, "a0": 0.3, "rho": 0.003, "tau": 0.2, "decentralisation_param": 0, "protocol_major_ver": 9,
+    "protocol_minor_ver": 0, "min_utxo": "4310", "min_pool_cost": "170000000", "price_mem": 0.0577,
+    "price_step": 0.0000721, "max_tx_ex_mem": "14000000", "max_tx_ex_steps": "10000000000",
+    "max_block_ex_mem": "62000000", "max_block_ex_steps": "20000000000", "max_val_size": "5000",
+    "collateral_percent": 150, "max_collateral_inputs": 3, "coins_per_utxo_size": "4310",
+    "coins_per_utxo_word": "4310", "min_fee_ref_script_cost_per_byte": 15, "cost_models": {}
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the chain APIs the app submits to and tracks confirmations with: a Blockfrost "
+                    "subset (protocol params, UTxOs, tx submit, tx lookup) and the Reeve follower tip/tx-details. "
+                    "Transactions are checked against a simulated ledger, so chained submissions that spend "
+                    "unconfirmed change are accepted and double spends are rejected.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9095, help="Port (default: 9095)")
+    parser.add_argument("--submit-latency", type=float, default=0.2,
+                        help="Seconds a submit takes before it is answered, like a node round trip (default: 0.2)")
+    parser.add_argument("--block-time", type=float, default=20,
+                        help="Seconds between simulated blocks; mempool txs land in the next block (default: 20)")
+    parser.add_argument("--fund-lovelace", type=int, default=10_000_000_000,
+                        help="Lovelace given to an address the first time its UTxOs are queried (default: 10000 ADA)")
+    parser.add_argument("--network", default="PREPROD",
+                        help="Network name reported by the follower tip endpoint (default: PREPROD)")
+    return parser.parse_args()
+
+
+def cbor_item(data, offset=0):
+    """Decode one CBOR item, returning (value, end offset). Byte strings come back as bytes, maps as lists of pairs."""
+    initial = data[offset]
+    major, info = initial >> 5, initial & 0x1f
+    offset += 1
+    if info < 24:
+        arg = info
+    elif info in (24, 25, 26, 27):
+        size = 1 << (info - 24)
+        arg = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+    elif info == 31:
+        arg = None
+    else:
+        raise ValueError(f"Unsupported CBOR additional info {info}")
+
+    if major == 0:
+        return arg, offset
+    if major == 1:
+        return -1 - arg, offset
+    if major in (2, 3):
+        if arg is None:
+            chunks = []
+            while data[offset] != 0xff:
+                chunk, offset = cbor_item(data, offset)
+                chunks.append(chunk)
+            return (b"".join(chunks) if major == 2 else "".join(chunks)), offset + 1
+        raw = bytes(data[offset:offset + arg])
+        return (raw if major == 2 else raw.decode("utf-8")), offset + arg
+    if major in (4, 5):
+        items = []
+        while (arg is None and data[offset] != 0xff) or (arg is not None and len(items) < arg):
+            if major == 4:
+                item, offset = cbor_item(data, offset)
+            else:
+                key, offset = cbor_item(data, offset)
+                value, offset = cbor_item(data, offset)
+                item = (key, value)
+            items.append(item)
+        return items, offset + (1 if arg is None else 0)
+    if major == 6:
+        # Tags (e.g. 258 for sets, 24 for embedded CBOR) do not matter for the ledger view
+        return cbor_item(data, offset)
+    return {20: False, 21: True, 22: None}.get(arg), offset
+
+
+def bech32_encode(hrp, payload):
+    words, acc, bits = [], 0, 0
+    for byte in payload:
+        acc, bits = (acc << 8) | byte, bits + 8
+        while bits >= 5:
+            bits -= 5
+            words.append((acc >> bits) & 31)
+    if bits:
+        words.append((acc << (5 - bits)) & 31)
+
+    def polymod(values):
+        generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+        chk = 1
+        for value in values:
+            top = chk >> 25
+            chk = (chk & 0x1ffffff) << 5 ^ value
+            for i in range(5):
+                chk ^= generator[i] if (top >> i) & 1 else 0
+        return chk
+
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    checksum = polymod(expanded + words + [0] * 6) ^ 1
+    words += [(checksum >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(BECH32_CHARSET[w] for w in words)
+
+
+def address_to_bech32(raw):
+    kind, network = raw[0] >> 4, raw[0] & 0x0f
+    if kind in (14, 15):
+        prefix = "stake"
+    else:
+        prefix = "addr"
+    return bech32_encode(prefix if network == 1 else f"{prefix}_test", raw)
+
+
+def parse_value(value):
+    if isinstance(value, int):
+        return [{"unit": "lovelace", "quantity": str(value)}]
+    coin, assets = value
+    amounts = [{"unit": "lovelace", "quantity": str(coin)}]
+    for policy, names in assets:
+        for name, quantity in names:
+            amounts.append({"unit": policy.hex() + name.hex(), "quantity": str(quantity)})
+    return amounts
+
+
+def parse_transaction(tx_bytes):
+    """Hash, inputs, outputs and fee of a signed transaction; the hash is blake2b-256 of the raw body bytes."""
+    if tx_bytes[0] >> 5 != 4:
+        raise ValueError("Transaction is not a CBOR array")
+    info = tx_bytes[0] & 0x1f
+    body_start = 1 if info < 24 or info == 31 else 1 + (1 << (info - 24))
+    body, body_end = cbor_item(tx_bytes, body_start)
+    tx_hash = hashlib.blake2b(tx_bytes[body_start:body_end], digest_size=32).hexdigest()
+    fields = dict(body)
+    inputs = [(tx_id.hex(), index) for tx_id, index in fields.get(0, [])]
+    outputs = []
+    for output in fields.get(1, []):
+        # Legacy outputs are arrays, post-Babbage outputs are maps keyed 0 (address) and 1 (value)
+        if isinstance(output[0], tuple):
+            output = [dict(output)[0], dict(output)[1]]
+        address, value = output[0], output[1]
+        outputs.append({"address": address_to_bech32(address), "amount": parse_value(value)})
+    return tx_hash, inputs, outputs, fields.get(2, 0)
+
+
+class Ledger:
+    """UTxO set plus a mempool that is emptied into a block every block_time seconds."""
+
+    def __init__(self, block_time, fund_lovelace):
+        self.block_time = block_time
+        self.fund_lovelace = fund_lovelace
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.utxos = {}        # (tx hash, index) -> utxo json
+        self.funded = set()
+        self.txs = {}          # tx hash -> tx json, once in a block
+        self.mempool = {}      # tx hash -> (tx json, outputs)
+        self.blocks = [{"height": 0, "slot": START_SLOT, "hash": hashlib.blake2b(b"genesis", digest_size=32).hexdigest()}]
+        self.stats = {"submitted": 0, "rejected": 0, "chained": 0, "max_mempool": 0,
+                      "tip_lookups": 0, "tx_details_lookups": 0, "tx_details_repeated": 0}
+        # One entry per follower tip lookup, i.e. per watchdog pass; tx-details lookups count against the latest
+        self.passes = []
+        self.looked_up_at = {}  # tx hash -> tip height of its last tx-details lookup
+
+    def slot(self):
+        return START_SLOT + int(time.time() - self.started)
+
+    def advance(self):
+        with self.lock:
+            while self.slot() >= self.blocks[-1]["slot"] + self.block_time:
+                tip = self.blocks[-1]
+                block = {"height": tip["height"] + 1, "slot": tip["slot"] + int(self.block_time)}
+                block["hash"] = hashlib.blake2b(f"{block['height']}".encode(), digest_size=32).hexdigest()
+                for tx_hash, (tx, outputs) in self.mempool.items():
+                    tx.update({"block": block["hash"], "block_height": block["height"], "slot": block["slot"],
+                               "block_time": int(self.started) + block["slot"] - START_SLOT})
+                    self.txs[tx_hash] = tx
+                if self.mempool:
+                    logger.info(f"Block {block['height']} at slot {block['slot']}: {len(self.mempool)} txs")
+                self.mempool = {}
+                self.blocks.append(block)
+
+    def fund(self, address):
+        with self.lock:
+            if address in self.funded:
+                return
+            self.funded.add(address)
+            tx_hash = hashlib.blake2b(address.encode(), digest_size=32).hexdigest()
+            self.utxos[(tx_hash, 0)] = {"address": address, "tx_hash": tx_hash, "output_index": 0,
+                                        "amount": [{"unit": "lovelace", "quantity": str(self.fund_lovelace)}],
+                                        "block": self.blocks[0]["hash"], "data_hash": None, "inline_datum": None,
+                                        "reference_script_hash": None}
+
+    def submit(self, tx_bytes):
+        tx_hash, inputs, outputs, fee = parse_transaction(tx_bytes)
+        with self.lock:
+            missing = [f"{h}#{i}" for h, i in inputs if (h, i) not in self.utxos]
+            if missing:
+                self.stats["rejected"] += 1
+                raise ValueError(f"BadInputsUTxO: {', '.join(missing)}")
+            if any(h in self.mempool for h, _ in inputs):
+                self.stats["chained"] += 1
+            for key in inputs:
+                del self.utxos[key]
+            for index, output in enumerate(outputs):
+                self.utxos[(tx_hash, index)] = {**output, "tx_hash": tx_hash, "output_index": index, "block": None,
+                                                "data_hash": None, "inline_datum": None, "reference_script_hash": None}
+            tx = {"hash": tx_hash, "fees": str(fee), "size": len(tx_bytes), "output_amount": [], "index": 0}
+            self.mempool[tx_hash] = (tx, outputs)
+            self.stats["submitted"] += 1
+            self.stats["max_mempool"] = max(self.stats["max_mempool"], len(self.mempool))
+        return tx_hash
+
+    def address_utxos(self, address, count, page):
+        with self.lock:
+            utxos = [u for u in self.utxos.values() if u["address"] == address]
+        return utxos[(page - 1) * count:page * count]
+
+    def record_tip_lookup(self):
+        with self.lock:
+            self.stats["tip_lookups"] += 1
+            self.passes.append({"at": time.time(), "tip_height": self.blocks[-1]["height"], "tx_details": 0,
+                                "distinct": set(), "repeated": 0})
+            del self.passes[:-1000]
+
+    def record_tx_details_lookup(self, tx_hash):
+        """Counts the lookup; a repeat is one of a tx already looked up at this tip, whose answer cannot have changed."""
+        with self.lock:
+            height = self.blocks[-1]["height"]
+            repeated = self.looked_up_at.get(tx_hash) == height
+            self.looked_up_at[tx_hash] = height
+            self.stats["tx_details_lookups"] += 1
+            self.stats["tx_details_repeated"] += repeated
+            if self.passes:
+                current = self.passes[-1]
+                current["tx_details"] += 1
+                current["repeated"] += repeated
+                current["distinct"].add(tx_hash)
+
+    def pass_stats(self):
+        with self.lock:
+            return [{**p, "distinct": len(p["distinct"])} for p in self.passes]
+
+    def tx_details(self, tx_hash):
+        with self.lock:
+            tx = self.txs.get(tx_hash)
+            if not tx:
+                return None
+            depth = self.blocks[-1]["height"] - tx["block_height"]
+        finality = [score for threshold, score in FINALITY_BY_DEPTH if depth >= threshold][-1]
+        return tx, finality
+
+
+def make_handler(ledger, args):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, fmt, *log_args):
+            logger.debug(fmt, *log_args)
+
+        def reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def not_found(self):
+            self.reply(404, {"status_code": 404, "error": "Not Found", "message": "The requested component has not been found."})
+
+        def route(self):
+            url = urlparse(self.path)
+            return re.sub("/+", "/", url.path).rstrip("/"), parse_qs(url.query)
+
+        def do_GET(self):
+            ledger.advance()
+            path, query = self.route()
+            tip = ledger.blocks[-1]
+
+            if path.endswith("/epochs/latest/parameters"):
+                return self.reply(200, PROTOCOL_PARAMETERS)
+            if path.endswith("/blocks/latest"):
+                return self.reply(200, {"hash": tip["hash"], "height": tip["height"], "slot": tip["slot"],
+                                        "epoch": PROTOCOL_PARAMETERS["epoch"], "time": int(ledger.started) + tip["slot"] - START_SLOT})
+            match = re.search(r"/addresses/([a-z0-9_]+)/utxos$", path)
+            if match:
+                ledger.fund(match.group(1))
+                count = int(query.get("count", ["100"])[0])
+                page = int(query.get("page", ["1"])[0])
+                return self.reply(200, ledger.address_utxos(match.group(1), count, page))
+            match = re.search(r"/txs/([0-9a-f]{64})/utxos$", path)
+            if match:
+                with ledger.lock:
+                    outputs = [u for (h, _), u in ledger.utxos.items() if h == match.group(1)]
+                return self.reply(200, {"hash": match.group(1), "inputs": [], "outputs": outputs})
+            match = re.search(r"/txs/([0-9a-f]{64})$", path)
+            if match:
+                details = ledger.tx_details(match.group(1))
+                return self.reply(200, details[0]) if details else self.not_found()
+            # Reeve follower API, used by the app for the chain tip and confirmation tracking
+            if path.endswith("/tip"):
+                ledger.record_tip_lookup()
+                return self.reply(200, {"absoluteSlot": tip["slot"], "blockHash": tip["hash"], "network": args.network,
+                                        "synced": True})
+            match = re.search(r"/tx-details/([0-9a-f]{64})$", path)
+            if match:
+                ledger.record_tx_details_lookup(match.group(1))
+                details = ledger.tx_details(match.group(1))
+                if not details:
+                    return self.not_found()
+                tx, finality = details
+                return self.reply(200, {"transactionHash": tx["hash"], "absoluteSlot": tx["slot"], "blockHash": tx["block"],
+                                        "finalityScore": finality, "network": args.network})
+            if path.endswith("/standin/stats"):
+                with ledger.lock:
+                    return self.reply(200, {**ledger.stats, "mempool": len(ledger.mempool), "blocks": tip["height"]})
+            if path.endswith("/standin/passes"):
+                return self.reply(200, ledger.pass_stats())
+            return self.not_found()
+
+        def do_POST(self):
+            ledger.advance()
+            path, _ = self.route()
+            if not path.endswith("/tx/submit"):
+                return self.not_found()
+            tx_bytes = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(args.submit_latency)
+            try:
+                tx_hash = ledger.submit(tx_bytes)
+            except (ValueError, IndexError, KeyError, TypeError) as e:
+                logger.warning(f"Rejected tx: {e}")
+                return self.reply(400, {"status_code": 400, "error": "Bad Request", "message": str(e)})
+            logger.info(f"Accepted tx {tx_hash}, mempool: {len(ledger.mempool)}")
+            return self.reply(200, tx_hash)
+
+    return Handler
+
+
+def main():
+    args = parse_arguments()
+    ledger = Ledger(args.block_time, args.fund_lovelace)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(ledger, args))
+    logger.info(f"Chain stand-in listening on http://{args.host}:{args.port}, block time {args.block_time}s, "
+                f"submit latency {args.submit_latency}s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with ledger.lock:
+            logger.info(f"Stats: {ledger.stats}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
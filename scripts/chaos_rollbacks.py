@@ -0,0 +1,174 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org
+from indexer_standin import IndexerStandIn, SyntheticChain
+from replay_metadata_events import REPLAY_PATH, synthetic_events
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ROLLBACK_PATH = "/api/v1/replay/rollback"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Inject chain rollbacks of increasing depth and measure recovery. --target indexer replays "
+                    "synthetic blocks into an indexer running with LOB_REPLAY_ENABLED=true, rolls it back --depths "
+                    "blocks and times the delete (within the recent block window or by slot). --target app serves "
+                    "a synthetic chain through the indexer stand-in, rolls it back and times until the app's reader "
+                    "has reverted the dropped consignments; start the app with FOLLOWER_APP_BASE_URL and "
+                    "FOLLOWER_APP_INDEXER_URL pointing at the stand-in and a short lob.blockchain_reader.rate.ms.")
+    parser.add_argument("--target", choices=["indexer", "app"], default="indexer", help="What to roll back (default: indexer)")
+    parser.add_argument("--depths", default="1,2,5,10,100,1000",
+                        help="Rollback depths in blocks (indexer) or transactions (app), comma separated "
+                             "(default: 1,2,5,10,100,1000)")
+    parser.add_argument("--blocks", type=int, default=1200,
+                        help="Synthetic blocks (indexer) or transactions (app) on chain, more than the deepest "
+                             "rollback (default: 1200)")
+    parser.add_argument("--txs-per-block", type=int, default=2, help="Consignment txs per block, indexer target (default: 2)")
+    parser.add_argument("--per-tx", type=int, default=10, help="Consignments per transaction (default: 10)")
+    parser.add_argument("--indexer-url", default=os.environ.get("INDEXER_BASE_URL", "http://localhost:9090"),
+                        help="Indexer base URL, indexer target (default: INDEXER_BASE_URL or http://localhost:9090)")
+    parser.add_argument("--events-per-request", type=int, default=100, help="Blocks per replay request (default: 100)")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env whose CMS reads the stand-in, app target (default: ORG1)")
+    parser.add_argument("--host", default="127.0.0.1", help="Stand-in bind address, app target (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9096, help="Stand-in port, app target (default: 9096)")
+    parser.add_argument("--sample", type=int, default=20,
+                        help="Dropped consignments polled at the app per rollback, app target (default: 20)")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a recovery (default: 300)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the results to as JSON")
+    return parser.parse_args()
+
+
+def replay_blocks(session, indexer_url, events, events_per_request):
+    stored = 0
+    for start in range(0, len(events), events_per_request):
+        response = session.post(indexer_url + REPLAY_PATH, json=events[start:start + events_per_request], timeout=600)
+        if response.status_code == 404:
+            raise RuntimeError(f"{indexer_url}{REPLAY_PATH} not found, is the indexer running with LOB_REPLAY_ENABLED=true?")
+        response.raise_for_status()
+        stored += response.json()["stored"]
+    return stored
+
+
+def chaos_indexer(args, depths):
+    """Rolls the indexer back depth blocks, then replays the dropped blocks so the next depth starts from the same tip."""
+    session = requests.Session()
+    indexer_url = args.indexer_url.rstrip("/")
+    events = list(synthetic_events(args.blocks, args.txs_per_block, args.per_tx, "1448"))
+    stored = replay_blocks(session, indexer_url, events, args.events_per_request)
+    logger.info(f"Replayed {len(events)} blocks, {stored} consignments new")
+    results = []
+    for depth in depths:
+        rollback_slot = events[-depth - 1]["slot"]
+        expected = depth * args.txs_per_block * args.per_tx
+        started = time.perf_counter()
+        response = session.post(indexer_url + ROLLBACK_PATH, params={"slot": rollback_slot}, timeout=600)
+        rollback_ms = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        rollback = response.json() if response.status_code == 200 else {}
+        deleted = len(rollback.get("consignmentIds", []))
+        started = time.perf_counter()
+        replay_blocks(session, indexer_url, events[-depth:], args.events_per_request)
+        restore_ms = (time.perf_counter() - started) * 1000
+        result = {"depth": depth, "rollback_slot": rollback_slot, "expected": expected, "deleted": deleted,
+                  "fast_path": rollback.get("fastPath"), "rollback_ms": rollback_ms, "restore_ms": restore_ms}
+        results.append(result)
+        logger.info(f"Depth {depth}: deleted {deleted}/{expected} consignments "
+                    f"{'within the window' if result['fast_path'] else 'by slot'} in {rollback_ms:.0f} ms, "
+                    f"restored in {restore_ms:.0f} ms")
+    return results
+
+
+def wait_ingested(cms, chain, timeout):
+    """Seconds until the app serves the last consignment on the chain."""
+    last = chain.txs[-1]["id_controls"][-1]
+    started = time.perf_counter()
+    while cms.get_consignment(last) is None:
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"The app did not ingest the stand-in chain within {timeout}s, check FOLLOWER_APP_BASE_URL")
+        time.sleep(0.5)
+    return time.perf_counter() - started
+
+
+def wait_reverted(cms, id_controls, timeout):
+    """Seconds until the app answers 404 for every id control, or None on timeout."""
+    started = time.perf_counter()
+    pending = set(id_controls)
+    while pending:
+        if time.perf_counter() - started > timeout:
+            return None
+        pending = {i for i in pending if cms.get_consignment(i) is not None}
+        if pending:
+            time.sleep(0.5)
+    return time.perf_counter() - started
+
+
+def chaos_app(args, depths):
+    """Rolls the stand-in back depth transactions and waits for the app to revert them, then extends the chain again."""
+    for var in (f"CMS_BASE_URL_{args.org}", f"CMS_AUTH_TOKEN_{args.org}"):
+        if not os.environ.get(var):
+            raise RuntimeError(f"Environment variable {var} is not set")
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+    cms = client_for_org(args.org)
+    chain = SyntheticChain().seed(args.blocks * args.per_tx, args.per_tx)
+    standin = IndexerStandIn(chain, args.host, args.port).start()
+    results = []
+    try:
+        logger.info(f"App ingested {chain.consignment_count} consignments in {wait_ingested(cms, chain, args.timeout):.1f}s")
+        for depth in depths:
+            with standin.lock:
+                dropped = chain.rollback(chain.txs[-depth - 1]["slot"])
+            id_controls = [i for tx in dropped for i in tx["id_controls"]]
+            sample = id_controls[-args.sample:]
+            recovery_s = wait_reverted(cms, sample, args.timeout)
+            result = {"depth": depth, "dropped": len(id_controls), "sampled": len(sample), "recovery_s": recovery_s}
+            results.append(result)
+            if recovery_s is None:
+                logger.error(f"Depth {depth}: dropped consignments still served after {args.timeout}s")
+            else:
+                logger.info(f"Depth {depth}: {len(id_controls)} consignments dropped, reverted after {recovery_s:.1f}s")
+            # The next depth rolls back from the same tip, once the app has read the blocks that replace these
+            with standin.lock:
+                chain.seed(depth * args.per_tx, args.per_tx)
+            wait_ingested(cms, chain, args.timeout)
+    finally:
+        standin.stop()
+    return results
+
+
+def main():
+    args = parse_arguments()
+    depths = sorted(int(d) for d in args.depths.split(","))
+    if depths[-1] >= args.blocks:
+        logger.error(f"Error: --blocks {args.blocks} must exceed the deepest rollback {depths[-1]}")
+        sys.exit(1)
+    try:
+        results = chaos_indexer(args, depths) if args.target == "indexer" else chaos_app(args, depths)
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        logger.error(f"Chaos run failed: {e}")
+        sys.exit(1)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"target": args.target, "results": results}, f, indent=2)
+        logger.info(f"Wrote results to {args.json_out}")
+    # A rollback the indexer did not fully apply, or the app did not revert in time
+    if any(r.get("deleted", 0) < r.get("expected", 0) or ("recovery_s" in r and r["recovery_s"] is None) for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Pool and retry settings, overridable from the environment (or scripts/.env). Read when a session or
+# client is built rather than on import, as the scripts import this module before loading their .env
+DEFAULT_POOL_SIZE = 20
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_TIMEOUT = 30.0
+RETRY_STATUSES = (500, 502, 503, 504)
+
+headers = {
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+}
+
+# One record per HTTP call; endpoint is the templated path, e.g. "GET /consignments/{id}"
+CallLatency = namedtuple("CallLatency", ["endpoint", "status", "elapsed_ms", "started_at"])
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list, pct in 0..100."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarise_latencies(latencies):
+    """Group CallLatency records by endpoint and return count/error/p50/p95/p99/max in ms."""
+    by_endpoint = {}
+    for record in latencies:
+        by_endpoint.setdefault(record.endpoint, []).append(record)
+    summary = {}
+    for endpoint, records in sorted(by_endpoint.items()):
+        elapsed = sorted(r.elapsed_ms for r in records)
+        summary[endpoint] = {
+            "count": len(records),
+            "errors": sum(1 for r in records if r.status is None or r.status >= 400),
+            "p50_ms": percentile(elapsed, 50),
+            "p95_ms": percentile(elapsed, 95),
+            "p99_ms": percentile(elapsed, 99),
+            "max_ms": elapsed[-1]
+        }
+    return summary
+
+
+def log_latency_summary(latencies, log=logger):
+    for endpoint, stats in summarise_latencies(latencies).items():
+        log.info(f"{endpoint}: count={stats['count']}, errors={stats['errors']}, "
+                 f"p50={stats['p50_ms']:.1f}ms, p95={stats['p95_ms']:.1f}ms, "
+                 f"p99={stats['p99_ms']:.1f}ms, max={stats['max_ms']:.1f}ms")
+
+
+def format_histogram(values, bins=10, width=40, unit="s"):
+    """ASCII histogram of a list of numbers, one line per equal-width bucket."""
+    if not values:
+        return ["(no samples)"]
+    low, high = min(values), max(values)
+    step = (high - low) / bins or 1.0
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / step), bins - 1)] += 1
+    peak = max(counts)
+    lines = []
+    for i, count in enumerate(counts):
+        bar = "#" * int(round(width * count / peak))
+        lines.append(f"{low + i * step:>9.1f}{unit} - {low + (i + 1) * step:>9.1f}{unit} | {bar:<{width}} {count}")
+    return lines
+
+
+def _setting(value, name, default, cast):
+    """An explicit value, else the CMS_HTTP_* environment variable, else the default."""
+    if value is not None:
+        return value
+    return cast(os.environ.get(name, default))
+
+
+def build_session(pool_size=None, max_retries=None, backoff_factor=None):
+    """Keep-alive session with a bounded connection pool and retry on 5xx / connection errors.
+
+    POST and PUT are deliberately not retried: the CMS derives consignment ids from the server
+    side dispatch time, so replaying a create would produce a duplicate consignment, and every
+    update publishes a new version, so replaying one would publish it twice.
+    """
+    pool_size = _setting(pool_size, "CMS_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE, int)
+    max_retries = _setting(max_retries, "CMS_HTTP_MAX_RETRIES", DEFAULT_MAX_RETRIES, int)
+    backoff_factor = _setting(backoff_factor, "CMS_HTTP_BACKOFF_FACTOR", DEFAULT_BACKOFF_FACTOR, float)
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "DELETE", "HEAD", "OPTIONS"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(headers)
+    return session
+
+
+class CmsClient:
+    """Client for one CMS app instance (one base URL), reusing pooled keep-alive connections."""
+
+    def __init__(self, base_url, auth_token=None, pool_size=None, max_retries=None, backoff_factor=None, timeout=None,
+                 session=None):
+        if not base_url:
+            raise ValueError("CMS base url must be provided")
+        self.base_url = base_url.strip('"').rstrip("/")
+        self.auth_token = auth_token
+        self.timeout = _setting(timeout, "CMS_HTTP_TIMEOUT", DEFAULT_TIMEOUT, float)
+        self.session = session or build_session(pool_size, max_retries, backoff_factor)
+        self.latencies = []
+        self._latencies_lock = threading.Lock()
+
+    def __repr__(self):
+        return f"CmsClient({self.base_url})"
+
+    def close(self):
+        self.session.close()
+
+    def reset_latencies(self):
+        with self._latencies_lock:
+            recorded = self.latencies
+            self.latencies = []
+        return recorded
+
+    def _headers(self, extra=None):
+        local_headers = {}
+        if self.auth_token:
+            local_headers["Authorization"] = f"Bearer {self.auth_token}"
+        if extra:
+            local_headers.update(extra)
+        return local_headers
+
+    def request(self, method, path, endpoint, **kwargs):
+        """Send a request, recording its latency under the templated endpoint name."""
+        url = f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs["headers"] = self._headers(kwargs.get("headers"))
+        started_at = time.time()
+        start = time.perf_counter()
+        status = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            with self._latencies_lock:
+                self.latencies.append(CallLatency(f"{method} {endpoint}", status, elapsed_ms, started_at))
+
+    def check_health(self):
+        response = self.request("GET", "/hello", "/hello", timeout=5)
+        return response.status_code == 200 and "Hello" in response.text
+
+    def create_consignment(self, goods, sender_id, receiver_id, tracking_status=None, latitude=None, longitude=None):
+        payload = consignment_payload(goods, sender_id, receiver_id, tracking_status, latitude, longitude)
+        logger.debug(f"Payload for consignment request: {json.dumps(payload, indent=2)}")
+        try:
+            response = self.request("POST", "/consignments", "/consignments", data=json.dumps(payload))
+            logger.info(f"POST response status: {response.status_code}, body: {response.text}")
+            response.raise_for_status()
+            logger.info(f"Created consignment: Response: {response.json()}")
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to create consignment {e.response.text}")
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error creating consignment {payload}: {e}")
+            raise
+
+    def create_consignments_bulk(self, payloads):
+        """POST a batch of consignment payloads as NDJSON; returns the per-item results."""
+        body = "".join(json.dumps(payload) + "\n" for payload in payloads)
+        response = self.request("POST", "/consignments/bulk", "/consignments/bulk", data=body.encode("utf-8"),
+                                headers={"Content-Type": "application/x-ndjson"})
+        logger.info(f"POST bulk response status: {response.status_code}, items: {len(payloads)}")
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to create consignment batch of {len(payloads)}: {e.response.text}")
+            raise
+        return response.json()
+
+    def update_consignment(self, consignment_id, goods, sender_id, receiver_id, tracking_status=None, latitude=None, longitude=None):
+        payload = consignment_payload(goods, sender_id, receiver_id, tracking_status, latitude, longitude)
+        payload = {"id": consignment_id, **payload}
+        logger.info(f"Payload for update request: {payload}")
+        try:
+            response = self.request("PUT", f"/consignments/{consignment_id}", "/consignments/{id}", data=json.dumps(payload))
+            logger.info(f"PUT response status: {response.status_code}, body: {response.text}")
+            response.raise_for_status()
+            logger.info(f"Updated consignment: {consignment_id}, Response: {response.json()}")
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to update consignment {consignment_id}: {e.response.text}")
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error updating consignment {consignment_id}: {e}")
+            raise
+
+    def get_consignment(self, consignment_id):
+        """Latest version of a consignment by idControl, or None when the CMS does not know it (yet)."""
+        try:
+            response = self.request("GET", f"/consignments/{consignment_id}", "/consignments/{id}")
+            logger.info(f"GET response status: {response.status_code}, body: {response.text}")
+            if response.status_code == 404:
+                logger.info(f"Consignment {consignment_id} not found in database")
+                return None
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to get consignment {consignment_id}: {e.response.text}")
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error getting consignment {consignment_id}: {e}")
+            raise
+
+    def list_consignments(self):
+        """Every consignment the CMS has stored."""
+        response = self.request("GET", "/consignments", "/consignments")
+        response.raise_for_status()
+        return response.json()
+
+    def list_consignments_page(self, after_updated_at=None, after_id=None, limit=100, **filters):
+        """One keyset page of current versions; filters are the query parameters of GET /consignments/page,
+        e.g. senderId, publishStatus or updatedFrom. Returns the page with its next cursor."""
+        params = {k: v for k, v in filters.items() if v is not None}
+        params["limit"] = limit
+        if after_updated_at:
+            params.update(afterUpdatedAt=after_updated_at, afterId=after_id)
+        response = self.request("GET", "/consignments/page", "/consignments/page", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def export_consignments(self, chunk_size=64 * 1024, **filters):
+        """Yields the NDJSON lines (bytes) of GET /consignments/export as they arrive, holding one chunk at a time."""
+        params = {k: v for k, v in filters.items() if v is not None}
+        response = self.request("GET", "/consignments/export", "/consignments/export", params=params, stream=True,
+                                headers={"Accept": "application/x-ndjson"})
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=chunk_size):
+                if line:
+                    yield line
+
+    def get_consignment_if_changed(self, consignment_id, etag=None):
+        """Conditional GET of the latest version; returns (state, etag, modified).
+
+        When the server answers 304 to If-None-Match the body is not transferred and
+        (None, etag, False) is returned; a 404 is returned as (None, None, True).
+        """
+        extra = {"If-None-Match": etag} if etag else None
+        response = self.request("GET", f"/consignments/{consignment_id}", "/consignments/{id}", headers=extra)
+        logger.debug(f"Conditional GET response status: {response.status_code}")
+        if response.status_code == 304:
+            return None, etag, False
+        if response.status_code == 404:
+            return None, None, True
+        response.raise_for_status()
+        return response.json(), response.headers.get("ETag"), True
+
+    def delete_consignment(self, consignment_id):
+        try:
+            response = self.request("DELETE", f"/consignments/{consignment_id}", "/consignments/{id}")
+            logger.info(f"DELETE response status: {response.status_code}, body: {response.text}")
+            if response.status_code in (200, 204):
+                logger.info(f"Deleted consignment: {consignment_id}")
+            elif response.status_code == 404:
+                logger.info(f"Consignment {consignment_id} not found, no deletion needed")
+            else:
+                logger.error(f"Failed to delete consignment {consignment_id}: {response.text}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error deleting consignment {consignment_id}: {e}")
+            raise
+
+    def get_organisation(self, org_id):
+        try:
+            response = self.request("GET", f"/organisations/{org_id}", "/organisations/{id}")
+            logger.info(f"GET organisation response status: {response.status_code}, body: {response.text}")
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to get organisation {org_id}: {e.response.text}")
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error getting organisation {org_id}: {e}")
+            raise
+
+    def find_organisation(self, org_id):
+        """Organisation by id, or None when it cannot be read (not found, not yet authorised, ...)."""
+        response = self.request("GET", f"/organisations/{org_id}", "/organisations/{id}")
+        logger.info(f"GET response status: {response.status_code}, body: {response.text}")
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def create_organisation(self, payload):
+        response = self.request("POST", "/organisations", "/organisations", data=json.dumps(payload))
+        logger.info(f"POST response status: {response.status_code}, body: {response.text}")
+        response.raise_for_status()
+        return response.json()
+
+    def get_profiling_dump(self):
+        """Job spans and slow cycle stack samples, needs the app running with lob.profiling.enabled=true."""
+        response = self.request("GET", "/profiling/dump", "/profiling/dump")
+        if response.status_code == 404:
+            raise ValueError(f"{self.base_url}/profiling/dump not found, is the app running with LOB_PROFILING_ENABLED=true?")
+        response.raise_for_status()
+        return response.json()
+
+    def clear_profiling_dump(self):
+        response = self.request("DELETE", "/profiling/dump", "/profiling/dump")
+        response.raise_for_status()
+
+    def get_merkle_proof(self, consignment_id, tx_hash=None):
+        """Inclusion proof of a consignment version published in an anchored batch, None if it was not."""
+        params = {"txHash": tx_hash} if tx_hash else None
+        response = self.request("GET", f"/merkle/proofs/{consignment_id}", "/merkle/proofs/{id}", params=params)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def verify_merkle_proof(self, proof):
+        response = self.request("POST", "/merkle/verify", "/merkle/verify", data=json.dumps(proof))
+        response.raise_for_status()
+        return response.json()
+
+
+def consignment_payload(goods, sender_id, receiver_id, tracking_status=None, latitude=None, longitude=None):
+    return {
+        "goods": goods,
+        "sender": {"id": sender_id},
+        "receiver": {"id": receiver_id},
+        "organisationId": sender_id,
+        "trackingStatus": tracking_status,
+        "latitude": latitude,
+        "longitude": longitude
+    }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_for(base_url, auth_token=None, **kwargs):
+    """Shared client per (base url, token) so every caller in a process reuses the same pool."""
+    key = (base_url.strip('"').rstrip("/"), auth_token)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = CmsClient(base_url, auth_token, **kwargs)
+            _clients[key] = client
+        return client
+
+
+def client_for_org(org, **kwargs):
+    """Client for an org configured in scripts/.env, e.g. org="ORG1" -> CMS_BASE_URL_ORG1 / CMS_AUTH_TOKEN_ORG1."""
+    org = org.upper()
+    base_url = os.environ.get(f"CMS_BASE_URL_{org}")
+    if not base_url:
+        raise ValueError(f"Environment variable CMS_BASE_URL_{org} is not set")
+    return client_for(base_url, os.environ.get(f"CMS_AUTH_TOKEN_{org}"), **kwargs)
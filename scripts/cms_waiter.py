@@ -0,0 +1,313 @@
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 30.0
+DEFAULT_BACKOFF = 2.0
+DEFAULT_JITTER = 0.2
+DEFAULT_WORKERS = 10
+
+
+class WaitTimeout(Exception):
+    """Raised when an awaited consignment did not reach the expected state in time."""
+
+    def __init__(self, consignment_id, description, timeout, last_state):
+        super().__init__(f"Consignment {consignment_id} did not reach {description} in {timeout}s. Last state: {last_state}")
+        self.consignment_id = consignment_id
+        self.timeout = timeout
+        self.last_state = last_state
+
+
+def expect(tracking_status=None, latitude=None, longitude=None, ver=None, publish_status=None):
+    """Predicate over a consignment state; None fields are not checked."""
+    def matches(state):
+        if not state:
+            return False
+        l1 = state.get("l1SubmissionData") or {}
+        return ((tracking_status is None or state.get("trackingStatus") == tracking_status) and
+                (latitude is None or state.get("latitude") == latitude) and
+                (longitude is None or state.get("longitude") == longitude) and
+                (ver is None or state.get("ver") == ver) and
+                (publish_status is None or l1.get("publishStatus") == publish_status))
+    fields = {"trackingStatus": tracking_status, "latitude": latitude, "longitude": longitude,
+              "ver": ver, "publishStatus": publish_status}
+    matches.description = ", ".join(f"{k}={v}" for k, v in fields.items() if v is not None) or "any state"
+    return matches
+
+
+def _fingerprint(state):
+    if state is None:
+        return None
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Await:
+    def __init__(self, predicate, deadline, timeout):
+        self.predicate = predicate
+        self.deadline = deadline
+        self.timeout = timeout
+        self.future = Future()
+
+
+class _Watch:
+    """Polling state shared by every await on the same consignment id."""
+
+    def __init__(self, consignment_id, min_interval):
+        self.consignment_id = consignment_id
+        self.awaits = []
+        self.etag = None
+        self.fingerprint = None
+        self.last_state = None
+        self.interval = min_interval
+        self.due = 0.0
+        self.in_flight = False
+        # A push that arrived while the GET was outstanding, the response may predate the change it announced
+        self.notified = False
+
+
+class ConsignmentWaiter:
+    """Waits for many consignments to reach expected states from a single process.
+
+    All awaits on the same consignment share one GET per round, due consignments are fetched
+    concurrently on a bounded pool, and each consignment backs off exponentially (with jitter)
+    while its state is unchanged. A change that does not yet match resets it to the minimum
+    interval, since more changes usually follow. Requests are conditional (If-None-Match) so an
+    ETag-aware server can answer 304. notify() lets a push source (see SseNotifier) pull a poll
+    forward instead of waiting for the next backoff step.
+    """
+
+    def __init__(self, cms, workers=DEFAULT_WORKERS, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 backoff=DEFAULT_BACKOFF, jitter=DEFAULT_JITTER):
+        self.cms = cms
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cms-waiter")
+        self._watches = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._scheduler = threading.Thread(target=self._run, name="cms-waiter-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._scheduler.join()
+        self._pool.shutdown(wait=True)
+
+    def submit(self, consignment_id, predicate, timeout=180):
+        """Start waiting; returns a Future resolving to the matching state or failing with WaitTimeout."""
+        now = time.monotonic()
+        pending = _Await(predicate, now + timeout, timeout)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Waiter is closed")
+            watch = self._watches.get(consignment_id)
+            if watch is None:
+                watch = _Watch(consignment_id, self.min_interval)
+                self._watches[consignment_id] = watch
+                self._schedule(watch, now)
+            elif predicate(watch.last_state):
+                pending.future.set_result(watch.last_state)
+                return pending.future
+            watch.awaits.append(pending)
+            # A long backoff must not overshoot the deadline of a newly added await
+            if not watch.in_flight and watch.due > pending.deadline:
+                self._schedule(watch, pending.deadline)
+            self._cond.notify()
+        return pending.future
+
+    def wait_for(self, consignment_id, predicate, timeout=180):
+        """Block until the consignment matches predicate; raises WaitTimeout otherwise."""
+        description = getattr(predicate, "description", "expected state")
+        logger.info(f"Waiting up to {timeout}s for consignment {consignment_id} to reach {description}")
+        state = self.submit(consignment_id, predicate, timeout).result()
+        logger.info(f"Consignment {consignment_id} reached {description}: {state}")
+        return state
+
+    def notify(self, consignment_id=None):
+        """Poll one consignment (or all of them) as soon as possible, e.g. on a server push."""
+        now = time.monotonic()
+        with self._cond:
+            watches = [self._watches.get(consignment_id)] if consignment_id else list(self._watches.values())
+            for watch in watches:
+                if watch is None:
+                    continue
+                if watch.in_flight:
+                    watch.notified = True
+                else:
+                    watch.interval = self.min_interval
+                    self._schedule(watch, now)
+            self._cond.notify()
+
+    def outstanding(self):
+        with self._cond:
+            return sum(len(w.awaits) for w in self._watches.values())
+
+    def _schedule(self, watch, due):
+        watch.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), watch.consignment_id))
+
+    def _next_interval(self, watch, changed):
+        watch.interval = self.min_interval if changed else min(self.max_interval, watch.interval * self.backoff)
+        return watch.interval * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._take_due()
+                while not due and not self._closed:
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                    due = self._take_due()
+                if self._closed:
+                    return
+                for watch in due:
+                    watch.in_flight = True
+            for watch in due:
+                self._pool.submit(self._poll, watch, watch.etag)
+
+    def _take_due(self):
+        """Pop every watch whose due time has passed, skipping stale heap entries."""
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry_due, _, consignment_id = heapq.heappop(self._heap)
+            watch = self._watches.get(consignment_id)
+            if watch is not None and not watch.in_flight and watch.due == entry_due:
+                due.append(watch)
+        return due
+
+    def _poll(self, watch, etag):
+        try:
+            state, new_etag, modified = self.cms.get_consignment_if_changed(watch.consignment_id, etag)
+            error = None
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Polling consignment {watch.consignment_id} failed: {e}")
+            state, new_etag, modified, error = None, etag, False, e
+        now = time.monotonic()
+        with self._cond:
+            watch.in_flight = False
+            changed = False
+            if modified and error is None:
+                fingerprint = _fingerprint(state)
+                changed = fingerprint != watch.fingerprint
+                watch.fingerprint, watch.last_state, watch.etag = fingerprint, state, new_etag
+            remaining = []
+            for pending in watch.awaits:
+                if pending.future.done():
+                    continue
+                if pending.predicate(watch.last_state):
+                    pending.future.set_result(watch.last_state)
+                elif now >= pending.deadline:
+                    description = getattr(pending.predicate, "description", "expected state")
+                    pending.future.set_exception(
+                        WaitTimeout(watch.consignment_id, description, pending.timeout, watch.last_state))
+                else:
+                    remaining.append(pending)
+            watch.awaits = remaining
+            if not remaining:
+                del self._watches[watch.consignment_id]
+            else:
+                if watch.notified:
+                    watch.notified = False
+                    watch.interval = self.min_interval
+                    next_due = now + self.min_interval
+                else:
+                    next_due = now + self._next_interval(watch, changed)
+                self._schedule(watch, min(next_due, min(p.deadline for p in remaining)))
+            self._cond.notify()
+
+
+def iter_sse_events(response, stopped=None):
+    """Yields (event, id, data) for every event of a streamed text/event-stream response; comments are skipped."""
+    name, event_id, data = None, None, []
+    # chunk_size=1 so an event is handled as soon as its blank line arrives, not when a buffer fills
+    for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+        if stopped is not None and stopped.is_set():
+            return
+        if line:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "data":
+                data.append(value)
+            elif field == "event":
+                name = value
+            elif field == "id":
+                event_id = value
+            continue
+        if data:
+            yield name or "message", event_id, "\n".join(data)
+        name, event_id, data = None, None, []
+
+
+class SseNotifier(threading.Thread):
+    """Reads a text/event-stream and nudges a ConsignmentWaiter for every event.
+
+    Events whose JSON data carries an idControl/consignmentId poll only that consignment,
+    anything else polls all outstanding ones. Reconnects after errors; polling carries on
+    regardless, so a missing or broken stream only costs latency.
+    """
+
+    def __init__(self, url, waiter, session=None, headers=None, reconnect_delay=5.0):
+        super().__init__(name="cms-waiter-sse", daemon=True)
+        self.url = url
+        self.waiter = waiter
+        self.session = session or requests.Session()
+        self.headers = {"Accept": "text/event-stream", **(headers or {})}
+        self.reconnect_delay = reconnect_delay
+        self._stopped = threading.Event()
+        self._response = None
+
+    def stop(self):
+        self._stopped.set()
+        if self._response is not None:
+            self._response.close()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                with self.session.get(self.url, headers=self.headers, stream=True, timeout=(5, None)) as response:
+                    response.raise_for_status()
+                    self._response = response
+                    logger.info(f"Subscribed to {self.url}")
+                    for _, _, data in iter_sse_events(response, self._stopped):
+                        self._dispatch(data)
+                    if self._stopped.is_set():
+                        return
+            except (requests.exceptions.RequestException, AttributeError) as e:
+                # AttributeError: urllib3 raises it when stop() closes the response mid-read
+                if not self._stopped.is_set():
+                    logger.warning(f"Event stream {self.url} failed: {e}, reconnecting in {self.reconnect_delay}s")
+            self._stopped.wait(self.reconnect_delay)
+
+    def _dispatch(self, data):
+        try:
+            event = json.loads(data)
+        except ValueError:
+            event = None
+        consignment_id = None
+        if isinstance(event, dict):
+            consignment_id = event.get("idControl") or event.get("consignmentId")
+        self.waiter.notify(consignment_id)
@@ -0,0 +1,381 @@
+"""Consignment label metadata in the app's "1.0" schema and its compact schema 2, see CompactConsignmentMetadata.kt.
+
+A consignment is a dict with id (hex), goods, sender and receiver organisations ({id, name, tax_id_number,
+currency_id, country_code}), tracking_status, latitude, longitude and dispatched_at (naive UTC datetime),
+plus ver where deltas are involved. encode_* return the label's metadata as plain values (bytes for schema 2
+ids), cbor() serialises them and to_json() renders them the way the indexer serves json_metadata, bytes as
+0x hex. decode() reads either schema from CBOR or JSON values, rebuilding schema 2 delta items from the
+metadata of the transactions they build on. Anchored batches put only a Merkle root on chain (encode_merkle_root),
+each leaf is the CBOR of encode_leaf(); merkle_* build and check the tree like ConsignmentMerkleTree.kt.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_HALF_EVEN, Decimal
+
+VERSION_1 = "1.0"
+VERSION_2 = 2
+TYPE_CONSIGNMENTS = 1
+TYPE_MERKLE_ROOT = 2
+COORDINATE_SCALE = 10_000_000
+ID_PREFIX_BYTES = 4
+# lob.l1.transaction.delta.checkpoint_interval
+CHECKPOINT_INTERVAL = 8
+MAX_DELTA_DEPTH = 64
+# Append only, the same codes as CompactConsignmentMetadata.kt
+TRACKING_STATUS_CODES = {status: code for code, status in enumerate(
+    ["CREATED", "IN_TRANSIT", "DELIVERED", "DISPATCHED", "RETURNED", "CANCELLED"], start=1)}
+TRACKING_STATUSES = {code: status for status, code in TRACKING_STATUS_CODES.items()}
+ORG_FIELDS_V1 = ("id", "name", "tax_id_number", "currency_id", "country_code")
+ORG_FIELDS_V2 = dict(zip(ORG_FIELDS_V1, ("i", "n", "t", "c", "k")))
+EPOCH = datetime(1970, 1, 1)
+
+
+def iso_millis(dt):
+    """ISO_LOCAL_DATE_TIME of the millisecond truncated value, as the 1.0 serialiser writes it."""
+    text = dt.strftime("%Y-%m-%dT%H:%M:%S")
+    millis = dt.microsecond // 1000
+    return text + (f".{millis:03d}" if millis else "")
+
+
+def java_local_date_time(dt):
+    """LocalDateTime.toString(), what consignment ids are hashed from."""
+    text = dt.strftime("%Y-%m-%dT%H:%M")
+    if dt.second or dt.microsecond:
+        text += f":{dt.second:02d}"
+    if dt.microsecond:
+        text += f".{dt.microsecond // 1000:03d}" if dt.microsecond % 1000 == 0 else f".{dt.microsecond:06d}"
+    return text
+
+
+def consignment_id(sender_id, receiver_id, dispatched_at, ver):
+    """ConsignmentEntity.id"""
+    return hashlib.sha256(f"{sender_id}::{receiver_id}::{java_local_date_time(dispatched_at)}::{ver}".encode()).hexdigest()
+
+
+def epoch_millis(dt):
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def fixed_point(degrees):
+    # From the shortest repr, like BigDecimal.valueOf(double) on the Kotlin side
+    return int(Decimal(repr(float(degrees))).scaleb(7).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+
+def _org_v1(org):
+    return {k: org[k] for k in ORG_FIELDS_V1 if org.get(k)}
+
+
+def encode_v1(organisation_id, consignments, creation_slot, now):
+    collapsed = all(c["sender"]["id"] == organisation_id for c in consignments)
+    data = []
+    for c in consignments:
+        item = {"id": c["id"], "goods": c["goods"]}
+        if not collapsed:
+            item["sender"] = _org_v1(c["sender"])
+        item["receiver"] = _org_v1(c["receiver"])
+        if c.get("tracking_status"):
+            item["tracking_status"] = c["tracking_status"]
+        if c.get("latitude") is not None:
+            item["latitude"] = repr(float(c["latitude"]))
+        if c.get("longitude") is not None:
+            item["longitude"] = repr(float(c["longitude"]))
+        item["dispatched_at"] = iso_millis(c["dispatched_at"])
+        data.append(item)
+    metadata = {"metadata": {"creation_slot": creation_slot,
+                             "timestamp": now.replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                             "version": VERSION_1}}
+    if collapsed and consignments:
+        metadata["org"] = _org_v1(consignments[0]["sender"])
+    metadata["type"] = "CONSIGNMENTS"
+    metadata["data"] = data
+    return metadata
+
+
+def _delta_base(c, base, checkpoint_interval):
+    """As ConsignmentMetadataSerialiser.deltaBase: the base entry to write c as a delta of, or None."""
+    ver = c.get("ver", 1)
+    if base is None or checkpoint_interval <= 1 or (ver - 1) % checkpoint_interval == 0:
+        return None
+    previous = base["consignment"]
+    if previous.get("ver", ver - 1) != ver - 1:
+        return None
+    if any(not c.get(k) and previous.get(k) for k in ("tracking_status",)) or \
+            any(c.get(k) is None and previous.get(k) is not None for k in ("latitude", "longitude")):
+        return None
+    return base
+
+
+def encode_v2(organisation_id, consignments, creation_slot, now, bases=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """bases maps a consignment id to {"tx_hash", "consignment"} of its previous version, published on chain."""
+    epoch_second = int((now - EPOCH).total_seconds())
+    organisations, indexes = [], {}
+    base_tx_hashes, base_tx_indexes = [], {}
+
+    def index(org):
+        if org["id"] not in indexes:
+            indexes[org["id"]] = len(organisations)
+            organisations.append({ORG_FIELDS_V2[k]: org[k] for k in ORG_FIELDS_V1 if org.get(k)})
+        return indexes[org["id"]]
+
+    # The batch organisation goes first, the default sender
+    first = next((c for c in consignments if c["sender"]["id"] == organisation_id), consignments[0] if consignments else None)
+    if first:
+        index(first["sender"])
+    data = []
+    for c in consignments:
+        base = _delta_base(c, (bases or {}).get(c["id"]), checkpoint_interval)
+        if base:
+            previous = base["consignment"]
+            if base["tx_hash"] not in base_tx_indexes:
+                base_tx_indexes[base["tx_hash"]] = len(base_tx_hashes)
+                base_tx_hashes.append(bytes.fromhex(base["tx_hash"]))
+            item = {"i": bytes.fromhex(c["id"])[:ID_PREFIX_BYTES], "p": base_tx_indexes[base["tx_hash"]],
+                    "b": bytes.fromhex(previous["id"])[:ID_PREFIX_BYTES], "n": c["ver"]}
+            if c["goods"] != previous["goods"]:
+                item["g"] = c["goods"]
+            if c.get("tracking_status") and c["tracking_status"] != previous.get("tracking_status"):
+                item["k"] = TRACKING_STATUS_CODES.get(c["tracking_status"], c["tracking_status"])
+            for key, field in (("y", "latitude"), ("x", "longitude")):
+                if c.get(field) is not None and (previous.get(field) is None
+                                                 or fixed_point(c[field]) != fixed_point(previous[field])):
+                    item[key] = fixed_point(c[field])
+            data.append(item)
+            continue
+        item = {"i": bytes.fromhex(c["id"]), "g": c["goods"]}
+        sender = index(c["sender"])
+        if sender:
+            item["s"] = sender
+        item["r"] = index(c["receiver"])
+        if c.get("tracking_status"):
+            item["k"] = TRACKING_STATUS_CODES.get(c["tracking_status"], c["tracking_status"])
+        if c.get("latitude") is not None:
+            item["y"] = fixed_point(c["latitude"])
+        if c.get("longitude") is not None:
+            item["x"] = fixed_point(c["longitude"])
+        item["t"] = epoch_millis(c["dispatched_at"]) - epoch_second * 1000
+        data.append(item)
+    metadata = {"v": VERSION_2, "t": TYPE_CONSIGNMENTS, "c": creation_slot, "e": epoch_second, "o": organisations}
+    if base_tx_hashes:
+        metadata["h"] = base_tx_hashes
+    metadata["d"] = data
+    return metadata
+
+
+def encode(schema, organisation_id, consignments, creation_slot, now, bases=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    if schema == VERSION_2:
+        return encode_v2(organisation_id, consignments, creation_slot, now, bases, checkpoint_interval)
+    return encode_v1(organisation_id, consignments, creation_slot, now)
+
+
+def encode_leaf(consignment, creation_slot, now):
+    """The off chain leaf of an anchored batch: the consignment as the only, full item of a schema 2 payload."""
+    return encode_v2(consignment["sender"]["id"], [consignment], creation_slot, now)
+
+
+def encode_merkle_root(organisation_id, root, count, window, creation_slot, now):
+    """The on chain part of an anchored batch, window is the first and last creation of its versions in epoch seconds."""
+    return {"v": VERSION_2, "t": TYPE_MERKLE_ROOT, "c": creation_slot, "e": int((now - EPOCH).total_seconds()),
+            "o": [{"i": organisation_id}], "r": root, "n": count, "w": list(window)}
+
+
+def leaf_hash(leaf):
+    return hashlib.sha256(b"\x00" + leaf).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def _next_level(level):
+    return [node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+
+
+def merkle_root(leaf_hashes):
+    """The root over leaf hashes, the last node of an odd level promoted unchanged."""
+    if not leaf_hashes:
+        raise ValueError("A Merkle tree needs at least one leaf")
+    level = list(leaf_hashes)
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+
+def merkle_proof(leaf_hashes, index):
+    """The sibling hashes of the leaf at index, from the leaf level up."""
+    path, level, position = [], list(leaf_hashes), index
+    while len(level) > 1:
+        if position ^ 1 < len(level):
+            path.append(level[position ^ 1])
+        level, position = _next_level(level), position // 2
+    return path
+
+
+def root_from_proof(leaf_hash_, index, count, path):
+    """The root path leads to from the leaf hash at index of count leaves, None when the path does not fit the tree."""
+    if count < 1 or not 0 <= index < count:
+        return None
+    digest, position, size, step = leaf_hash_, index, count, 0
+    while size > 1:
+        if position ^ 1 < size:
+            if step >= len(path):
+                return None
+            sibling = path[step]
+            step += 1
+            digest = node_hash(digest, sibling) if position % 2 == 0 else node_hash(sibling, digest)
+        position, size = position // 2, (size + 1) // 2
+    return digest if step == len(path) else None
+
+
+def _id_hex(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    return value.removeprefix("0x").lower()
+
+
+def _org_from_v2(org):
+    return {k: org.get(short, "") for k, short in ORG_FIELDS_V2.items()}
+
+
+def _compact_item(metadata, item, base_metadata, depth):
+    """The consignment a schema 2 item publishes, delta items applied to their rebuilt base. id is a prefix for deltas."""
+    status = item.get("k")
+    published = {
+        "id": _id_hex(item["i"]),
+        "goods": item.get("g"),
+        "tracking_status": TRACKING_STATUSES[status] if isinstance(status, int) else status,
+        "latitude": item["y"] / COORDINATE_SCALE if "y" in item else None,
+        "longitude": item["x"] / COORDINATE_SCALE if "x" in item else None,
+    }
+    if "p" in item:
+        base = _published(_id_hex(metadata["h"][item["p"]]), _id_hex(item["b"]), base_metadata, depth + 1)
+        return {**base, **{k: v for k, v in published.items() if v is not None}}
+    organisations = [_org_from_v2(o) for o in metadata["o"]]
+    return {**published,
+            "sender": organisations[item.get("s", 0)],
+            "receiver": organisations[item["r"]],
+            "dispatched_at": EPOCH + timedelta(milliseconds=metadata["e"] * 1000 + item["t"])}
+
+
+def _published(tx_hash, id_prefix, base_metadata, depth):
+    """The consignment published in tx_hash whose id starts with id_prefix, in either schema."""
+    if depth > MAX_DELTA_DEPTH:
+        raise ValueError(f"Delta chain longer than {MAX_DELTA_DEPTH} at transaction {tx_hash}")
+    metadata = base_metadata(tx_hash) if base_metadata else None
+    if metadata is None:
+        raise ValueError(f"No consignment metadata for base transaction {tx_hash}")
+    if metadata.get("v") == VERSION_2:
+        matches = [item for item in metadata["d"] if _id_hex(item["i"]).startswith(id_prefix)]
+    else:
+        matches = [item for item in metadata["data"] if item["id"].startswith(id_prefix)]
+    if len(matches) != 1:
+        raise ValueError(f"{len(matches)} consignments with id prefix {id_prefix} in base transaction {tx_hash}")
+    if metadata.get("v") == VERSION_2:
+        return _compact_item(metadata, matches[0], base_metadata, depth)
+    return next(c for c in decode(metadata) if c["id"] == matches[0]["id"])
+
+
+def decode(metadata, base_metadata=None):
+    """The consignments of label metadata in either schema, as dicts like the ones encoded. base_metadata(tx_hash)
+    returns the label metadata of a transaction delta items build on."""
+    if metadata.get("v") == VERSION_2:
+        if metadata.get("t") != TYPE_CONSIGNMENTS:
+            return []
+        consignments = []
+        for item in metadata["d"]:
+            consignment = _compact_item(metadata, item, base_metadata, 0)
+            if "p" in item:
+                full_id = consignment_id(consignment["sender"]["id"], consignment["receiver"]["id"],
+                                         consignment["dispatched_at"], item["n"])
+                if not full_id.startswith(consignment["id"]):
+                    raise ValueError(f"Delta id prefix {consignment['id']} does not match rebuilt id {full_id}")
+                consignment = {**consignment, "id": full_id, "ver": item["n"]}
+            consignments.append({**consignment, "creation_slot": metadata["c"]})
+        return consignments
+    if metadata.get("type") != "CONSIGNMENTS":
+        return []
+    org = metadata.get("org") or {}
+    consignments = []
+    for item in metadata["data"]:
+        sender = item.get("sender") or org
+        consignments.append({
+            "id": item["id"],
+            "goods": item["goods"],
+            "sender": {k: sender.get(k, "") for k in ORG_FIELDS_V1},
+            "receiver": {k: item["receiver"].get(k, "") for k in ORG_FIELDS_V1},
+            "tracking_status": item.get("tracking_status"),
+            "latitude": float(item["latitude"]) if item.get("latitude") is not None else None,
+            "longitude": float(item["longitude"]) if item.get("longitude") is not None else None,
+            "dispatched_at": datetime.fromisoformat(item["dispatched_at"]),
+            "creation_slot": metadata["metadata"]["creation_slot"],
+        })
+    return consignments
+
+
+def cbor(value):
+    """CBOR for transaction metadata: ints, bytes, text, lists and maps."""
+    def head(major, n):
+        if n < 24:
+            return bytes([major << 5 | n])
+        for info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+            if n < 1 << (8 * size):
+                return bytes([major << 5 | info]) + n.to_bytes(size, "big")
+        raise ValueError(f"{n} does not fit CBOR")
+    if isinstance(value, bool):
+        raise TypeError("Metadata has no booleans")
+    if isinstance(value, int):
+        return head(0, value) if value >= 0 else head(1, -1 - value)
+    if isinstance(value, (bytes, bytearray)):
+        return head(2, len(value)) + bytes(value)
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return head(3, len(data)) + data
+    if isinstance(value, list):
+        return head(4, len(value)) + b"".join(cbor(v) for v in value)
+    if isinstance(value, dict):
+        return head(5, len(value)) + b"".join(cbor(k) + cbor(v) for k, v in value.items())
+    raise TypeError(f"Cannot encode {type(value)}")
+
+
+def cbor_decode(data):
+    def item(offset):
+        major, info = data[offset] >> 5, data[offset] & 0x1f
+        offset += 1
+        if info < 24:
+            n = info
+        else:
+            size = {24: 1, 25: 2, 26: 4, 27: 8}[info]
+            n = int.from_bytes(data[offset:offset + size], "big")
+            offset += size
+        if major == 0:
+            return n, offset
+        if major == 1:
+            return -1 - n, offset
+        if major in (2, 3):
+            raw = data[offset:offset + n]
+            return (bytes(raw) if major == 2 else raw.decode("utf-8")), offset + n
+        if major == 4:
+            values = []
+            for _ in range(n):
+                value, offset = item(offset)
+                values.append(value)
+            return values, offset
+        if major == 5:
+            values = {}
+            for _ in range(n):
+                key, offset = item(offset)
+                values[key], offset = item(offset)
+            return values, offset
+        raise ValueError(f"Unsupported CBOR major type {major}")
+    value, _ = item(0)
+    return value
+
+
+def to_json(value):
+    """Metadata values as the indexer serves json_metadata: bytes as 0x hex."""
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if isinstance(value, list):
+        return [to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    return value
@@ -0,0 +1,104 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+from dotenv import load_dotenv
+from cms_client import client_for_org
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Export the current version of every matching consignment as NDJSON. Lines are written as "
+                    "they arrive, so memory stays flat however many consignments match.")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env whose CMS to export from (default: ORG1)")
+    parser.add_argument("--out", default="-", help="Output file, .gz to compress, - for stdout (default: -)")
+    parser.add_argument("--sender-id", default=None, help="Only consignments sent by this organisation")
+    parser.add_argument("--receiver-id", default=None, help="Only consignments received by this organisation")
+    parser.add_argument("--tracking-status", default=None, help="Only this tracking status, e.g. IN_TRANSIT")
+    parser.add_argument("--publish-status", default=None, help="Only this publish status, e.g. FINALIZED")
+    parser.add_argument("--finality-score", default=None, help="Only this finality score, e.g. FINAL")
+    parser.add_argument("--updated-from", default=None, help="updatedAt on or after, ISO date-time")
+    parser.add_argument("--updated-to", default=None, help="updatedAt before, ISO date-time")
+    parser.add_argument("--paged", action="store_true",
+                        help="Walk GET /consignments/page instead of the /consignments/export stream")
+    parser.add_argument("--page-size", type=int, default=500, help="Consignments per page with --paged (default: 500)")
+    return parser.parse_args()
+
+
+def exported_lines(cms, args, filters):
+    if not args.paged:
+        yield from cms.export_consignments(**filters)
+        return
+    after_updated_at = after_id = None
+    while True:
+        page = cms.list_consignments_page(after_updated_at, after_id, args.page_size, **filters)
+        for item in page["items"]:
+            yield json.dumps(item).encode("utf-8")
+        if not page.get("nextAfterUpdatedAt"):
+            return
+        after_updated_at, after_id = page["nextAfterUpdatedAt"], page["nextAfterId"]
+
+
+def main():
+    args = parse_arguments()
+    for var in (f"CMS_BASE_URL_{args.org}", f"CMS_AUTH_TOKEN_{args.org}"):
+        if not os.environ.get(var):
+            logger.error(f"Error: Environment variable {var} is not set")
+            sys.exit(1)
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+
+    cms = client_for_org(args.org)
+    filters = {
+        "senderId": args.sender_id,
+        "receiverId": args.receiver_id,
+        "trackingStatus": args.tracking_status,
+        "publishStatus": args.publish_status,
+        "finalityScore": args.finality_score,
+        "updatedFrom": args.updated_from,
+        "updatedTo": args.updated_to,
+    }
+    if args.out == "-":
+        out = sys.stdout.buffer
+    elif args.out.endswith(".gz"):
+        out = gzip.open(args.out, "wb")
+    else:
+        out = open(args.out, "wb")
+
+    started = time.perf_counter()
+    rows = written = 0
+    try:
+        for line in exported_lines(cms, args, filters):
+            out.write(line)
+            out.write(b"\n")
+            rows += 1
+            written += len(line) + 1
+    except Exception as e:
+        logger.error(f"Export failed after {rows} consignments: {e}")
+        sys.exit(1)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        else:
+            out.flush()
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    logger.info(f"Exported {rows} consignments ({written} bytes) in {elapsed:.1f}s, "
+                f"{rows / elapsed if elapsed else 0:.0f}/s, peak memory {peak_mib:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import argparse
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+METADATA_LABEL = "1448"
+START_SLOT = 80_000_000
+
+
+def java_local_date_time(dt):
+    """LocalDateTime.toString(), which the app hashes into consignment ids: seconds and fraction only when non-zero."""
+    text = dt.strftime("%Y-%m-%dT%H:%M")
+    if dt.second or dt.microsecond:
+        text += f":{dt.second:02d}"
+    if dt.microsecond:
+        text += f".{dt.microsecond // 1000:03d}" if dt.microsecond % 1000 == 0 else f".{dt.microsecond:06d}"
+    return text
+
+
+def consignment_id(sender_id, receiver_id, dispatched_at, ver):
+    return hashlib.sha256(f"{sender_id}::{receiver_id}::{java_local_date_time(dispatched_at)}::{ver}".encode()).hexdigest()
+
+
+def id_control(sender_id, receiver_id, dispatched_at):
+    return hashlib.sha256(f"{sender_id}::{receiver_id}::{java_local_date_time(dispatched_at)}".encode()).hexdigest()
+
+
+def organisation(org_id, name):
+    return {"id": org_id, "name": name, "country_code": "AU", "tax_id_number": f"TAX-{name}", "currency_id": "ISO_4217:AUD"}
+
+
+class SyntheticChain:
+    """Consignment transactions as the publisher writes them, with the indexer rows pointing at them."""
+
+    def __init__(self, sender_id=None, receiver_id=None, slots_per_tx=20):
+        self.sender = organisation(sender_id or str(uuid.uuid4()), "standin-sender")
+        self.receiver = organisation(receiver_id or str(uuid.uuid4()), "standin-receiver")
+        self.slots_per_tx = slots_per_tx
+        self.txs = []          # in chain order: {"hash", "slot", "metadata", "consignment_ids", "id_controls"}
+        self.rollbacks = []    # as GET /api/v1/rollbacks serves them
+        self.tx_by_hash = {}
+        self.next_slot = START_SLOT
+        self.next_index = 0
+        self.base_time = datetime(2025, 7, 31, 12, 0, 1)
+
+    def add_tx(self, items):
+        """Appends one transaction carrying items given as (index, ver, goods)."""
+        data = []
+        for index, ver, goods in items:
+            dispatched_at = self.dispatched_at(index)
+            data.append({
+                "id": consignment_id(self.sender["id"], self.receiver["id"], dispatched_at, ver),
+                "goods": goods,
+                "receiver": self.receiver,
+                "tracking_status": "IN_TRANSIT",
+                "latitude": "51.5074",
+                "longitude": "-0.1278",
+                # ISO_LOCAL_DATE_TIME of the millisecond truncated value, as the serialiser writes it
+                "dispatched_at": dispatched_at.strftime("%Y-%m-%dT%H:%M:%S") + (
+                    f".{dispatched_at.microsecond // 1000:03d}" if dispatched_at.microsecond else "")
+            })
+        tx_hash = hashlib.sha256(f"{self.sender['id']}:{len(self.txs)}:{self.next_slot}".encode()).hexdigest()
+        metadata = {
+            "metadata": {"creation_slot": self.next_slot - 5, "timestamp": "2025-07-31T12:00:00Z", "version": "1.0"},
+            "org": self.sender,
+            "type": "CONSIGNMENTS",
+            "data": data
+        }
+        self.txs.append({"hash": tx_hash, "slot": self.next_slot, "metadata": metadata,
+                         "consignment_ids": sorted(item["id"] for item in data),
+                         "id_controls": [id_control(self.sender["id"], self.receiver["id"], self.dispatched_at(index))
+                                         for index, _, _ in items],
+                         "items": [(index, ver) for index, ver, _ in items]})
+        self.tx_by_hash[tx_hash] = self.txs[-1]
+        self.next_slot += self.slots_per_tx
+        return tx_hash
+
+    def dispatched_at(self, index):
+        return self.base_time + timedelta(milliseconds=index + 1)
+
+    def latest_versions(self):
+        versions = {}
+        for tx in self.txs:
+            for index, ver in tx["items"]:
+                versions[index] = max(ver, versions.get(index, 0))
+        return versions
+
+    def seed(self, count, per_tx=50, updates=0):
+        """count new consignments, then updates later versions of the earliest ones, per_tx to a transaction."""
+        items = []
+        for index in range(self.next_index, self.next_index + count):
+            items.append((index, 1, {"item1": index + 1}))
+        self.next_index += count
+        for index, ver in sorted(self.latest_versions().items())[:updates]:
+            items.append((index, ver + 1, {"item1": index + 1, "updated": ver + 1}))
+        for start in range(0, len(items), per_tx):
+            self.add_tx(items[start:start + per_tx])
+        return self
+
+    def rollback(self, slot):
+        """Drops every transaction after slot; the chain carries on from there, below slots already served."""
+        dropped = [tx for tx in self.txs if tx["slot"] > slot]
+        self.txs = [tx for tx in self.txs if tx["slot"] <= slot]
+        for tx in dropped:
+            del self.tx_by_hash[tx["hash"]]
+        self.next_slot = slot + 1
+        if dropped:
+            self.rollbacks.append({
+                "id": len(self.rollbacks) + 1,
+                "rollbackSlot": slot,
+                "blockHash": hashlib.sha256(str(slot).encode()).hexdigest(),
+                "consignmentIds": [cid for tx in dropped for cid in tx["consignment_ids"]],
+                "fastPath": True,
+                "createdAt": datetime.now().isoformat()
+            })
+        return dropped
+
+    def rows(self, after=None):
+        """Indexer rows in (slot, tx hash, consignment id) order, optionally after a (slot, tx hash) cursor."""
+        start = bisect.bisect_right([(tx["slot"], tx["hash"]) for tx in self.txs], after) if after else 0
+        for tx in self.txs[start:]:
+            for cid in tx["consignment_ids"]:
+                yield {"consignmentId": cid, "organisationId": self.sender["id"], "l1AbsoluteSlot": tx["slot"],
+                       "l1TransactionHash": tx["hash"]}
+
+    @property
+    def consignment_count(self):
+        return sum(len(tx["consignment_ids"]) for tx in self.txs)
+
+
+class IndexerStandIn:
+    """Serves a SyntheticChain the way the follower (consignments, rollbacks, tip) and yaci-store (tx metadata) APIs do."""
+
+    def __init__(self, chain, host="127.0.0.1", port=9096):
+        self.chain = chain
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"consignment_requests": 0, "consignment_rows": 0, "metadata_requests": 0,
+                          "metadata_hashes": set(), "lookups": 0, "lookup_misses": 0,
+                          "first_request_at": None, "last_request_at": None}
+            # One entry per consignment page served, metadata lookups are counted against the latest page
+            self.requests = []
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["metadata_hashes"] = len(stats["metadata_hashes"])
+        return stats
+
+    def pages(self):
+        with self.lock:
+            return [dict(page) for page in self.requests]
+
+    def _record(self, **changes):
+        now = time.time()
+        with self.lock:
+            for key, value in changes.items():
+                if key == "metadata_hash":
+                    self.stats["metadata_hashes"].add(value)
+                    if self.requests:
+                        self.requests[-1]["metadata_requests"] += 1
+                else:
+                    self.stats[key] += value
+            self.stats["first_request_at"] = self.stats["first_request_at"] or now
+            self.stats["last_request_at"] = now
+
+    def consignments(self, query):
+        limit = int(query.get("limit", ["1000"])[0])
+        after = None
+        if "afterSlot" in query:
+            after = (int(query["afterSlot"][0]), query.get("afterTxHash", [""])[0])
+        with self.lock:
+            rows = list(itertools.islice(self.chain.rows(after), limit))
+            self.requests.append({"at": time.time(), "limit": limit, "after": after, "rows": len(rows),
+                                  "metadata_requests": 0})
+        return rows
+
+    def rollbacks(self, query):
+        after_id = int(query.get("afterId", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        with self.lock:
+            return [r for r in self.chain.rollbacks if r["id"] > after_id][:limit]
+
+    def has_consignment(self, cid):
+        with self.lock:
+            return any(cid in tx["consignment_ids"] for tx in self.chain.txs)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Indexer stand-in on {self.base_url}: {len(self.chain.txs)} txs, "
+                    f"{self.chain.consignment_count} consignments")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, fmt, *log_args):
+                logger.debug(fmt, *log_args)
+
+            def reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path, query = re.sub("/+", "/", url.path).rstrip("/"), parse_qs(url.query)
+
+                if path.endswith("/api/v1/consignments"):
+                    rows = standin.consignments(query)
+                    standin._record(consignment_requests=1, consignment_rows=len(rows))
+                    return self.reply(200, rows)
+                if path.endswith("/api/v1/rollbacks"):
+                    return self.reply(200, standin.rollbacks(query))
+                if path.endswith("/api/v1/rollbacks/latest"):
+                    with standin.lock:
+                        latest = standin.chain.rollbacks[-1] if standin.chain.rollbacks else None
+                    if latest is None:
+                        return self.reply(404, {"message": "Not found"})
+                    return self.reply(200, latest)
+                match = re.search(r"/api/v1/consignments/([0-9a-f]{64})$", path)
+                if match:
+                    found = standin.has_consignment(match.group(1))
+                    standin._record(lookups=1, lookup_misses=0 if found else 1)
+                    if not found:
+                        return self.reply(404, {"message": "Not found"})
+                    return self.reply(200, {"consignmentId": match.group(1)})
+                match = re.search(r"/txs/([0-9a-f]{64})/metadata$", path)
+                if match:
+                    standin._record(metadata_requests=1, metadata_hash=match.group(1))
+                    with standin.lock:
+                        tx = standin.chain.tx_by_hash.get(match.group(1))
+                    if tx is None:
+                        return self.reply(404, {"message": "Not found"})
+                    return self.reply(200, [{"label": METADATA_LABEL, "json_metadata": tx["metadata"]}])
+                if path.endswith("/tip"):
+                    slot = standin.chain.next_slot
+                    return self.reply(200, {"absoluteSlot": slot, "blockHash": hashlib.sha256(str(slot).encode()).hexdigest(),
+                                            "network": "PREPROD", "synced": True})
+                if path.endswith("/standin/stats"):
+                    return self.reply(200, standin.snapshot())
+                return self.reply(404, {"message": "Not found"})
+
+        return Handler
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Serve a synthetic consignment chain through the follower and yaci-store endpoints the reader polls")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9096, help="Port (default: 9096)")
+    parser.add_argument("--count", type=int, default=1000, help="Consignments to seed (default: 1000)")
+    parser.add_argument("--per-tx", type=int, default=50, help="Consignments per transaction (default: 50)")
+    parser.add_argument("--updates", type=int, default=0,
+                        help="Later versions of the first consignments, in later transactions (default: 0)")
+    parser.add_argument("--sender-id", default=None, help="Sending organisation id (default: random)")
+    parser.add_argument("--receiver-id", default=None, help="Receiving organisation id (default: random)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    chain = SyntheticChain(args.sender_id, args.receiver_id).seed(args.count, args.per_tx, args.updates)
+    standin = IndexerStandIn(chain, args.host, args.port)
+    logger.info(f"Point FOLLOWER_APP_BASE_URL at {standin.base_url}/api/v1/ and FOLLOWER_APP_INDEXER_URL at "
+                f"{standin.base_url}/yaci-api/, sender id {chain.sender['id']}")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info(f"Stats: {standin.snapshot()}")
+        standin.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org, summarise_latencies
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CITY_COORDINATES = [
+    (51.5074, -0.1278),
+    (-33.8688, 151.2093),
+    (40.7128, -74.0060),
+    (-22.9068, -43.1729),
+    (35.6762, 139.6503),
+    (-33.9249, 18.4241),
+    (3.1390, 101.6869),
+    (48.8566, 2.3522),
+    (19.0760, 72.8777),
+    (43.6532, -79.3832)
+]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Asyncio load generator for consignment create/update traffic")
+    parser.add_argument("--orgs", default="ORG1",
+                        help="Comma separated orgs from scripts/.env to load, e.g. ORG1,ORG2 (default: ORG1)")
+    parser.add_argument("--shippers", type=int, default=10,
+                        help="Number of virtual shippers; in concurrency mode this is the fixed concurrency (default: 10)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Target total request rate per second across all shippers; omit for fixed concurrency")
+    parser.add_argument("--duration", type=float, default=60,
+                        help="Duration of the run in seconds (default: 60)")
+    parser.add_argument("--updates", type=int, default=3,
+                        help="Tracking updates per consignment after creation (default: 3)")
+    parser.add_argument("--update-delay", type=float, default=1.0,
+                        help="Seconds a shipper waits between create and each update, the CMS stores new versions "
+                             "asynchronously so an immediate update can race the previous one (default: 1.0)")
+    parser.add_argument("--json-out", default=None,
+                        help="Optional file to write the run report to as JSON")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Keep per-request client logging (very noisy under load)")
+    return parser.parse_args()
+
+
+def interpolate_route(start_coords, end_coords, progress):
+    """Interpolate coordinates between start and end based on progress (0.0 to 1.0)."""
+    lat = start_coords[0] + (end_coords[0] - start_coords[0]) * progress
+    lon = start_coords[1] + (end_coords[1] - start_coords[1]) * progress
+    return round(lat, 4), round(lon, 4)
+
+
+class RatePacer:
+    """Hands out evenly spaced start times so all shippers together stay at the target rate."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        async with self.lock:
+            now = time.monotonic()
+            # Do not bank credit while shippers were busy, that would turn into bursts
+            start_at = max(self.next_at, now)
+            self.next_at = start_at + self.interval
+        delay = start_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class LoadStats:
+    def __init__(self):
+        self.ok = {}
+        self.failed = {}
+
+    def record(self, endpoint, success):
+        counter = self.ok if success else self.failed
+        counter[endpoint] = counter.get(endpoint, 0) + 1
+
+
+async def call(stats, endpoint, fn, *args, **kwargs):
+    try:
+        result = await asyncio.to_thread(fn, *args, **kwargs)
+        stats.record(endpoint, True)
+        return result
+    except requests.exceptions.RequestException as e:
+        stats.record(endpoint, False)
+        logger.debug(f"{endpoint} failed: {e}")
+        return None
+
+
+async def shipper(shipper_id, cms, sender_id, receiver_id, args, deadline, pacer, stats):
+    """One virtual shipper: create a consignment, move it along its route with updates, repeat."""
+    rng = random.Random(shipper_id)
+    while time.monotonic() < deadline:
+        start_coords, end_coords = rng.sample(CITY_COORDINATES, 2)
+        goods = {f"item{i}": rng.randint(1, 100) for i in range(1, rng.randint(2, 4))}
+        if pacer:
+            await pacer.wait_turn()
+        created = await call(stats, "POST /consignments", cms.create_consignment,
+                             goods, sender_id, receiver_id, "CREATED", start_coords[0], start_coords[1])
+        if not created:
+            continue
+        for update in range(1, args.updates + 1):
+            await asyncio.sleep(args.update_delay)
+            if time.monotonic() >= deadline:
+                return
+            progress = update / args.updates
+            lat, lon = interpolate_route(start_coords, end_coords, progress)
+            status = "DELIVERED" if update == args.updates else "IN_TRANSIT"
+            if pacer:
+                await pacer.wait_turn()
+            await call(stats, "PUT /consignments/{id}", cms.update_consignment,
+                       created["idControl"], goods, sender_id, receiver_id, status, lat, lon)
+
+
+def build_report(orgs, clients, stats, elapsed, args):
+    latencies = [record for cms in clients for record in cms.latencies]
+    report = {
+        "orgs": orgs,
+        "shippers": args.shippers,
+        "mode": "rate" if args.rate else "concurrency",
+        "target_rate": args.rate,
+        "duration_s": round(elapsed, 2),
+        "endpoints": {}
+    }
+    for endpoint, latency in summarise_latencies(latencies).items():
+        ok = stats.ok.get(endpoint, 0)
+        report["endpoints"][endpoint] = {
+            "ok": ok,
+            "failed": stats.failed.get(endpoint, 0),
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            **{k: (round(v, 1) if isinstance(v, float) else v) for k, v in latency.items()}
+        }
+    return report
+
+
+def log_report(report):
+    logger.info(f"Load run: mode={report['mode']}, shippers={report['shippers']}, target_rate={report['target_rate']}, "
+                f"orgs={','.join(report['orgs'])}, duration={report['duration_s']}s")
+    logger.info(f"{'endpoint':<28}{'ok':>8}{'failed':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, s in report["endpoints"].items():
+        logger.info(f"{endpoint:<28}{s['ok']:>8}{s['failed']:>8}{s['throughput_rps']:>9}"
+                    f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+async def run(args):
+    orgs = [org.strip().upper() for org in args.orgs.split(",") if org.strip()]
+    for org in orgs:
+        for var in (f"CMS_BASE_URL_{org}", f"CMS_AUTH_TOKEN_{org}", f"{org}_ID"):
+            if not os.environ.get(var):
+                logger.error(f"Error: Environment variable {var} is not set")
+                sys.exit(1)
+
+    # Blocking HTTP runs on worker threads; size both the executor and the pools to the shipper count
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.shippers))
+    clients = {org: client_for_org(org, pool_size=args.shippers) for org in orgs}
+    org_ids = {org: os.environ.get(f"{org}_ID") for org in orgs}
+
+    pacer = RatePacer(args.rate) if args.rate else None
+    stats = LoadStats()
+    deadline = time.monotonic() + args.duration
+    tasks = []
+    for shipper_id in range(args.shippers):
+        org = orgs[shipper_id % len(orgs)]
+        # Ship to another loaded org when there is one, otherwise to an arbitrary receiver
+        others = [o for o in orgs if o != org]
+        receiver_id = org_ids[others[shipper_id % len(others)]] if others else str(uuid.uuid4())
+        tasks.append(shipper(shipper_id, clients[org], org_ids[org], receiver_id, args, deadline, pacer, stats))
+
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    return build_report(orgs, list(clients.values()), stats, elapsed, args)
+
+
+def main():
+    args = parse_arguments()
+    if not args.verbose:
+        logging.getLogger("cms_client").setLevel(logging.WARNING)
+    try:
+        report = asyncio.run(run(args))
+        log_report(report)
+        if args.json_out:
+            with open(args.json_out, "w") as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Wrote report to {args.json_out}")
+    except KeyboardInterrupt:
+        logger.info("Load run interrupted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
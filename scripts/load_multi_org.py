@@ -0,0 +1,167 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org, format_histogram, percentile
+from cms_waiter import ConsignmentWaiter, WaitTimeout
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Create consignments from several organisations at once and report per-org dispatch queue latency")
+    parser.add_argument("--orgs", default="ORG1,ORG2",
+                        help="Comma separated orgs from scripts/.env sending consignments (default: ORG1,ORG2)")
+    parser.add_argument("--synthetic-orgs", type=int, default=0,
+                        help="Additionally create this many organisations on the first org's app and send from them, "
+                             "so a single app has several organisation queues to dispatch (default: 0)")
+    parser.add_argument("--per-org", type=int, default=10,
+                        help="Consignments created per sending organisation (default: 10)")
+    parser.add_argument("--timeout", type=float, default=900,
+                        help="Seconds to wait for each consignment to get a transaction hash (default: 900)")
+    parser.add_argument("--json-out", default=None,
+                        help="Optional file to write per-org latencies to as JSON")
+    return parser.parse_args()
+
+
+def has_transaction_hash(state):
+    return bool(state and (state.get("l1SubmissionData") or {}).get("transactionHash"))
+
+
+has_transaction_hash.description = "a transaction hash"
+
+
+def create_synthetic_orgs(cms, count):
+    org_ids = []
+    for i in range(count):
+        org_id = str(uuid.uuid4())
+        payload = {
+            "id": org_id,
+            "name": f"loadorg{i + 1}",
+            "city": "London",
+            "countryCode": "GB",
+            "taxIdNumber": f"LOAD-{i + 1}",
+            "preApproveTransactions": False,
+            "preApproveTransactionsDispatch": False,
+            "accountPeriodDays": 30,
+            "currencyId": "USD",
+            "reportCurrencyId": "USD"
+        }
+        cms.create_organisation(payload)
+        org_ids.append(org_id)
+    logger.info(f"Created {count} synthetic organisations")
+    return org_ids
+
+
+class QueueLatencies:
+    """Seconds from create accepted to transaction hash observed, per sending organisation."""
+
+    def __init__(self):
+        self.by_org = {}
+        self.timeouts = {}
+        self.lock = threading.Lock()
+
+    def record(self, org_name, accepted_at, future):
+        with self.lock:
+            if future.exception() is None:
+                self.by_org.setdefault(org_name, []).append(time.time() - accepted_at)
+            else:
+                self.timeouts[org_name] = self.timeouts.get(org_name, 0) + 1
+
+
+def main():
+    args = parse_arguments()
+    logging.getLogger("cms_client").setLevel(logging.WARNING)
+
+    orgs = [org.strip().upper() for org in args.orgs.split(",") if org.strip()]
+    for org in orgs:
+        for var in (f"CMS_BASE_URL_{org}", f"CMS_AUTH_TOKEN_{org}", f"{org}_ID"):
+            if not os.environ.get(var):
+                logger.error(f"Error: Environment variable {var} is not set")
+                sys.exit(1)
+
+    # Sender name -> (client, org id); synthetic orgs live on the first org's app and share its token
+    senders = {org: (client_for_org(org), os.environ.get(f"{org}_ID")) for org in orgs}
+    try:
+        first_cms = senders[orgs[0]][0]
+        for i, org_id in enumerate(create_synthetic_orgs(first_cms, args.synthetic_orgs)):
+            senders[f"{orgs[0]}-LOAD{i + 1}"] = (first_cms, org_id)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Could not create synthetic organisations: {e}")
+        sys.exit(1)
+
+    names = list(senders)
+    waiters = {id(cms): ConsignmentWaiter(cms, max_interval=5) for cms, _ in senders.values()}
+    latencies = QueueLatencies()
+
+    def send(name, index):
+        cms, sender_id = senders[name]
+        receiver_id = senders[names[(names.index(name) + 1) % len(names)]][1]
+        created = cms.create_consignment({"item1": index + 1}, sender_id, receiver_id, "CREATED", 51.5074, -0.1278)
+        accepted_at = time.time()
+        future = waiters[id(cms)].submit(created["idControl"], has_transaction_hash, args.timeout)
+        future.add_done_callback(lambda f: latencies.record(name, accepted_at, f))
+        return future
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=min(32, len(names) * args.per_org)) as pool:
+        # Interleave organisations so no organisation's creates all land first
+        submitted = [pool.submit(send, name, i) for i in range(args.per_org) for name in names]
+        futures = []
+        for s in submitted:
+            try:
+                futures.append(s.result())
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Create failed: {e}")
+    logger.info(f"Created {len(futures)} consignments from {len(names)} organisations in {time.time() - started:.1f}s")
+
+    for future in futures:
+        try:
+            future.result()
+        except WaitTimeout as e:
+            logger.warning(str(e))
+    for waiter in waiters.values():
+        waiter.close()
+
+    report = {}
+    for name in names:
+        values = sorted(latencies.by_org.get(name, []))
+        report[name] = {
+            "count": len(values),
+            "timeouts": latencies.timeouts.get(name, 0),
+            "p50_s": percentile(values, 50),
+            "p95_s": percentile(values, 95),
+            "max_s": values[-1] if values else None
+        }
+        if values:
+            logger.info(f"{name}: queue latency p50={report[name]['p50_s']:.1f}s p95={report[name]['p95_s']:.1f}s "
+                        f"max={report[name]['max_s']:.1f}s, timeouts={report[name]['timeouts']}")
+            for line in format_histogram(values, bins=5):
+                logger.info(f"    {line}")
+    medians = [r["p50_s"] for r in report.values() if r["p50_s"] is not None]
+    if len(medians) > 1:
+        logger.info(f"Spread of per-org median queue latency: {max(medians) - min(medians):.1f}s "
+                    f"(serial dispatch makes later organisations wait for earlier ones)")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote report to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
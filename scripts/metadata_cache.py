@@ -0,0 +1,187 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+from collections import Counter
+
+import requests
+from dotenv import load_dotenv
+from cms_client import percentile
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TX_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Inspect the reader's on-disk transaction metadata cache (lob.blockchain_reader.metadata_cache.dir): "
+                    "one <dir>/<first two hex>/<tx hash>.json per transaction, holding txHash, label and the label's "
+                    "JSON metadata (null when the transaction has none). Without an action, prints cache statistics.")
+    parser.add_argument("--dir", default=os.environ.get("LOB_METADATA_CACHE_DIR", "metadata-cache"),
+                        help="Cache directory (default: LOB_METADATA_CACHE_DIR or metadata-cache)")
+    parser.add_argument("--tx-hash", default=None, help="Print the cached metadata of this transaction")
+    parser.add_argument("--export", default=None, help="Write every entry to this NDJSON file, one per line")
+    parser.add_argument("--evict", action="append", default=None, help="Remove this transaction's entry, repeatable")
+    parser.add_argument("--fetch", action="append", default=None,
+                        help="Fetch this transaction's metadata from the indexer into the cache if missing, repeatable")
+    parser.add_argument("--indexer-url", default=os.environ.get("FOLLOWER_APP_INDEXER_URL", "http://localhost:9090/yaci-api/"),
+                        help="yaci-store API used by --fetch (default: FOLLOWER_APP_INDEXER_URL or "
+                             "http://localhost:9090/yaci-api/)")
+    parser.add_argument("--label", type=int, default=1448, help="Metadata label of entries written by --fetch (default: 1448)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the statistics to as JSON")
+    return parser.parse_args()
+
+
+def entry_path(cache_dir, tx_hash):
+    if not TX_HASH.match(tx_hash):
+        raise ValueError(f"Not a transaction hash: {tx_hash}")
+    return os.path.join(cache_dir, tx_hash[:2], f"{tx_hash}.json")
+
+
+def read_entry(cache_dir, tx_hash):
+    """The cached entry of the transaction, or None when it is not cached."""
+    try:
+        with open(entry_path(cache_dir, tx_hash)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_entry(cache_dir, tx_hash, label, metadata):
+    """Writes an entry the way the app does, to a temporary file renamed into place."""
+    path = entry_path(cache_dir, tx_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=tx_hash, suffix=".tmp", dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as f:
+        json.dump({"txHash": tx_hash, "label": label, "metadata": metadata}, f)
+    os.replace(tmp, path)
+
+
+def iter_entries(cache_dir):
+    """(path, size in bytes, entry) of every cached transaction."""
+    for shard in sorted(os.listdir(cache_dir)):
+        shard_dir = os.path.join(cache_dir, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in sorted(os.listdir(shard_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(shard_dir, name)
+            try:
+                with open(path) as f:
+                    yield path, os.path.getsize(path), json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable entry {path}: {e}")
+
+
+def fetch_metadata(session, indexer_url, tx_hash, label):
+    response = session.get(f"{indexer_url.rstrip('/')}/txs/{tx_hash}/metadata", timeout=30)
+    response.raise_for_status()
+    return next((m.get("json_metadata") for m in response.json() if str(m.get("label")) == str(label)), None)
+
+
+def cache_stats(cache_dir):
+    sizes, consignments = [], []
+    types, versions, labels = Counter(), Counter(), Counter()
+    without_metadata = 0
+    for _, size, entry in iter_entries(cache_dir):
+        sizes.append(size)
+        labels[entry.get("label")] += 1
+        metadata = entry.get("metadata")
+        if metadata is None:
+            without_metadata += 1
+            continue
+        if "v" in metadata:
+            # Compact schema 2, see consignment_metadata.py
+            types[metadata.get("t")] += 1
+            versions[metadata.get("v")] += 1
+            items = metadata.get("d")
+        else:
+            types[metadata.get("type")] += 1
+            versions[(metadata.get("metadata") or {}).get("version")] += 1
+            items = metadata.get("data")
+        if isinstance(items, list):
+            consignments.append(len(items))
+    sizes.sort()
+    consignments.sort()
+    return {
+        "entries": len(sizes),
+        "bytes": sum(sizes),
+        "entry_bytes_p50": percentile(sizes, 50) or 0,
+        "entry_bytes_p95": percentile(sizes, 95) or 0,
+        "without_metadata": without_metadata,
+        "consignments": sum(consignments),
+        "consignments_per_tx_mean": sum(consignments) / len(consignments) if consignments else 0,
+        "consignments_per_tx_max": max(consignments, default=0),
+        "labels": {str(k): v for k, v in labels.items()},
+        "types": {str(k): v for k, v in types.items()},
+        "versions": {str(k): v for k, v in versions.items()},
+    }
+
+
+def main():
+    args = parse_arguments()
+    try:
+        if args.tx_hash:
+            entry = read_entry(args.dir, args.tx_hash)
+            if entry is None:
+                logger.error(f"Error: {args.tx_hash} is not cached in {args.dir}")
+                sys.exit(1)
+            print(json.dumps(entry, indent=2))
+            return
+        if args.evict:
+            for tx_hash in args.evict:
+                path = entry_path(args.dir, tx_hash)
+                if os.path.exists(path):
+                    os.remove(path)
+                    logger.info(f"Evicted {tx_hash}")
+                else:
+                    logger.info(f"{tx_hash} is not cached")
+            return
+        if args.fetch:
+            session = requests.Session()
+            for tx_hash in args.fetch:
+                if read_entry(args.dir, tx_hash) is not None:
+                    logger.info(f"{tx_hash} is already cached")
+                    continue
+                write_entry(args.dir, tx_hash, args.label, fetch_metadata(session, args.indexer_url, tx_hash, args.label))
+                logger.info(f"Cached {tx_hash}")
+            return
+        if not os.path.isdir(args.dir):
+            logger.error(f"Error: no cache directory at {args.dir}")
+            sys.exit(1)
+        if args.export:
+            exported = 0
+            with open(args.export, "w") as f:
+                for _, _, entry in iter_entries(args.dir):
+                    f.write(json.dumps(entry) + "\n")
+                    exported += 1
+            logger.info(f"Exported {exported} entries to {args.export}")
+            return
+        stats = cache_stats(args.dir)
+    except (OSError, ValueError, requests.exceptions.RequestException) as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+
+    logger.info(f"{stats['entries']} transactions cached in {stats['bytes'] / 1024:.1f} KiB (entry p50 "
+                f"{stats['entry_bytes_p50']} B, p95 {stats['entry_bytes_p95']} B), {stats['without_metadata']} without metadata")
+    logger.info(f"{stats['consignments']} consignments, {stats['consignments_per_tx_mean']:.1f} per transaction "
+                f"(max {stats['consignments_per_tx_max']}), types {stats['types']}, versions {stats['versions']}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(stats, f, indent=2)
+        logger.info(f"Wrote statistics to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import requests
+from dotenv import load_dotenv
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRAPE_PATH = "/actuator/prometheus"
+QUANTILES = (0.5, 0.95, 0.99)
+# Throughput, where a drop is the regression; every other compared stat regresses by growing
+HIGHER_IS_BETTER = {
+    "cms_publisher_transactions_total:per_min",
+    "cms_publisher_transaction_consignments:mean",
+    "cms_reader_consignments_ingested_total:per_min",
+    "cms_indexer_consignments_stored_total:per_min",
+}
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Snapshot the cms_* metrics of the app and the indexer from /actuator/prometheus: two scrapes "
+                    "--interval seconds apart give counters per minute and, for timers, the mean and percentiles of "
+                    "what was observed in between; gauges are read at the second scrape. With --compare, diff two "
+                    "snapshots and exit 1 on a regression beyond --threshold.")
+    parser.add_argument("--app-url", default=os.environ.get("CMS_BASE_URL_ORG1", "http://localhost:8088"),
+                        help="App base URL, with or without /api, empty to skip (default: CMS_BASE_URL_ORG1 or "
+                             "http://localhost:8088)")
+    parser.add_argument("--indexer-url", default=os.environ.get("INDEXER_BASE_URL", "http://localhost:9090"),
+                        help="Indexer base URL, empty to skip (default: INDEXER_BASE_URL or http://localhost:9090)")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between the two scrapes (default: 60)")
+    parser.add_argument("--prefix", default="cms_", help="Only metric families with this prefix (default: cms_)")
+    parser.add_argument("--out", default="metrics_snapshot.json", help="Snapshot file (default: metrics_snapshot.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), default=None,
+                        help="Compare two snapshot files instead of taking one")
+    parser.add_argument("--threshold", type=float, default=20,
+                        help="Percent change in the worse direction that counts as a regression (default: 20)")
+    parser.add_argument("--min-abs", type=float, default=0,
+                        help="Ignore changes smaller than this in absolute terms, e.g. noise on near zero timers (default: 0)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the comparison to as JSON")
+    return parser.parse_args()
+
+
+def parse_exposition(text, prefix):
+    """Prometheus text format into ({family: type}, {(name, labels): value}), labels a sorted tuple of pairs."""
+    types = {}
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, family, kind = line.split(None, 3)
+            types[family] = kind
+            continue
+        if not line or line.startswith("#") or not line.startswith(prefix):
+            continue
+        match = SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        labels = tuple(sorted((k, v.replace('\\"', '"')) for k, v in LABEL.findall(labels or "")))
+        samples[(name, labels)] = float(value)
+    return types, samples
+
+
+def scrape(session, base_url, prefix):
+    # CMS_BASE_URL_* point at the app's /api, the actuator sits at its root
+    base_url = base_url.strip('"').rstrip("/").removesuffix("/api")
+    response = session.get(base_url + SCRAPE_PATH, timeout=30)
+    if response.status_code == 404:
+        raise RuntimeError(f"{base_url}{SCRAPE_PATH} not found, is prometheus in WEB_EXPOSURE_INCLUDE?")
+    response.raise_for_status()
+    return parse_exposition(response.text, prefix)
+
+
+def series_key(name, labels):
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+def bucket_quantile(buckets, q):
+    """histogram_quantile over cumulative (le, count) buckets, interpolating linearly within a bucket."""
+    buckets = sorted(buckets)
+    total = buckets[-1][1] if buckets else 0
+    if total <= 0:
+        return None
+    rank = q * total
+    lower_le, lower_count = 0.0, 0.0
+    for le, count in buckets:
+        if count >= rank:
+            if math.isinf(le):
+                return lower_le
+            if count == lower_count:
+                return le
+            return lower_le + (le - lower_le) * (rank - lower_count) / (count - lower_count)
+        lower_le, lower_count = le, count
+    return lower_le
+
+
+def summarise(types, before, after, minutes):
+    """One flat {series:stat: value} dict from two scrapes of the same target."""
+    stats = {}
+    histograms = defaultdict(lambda: {"buckets": [], "count": None, "sum": None})
+    for (name, labels), value in after.items():
+        previous = before.get((name, labels), 0.0)
+        family = next((f for f in (name[:-len(s)] for s in ("_bucket", "_count", "_sum", "_max") if name.endswith(s))
+                       if types.get(f) in ("histogram", "summary")), None)
+        if family is not None:
+            le = dict(labels).get("le")
+            key = series_key(family, tuple(kv for kv in labels if kv[0] != "le"))
+            if name.endswith("_bucket") and le is not None:
+                histograms[key]["buckets"].append((float(le), value - previous))
+            elif name.endswith("_count"):
+                histograms[key]["count"] = value - previous
+            elif name.endswith("_sum"):
+                histograms[key]["sum"] = value - previous
+            continue
+        if types.get(name) == "gauge":
+            if not math.isnan(value):
+                stats[series_key(name, labels) + ":value"] = value
+        elif types.get(name) == "counter" or name.endswith("_total"):
+            stats[series_key(name, labels) + ":per_min"] = (value - previous) / minutes
+    for key, h in histograms.items():
+        if not h["count"]:
+            continue
+        stats[key + ":count_per_min"] = h["count"] / minutes
+        stats[key + ":mean"] = h["sum"] / h["count"]
+        for q in QUANTILES:
+            value = bucket_quantile(h["buckets"], q)
+            if value is not None:
+                stats[f"{key}:p{int(q * 100)}"] = value
+    return stats
+
+
+def take_snapshot(args):
+    session = requests.Session()
+    targets = {name: url for name, url in (("app", args.app_url), ("indexer", args.indexer_url)) if url}
+    if not targets:
+        raise RuntimeError("Nothing to scrape, give --app-url and/or --indexer-url")
+    first = {name: scrape(session, url, args.prefix) for name, url in targets.items()}
+    logger.info(f"Scraped {', '.join(targets)}, scraping again in {args.interval:.0f}s")
+    started = time.perf_counter()
+    time.sleep(args.interval)
+    second = {name: scrape(session, url, args.prefix) for name, url in targets.items()}
+    minutes = (time.perf_counter() - started) / 60
+    snapshot = {"taken_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "interval_s": minutes * 60, "targets": {}}
+    for name in targets:
+        types, after = second[name]
+        snapshot["targets"][name] = summarise(types, first[name][1], after, minutes)
+    return snapshot
+
+
+def regression(key, baseline, candidate, threshold, min_abs):
+    """The percent change in the worse direction when it exceeds the threshold, else None."""
+    if key.endswith(":count_per_min"):
+        # How often a timer ran follows the load offered, not how well it was served
+        return None
+    series, stat = key.rsplit(":", 1)
+    delta = candidate - baseline
+    if f"{series.split('{')[0]}:{stat}" in HIGHER_IS_BETTER:
+        delta = -delta
+    if delta <= min_abs:
+        return None
+    change = math.inf if baseline == 0 else delta / abs(baseline) * 100
+    return change if change > threshold else None
+
+
+def compare(args):
+    with open(args.compare[0]) as f:
+        baseline = json.load(f)
+    with open(args.compare[1]) as f:
+        candidate = json.load(f)
+    rows = []
+    for target in sorted(set(baseline["targets"]) & set(candidate["targets"])):
+        before, after = baseline["targets"][target], candidate["targets"][target]
+        for key in sorted(set(before) & set(after)):
+            change = regression(key, before[key], after[key], args.threshold, args.min_abs)
+            rows.append({"target": target, "stat": key, "baseline": before[key], "candidate": after[key],
+                         "regression_pct": change})
+            if change is not None:
+                logger.warning(f"REGRESSION {target} {key}: {before[key]:.4g} -> {after[key]:.4g} "
+                               f"({'from zero' if math.isinf(change) else f'{change:.0f}% worse'})")
+        for key in sorted(set(before) ^ set(after)):
+            logger.info(f"{target} {key}: only in the {'baseline' if key in before else 'candidate'}")
+    return rows
+
+
+def main():
+    args = parse_arguments()
+    if args.compare:
+        try:
+            rows = compare(args)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error: cannot read snapshots: {e}")
+            sys.exit(1)
+        regressions = [r for r in rows if r["regression_pct"] is not None]
+        logger.info(f"Compared {len(rows)} stats, {len(regressions)} regressed beyond {args.threshold:.0f}%")
+        if args.json_out:
+            with open(args.json_out, "w") as f:
+                # inf is not JSON
+                json.dump([{**r, "regression_pct": None if r["regression_pct"] is None or math.isinf(r["regression_pct"])
+                            else r["regression_pct"], "regressed": r["regression_pct"] is not None} for r in rows],
+                          f, indent=2)
+            logger.info(f"Wrote comparison to {args.json_out}")
+        if regressions:
+            sys.exit(1)
+        return
+
+    try:
+        snapshot = take_snapshot(args)
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        logger.error(f"Snapshot failed: {e}")
+        sys.exit(1)
+    with open(args.out, "w") as f:
+        json.dump(snapshot, f, indent=2, sort_keys=True)
+    for target, stats in snapshot["targets"].items():
+        logger.info(f"{target}: {len(stats)} stats")
+        for key in sorted(stats):
+            print(f"{target:8} {key:100} {stats[key]:.6g}")
+    logger.info(f"Wrote snapshot to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
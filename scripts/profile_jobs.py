@@ -0,0 +1,217 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from html import escape
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org, percentile
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# A sample goes to the category of its leaf-most frame in one of these packages, so a socket read under the
+# Postgres driver counts as JDBC and Jackson decoding an HTTP response as serialisation
+CATEGORIES = [
+    ("JDBC", ("org.postgresql.", "com.zaxxer.hikari.", "org.springframework.jdbc.")),
+    ("JPA", ("org.hibernate.", "jakarta.persistence.", "org.springframework.orm.", "org.springframework.data.")),
+    ("Javers", ("org.javers.",)),
+    ("serialisation", ("com.fasterxml.jackson.", "co.nstant.in.cbor.", "com.bloxbean.cardano.client.metadata.",
+                       "com.bloxbean.cardano.client.transaction.spec.", "com.bloxbean.cardano.client.util.JsonUtil")),
+    ("HTTP", ("org.springframework.web.client.", "org.springframework.http.client.", "java.net.http.",
+              "jdk.internal.net.http.", "sun.net.www.", "org.apache.hc.", "okhttp3.", "retrofit2.")),
+]
+# Only when no category above matches, e.g. the reader cycle waiting on its metadata fetch pool
+WAITING = ("java.util.concurrent.", "jdk.internal.misc.Unsafe.park", "java.lang.Thread.sleep", "java.lang.Object.wait")
+APP = "tech.edgx."
+COLOURS = {"JDBC": "#4e79a7", "JPA": "#76b7b2", "Javers": "#b07aa1", "serialisation": "#59a14f", "HTTP": "#f28e2b",
+           "waiting": "#bab0ac", "app": "#e15759", "other": "#edc948"}
+FRAME_HEIGHT = 16
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Fetch the job profiler dump of an app running with LOB_PROFILING_ENABLED=true and summarise it: "
+                    "wall and CPU time per job, where the sampled time of slow cycles went (JDBC, JPA, Javers, "
+                    "serialisation, HTTP, waiting, app code), the top frames, and optionally a flame graph.")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env whose CMS to profile (default: ORG1)")
+    parser.add_argument("--dump-file", default=None, help="Summarise a dump saved with --save instead of fetching one")
+    parser.add_argument("--save", default=None, help="Write the fetched dump to this file")
+    parser.add_argument("--clear", action="store_true", help="Clear the app's dump after fetching it")
+    parser.add_argument("--job", action="append", default=None,
+                        help="Only captures of this job, repeatable, e.g. reader.cycle or dispatcher.organisation")
+    parser.add_argument("--top", type=int, default=20, help="Hot frames to list (default: 20)")
+    parser.add_argument("--svg", default=None, help="Write a flame graph of the captured samples to this SVG file")
+    parser.add_argument("--folded", default=None,
+                        help="Write the captured samples as folded stacks, for flamegraph.pl or speedscope")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the summary to as JSON")
+    return parser.parse_args()
+
+
+def category(frames):
+    for frame in reversed(frames):
+        for name, prefixes in CATEGORIES:
+            if frame.startswith(prefixes):
+                return name
+    if any(frame.startswith(WAITING) for frame in frames):
+        return "waiting"
+    return "app" if any(frame.startswith(APP) for frame in frames) else "other"
+
+
+def frame_category(frame):
+    for name, prefixes in CATEGORIES:
+        if frame.startswith(prefixes):
+            return name
+    if frame.startswith(WAITING):
+        return "waiting"
+    return "app" if frame.startswith(APP) else "other"
+
+
+def merge_samples(captures):
+    folded = Counter()
+    for capture in captures:
+        folded.update(capture["samples"])
+    return folded
+
+
+def job_summary(jobs):
+    rows = []
+    for job in jobs:
+        wall = sorted(job["recentWallMs"])
+        spans = job["spans"] or 1
+        rows.append({"job": job["job"], "spans": job["spans"], "slow_spans": job["slowSpans"],
+                     "wall_mean_ms": job["wallMsTotal"] / spans, "wall_p95_ms": percentile(wall, 95) or 0,
+                     "wall_max_ms": job["wallMsMax"], "cpu_mean_ms": job["cpuMsTotal"] / spans,
+                     "cpu_share": job["cpuMsTotal"] / job["wallMsTotal"] if job["wallMsTotal"] else 0})
+    return rows
+
+
+def hot_frames(folded, top):
+    self_counts, total_counts = Counter(), Counter()
+    for stack, count in folded.items():
+        frames = stack.split(";")[1:]
+        self_counts[frames[-1]] += count
+        # Recursion would count a frame once per level otherwise
+        for frame in set(frames):
+            total_counts[frame] += count
+    return self_counts.most_common(top), total_counts.most_common(top)
+
+
+def flame_graph_svg(folded, title, width=1200):
+    root = {"name": "all", "count": 0, "children": {}}
+    for stack, count in folded.items():
+        root["count"] += count
+        node = root
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"name": frame, "count": 0, "children": {}})
+            node["count"] += count
+
+    def depth(node):
+        return 1 + max((depth(child) for child in node["children"].values()), default=0)
+
+    levels = depth(root)
+    height = (levels + 2) * FRAME_HEIGHT
+    scale = width / max(root["count"], 1)
+    rects = []
+
+    # Root at the bottom, callees stacked above their callers
+    def draw(node, x, level):
+        w = node["count"] * scale
+        if w < 0.3:
+            return
+        y = height - (level + 1) * FRAME_HEIGHT
+        label = node["name"].rsplit(".", 2)[-2:] if "." in node["name"] else [node["name"]]
+        text = ".".join(label)
+        chars = int(w / 7)
+        text = text if len(text) <= chars else (text[:chars - 2] + ".." if chars > 3 else "")
+        pct = 100 * node["count"] / max(root["count"], 1)
+        rects.append(f'<g><title>{escape(node["name"])} ({node["count"]} samples, {pct:.1f}%)</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{FRAME_HEIGHT - 1}" '
+                     f'fill="{COLOURS[frame_category(node["name"])]}" rx="2"/>'
+                     f'<text x="{x + 3:.1f}" y="{y + FRAME_HEIGHT - 4}">{escape(text)}</text></g>')
+        for child in sorted(node["children"].values(), key=lambda c: c["name"]):
+            draw(child, x, level + 1)
+            x += child["count"] * scale
+
+    draw(root, 0.0, 0)
+    legend = " ".join(f'<tspan fill="{colour}">&#9632; {name}</tspan>' for name, colour in COLOURS.items())
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="4" y="12" font-size="12">{escape(title)} {legend}</text>{"".join(rects)}</svg>\n')
+
+
+def main():
+    args = parse_arguments()
+    try:
+        if args.dump_file:
+            with open(args.dump_file) as f:
+                dump = json.load(f)
+        else:
+            logging.getLogger("cms_client").setLevel(logging.WARNING)
+            cms = client_for_org(args.org)
+            dump = cms.get_profiling_dump()
+            if args.clear:
+                cms.clear_profiling_dump()
+    except (requests.exceptions.RequestException, ValueError, OSError) as e:
+        logger.error(f"Error: cannot read the profiling dump: {e}")
+        sys.exit(1)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(dump, f, indent=2)
+        logger.info(f"Wrote dump to {args.save}")
+
+    jobs = job_summary(dump["jobs"])
+    for row in jobs:
+        print(f"{row['job']:26} spans {row['spans']:6}  slow {row['slow_spans']:4}  wall mean {row['wall_mean_ms']:9.1f} ms"
+              f"  p95 {row['wall_p95_ms']:9.1f} ms  max {row['wall_max_ms']:9.1f} ms  cpu mean {row['cpu_mean_ms']:9.1f} ms"
+              f"  ({100 * row['cpu_share']:.0f}% on CPU)")
+
+    captures = [c for c in dump["captures"] if not args.job or c["job"] in args.job]
+    folded = merge_samples(captures)
+    total = sum(folded.values())
+    summary = {"jobs": jobs, "captures": len(captures), "samples": total}
+    if not total:
+        logger.info(f"No stack samples in {len(captures)} slow captures, cycles slower than "
+                    f"{dump['slowThresholdMs']} ms are sampled")
+    else:
+        by_category = Counter()
+        for stack, count in folded.items():
+            by_category[category(stack.split(";")[1:])] += count
+        print(f"\nWhere the {total} samples of {len(captures)} slow cycles went:")
+        for name, count in by_category.most_common():
+            print(f"  {name:14} {100 * count / total:5.1f}%")
+        self_frames, total_frames = hot_frames(folded, args.top)
+        print(f"\nTop {args.top} frames by self samples:")
+        for frame, count in self_frames:
+            print(f"  {100 * count / total:5.1f}%  {frame}")
+        print(f"\nTop {args.top} frames by total samples:")
+        for frame, count in total_frames:
+            print(f"  {100 * count / total:5.1f}%  {frame}")
+        summary.update(categories={k: v / total for k, v in by_category.items()},
+                       self_frames=self_frames, total_frames=total_frames)
+
+    if args.folded:
+        with open(args.folded, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(folded.items()))
+        logger.info(f"Wrote {len(folded)} folded stacks to {args.folded}")
+    if args.svg:
+        title = f"{', '.join(args.job) if args.job else 'all jobs'}: {total} samples, {len(captures)} slow cycles"
+        with open(args.svg, "w") as f:
+            f.write(flame_graph_svg(folded, title))
+        logger.info(f"Wrote flame graph to {args.svg}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Wrote summary to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pc = ds = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Query consignment history archived by scripts/archive_partitions.py. Filters are pushed down to "
+                    "the Parquet row groups, so a lookup reads only the months and row groups that can match. "
+                    "Needs pyarrow (pip install pyarrow).")
+    parser.add_argument("--out-dir", default="archive", help="Archive root given to archive_partitions.py (default: archive)")
+    parser.add_argument("--table", default="blockchain_publisher_consignment",
+                        help="Archived table (default: blockchain_publisher_consignment)")
+    parser.add_argument("--consignment-id", default=None, help="Only this consignment version")
+    parser.add_argument("--id-control", default=None, help="Only versions of this consignment")
+    parser.add_argument("--sender-id", default=None, help="Only consignments sent by this organisation")
+    parser.add_argument("--tx-hash", default=None, help="Only consignments of this L1 transaction")
+    parser.add_argument("--from", dest="created_from", default=None, help="created_at on or after, ISO date or date-time")
+    parser.add_argument("--to", dest="created_to", default=None, help="created_at before, ISO date or date-time")
+    parser.add_argument("--columns", default=None, help="Comma separated columns to output (default: all)")
+    parser.add_argument("--limit", type=int, default=100, help="Rows to output, 0 for all (default: 100)")
+    parser.add_argument("--count", action="store_true", help="Only print the number of matching rows")
+    return parser.parse_args()
+
+
+def build_filter(args, schema):
+    equals = {
+        "consignment_id": args.consignment_id,
+        "id_control": args.id_control,
+        "sender_id": args.sender_id,
+        "l1_transaction_hash": args.tx_hash,
+    }
+    conditions = []
+    for column, value in equals.items():
+        if value is None:
+            continue
+        if column not in schema.names:
+            logger.error(f"Error: {args.table} archives have no {column} column")
+            sys.exit(1)
+        conditions.append(pc.field(column) == value)
+    if args.created_from:
+        conditions.append(pc.field("created_at") >= datetime.fromisoformat(args.created_from))
+    if args.created_to:
+        conditions.append(pc.field("created_at") < datetime.fromisoformat(args.created_to))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def main():
+    args = parse_arguments()
+    if ds is None:
+        logger.error("Error: pyarrow is required, pip install pyarrow")
+        sys.exit(1)
+    path = os.path.join(args.out_dir, args.table)
+    if not os.path.isdir(path):
+        logger.error(f"Error: no archive at {path}")
+        sys.exit(1)
+
+    dataset = ds.dataset(path, format="parquet")
+    expression = build_filter(args, dataset.schema)
+    if args.count:
+        print(dataset.count_rows(filter=expression))
+        return
+
+    columns = args.columns.split(",") if args.columns else None
+    scanner = dataset.scanner(columns=columns, filter=expression)
+    table = scanner.head(args.limit) if args.limit else scanner.to_table()
+    for row in table.to_pylist():
+        print(json.dumps(row, default=str))
+    logger.info(f"{table.num_rows} rows from {len(dataset.files)} archived months")
+
+
+if __name__ == "__main__":
+    main()
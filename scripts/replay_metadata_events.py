@@ -0,0 +1,192 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from itertools import groupby, islice
+
+import requests
+from dotenv import load_dotenv
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REPLAY_PATH = "/api/v1/replay/metadata-events"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure indexer sync throughput by replaying recorded TxMetadataEvents (one per block) through "
+                    "its consignment processor. Events are JSON lines {slot, blockNumber, entries: [{txHash, label, "
+                    "cbor}]}, recorded from a yaci store database or generated. The indexer must run with "
+                    "LOB_REPLAY_ENABLED=true.")
+    parser.add_argument("--events", default="metadata_events.jsonl", help="Events file (default: metadata_events.jsonl)")
+    parser.add_argument("--record-dsn", default=None,
+                        help="Record the events file from the transaction_metadata table of this yaci store database "
+                             "(libpq connection string, needs pip install psycopg2-binary)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate an events file of this many blocks instead")
+    parser.add_argument("--txs-per-block", type=int, default=5, help="Consignment txs per synthetic block (default: 5)")
+    parser.add_argument("--consignments-per-tx", type=int, default=50,
+                        help="Consignments per synthetic tx (default: 50)")
+    parser.add_argument("--label", default="1448", help="Metadata label (default: 1448)")
+    parser.add_argument("--indexer-url", default=os.environ.get("INDEXER_BASE_URL", "http://localhost:9090"),
+                        help="Indexer base URL (default: INDEXER_BASE_URL or http://localhost:9090)")
+    parser.add_argument("--events-per-request", type=int, default=100, help="Events per replay request (default: 100)")
+    parser.add_argument("--passes", type=int, default=2,
+                        help="Replays of the file; passes after the first measure the already-stored path (default: 2)")
+    parser.add_argument("--record-only", action="store_true", help="Only write the events file")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the results to as JSON")
+    return parser.parse_args()
+
+
+def cbor(value):
+    """Minimal CBOR encoder for transaction metadata: unsigned ints, text, lists and maps."""
+    def head(major, n):
+        if n < 24:
+            return bytes([major << 5 | n])
+        for info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+            if n < 1 << (8 * size):
+                return bytes([major << 5 | info]) + n.to_bytes(size, "big")
+        raise ValueError(f"{n} does not fit CBOR")
+    if isinstance(value, int):
+        return head(0, value)
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return head(3, len(data)) + data
+    if isinstance(value, list):
+        return head(4, len(value)) + b"".join(cbor(v) for v in value)
+    if isinstance(value, dict):
+        return head(5, len(value)) + b"".join(cbor(k) + cbor(v) for k, v in value.items())
+    raise TypeError(f"Cannot encode {type(value)}")
+
+
+def synthetic_events(blocks, txs_per_block, consignments_per_tx, label):
+    org_id = hashlib.sha256(b"replay-org").hexdigest()
+    slot = 70_000_000
+    for block in range(blocks):
+        slot += 20
+        entries = []
+        for tx in range(txs_per_block):
+            ids = [hashlib.sha256(f"{block}:{tx}:{i}".encode()).hexdigest() for i in range(consignments_per_tx)]
+            metadata = {int(label): {"org": {"id": org_id}, "type": "CONSIGNMENTS", "data": [{"id": i} for i in ids]}}
+            entries.append({"txHash": hashlib.sha256(f"tx:{block}:{tx}".encode()).hexdigest(),
+                            "label": label, "cbor": cbor(metadata).hex()})
+        yield {"slot": slot, "blockNumber": block, "entries": entries}
+
+
+def hex_cbor(body):
+    # The store keeps metadata cbor as hex text, or bytea depending on its version
+    return bytes(body).hex() if isinstance(body, (bytes, memoryview)) else body
+
+
+def recorded_events(dsn, label):
+    """Consignment metadata from yaci store, grouped per block as the store emits it."""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor(name="replay_metadata") as cur:
+            cur.itersize = 10_000
+            cur.execute("""
+                SELECT slot, tx_hash, label, cbor FROM transaction_metadata
+                WHERE label = %s ORDER BY slot, tx_hash
+            """, (label,))
+            for slot, rows in groupby(cur, key=lambda row: row[0]):
+                yield {"slot": slot, "entries": [{"txHash": tx_hash, "label": row_label, "cbor": hex_cbor(body)}
+                                                 for _, tx_hash, row_label, body in rows]}
+    finally:
+        conn.close()
+
+
+def write_events(path, events):
+    count = 0
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+            count += 1
+    return count
+
+
+def read_batches(path, size):
+    with open(path) as f:
+        lines = (json.loads(line) for line in f if line.strip())
+        while True:
+            batch = list(islice(lines, size))
+            if not batch:
+                return
+            yield batch
+
+
+def replay(session, url, path, events_per_request):
+    totals = {"events": 0, "transactions": 0, "stored": 0, "server_ms": 0}
+    started = time.perf_counter()
+    for batch in read_batches(path, events_per_request):
+        response = session.post(url, json=batch, timeout=600)
+        if response.status_code == 404:
+            raise RuntimeError(f"{url} not found, is the indexer running with LOB_REPLAY_ENABLED=true?")
+        response.raise_for_status()
+        result = response.json()
+        totals["events"] += result["events"]
+        totals["transactions"] += result["transactions"]
+        totals["stored"] += result["stored"]
+        totals["server_ms"] += result["elapsedMs"]
+    totals["wall_ms"] = (time.perf_counter() - started) * 1000
+    seconds = totals["server_ms"] / 1000 or 1e-9
+    totals["events_per_s"] = totals["events"] / seconds
+    totals["transactions_per_s"] = totals["transactions"] / seconds
+    totals["stored_per_s"] = totals["stored"] / seconds
+    return totals
+
+
+def main():
+    args = parse_arguments()
+    if args.record_dsn:
+        if psycopg2 is None:
+            logger.error("Error: recording needs psycopg2, pip install psycopg2-binary")
+            sys.exit(1)
+        count = write_events(args.events, recorded_events(args.record_dsn, args.label))
+        logger.info(f"Recorded {count} metadata events to {args.events}")
+    elif args.synthetic:
+        count = write_events(args.events, synthetic_events(args.synthetic, args.txs_per_block,
+                                                           args.consignments_per_tx, args.label))
+        logger.info(f"Generated {count} metadata events "
+                    f"({count * args.txs_per_block * args.consignments_per_tx} consignments) to {args.events}")
+    if args.record_only:
+        return
+    if not os.path.exists(args.events):
+        logger.error(f"Error: no events file {args.events}, record one with --record-dsn or --synthetic")
+        sys.exit(1)
+
+    session = requests.Session()
+    url = args.indexer_url.rstrip("/") + REPLAY_PATH
+    results = []
+    try:
+        for n in range(1, args.passes + 1):
+            totals = replay(session, url, args.events, args.events_per_request)
+            results.append(totals)
+            logger.info(f"Pass {n}: {totals['events']} events, {totals['transactions']} txs, {totals['stored']} "
+                        f"consignments stored in {totals['server_ms']} ms server time "
+                        f"({totals['wall_ms']:.0f} ms wall): {totals['events_per_s']:.0f} events/s, "
+                        f"{totals['transactions_per_s']:.0f} txs/s, {totals['stored_per_s']:.0f} stored/s")
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        logger.error(f"Replay failed: {e}")
+        sys.exit(1)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"events_file": args.events, "passes": results}, f, indent=2)
+        logger.info(f"Wrote results to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
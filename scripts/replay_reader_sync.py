@@ -0,0 +1,132 @@
+import argparse
+import json
+import logging
+import sys
+import time
+
+from indexer_standin import IndexerStandIn, SyntheticChain
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Replay a growing synthetic chain through a local indexer stand-in and check that the app's "
+                    "reader cost per cycle (rows fetched, metadata lookups) stays constant as history grows. Start "
+                    "the app with FOLLOWER_APP_BASE_URL/FOLLOWER_APP_INDEXER_URL pointing at the stand-in; a short "
+                    "lob.blockchain_reader.rate.ms (e.g. 5000) keeps the run short.")
+    parser.add_argument("--host", default="127.0.0.1", help="Stand-in bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9096, help="Stand-in port (default: 9096)")
+    parser.add_argument("--history", type=int, default=2000,
+                        help="Consignments on chain before the first cycle (default: 2000)")
+    parser.add_argument("--cycles", type=int, default=10, help="Reader cycles to replay (default: 10)")
+    parser.add_argument("--per-cycle", type=int, default=200,
+                        help="Consignments added to the chain before each cycle (default: 200)")
+    parser.add_argument("--per-tx", type=int, default=50, help="Consignments per transaction (default: 50)")
+    parser.add_argument("--rollback-at", type=int, default=None,
+                        help="Before this cycle, roll back the last --rollback-txs transactions (default: no rollback)")
+    parser.add_argument("--rollback-txs", type=int, default=2,
+                        help="Transactions dropped by the rollback (default: 2)")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Largest allowed ratio of a cycle's rows fetched to the rows added (default: 1.5)")
+    parser.add_argument("--cycle-timeout", type=float, default=180,
+                        help="Seconds to wait for the reader's next poll (default: 180)")
+    parser.add_argument("--json-out", default=None, help="Optional file to write per-cycle costs to as JSON")
+    return parser.parse_args()
+
+
+def wait_for_page(standin, seen, timeout):
+    """Blocks until the reader has fetched a page past the first `seen`, returns all pages so far."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        pages = standin.pages()
+        if len(pages) > seen:
+            return pages
+        time.sleep(0.2)
+    logger.error(f"The reader did not poll within {timeout}s, check FOLLOWER_APP_BASE_URL and the reader rate")
+    sys.exit(1)
+
+
+def catch_up(standin, seen, timeout):
+    """Waits until the reader fetched a page short of its limit past the first `seen` pages, i.e. it is up to
+    date with the chain, then for one page more so the metadata lookups of the last page are complete."""
+    pages = wait_for_page(standin, seen, timeout)
+    while pages[-1]["rows"] >= pages[-1]["limit"]:
+        pages = wait_for_page(standin, len(pages), timeout)
+    return wait_for_page(standin, len(pages), timeout)
+
+
+def main():
+    args = parse_arguments()
+    chain = SyntheticChain().seed(args.history, args.per_tx)
+    standin = IndexerStandIn(chain, args.host, args.port).start()
+    cycles = []
+    pages, rollback_slot, rollback_page = [], None, 0
+    try:
+        seen = len(catch_up(standin, 0, args.cycle_timeout)) - 1
+        logger.info(f"Reader caught up with {chain.consignment_count} consignments of history after {seen} pages")
+        for cycle in range(1, args.cycles + 1):
+            rolled_back = None
+            with standin.lock:
+                if cycle == args.rollback_at:
+                    rollback_slot = chain.txs[-args.rollback_txs - 1]["slot"]
+                    rolled_back = len(chain.rollback(rollback_slot))
+                chain.seed(args.per_cycle, args.per_tx)
+                seeded = len(standin.requests)
+            if rolled_back:
+                rollback_page = seeded
+                logger.info(f"Rolled back {rolled_back} txs to slot {rollback_slot}")
+            pages = catch_up(standin, seeded, args.cycle_timeout)
+            # The last page was fetched with nothing new to read, it opens the next cycle
+            cycle_pages = pages[seen:-1]
+            seen = len(pages) - 1
+            cycles.append({
+                "cycle": cycle,
+                "added": args.per_cycle,
+                "rolled_back_txs": rolled_back,
+                "pages": len(cycle_pages),
+                "rows": sum(p["rows"] for p in cycle_pages),
+                "metadata_requests": sum(p["metadata_requests"] for p in cycle_pages),
+                "from": cycle_pages[0]["after"] if cycle_pages else None
+            })
+            c = cycles[-1]
+            logger.info(f"Cycle {cycle}: {c['pages']} pages, {c['rows']} rows, {c['metadata_requests']} metadata lookups"
+                        f"{', after rollback' if rolled_back else ''}")
+        stats = standin.snapshot()
+    finally:
+        standin.stop()
+
+    steady = [c for c in cycles if not c["rolled_back_txs"] and c["pages"]]
+    failures = []
+    for c in steady:
+        if c["rows"] > c["added"] * args.tolerance:
+            failures.append(f"cycle {c['cycle']} fetched {c['rows']} rows for {c['added']} new consignments")
+    if len(steady) >= 4:
+        half = len(steady) // 2
+        early = sum(c["rows"] for c in steady[:half]) / half
+        late = sum(c["rows"] for c in steady[half:]) / (len(steady) - half)
+        if early and late > early * args.tolerance:
+            failures.append(f"rows per cycle grew from {early:.0f} to {late:.0f} as history grew")
+    if args.rollback_at:
+        if stats["lookup_misses"] == 0:
+            failures.append("the rollback was never noticed, the reader did not look up its cursor consignment")
+        elif not any(p["after"] and p["after"][0] <= rollback_slot for p in pages[rollback_page:]):
+            failures.append(f"the reader did not rewind its cursor to slot {rollback_slot} or earlier")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"cycles": cycles, "failures": failures}, f, indent=2)
+        logger.info(f"Wrote per-cycle costs to {args.json_out}")
+    if failures:
+        for failure in failures:
+            logger.error(f"FAIL: {failure}")
+        sys.exit(1)
+    logger.info(f"PASS: {len(steady)} steady cycles, rows per cycle "
+                f"{min(c['rows'] for c in steady) if steady else 0}-{max(c['rows'] for c in steady) if steady else 0} "
+                f"for {args.per_cycle} new consignments each")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ import re
 import random
 import time
 import logging
+from cms_client import CmsClient, build_session
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -38,6 +39,11 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = "/app"
 SCRIPTS_DOT_ENV_FILE = os.path.join(SCRIPT_DIR, ".env")
 
+# Pooled keep-alive sessions, one for keycloak and one for the CMS app
+# Use Docker service name 'app' instead of localhost for in-container calls
+keycloak_session = build_session()
+cms = CmsClient(f"http://app:{CMS_APP_PORT}/api")
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Keycloak and application setup script")
     parser.add_argument(
@@ -49,15 +55,11 @@ def parse_arguments():
 
 def check_app_health(max_attempts=30, delay=5):
     """Check if CMS app is healthy by calling the /api/hello endpoint"""
-    # Use Docker service name 'app' instead of localhost for in-container health check
-    health_url = f"http://app:{CMS_APP_PORT}/api/hello"
-    logger.info(f"Trying: {health_url}")
-    headers = {"Content-Type": "application/json"}
+    logger.info(f"Trying: {cms.base_url}/hello")
 
     for attempt in range(max_attempts):
         try:
-            response = requests.get(health_url, headers=headers, timeout=5)
-            if response.status_code == 200 and "Hello" in response.text:
+            if cms.check_health():
                 logger.info("CMS app is healthy")
                 return True
             logger.info(f"Health check attempt {attempt + 1}/{max_attempts}: App not ready yet")
@@ -87,7 +89,7 @@ def get_admin_token():
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     try:
-        response = requests.post(url, data=payload, headers=headers)
+        response = keycloak_session.post(url, data=payload, headers=headers)
         response.raise_for_status()
         return response.json()["access_token"]
     except requests.exceptions.HTTPError as e:
@@ -108,7 +110,7 @@ def create_realm(admin_token):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = keycloak_session.post(url, json=payload, headers=headers)
         if response.status_code == 201:
             logger.info(f"Created realm: {REALM_NAME}")
         elif response.status_code == 409:
@@ -127,7 +129,7 @@ def delete_client(admin_token, client_id):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.delete(url, headers=headers)
+        response = keycloak_session.delete(url, headers=headers)
         if response.status_code == 204:
             logger.info(f"Deleted existing client: {CLIENT_ID}")
         elif response.status_code == 404:
@@ -151,7 +153,7 @@ def create_client(admin_token):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.get(secret_url, headers=headers)
+        response = keycloak_session.get(secret_url, headers=headers)
         response.raise_for_status()
         client_secret = response.json()["value"]
         logger.info(f"Retrieved client secret: {client_secret[:8]}...")
@@ -213,7 +215,7 @@ def create_new_client(admin_token):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = keycloak_session.post(url, json=payload, headers=headers)
         if response.status_code == 201:
             logger.info(f"Created client: {CLIENT_ID}")
         else:
@@ -243,7 +245,7 @@ def update_client(admin_token, client_id):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.put(url, json=payload, headers=headers)
+        response = keycloak_session.put(url, json=payload, headers=headers)
         response.raise_for_status()
         logger.info(f"Updated client {CLIENT_ID}")
     except requests.exceptions.RequestException as e:
@@ -257,7 +259,7 @@ def get_client_id(admin_token):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.get(url, headers=headers)
+        response = keycloak_session.get(url, headers=headers)
         response.raise_for_status()
         clients = response.json()
         if clients:
@@ -274,7 +276,7 @@ def assign_organisation_to_service_account(admin_token, client_id, organisation_
         "Content-Type": "application/json"
     }
     try:
-        response = requests.get(url, headers=headers)
+        response = keycloak_session.get(url, headers=headers)
         response.raise_for_status()
         service_account_user = response.json()
         user_id = service_account_user["id"]
@@ -284,7 +286,7 @@ def assign_organisation_to_service_account(admin_token, client_id, organisation_
                 "organisations": [organisation_id]
             }
         }
-        response = requests.put(url, json=payload, headers=headers)
+        response = keycloak_session.put(url, json=payload, headers=headers)
         response.raise_for_status()
         logger.info(f"Assigned organisation {organisation_id} to service account for client {CLIENT_ID}")
     except requests.exceptions.HTTPError as e:
@@ -304,7 +306,7 @@ def get_access_token(client_secret):
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     try:
-        response = requests.post(url, data=payload, headers=headers)
+        response = keycloak_session.post(url, data=payload, headers=headers)
         response.raise_for_status()
         token = response.json()["access_token"]
         decoded = jwt.decode(token, options={"verify_signature": False})
@@ -327,11 +329,10 @@ def get_access_token(client_secret):
         sys.exit(1)
 
 def create_organisation(name, currency_id, tax_id_number, organisation_id=None, cms_auth_token=None):
-    url = f"http://app:{CMS_APP_PORT}/api/organisations"
-    headers = {"Content-Type": "application/json"}
+    # Scoped to this call, the shared client stays unauthenticated; it reuses the shared pool
+    org_cms = CmsClient(cms.base_url, cms_auth_token, session=cms.session) if cms_auth_token else cms
     if cms_auth_token:
-        headers["Authorization"] = f"Bearer {cms_auth_token}"
-        logger.debug(f"Setting Authorization header: Bearer {cms_auth_token[:10]}...")
+        logger.debug(f"Using Authorization header: Bearer {cms_auth_token[:10]}...")
     cities = list(CITY_COORDINATES.keys())
     city = random.choice(cities)
     payload = {
@@ -356,19 +357,14 @@ def create_organisation(name, currency_id, tax_id_number, organisation_id=None,
     }
     try:
         if organisation_id:
-            check_url = f"http://app:{CMS_APP_PORT}/api/organisations/{organisation_id}"
-            check_response = requests.get(check_url, headers=headers)
-            logger.info(f"GET response status: {check_response.status_code}, body: {check_response.text}")
-            if check_response.status_code == 200:
+            existing = org_cms.find_organisation(organisation_id)
+            if existing:
                 logger.info(f"Organisation {organisation_id} already exists, skipping creation")
-                return check_response.json()
-            elif check_response.status_code in (401, 404):
-                logger.info(f"Organisation {organisation_id} not found or unauthorized, attempting creation")
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        logger.info(f"POST response status: {response.status_code}, body: {response.text}")
-        response.raise_for_status()
-        logger.info(f"Created organisation: {name} (ID: {organisation_id or 'auto-generated'}), Response: {response.json()}")
-        return response.json()
+                return existing
+            logger.info(f"Organisation {organisation_id} not found or unauthorized, attempting creation")
+        created = org_cms.create_organisation(payload)
+        logger.info(f"Created organisation: {name} (ID: {organisation_id or 'auto-generated'}), Response: {created}")
+        return created
     except requests.exceptions.HTTPError as e:
         logger.error(f"Failed to process organisation {name} (ID: {organisation_id or 'N/A'}): {e.response.text}")
         sys.exit(1)
@@ -0,0 +1,112 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+from cms_waiter import iter_sse_events
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/api/v1/consignments/stream"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Tail the indexer's consignment change feed: one line per transaction of newly stored "
+                    "consignments and per rollback. Reconnects after errors and resumes after the last event seen, "
+                    "so nothing is missed or repeated.")
+    parser.add_argument("--indexer-url", default=os.environ.get("INDEXER_BASE_URL", "http://localhost:9090"),
+                        help="Indexer base URL (default: INDEXER_BASE_URL or http://localhost:9090)")
+    parser.add_argument("--after-slot", type=int, default=None,
+                        help="Start with the consignments stored after this slot (default: live events only)")
+    parser.add_argument("--after-tx-hash", default=None, help="With --after-slot, start after this transaction")
+    parser.add_argument("--max-events", type=int, default=None, help="Stop after this many events")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument("--reconnect-delay", type=float, default=5.0, help="Seconds between reconnects (default: 5)")
+    parser.add_argument("--raw", action="store_true", help="Print each event's JSON data instead of a summary line")
+    parser.add_argument("--json-out", default=None, help="Optional file to write totals to as JSON")
+    return parser.parse_args()
+
+
+def describe(name, data):
+    if name == "rollback":
+        return (f"rollback to slot {data['rollbackSlot']}: {len(data['consignmentIds'])} consignments removed "
+                f"({'within window' if data.get('fastPath') else 'by slot'})")
+    first = data[0]
+    return f"slot {first['l1AbsoluteSlot']} tx {first['l1TransactionHash']}: {len(data)} consignments"
+
+
+def tail(args, totals):
+    session = requests.Session()
+    url = args.indexer_url.rstrip("/") + STREAM_PATH
+    params = {}
+    if args.after_slot is not None:
+        params = {"afterSlot": args.after_slot, "afterTxHash": args.after_tx_hash or ""}
+    last_event_id = None
+    started = time.time()
+    while True:
+        headers = {"Accept": "text/event-stream"}
+        if last_event_id:
+            headers["Last-Event-ID"] = last_event_id
+        try:
+            with session.get(url, params=params, headers=headers, stream=True, timeout=(5, None)) as response:
+                response.raise_for_status()
+                logger.info(f"Subscribed to {url}" + (f" after {last_event_id}" if last_event_id else ""))
+                for name, event_id, raw in iter_sse_events(response):
+                    data = json.loads(raw)
+                    totals["events"] += 1
+                    if name == "rollback":
+                        totals["rollbacks"] += 1
+                        totals["rolled_back"] += len(data["consignmentIds"])
+                        # The transactions replacing the rolled back ones sort before the last event seen
+                        if last_event_id and int(last_event_id.split(":")[0]) > data["rollbackSlot"]:
+                            last_event_id = f"{data['rollbackSlot']}:"
+                    else:
+                        totals["consignments"] += len(data)
+                        last_event_id = event_id or last_event_id
+                    print(raw if args.raw else f"{time.strftime('%H:%M:%S')} {name} {describe(name, data)}", flush=True)
+                    if args.max_events and totals["events"] >= args.max_events:
+                        return
+                    if args.duration and time.time() - started > args.duration:
+                        return
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Feed {url} failed: {e}, reconnecting in {args.reconnect_delay}s")
+        totals["reconnects"] += 1
+        if args.duration and time.time() - started + args.reconnect_delay > args.duration:
+            return
+        time.sleep(args.reconnect_delay)
+
+
+def main():
+    args = parse_arguments()
+    totals = {"events": 0, "consignments": 0, "rollbacks": 0, "rolled_back": 0, "reconnects": 0}
+    started = time.perf_counter()
+    try:
+        tail(args, totals)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        logger.error(f"Error: unexpected event data: {e}")
+        sys.exit(1)
+    totals["elapsed_s"] = time.perf_counter() - started
+    logger.info(f"{totals['events']} events, {totals['consignments']} consignments, {totals['rollbacks']} rollbacks "
+                f"({totals['rolled_back']} consignments), {totals['reconnects']} reconnects "
+                f"in {totals['elapsed_s']:.0f}s")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(totals, f, indent=2)
+        logger.info(f"Wrote totals to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-import requests
-import json
 import sys
 import os
 from datetime import datetime
@@ -8,6 +6,7 @@ import random
 import time
 import logging
 from dotenv import load_dotenv
+from cms_client import CmsClient, log_latency_summary
 
 # Load .env file
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,10 +18,6 @@ logger = logging.getLogger(__name__)
 
 # Environment variables
 CMS_BASE_URL = os.environ.get("CMS_BASE_URL_ORG1")
-headers = {
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
 
 CITY_COORDINATES = {
     "London": (51.5074, -0.1278),
@@ -37,120 +32,6 @@ CITY_COORDINATES = {
     "Toronto": (43.6532, -79.3832)
 }
 
-def delete_consignment(consignment_id, cms_auth_token=None):
-    url = f"{CMS_BASE_URL}/consignments/{consignment_id}"
-    local_headers = headers.copy()
-    if cms_auth_token:
-        local_headers["Authorization"] = f"Bearer {cms_auth_token}"
-        logger.debug(f"Setting Authorization header for delete: Bearer {cms_auth_token[:10]}...")
-    try:
-        response = requests.delete(url, headers=local_headers)
-        logger.info(f"DELETE response status: {response.status_code}, body: {response.text}")
-        if response.status_code == 204:
-            logger.info(f"Deleted consignment: {consignment_id}")
-        elif response.status_code == 404:
-            logger.info(f"Consignment {consignment_id} not found, no deletion needed")
-        else:
-            logger.error(f"Failed to delete consignment {consignment_id}: {response.text}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error deleting consignment {consignment_id}: {e}")
-        raise
-
-def create_consignment(goods, sender_id, receiver_id, tracking_status=None, latitude=None, longitude=None, cms_auth_token=None):
-    url = f"{CMS_BASE_URL}/consignments"
-    payload = {
-        "goods": goods,
-        "sender": {"id": sender_id},
-        "receiver": {"id": receiver_id},
-        "organisationId": sender_id,
-        "trackingStatus": tracking_status,
-        "latitude": latitude,
-        "longitude": longitude
-    }
-    local_headers = headers.copy()
-    if cms_auth_token:
-        local_headers["Authorization"] = f"Bearer {cms_auth_token}"
-        logger.debug(f"Setting Authorization header: Bearer {cms_auth_token[:10]}...")
-    logger.debug(f"Payload for consignment request: {json.dumps(payload, indent=2)}")
-    try:
-        response = requests.post(url, headers=local_headers, data=json.dumps(payload))
-        logger.info(f"POST response status: {response.status_code}, body: {response.text}")
-        response.raise_for_status()
-        logger.info(f"Created consignment: Response: {response.json()}")
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Failed to create consignment {e.response.text}")
-        raise
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error creating consignment {payload}: {e}")
-        raise
-
-def update_consignment(consignment_id, goods, sender_id, receiver_id, tracking_status=None, latitude=None, longitude=None, cms_auth_token=None):
-    url = f"{CMS_BASE_URL}/consignments/{consignment_id}"
-    payload = {
-        "id": consignment_id,
-        "goods": goods,
-        "sender": {"id": sender_id},
-        "receiver": {"id": receiver_id},
-        "organisationId": sender_id,
-        "trackingStatus": tracking_status,
-        "latitude": latitude,
-        "longitude": longitude
-    }
-    local_headers = headers.copy()
-    if cms_auth_token:
-        local_headers["Authorization"] = f"Bearer {cms_auth_token}"
-        logger.debug(f"Setting Authorization header for update: Bearer {cms_auth_token[:10]}...")
-    logger.info(f"Payload for update request: {json.dumps(payload, indent=2)}")
-    try:
-        response = requests.put(url, headers=local_headers, data=json.dumps(payload))
-        logger.info(f"PUT response status: {response.status_code}, body: {response.text}")
-        response.raise_for_status()
-        logger.info(f"Updated consignment: {consignment_id}, Response: {response.json()}")
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Failed to update consignment {consignment_id}: {e.response.text}")
-        raise
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error updating consignment {consignment_id}: {e}")
-        raise
-
-def get_consignment(consignment_id, cms_auth_token=None):
-    url = f"{CMS_BASE_URL}/consignments/{consignment_id}"
-    local_headers = headers.copy()
-    if cms_auth_token:
-        local_headers["Authorization"] = f"Bearer {cms_auth_token}"
-        logger.debug(f"Setting Authorization header for get: Bearer {cms_auth_token[:10]}...")
-    try:
-        response = requests.get(url, headers=local_headers)
-        logger.info(f"GET response status: {response.status_code}, body: {response.text}")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Failed to get consignment {consignment_id}: {e.response.text}")
-        raise
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error getting consignment {consignment_id}: {e}")
-        raise
-
-def get_organisation(org_id, cms_auth_token=None):
-    url = f"{CMS_BASE_URL}/organisations/{org_id}"
-    local_headers = headers.copy()
-    if cms_auth_token:
-        local_headers["Authorization"] = f"Bearer {cms_auth_token}"
-        logger.debug(f"Setting Authorization header for get organisation: Bearer {cms_auth_token[:10]}...")
-    try:
-        response = requests.get(url, headers=local_headers)
-        logger.info(f"GET organisation response status: {response.status_code}, body: {response.text}")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Failed to get organisation {org_id}: {e.response.text}")
-        raise
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error getting organisation {org_id}: {e}")
-        raise
-
 def main():
     try:
         # Validate required environment variables
@@ -168,10 +49,11 @@ def main():
         org2_id = str(uuid.uuid4())
         org2_name = "org2"
         logger.info(f"Using CMS_AUTH_TOKEN_ORG1: {cms_auth_token_org1[:10]}...{cms_auth_token_org1[-10:]}, ORG1_ID: {org1_id}, ORG1_NAME: {org1_name}, ORG2_ID: {org2_id}, ORG2_NAME: {org2_name}")
+        cms_org1 = CmsClient(CMS_BASE_URL, cms_auth_token_org1)
 
         # Fetch Org1 details to get the city
         logger.info(f"Fetching organisation details for {org1_id} at {datetime.now()}")
-        org1 = get_organisation(org1_id, cms_auth_token_org1)
+        org1 = cms_org1.get_organisation(org1_id)
         org1_city = org1.get("city", "London")  # Fallback to London if city not found
         org2_city = "Sydney"  # Default for receiver
         start_coords = CITY_COORDINATES.get(org1_city, CITY_COORDINATES["London"])
@@ -180,21 +62,23 @@ def main():
 
         # Create consignment
         logger.info(f"Creating consignment for {org1_id} at {datetime.now()}")
-        cons1 = create_consignment(
+        cons1 = cms_org1.create_consignment(
             goods={"item1": 10, "item2": 20},
             sender_id=org1_id,
             receiver_id=org2_id,
             tracking_status="CREATED",
             latitude=start_coords[0],
-            longitude=start_coords[1],
-            cms_auth_token=cms_auth_token_org1
+            longitude=start_coords[1]
         )
 
         logger.info(f"Created consignment: {cons1}")
         # Verify database state
         logger.info(f"Verifying database state for {org1_id} at {datetime.now()}")
-        cons_state = get_consignment(cons1['idControl'], cms_auth_token=cms_auth_token_org1)
+        cons_state = cms_org1.get_consignment(cons1['idControl'])
+        if cons_state is None:
+            raise RuntimeError(f"Consignment {cons1['idControl']} not found in database after creation")
         logger.info(f"Scenario completed successfully for {org1_name}, {org1_id}")
+        log_latency_summary(cms_org1.latencies, logger)
 
     except Exception as e:
         logger.error(f"Scenario failed for {org1_name}, {org1_id}: {e}")
@@ -0,0 +1,138 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import requests
+from dotenv import load_dotenv
+from cms_client import client_for_org
+from consignment_metadata import TYPE_MERKLE_ROOT, VERSION_2, cbor_decode, decode, leaf_hash, root_from_proof
+
+# Load .env file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Verify that a consignment version published in an anchored batch (lob.l1.transaction.merkle) is "
+                    "included under the Merkle root on chain, independently of the app: the leaf hashes to the proof's "
+                    "leaf hash and holds the consignment, the path leads to a root, and the transaction's label "
+                    "metadata, fetched from the indexer, carries that root and leaf count. Prints the decoded "
+                    "consignment. Exits 1 when the proof does not verify.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--consignment-id", default=None, help="Fetch the proof of this consignment version from the app")
+    source.add_argument("--proof-file", default=None, help="Verify the proof in this JSON file, as GET /api/merkle/proofs returns it")
+    parser.add_argument("--org", default="ORG1", help="Org from scripts/.env whose CMS serves the proof (default: ORG1)")
+    parser.add_argument("--tx-hash", default=None, help="The anchored batch to prove the version in (default: the one it "
+                                                        "was submitted in)")
+    parser.add_argument("--store-dir", default=None,
+                        help="Also check the leaf against this copy of the shared store (lob.l1.transaction.merkle.store_dir)")
+    parser.add_argument("--indexer-url", default=os.environ.get("FOLLOWER_APP_INDEXER_URL", "http://localhost:9090/yaci-api/"),
+                        help="yaci-store API to read the root from (default: FOLLOWER_APP_INDEXER_URL or "
+                             "http://localhost:9090/yaci-api/)")
+    parser.add_argument("--label", type=int, default=1448, help="Metadata label (default: 1448)")
+    parser.add_argument("--server-verify", action="store_true",
+                        help="Also ask the app's POST /api/merkle/verify and report whether it agrees")
+    parser.add_argument("--json-out", default=None, help="Optional file to write the result to as JSON")
+    return parser.parse_args()
+
+
+def fetch_metadata(indexer_url, tx_hash, label):
+    response = requests.get(f"{indexer_url.rstrip('/')}/txs/{tx_hash}/metadata", timeout=30)
+    response.raise_for_status()
+    return next((m.get("json_metadata") for m in response.json() if str(m.get("label")) == str(label)), None)
+
+
+def root_hex(value):
+    # The indexer renders metadata bytes as 0x hex
+    return value.removeprefix("0x").lower()
+
+
+def stored_leaf(store_dir, leaf_hash_hex):
+    path = os.path.join(store_dir, "leaves", leaf_hash_hex[:2], f"{leaf_hash_hex}.cbor")
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def check_proof(proof, metadata):
+    """Returns (reason or None, decoded consignment, computed root hex), reason None when the proof verifies."""
+    leaf = bytes.fromhex(proof["leaf"])
+    if leaf_hash(leaf).hex() != proof["leafHash"].lower():
+        return "leaf does not hash to leafHash", None, None
+    consignments = decode(cbor_decode(leaf))
+    if len(consignments) != 1 or consignments[0]["id"] != proof["consignmentId"].lower():
+        return f"leaf is not consignment {proof['consignmentId']}", None, None
+    computed = root_from_proof(leaf_hash(leaf), proof["index"], proof["count"], [bytes.fromhex(h) for h in proof["path"]])
+    if computed is None:
+        return f"path does not fit leaf {proof['index']} of {proof['count']}", consignments[0], None
+    computed = computed.hex()
+    if not metadata or metadata.get("v") != VERSION_2 or metadata.get("t") != TYPE_MERKLE_ROOT:
+        return f"transaction {proof['txHash']} carries no Merkle root", consignments[0], computed
+    if metadata["n"] != proof["count"]:
+        return f"proof is for {proof['count']} leaves, the batch on chain has {metadata['n']}", consignments[0], computed
+    if root_hex(metadata["r"]) != computed:
+        return f"path leads to {computed}, the root on chain is {root_hex(metadata['r'])}", consignments[0], computed
+    return None, consignments[0], computed
+
+
+def main():
+    args = parse_arguments()
+    cms = None
+    try:
+        if args.proof_file:
+            with open(args.proof_file) as f:
+                proof = json.load(f)
+        else:
+            logging.getLogger("cms_client").setLevel(logging.WARNING)
+            cms = client_for_org(args.org)
+            proof = cms.get_merkle_proof(args.consignment_id, args.tx_hash)
+            if proof is None:
+                logger.error(f"Error: {args.consignment_id} is not in an anchored batch the app knows of")
+                sys.exit(1)
+        metadata = fetch_metadata(args.indexer_url, proof["txHash"], args.label)
+    except (requests.exceptions.RequestException, ValueError, OSError) as e:
+        logger.error(f"Error: cannot read the proof or the root on chain: {e}")
+        sys.exit(1)
+
+    try:
+        reason, consignment, computed = check_proof(proof, metadata)
+    except (KeyError, ValueError) as e:
+        reason, consignment, computed = f"malformed proof: {e}", None, None
+    if reason is None and args.store_dir:
+        stored = stored_leaf(args.store_dir, proof["leafHash"].lower())
+        if stored is None or stored.hex() != proof["leaf"].lower():
+            reason = f"leaf {proof['leafHash']} is missing from or differs in {args.store_dir}"
+    result = {"consignment_id": proof["consignmentId"], "tx_hash": proof["txHash"], "index": proof["index"],
+              "count": proof["count"], "valid": reason is None, "reason": reason, "computed_root": computed,
+              "on_chain_root": root_hex(metadata["r"]) if metadata and "r" in metadata else None}
+    if args.server_verify:
+        cms = cms or client_for_org(args.org)
+        server = cms.verify_merkle_proof(proof)
+        result["server_valid"] = server["valid"]
+        if server["valid"] != result["valid"]:
+            logger.warning(f"The app disagrees: valid={server['valid']}, reason: {server.get('reason')}")
+
+    if consignment:
+        logger.info(f"Leaf {proof['index']} of {proof['count']}: {consignment['id']} {consignment['tracking_status']} "
+                    f"at {consignment['latitude']}, {consignment['longitude']}, from {consignment['sender']['id']} to "
+                    f"{consignment['receiver']['id']}, dispatched {consignment['dispatched_at'].isoformat()}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Wrote result to {args.json_out}")
+    if reason:
+        logger.error(f"Proof does not verify: {reason}")
+        sys.exit(1)
+    logger.info(f"Proof verifies against root {computed} in transaction {proof['txHash']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.domain.core
+
+import com.fasterxml.jackson.annotation.JsonIgnoreProperties
+
+/**
+ * The manifest of a batch published as a Merkle root: the transaction carrying the root and the
+ * leaves in tree order, each a consignment version and the hash its leaf is stored under. Window
+ * is the first and last creation of the versions, in epoch seconds, as published on chain.
+ */
+@JsonIgnoreProperties(ignoreUnknown = true)
+data class AnchoredBatch(
+    val txHash: String,
+    val organisationId: String,
+    val root: String,
+    val creationSlot: Long,
+    val window: List<Long>,
+    val leaves: List<AnchoredLeaf>
+)
+
+@JsonIgnoreProperties(ignoreUnknown = true)
+data class AnchoredLeaf(
+    val consignmentId: String,
+    val leafHash: String
+)
+
+/** What a counterpart needs to check a consignment version against the root on chain, leaf included. */
+data class ConsignmentMerkleProof(
+    val consignmentId: String,
+    val txHash: String,
+    val root: String,
+    val index: Long,
+    val count: Long,
+    val leafHash: String,
+    val leaf: String,
+    val path: List<String>
+)
+
+/** The outcome of checking a proof, with the root and leaf count found on chain when there was one. */
+data class MerkleProofVerification(
+    val valid: Boolean,
+    val reason: String?,
+    val computedRoot: String?,
+    val onChainRoot: String?,
+    val onChainCount: Long?
+)
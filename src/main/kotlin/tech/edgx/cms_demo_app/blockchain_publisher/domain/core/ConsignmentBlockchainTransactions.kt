@@ -8,5 +8,7 @@ data class ConsignmentBlockchainTransactions(
     val remainingConsignments: Set<ConsignmentEntity>,
     val creationSlot: Long,
     val txBytes: ByteArray,
-    val organiserAddress: String
+    val organiserAddress: String,
+    // The manifest of an anchor transaction, stored once the transaction is submitted
+    val anchoredBatch: AnchoredBatch? = null
 )
\ No newline at end of file
@@ -0,0 +1,20 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.domain.core
+
+import org.cardanofoundation.lob.app.blockchain_common.domain.FinalityScore
+import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.BlockchainPublishStatus
+import org.springframework.format.annotation.DateTimeFormat
+import java.time.LocalDateTime
+
+/**
+ * Filters of the consignment listing, bound from the query parameters of the same names. Null
+ * fields match everything, updatedTo is exclusive.
+ */
+data class ConsignmentFilter(
+    val senderId: String? = null,
+    val receiverId: String? = null,
+    val trackingStatus: String? = null,
+    val publishStatus: BlockchainPublishStatus? = null,
+    val finalityScore: FinalityScore? = null,
+    @DateTimeFormat(iso = DateTimeFormat.ISO.DATE_TIME) val updatedFrom: LocalDateTime? = null,
+    @DateTimeFormat(iso = DateTimeFormat.ISO.DATE_TIME) val updatedTo: LocalDateTime? = null
+)
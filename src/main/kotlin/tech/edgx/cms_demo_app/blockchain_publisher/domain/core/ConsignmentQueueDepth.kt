@@ -0,0 +1,10 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.domain.core
+
+import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.BlockchainPublishStatus
+
+/** Consignments of one organisation in one publish status, a point of the queue depth gauge. */
+data class ConsignmentQueueDepth(
+    val organisationId: String,
+    val publishStatus: BlockchainPublishStatus,
+    val consignments: Long
+)
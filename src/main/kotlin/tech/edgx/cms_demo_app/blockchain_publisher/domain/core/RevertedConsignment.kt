@@ -0,0 +1,7 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.domain.core
+
+/** A consignment version read from chain and removed again by a rollback, with the transaction that carried it. */
+data class RevertedConsignment(
+    val idControl: String,
+    val transactionHash: String?
+)
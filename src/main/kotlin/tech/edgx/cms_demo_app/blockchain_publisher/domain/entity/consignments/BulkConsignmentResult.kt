@@ -0,0 +1,16 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments
+
+data class BulkConsignmentResult(
+    val index: Int,
+    val status: Status,
+    val id: String? = null,
+    val idControl: String? = null,
+    val ver: Long? = null,
+    val error: String? = null
+) {
+    enum class Status {
+        ACCEPTED,
+        DUPLICATE,
+        REJECTED
+    }
+}
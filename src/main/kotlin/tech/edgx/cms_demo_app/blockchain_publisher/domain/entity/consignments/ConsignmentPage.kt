@@ -0,0 +1,10 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments
+
+import java.time.LocalDateTime
+
+/** One page of the consignment listing; pass the next* values as after* to get the following page. */
+data class ConsignmentPage(
+    val items: List<Consignment>,
+    val nextAfterUpdatedAt: LocalDateTime? = null,
+    val nextAfterId: String? = null
+)
@@ -0,0 +1,45 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.job
+
+import jakarta.annotation.PostConstruct
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+
+/**
+ * Keeps the version history of long-lived consignments bounded by moving finalised versions that
+ * are more than keep_versions behind the current one into the archive table. Off by default.
+ */
+@Service
+class ConsignmentHistoryCompactionJob(
+    private val consignmentRepositoryGateway: ConsignmentEntityRepositoryGateway,
+    @Value("\${lob.blockchain_publisher.history_compaction.enabled:false}") private val enabled: Boolean,
+    @Value("\${lob.blockchain_publisher.history_compaction.keep_versions:20}") private val keepVersions: Int,
+    @Value("\${lob.blockchain_publisher.history_compaction.batch_size:1000}") private val batchSize: Int
+) {
+    private val log = LoggerFactory.getLogger(ConsignmentHistoryCompactionJob::class.java)
+
+    @PostConstruct
+    fun init() {
+        log.info("ConsignmentHistoryCompactionJob is {}, keeping {} versions.", if (enabled) "enabled" else "disabled", keepVersions)
+    }
+
+    @Scheduled(
+        fixedDelayString = "\${lob.blockchain_publisher.history_compaction.fixed_delay:PT1H}",
+        initialDelayString = "\${lob.blockchain_publisher.history_compaction.initial_delay:PT5M}"
+    )
+    fun execute() {
+        if (!enabled) {
+            return
+        }
+        log.info("Archiving superseded consignment versions...")
+        var archived = 0
+        do {
+            // One transaction per batch, so a large backlog does not hold locks for the whole run
+            val moved = consignmentRepositoryGateway.archiveSupersededVersions(keepVersions, batchSize)
+            archived += moved
+        } while (moved == batchSize)
+        log.info("Archiving superseded consignment versions...done, archived: {}", archived)
+    }
+}
@@ -0,0 +1,68 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.job
+
+import jakarta.annotation.PostConstruct
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentPartitionRepository
+import tech.edgx.cms_demo_app.blockchain_publisher.service.ApiReadCache
+import java.time.Clock
+import java.time.YearMonth
+
+/**
+ * Creates the monthly partitions of blockchain_publisher_consignment ahead of time, so rows never
+ * land in the default partition, and detaches partitions older than the retention period for
+ * scripts/archive_partitions.py to export. A retention of 0 months keeps everything attached.
+ */
+@Service
+class ConsignmentPartitionMaintenanceJob(
+    private val consignmentPartitionRepository: ConsignmentPartitionRepository,
+    private val apiReadCache: ApiReadCache,
+    private val clock: Clock,
+    @Value("\${lob.blockchain_publisher.partitions.months_ahead:2}") private val monthsAhead: Long,
+    @Value("\${lob.blockchain_publisher.partitions.retention_months:0}") private val retentionMonths: Long
+) {
+    private val log = LoggerFactory.getLogger(ConsignmentPartitionMaintenanceJob::class.java)
+
+    @PostConstruct
+    fun init() {
+        log.info("ConsignmentPartitionMaintenanceJob is enabled, months ahead: {}, retention months: {}", monthsAhead, retentionMonths)
+    }
+
+    @Scheduled(
+        fixedDelayString = "\${lob.blockchain_publisher.partitions.fixed_delay:PT6H}",
+        initialDelayString = "\${lob.blockchain_publisher.partitions.initial_delay:PT1M}"
+    )
+    fun execute() {
+        log.info("Maintaining consignment partitions...")
+        val currentMonth = YearMonth.now(clock)
+        for (ahead in 0..monthsAhead) {
+            try {
+                consignmentPartitionRepository.createPartition(currentMonth.plusMonths(ahead))
+            } catch (e: Exception) {
+                // Typically rows of that month already sit in the default partition
+                log.error("Failed to create consignment partition for {}", currentMonth.plusMonths(ahead), e)
+            }
+        }
+        if (retentionMonths > 0) {
+            detachExpiredPartitions(currentMonth.minusMonths(retentionMonths))
+        }
+        log.info("Maintaining consignment partitions...done")
+    }
+
+    private fun detachExpiredPartitions(oldestKept: YearMonth) {
+        consignmentPartitionRepository.attachedPartitions()
+            .filterKeys { it < oldestKept }
+            .forEach { (month, partition) ->
+                if (consignmentPartitionRepository.hasUnfinalisedConsignments(partition)) {
+                    log.warn("Keeping consignment partition {} past retention, it holds consignments not yet finalised", partition)
+                    return@forEach
+                }
+                val removedHeads = consignmentPartitionRepository.detachPartition(partition)
+                // Retired consignments are no longer readable, whichever idControls they were
+                apiReadCache.evictAll()
+                log.info("Detached consignment partition {} ({}) for archiving, consignments retired: {}", partition, month, removedHeads)
+            }
+    }
+}
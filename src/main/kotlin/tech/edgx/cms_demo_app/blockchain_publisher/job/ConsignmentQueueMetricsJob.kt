@@ -0,0 +1,44 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.job
+
+import io.micrometer.core.instrument.MeterRegistry
+import io.micrometer.core.instrument.MultiGauge
+import io.micrometer.core.instrument.Tags
+import jakarta.annotation.PostConstruct
+import org.slf4j.LoggerFactory
+import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+
+/**
+ * Publishes cms.publisher.queue.depth, the consignments waiting dispatch or finality per
+ * organisation and publish status. Counted with one grouped query per run rather than on every
+ * scrape; an organisation and status that emptied since the last run drops out of the gauge.
+ */
+@Service
+class ConsignmentQueueMetricsJob(
+    private val consignmentRepositoryGateway: ConsignmentEntityRepositoryGateway,
+    meterRegistry: MeterRegistry
+) {
+    private val log = LoggerFactory.getLogger(ConsignmentQueueMetricsJob::class.java)
+
+    private val queueDepth = MultiGauge.builder("cms.publisher.queue.depth")
+        .description("Consignments waiting dispatch or finality")
+        .register(meterRegistry)
+
+    @PostConstruct
+    fun init() {
+        log.info("ConsignmentQueueMetricsJob is enabled.")
+    }
+
+    @Scheduled(
+        fixedDelayString = "\${lob.metrics.queue_depth.fixed_delay:PT30S}",
+        initialDelayString = "\${lob.metrics.queue_depth.initial_delay:PT30S}"
+    )
+    fun execute() {
+        val depths = consignmentRepositoryGateway.countQueuedBySenderAndStatus()
+        queueDepth.register(depths.map {
+            MultiGauge.Row.of(Tags.of("organisation", it.organisationId, "status", it.publishStatus.name), it.consignments)
+        }, true)
+        log.debug("Consignment queue depth refreshed, {} organisation and status pairs", depths.size)
+    }
+}
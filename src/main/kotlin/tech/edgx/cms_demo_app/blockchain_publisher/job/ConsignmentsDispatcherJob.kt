@@ -5,10 +5,12 @@ import org.slf4j.LoggerFactory
 import org.springframework.scheduling.annotation.Scheduled
 import org.springframework.stereotype.Service
 import tech.edgx.cms_demo_app.blockchain_publisher.service.dispatch.BlockchainConsignmentsDispatcher
+import tech.edgx.cms_demo_app.util.JobProfiler
 
 @Service("ims_demo_app.ConsignmentsDispatcherJob")
 class ConsignmentsDispatcherJob(
-    private val blockchainConsignmentsDispatcher: BlockchainConsignmentsDispatcher
+    private val blockchainConsignmentsDispatcher: BlockchainConsignmentsDispatcher,
+    private val jobProfiler: JobProfiler
 ) {
 
     private val logger = LoggerFactory.getLogger(ConsignmentsDispatcherJob::class.java)
@@ -25,7 +27,8 @@ class ConsignmentsDispatcherJob(
     fun execute() {
         logger.info("Polling for consignment blockchain transactions to be sent to the blockchain...")
 
-        blockchainConsignmentsDispatcher.dispatchConsignments()
+        // Only hands organisations to the dispatch pool, each one is profiled as dispatcher.organisation
+        jobProfiler.span("dispatcher.poll") { blockchainConsignmentsDispatcher.dispatchConsignments() }
 
         logger.info("Polling for consignment blockchain transactions to be sent to the blockchain...done")
     }
@@ -1,17 +1,43 @@
 package tech.edgx.cms_demo_app.blockchain_publisher.repository
 
 import jakarta.persistence.LockModeType
+import jakarta.persistence.QueryHint
+import org.hibernate.jpa.HibernateHints
 import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.BlockchainPublishStatus
 import org.springframework.data.domain.Limit
 import org.springframework.data.jpa.repository.JpaRepository
 import org.springframework.data.jpa.repository.Lock
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.jpa.repository.QueryHints
 import org.springframework.data.repository.query.Param
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import java.time.LocalDateTime
 import java.util.*
+import java.util.stream.Stream
 
 interface ConsignmentEntityRepository : JpaRepository<ConsignmentEntity, String> {
 
+    companion object {
+        // Current versions in (updated_at, consignment_id) order, V1_8 indexes. Null parameters match everything,
+        // the casts give Postgres a type for them
+        const val CURRENT_CONSIGNMENTS = """
+            SELECT c.* FROM blockchain_publisher_consignment c
+            JOIN blockchain_publisher_consignment_head h
+                ON h.id_control = c.id_control AND h.consignment_id = c.consignment_id
+            WHERE (CAST(:senderId AS VARCHAR) IS NULL OR c.sender_id = :senderId)
+            AND (CAST(:receiverId AS VARCHAR) IS NULL OR c.receiver_id = :receiverId)
+            AND (CAST(:trackingStatus AS VARCHAR) IS NULL OR c.tracking_status = :trackingStatus)
+            AND (CAST(:publishStatus AS VARCHAR) IS NULL OR CAST(c.l1_publish_status AS VARCHAR) = :publishStatus)
+            AND (CAST(:finalityScore AS VARCHAR) IS NULL OR CAST(c.l1_finality_score AS VARCHAR) = :finalityScore)
+            AND (CAST(:updatedFrom AS TIMESTAMP) IS NULL OR c.updated_at >= CAST(:updatedFrom AS TIMESTAMP))
+            AND (CAST(:updatedTo AS TIMESTAMP) IS NULL OR c.updated_at < CAST(:updatedTo AS TIMESTAMP))
+            AND (CAST(:afterUpdatedAt AS TIMESTAMP) IS NULL
+                OR (c.updated_at, c.consignment_id) > (CAST(:afterUpdatedAt AS TIMESTAMP), :afterId))
+            ORDER BY c.updated_at, c.consignment_id
+            LIMIT :limit
+        """
+    }
+
     @Query("""
         SELECT c FROM ConsignmentEntity c
         WHERE c.sender.id = :organisationId
@@ -26,12 +52,12 @@ interface ConsignmentEntityRepository : JpaRepository<ConsignmentEntity, String>
         @Param("publishStatuses") publishStatuses: Set<BlockchainPublishStatus>
     ): Optional<ConsignmentEntity>
 
-    @Query("""
-        SELECT c FROM ConsignmentEntity c
-        WHERE c.idControl = :idControl
-        ORDER BY c.ver DESC
-        LIMIT 1
-    """)
+    // The head table points at the current version, kept up to date by triggers (V1_6)
+    @Query(value = """
+        SELECT c.* FROM blockchain_publisher_consignment_head h
+        JOIN blockchain_publisher_consignment c ON c.consignment_id = h.consignment_id
+        WHERE h.id_control = :idControl
+    """, nativeQuery = true)
     fun findLatestByIdControl(@Param("idControl") idControl: String): ConsignmentEntity?
 
     @Query("""
@@ -71,6 +97,39 @@ interface ConsignmentEntityRepository : JpaRepository<ConsignmentEntity, String>
     ): Set<ConsignmentEntity>
 
 
+    @Query(value = CURRENT_CONSIGNMENTS, nativeQuery = true)
+    fun findCurrentPage(
+        @Param("senderId") senderId: String?,
+        @Param("receiverId") receiverId: String?,
+        @Param("trackingStatus") trackingStatus: String?,
+        @Param("publishStatus") publishStatus: String?,
+        @Param("finalityScore") finalityScore: String?,
+        @Param("updatedFrom") updatedFrom: LocalDateTime?,
+        @Param("updatedTo") updatedTo: LocalDateTime?,
+        @Param("afterUpdatedAt") afterUpdatedAt: LocalDateTime?,
+        @Param("afterId") afterId: String?,
+        @Param("limit") limit: Int
+    ): List<ConsignmentEntity>
+
+    // Read through a server side cursor, fetchSize rows at a time; the caller must be in a transaction
+    @Query(value = CURRENT_CONSIGNMENTS, nativeQuery = true)
+    @QueryHints(QueryHint(name = HibernateHints.HINT_FETCH_SIZE, value = "500"))
+    fun streamCurrent(
+        @Param("senderId") senderId: String?,
+        @Param("receiverId") receiverId: String?,
+        @Param("trackingStatus") trackingStatus: String?,
+        @Param("publishStatus") publishStatus: String?,
+        @Param("finalityScore") finalityScore: String?,
+        @Param("updatedFrom") updatedFrom: LocalDateTime?,
+        @Param("updatedTo") updatedTo: LocalDateTime?,
+        @Param("afterUpdatedAt") afterUpdatedAt: LocalDateTime?,
+        @Param("afterId") afterId: String?,
+        @Param("limit") limit: Int
+    ): Stream<ConsignmentEntity>
+
+    @Query("SELECT c.consignmentId FROM ConsignmentEntity c WHERE c.consignmentId IN :consignmentIds")
+    fun findExistingIds(@Param("consignmentIds") consignmentIds: Collection<String>): Set<String>
+
     @Query("SELECT c FROM ConsignmentEntity c WHERE c.idControl = :idControl")
     fun findByIdControl(idControl: String): List<ConsignmentEntity>
 
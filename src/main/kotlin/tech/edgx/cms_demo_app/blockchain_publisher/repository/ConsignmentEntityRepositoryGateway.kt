@@ -1,21 +1,30 @@
 package tech.edgx.cms_demo_app.blockchain_publisher.repository
 
 import com.google.common.collect.Sets
+import jakarta.persistence.EntityManager
 import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.BlockchainPublishStatus
 import org.slf4j.LoggerFactory
 import org.springframework.beans.factory.annotation.Value
 import org.springframework.data.domain.Limit
 import org.springframework.stereotype.Service
 import org.springframework.transaction.annotation.Transactional
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentFilter
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentQueueDepth
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.RevertedConsignment
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import tech.edgx.cms_demo_app.blockchain_publisher.service.ApiReadCache
 import java.time.Clock
 import java.time.Duration
+import java.time.LocalDateTime
 import java.util.*
 
 @Service
 @Transactional(readOnly = true)
 class ConsignmentEntityRepositoryGateway(
     private val consignmentEntityRepository: ConsignmentEntityRepository,
+    private val consignmentJdbcRepository: ConsignmentJdbcRepository,
+    private val apiReadCache: ApiReadCache,
+    private val entityManager: EntityManager,
     private val clock: Clock,
     @Value("\${lob.blockchain_publisher.dispatcher.lock_timeout:PT3H}") private val lockTimeoutDuration: Duration = Duration.ofHours(3)
 ) {
@@ -32,8 +41,16 @@ class ConsignmentEntityRepositoryGateway(
         return consignmentEntityRepository.findConsignmentsByStatus(organisationId, dispatchStatuses, limit)
     }
 
+    fun findExistingIds(consignmentIds: Collection<String>): Set<String> {
+        if (consignmentIds.isEmpty()) {
+            return emptySet()
+        }
+        return consignmentEntityRepository.findExistingIds(consignmentIds)
+    }
+
     fun deleteById(consignmentId: String) {
         consignmentEntityRepository.deleteById(consignmentId)
+        apiReadCache.evictConsignmentVersions(listOf(consignmentId))
     }
 
     fun findAll(): List<ConsignmentEntity> {
@@ -48,6 +65,50 @@ class ConsignmentEntityRepositoryGateway(
         return consignmentEntityRepository.findLatestByIdControl(idControl)
     }
 
+    fun findCurrentPage(filter: ConsignmentFilter, afterUpdatedAt: LocalDateTime?, afterId: String?, limit: Int): List<ConsignmentEntity> {
+        return consignmentEntityRepository.findCurrentPage(
+            filter.senderId, filter.receiverId, filter.trackingStatus, filter.publishStatus?.name, filter.finalityScore?.name,
+            filter.updatedFrom, filter.updatedTo, afterUpdatedAt, afterId, limit
+        )
+    }
+
+    /**
+     * Passes every current version matching filter to consumer, reading through a cursor and
+     * detaching each entity once consumed, so memory stays flat however many match. Returns the count.
+     */
+    fun forEachCurrent(filter: ConsignmentFilter, consumer: (ConsignmentEntity) -> Unit): Long {
+        var count = 0L
+        consignmentEntityRepository.streamCurrent(
+            filter.senderId, filter.receiverId, filter.trackingStatus, filter.publishStatus?.name, filter.finalityScore?.name,
+            filter.updatedFrom, filter.updatedTo, null, null, Int.MAX_VALUE
+        ).use { consignments ->
+            consignments.forEach {
+                consumer(it)
+                entityManager.detach(it)
+                count++
+            }
+        }
+        return count
+    }
+
+    /**
+     * The previous version of each later version in consignments, keyed by the later version's id,
+     * where the watchdog has seen it on chain. A delta must not build on a transaction that may
+     * still be dropped, nor on one readers have not had the chance to see.
+     */
+    fun findDeltaBases(consignments: Collection<ConsignmentEntity>): Map<String, ConsignmentEntity> {
+        val laterVersions = consignments
+            .filter { it.ver > 1 }
+            .associateBy { ConsignmentEntity.id(it.sender.id, it.receiver.id, it.dispatchedAt, it.ver - 1) }
+        if (laterVersions.isEmpty()) {
+            return emptyMap()
+        }
+        val notOnChain = BlockchainPublishStatus.toDispatchStatuses() + BlockchainPublishStatus.SUBMITTED
+        return consignmentEntityRepository.findAllById(laterVersions.keys)
+            .filter { base -> base.getL1SubmissionData().flatMap { it.publishStatus }.map { it !in notOnChain }.orElse(false) }
+            .associateBy { laterVersions.getValue(it.consignmentId).consignmentId }
+    }
+
     fun findDispatchedConsignmentsThatAreNotFinalizedYet(organisationId: String, limit: Limit): Set<ConsignmentEntity> {
         val notFinalisedButVisibleOnChain = BlockchainPublishStatus.notFinalisedButVisibleOnChain()
         return consignmentEntityRepository.findDispatchedConsignmentsThatAreNotFinalizedYet(
@@ -65,6 +126,13 @@ class ConsignmentEntityRepositoryGateway(
         )
     }
 
+    fun findAllSubmittedConsignments(limit: Limit): Set<ConsignmentEntity> {
+        return consignmentEntityRepository.findAllDispatchedConsignmentsThatAreNotFinalizedYet(
+            setOf(BlockchainPublishStatus.SUBMITTED),
+            limit
+        )
+    }
+
     @Transactional
     fun storeOnlyNew(consignmentEntities: Set<ConsignmentEntity>): Set<ConsignmentEntity> {
         log.info("StoreOnlyNewConsignments:{}", consignmentEntities.size)
@@ -74,22 +142,66 @@ class ConsignmentEntityRepositoryGateway(
             .toSet()
         log.debug("Consignment Ids: {}", consignmentIds)
 
+        // Until commit, so a concurrent writer of the same ids waits and then finds them stored
+        consignmentJdbcRepository.lockConsignmentIds(consignmentIds)
         val existingConsignments = HashSet(consignmentEntityRepository.findAllById(consignmentIds))
         log.debug("Existing consignments: {}", existingConsignments)
 
         val newConsignments = Sets.difference(consignmentEntities, existingConsignments)
         log.debug("New consignments: {}", newConsignments)
 
-        return consignmentEntityRepository.saveAll(newConsignments).toSet()
+        val stored = consignmentEntityRepository.saveAll(newConsignments).toSet()
+        apiReadCache.evictConsignments(stored.map { it.idControl })
+        return stored
+    }
+
+    @Transactional
+    fun insertOnlyNew(consignmentEntities: Collection<ConsignmentEntity>, batchSize: Int = 500): Int {
+        consignmentJdbcRepository.lockConsignmentIds(consignmentEntities.map { it.consignmentId })
+        val inserted = consignmentJdbcRepository.insertIgnoringExisting(consignmentEntities, batchSize)
+        log.info("InsertOnlyNew: {} of {} consignments inserted", inserted, consignmentEntities.size)
+        if (inserted > 0) {
+            apiReadCache.evictConsignments(consignmentEntities.map { it.idControl })
+        }
+        return inserted
+    }
+
+    @Transactional
+    fun recordReadFromChain(consignmentEntities: Collection<ConsignmentEntity>, batchSize: Int = 500) {
+        consignmentJdbcRepository.recordReadFromChain(consignmentEntities, batchSize)
+    }
+
+    /** Deletes the versions the reader inserted from a rolled back block, returns the idControls and transactions affected. */
+    @Transactional
+    fun revertReadFromChain(consignmentIds: Collection<String>): List<RevertedConsignment> {
+        val reverted = consignmentJdbcRepository.revertReadFromChain(consignmentIds)
+        apiReadCache.evictConsignments(reverted.map { it.idControl })
+        return reverted
+    }
+
+    @Transactional
+    fun pruneReadFromChain(belowSlot: Long): Int {
+        return consignmentJdbcRepository.pruneReadFromChain(belowSlot)
+    }
+
+    fun countQueuedBySenderAndStatus(): List<ConsignmentQueueDepth> {
+        return consignmentJdbcRepository.countQueuedBySenderAndStatus()
+    }
+
+    @Transactional
+    fun archiveSupersededVersions(keepVersions: Int, batchSize: Int): Int {
+        return consignmentJdbcRepository.archiveSupersededVersions(keepVersions, batchSize)
     }
 
     @Transactional
     fun storeConsignment(consignmentEntity: ConsignmentEntity) {
         consignmentEntityRepository.save(consignmentEntity)
+        apiReadCache.evictConsignments(listOf(consignmentEntity.idControl))
     }
 
     @Transactional
     fun storeConsignments(successfullyUpdatedConsignmentEntities: Set<ConsignmentEntity>) {
         consignmentEntityRepository.saveAll(successfullyUpdatedConsignmentEntities)
+        apiReadCache.evictConsignments(successfullyUpdatedConsignmentEntities.map { it.idControl })
     }
 }
\ No newline at end of file
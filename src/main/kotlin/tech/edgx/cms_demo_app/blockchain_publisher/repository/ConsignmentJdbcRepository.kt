@@ -0,0 +1,210 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.repository
+
+import com.fasterxml.jackson.databind.ObjectMapper
+import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.BlockchainPublishStatus
+import org.springframework.jdbc.core.JdbcTemplate
+import org.springframework.jdbc.core.PreparedStatementCreator
+import org.springframework.jdbc.core.RowMapper
+import org.springframework.stereotype.Repository
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentQueueDepth
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.RevertedConsignment
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import java.sql.Statement
+import java.sql.Timestamp
+import java.sql.Types
+import java.time.Clock
+import java.time.LocalDateTime
+
+/**
+ * Plain JDBC writes for bulk paths where going through the entity manager costs a select per
+ * row (Persistable.isNew) and leaves it to the caller to find out which rows already exist.
+ */
+@Repository
+class ConsignmentJdbcRepository(
+    private val jdbcTemplate: JdbcTemplate,
+    private val objectMapper: ObjectMapper,
+    private val clock: Clock
+) {
+
+    companion object {
+        private const val INSERT_IGNORING_EXISTING = """
+            INSERT INTO blockchain_publisher_consignment (
+                consignment_id, id_control, ver, goods,
+                sender_id, sender_name, sender_country_code, sender_tax_id_number, sender_currency_id,
+                receiver_id, receiver_name, receiver_country_code, receiver_tax_id_number, receiver_currency_id,
+                l1_transaction_hash, l1_absolute_slot, l1_creation_slot, l1_finality_score, l1_publish_status,
+                tracking_status, latitude, longitude, dispatched_at, created_at, updated_at
+            )
+            SELECT
+                ?, ?, ?, ?::jsonb,
+                ?, ?, ?, ?, ?,
+                ?, ?, ?, ?, ?,
+                ?, ?, ?, ?::blockchain_publisher_finality_score_type, ?::blockchain_publisher_blockchain_publish_status_type,
+                ?, ?, ?, CAST(? AS TIMESTAMP), CAST(? AS TIMESTAMP), CAST(? AS TIMESTAMP)
+            -- The table is partitioned on created_at, so consignment_id alone has no unique constraint to conflict on;
+            -- the ids are locked first (lockConsignmentIds), so this sees any concurrent insert of them once committed
+            WHERE NOT EXISTS (SELECT 1 FROM blockchain_publisher_consignment WHERE consignment_id = ?)
+        """
+
+        // Versions at least keepVersions behind the current one, oldest first, once final on chain
+        private const val ARCHIVE_SUPERSEDED_VERSIONS = """
+            WITH moved AS (
+                DELETE FROM blockchain_publisher_consignment
+                WHERE consignment_id IN (
+                    SELECT c.consignment_id
+                    FROM blockchain_publisher_consignment_head h
+                    JOIN blockchain_publisher_consignment c
+                        ON c.id_control = h.id_control AND c.ver <= h.ver - ?
+                    WHERE h.ver > ?
+                    AND c.l1_publish_status = 'FINALIZED'
+                    ORDER BY c.created_at
+                    LIMIT ?
+                )
+                RETURNING *
+            )
+            INSERT INTO blockchain_publisher_consignment_archive
+            SELECT moved.*, CAST(? AS TIMESTAMP) FROM moved
+        """
+
+        // The advisory locks the V1_10 insert trigger takes, in key order so two writers never deadlock
+        private const val LOCK_CONSIGNMENT_IDS = """
+            SELECT COUNT(pg_advisory_xact_lock(1448, k))
+            FROM (
+                SELECT DISTINCT hashtext(id) AS k
+                FROM unnest(CAST(? AS VARCHAR(64)[])) AS id
+                ORDER BY k
+            ) AS keys
+        """
+
+        private const val RECORD_READ_FROM_CHAIN = """
+            INSERT INTO blockchain_reader_ingested (consignment_id, id_control, l1_absolute_slot)
+            VALUES (?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """
+
+        // The head trigger makes the previous version of each reverted idControl current again
+        private const val REVERT_READ_FROM_CHAIN = """
+            WITH reverted AS (
+                DELETE FROM blockchain_reader_ingested
+                WHERE consignment_id = ANY(CAST(? AS VARCHAR(64)[]))
+                RETURNING consignment_id
+            ), removed AS (
+                DELETE FROM blockchain_publisher_consignment c
+                USING reverted r
+                WHERE c.consignment_id = r.consignment_id
+                RETURNING c.id_control, c.l1_transaction_hash
+            )
+            SELECT DISTINCT id_control, l1_transaction_hash FROM removed
+        """
+
+        // Only the statuses covered by the partial indexes of V1_5, FINALIZED rows are the bulk of the table
+        private const val COUNT_QUEUED_BY_SENDER_AND_STATUS = """
+            SELECT sender_id, l1_publish_status, COUNT(*)
+            FROM blockchain_publisher_consignment
+            WHERE l1_publish_status IN ('STORED', 'ROLLBACKED', 'SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED')
+            GROUP BY sender_id, l1_publish_status
+        """
+    }
+
+    /**
+     * Holds the consignment ids until the transaction ends, so checking which of them are stored
+     * and inserting the rest cannot race another writer of the same ids. The insert trigger of
+     * V1_10 takes the same locks, so a writer that skips this fails instead of storing a duplicate.
+     */
+    fun lockConsignmentIds(consignmentIds: Collection<String>) {
+        if (consignmentIds.isEmpty()) {
+            return
+        }
+        jdbcTemplate.query(PreparedStatementCreator { connection ->
+            connection.prepareStatement(LOCK_CONSIGNMENT_IDS).apply {
+                setArray(1, connection.createArrayOf("varchar", consignmentIds.toTypedArray()))
+            }
+        }, RowMapper { rs, _ -> rs.getLong(1) })
+    }
+
+    /** Inserts in JDBC batches, rows whose consignment id is already stored are skipped. Returns the rows inserted. */
+    fun insertIgnoringExisting(consignmentEntities: Collection<ConsignmentEntity>, batchSize: Int): Int {
+        if (consignmentEntities.isEmpty()) {
+            return 0
+        }
+        val now = Timestamp.valueOf(LocalDateTime.now(clock))
+        val updateCounts = jdbcTemplate.batchUpdate(INSERT_IGNORING_EXISTING, consignmentEntities, batchSize) { ps, c ->
+            val l1 = c.l1SubmissionData
+            ps.setString(1, c.consignmentId)
+            ps.setString(2, c.idControl)
+            ps.setLong(3, c.ver)
+            ps.setString(4, objectMapper.writeValueAsString(c.goods))
+            ps.setString(5, c.sender.id)
+            ps.setString(6, c.sender.name)
+            ps.setString(7, c.sender.countryCode)
+            ps.setString(8, c.sender.taxIdNumber)
+            ps.setString(9, c.sender.currencyId)
+            ps.setString(10, c.receiver.id)
+            ps.setString(11, c.receiver.name)
+            ps.setString(12, c.receiver.countryCode)
+            ps.setString(13, c.receiver.taxIdNumber)
+            ps.setString(14, c.receiver.currencyId)
+            ps.setString(15, l1?.transactionHash?.orElse(null))
+            ps.setObject(16, l1?.absoluteSlot?.orElse(null), Types.BIGINT)
+            ps.setObject(17, l1?.creationSlot?.orElse(null), Types.BIGINT)
+            ps.setString(18, l1?.finalityScore?.orElse(null)?.name)
+            ps.setString(19, l1?.publishStatus?.orElse(null)?.name)
+            ps.setString(20, c.trackingStatus)
+            ps.setObject(21, c.latitude, Types.DOUBLE)
+            ps.setObject(22, c.longitude, Types.DOUBLE)
+            ps.setTimestamp(23, Timestamp.valueOf(c.dispatchedAt))
+            ps.setTimestamp(24, now)
+            ps.setTimestamp(25, now)
+            ps.setString(26, c.consignmentId)
+        }
+        // The driver may report SUCCESS_NO_INFO for rewritten batches, count those as inserted
+        return updateCounts.sumOf { batch -> batch.count { it > 0 || it == Statement.SUCCESS_NO_INFO } }
+    }
+
+    /** Records consignments the reader inserted from chain, see revertReadFromChain. */
+    fun recordReadFromChain(consignmentEntities: Collection<ConsignmentEntity>, batchSize: Int) {
+        val fromChain = consignmentEntities.mapNotNull { c -> c.l1SubmissionData?.absoluteSlot?.orElse(null)?.let { c to it } }
+        jdbcTemplate.batchUpdate(RECORD_READ_FROM_CHAIN, fromChain, batchSize) { ps, (c, slot) ->
+            ps.setString(1, c.consignmentId)
+            ps.setString(2, c.idControl)
+            ps.setLong(3, slot)
+        }
+    }
+
+    /**
+     * Deletes those of the given consignments that the reader inserted from chain, leaving any
+     * published by this instance. Returns the idControls whose current version changed, once per
+     * transaction their reverted versions came from.
+     */
+    fun revertReadFromChain(consignmentIds: Collection<String>): List<RevertedConsignment> {
+        if (consignmentIds.isEmpty()) {
+            return emptyList()
+        }
+        return jdbcTemplate.query(PreparedStatementCreator { connection ->
+            connection.prepareStatement(REVERT_READ_FROM_CHAIN).apply {
+                setArray(1, connection.createArrayOf("varchar", consignmentIds.toTypedArray()))
+            }
+        }, RowMapper { rs, _ -> RevertedConsignment(rs.getString(1), rs.getString(2)) })
+    }
+
+    /** Forgets consignments read from chain before the slot, they are past any rollback. Returns the rows removed. */
+    fun pruneReadFromChain(belowSlot: Long): Int {
+        return jdbcTemplate.update("DELETE FROM blockchain_reader_ingested WHERE l1_absolute_slot < ?", belowSlot)
+    }
+
+    /** Consignments waiting dispatch or finality, per sender and publish status. */
+    fun countQueuedBySenderAndStatus(): List<ConsignmentQueueDepth> {
+        return jdbcTemplate.query(COUNT_QUEUED_BY_SENDER_AND_STATUS, RowMapper { rs, _ ->
+            ConsignmentQueueDepth(rs.getString(1), BlockchainPublishStatus.valueOf(rs.getString(2)), rs.getLong(3))
+        })
+    }
+
+    /**
+     * Moves up to limit finalised versions that are at least keepVersions behind the current one
+     * into blockchain_publisher_consignment_archive. Returns the rows moved.
+     */
+    fun archiveSupersededVersions(keepVersions: Int, limit: Int): Int {
+        val now = Timestamp.valueOf(LocalDateTime.now(clock))
+        return jdbcTemplate.update(ARCHIVE_SUPERSEDED_VERSIONS, keepVersions, keepVersions, limit, now)
+    }
+}
@@ -0,0 +1,72 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.repository
+
+import org.springframework.jdbc.core.JdbcTemplate
+import org.springframework.stereotype.Repository
+import org.springframework.transaction.annotation.Transactional
+import java.time.YearMonth
+import java.time.format.DateTimeFormatter
+
+/**
+ * DDL for the monthly created_at partitions of blockchain_publisher_consignment (V1_7). A
+ * partition is named blockchain_publisher_consignment_pYYYY_MM and keeps that name once detached,
+ * which is how scripts/archive_partitions.py finds it.
+ */
+@Repository
+class ConsignmentPartitionRepository(
+    private val jdbcTemplate: JdbcTemplate
+) {
+
+    companion object {
+        const val TABLE = "blockchain_publisher_consignment"
+        private val SUFFIX = DateTimeFormatter.ofPattern("'_p'yyyy_MM")
+        private val PARTITION_NAME = Regex("^${TABLE}_p(\\d{4})_(\\d{2})$")
+
+        fun partitionName(month: YearMonth): String = TABLE + month.format(SUFFIX)
+    }
+
+    fun attachedPartitions(): Map<YearMonth, String> {
+        val names = jdbcTemplate.queryForList("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(? AS regclass)
+        """, String::class.java, TABLE)
+        return names.mapNotNull { name ->
+            PARTITION_NAME.find(name)?.let { YearMonth.of(it.groupValues[1].toInt(), it.groupValues[2].toInt()) to name }
+        }.toMap().toSortedMap()
+    }
+
+    fun createPartition(month: YearMonth) {
+        jdbcTemplate.execute("""
+            CREATE TABLE IF NOT EXISTS ${partitionName(month)} PARTITION OF $TABLE
+            FOR VALUES FROM ('${month.atDay(1)}') TO ('${month.plusMonths(1).atDay(1)}')
+        """)
+    }
+
+    /**
+     * True while the partition holds consignments still waiting dispatch or finality. Rows with no
+     * publish status were never dispatched from here and nothing waits on them.
+     */
+    fun hasUnfinalisedConsignments(partition: String): Boolean {
+        return jdbcTemplate.queryForObject("""
+            SELECT EXISTS (
+                SELECT 1 FROM $partition
+                WHERE l1_publish_status IN ('STORED', 'ROLLBACKED', 'SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED')
+            )
+        """, Boolean::class.java) ?: true
+    }
+
+    /**
+     * Detaches a partition, leaving it as a standalone table for archiving. Detaching fires no
+     * delete triggers, so head rows pointing into the partition are removed here; their
+     * consignments have no later version, as that would sit in a later partition.
+     */
+    @Transactional
+    fun detachPartition(partition: String): Int {
+        jdbcTemplate.execute("ALTER TABLE $TABLE DETACH PARTITION $partition")
+        return jdbcTemplate.update("""
+            DELETE FROM blockchain_publisher_consignment_head h
+            USING $partition d
+            WHERE h.consignment_id = d.consignment_id
+        """)
+    }
+}
@@ -0,0 +1,126 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service
+
+import com.fasterxml.jackson.databind.ObjectMapper
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.AnchoredBatch
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentMerkleTree
+import tech.edgx.cms_demo_app.util.LruTtlCache
+import java.io.IOException
+import java.nio.file.Files
+import java.nio.file.Path
+import java.nio.file.StandardCopyOption
+import java.time.Clock
+import java.time.Duration
+
+/**
+ * The off chain half of anchored batches, in a directory meant to be shared with counterpart
+ * organisations (a mounted volume or a synced bucket). Leaves are content addressed,
+ * <dir>/leaves/<first two hex>/<leaf hash>.cbor, and checked against their hash when read; the
+ * manifest of each batch is <dir>/batches/<tx hash>.json, written once the transaction is
+ * submitted and removed if it is rolled back. Files are renamed into place and never rewritten, so
+ * readers of the shared directory never see a partly written one.
+ */
+@Service
+class AnchoredBatchStore(
+    private val objectMapper: ObjectMapper,
+    clock: Clock,
+    @Value("\${lob.l1.transaction.merkle.store_dir:merkle-store}") dir: String
+) {
+    private val log = LoggerFactory.getLogger(AnchoredBatchStore::class.java)
+
+    companion object {
+        // Manifests are immutable, the TTL only has to outlive the process
+        private val NEVER_EXPIRES = Duration.ofDays(36500)
+        private const val MAX_CACHED_BATCHES = 64
+        private val HASH = Regex("[0-9a-f]{64}")
+    }
+
+    private val directory: Path = Path.of(dir)
+    private val batches = LruTtlCache<String, AnchoredBatch>(MAX_CACHED_BATCHES, NEVER_EXPIRES, clock)
+
+    /** Stores the leaf under its hash and returns the hash as hex. */
+    @Throws(IOException::class)
+    fun putLeaf(leaf: ByteArray): String {
+        val leafHash = hex(ConsignmentMerkleTree.leafHash(leaf))
+        val path = leafPath(leafHash)
+        if (!Files.exists(path)) {
+            writeAtomically(path) { Files.write(it, leaf) }
+        }
+        return leafHash
+    }
+
+    /** The leaf stored under [leafHash], or null when it is missing or does not hash to it. */
+    fun getLeaf(leafHash: String): ByteArray? {
+        if (!HASH.matches(leafHash)) {
+            return null
+        }
+        val path = leafPath(leafHash).takeIf { Files.exists(it) } ?: return null
+        val leaf = try {
+            Files.readAllBytes(path)
+        } catch (e: IOException) {
+            log.warn("Ignoring unreadable leaf {}: {}", path, e.message)
+            return null
+        }
+        if (hex(ConsignmentMerkleTree.leafHash(leaf)) != leafHash) {
+            log.warn("Ignoring stored leaf {} that does not match its hash", path)
+            return null
+        }
+        return leaf
+    }
+
+    @Throws(IOException::class)
+    fun putBatch(batch: AnchoredBatch) {
+        writeAtomically(batchPath(batch.txHash)) { objectMapper.writeValue(it.toFile(), batch) }
+        log.info("Stored anchored batch of {} leaves, txHash: {}, root: {}", batch.leaves.size, batch.txHash, batch.root)
+    }
+
+    /** Forgets the batch of a transaction that never made it on chain, its leaves may be shared and stay. */
+    @Throws(IOException::class)
+    fun removeBatch(txHash: String) {
+        if (!HASH.matches(txHash)) {
+            return
+        }
+        val removed = Files.deleteIfExists(batchPath(txHash))
+        batches.invalidate(txHash)
+        if (removed) {
+            log.info("Removed anchored batch of rolled back txHash: {}", txHash)
+        }
+    }
+
+    fun findBatch(txHash: String): AnchoredBatch? {
+        if (!HASH.matches(txHash)) {
+            return null
+        }
+        return batches.getOrLoad(txHash) { key ->
+            val path = batchPath(key).takeIf { Files.exists(it) } ?: return@getOrLoad null
+            try {
+                objectMapper.readValue(path.toFile(), AnchoredBatch::class.java).takeIf { it.txHash == key }
+            } catch (e: IOException) {
+                log.warn("Ignoring unreadable anchored batch {}: {}", path, e.message)
+                null
+            }
+        }.first
+    }
+
+    /** True when [txHash] carries a Merkle root rather than consignments. */
+    fun isAnchored(txHash: String): Boolean = HASH.matches(txHash) && Files.exists(batchPath(txHash))
+
+    private fun writeAtomically(path: Path, write: (Path) -> Unit) {
+        Files.createDirectories(path.parent)
+        val tmp = Files.createTempFile(path.parent, path.fileName.toString(), ".tmp")
+        try {
+            write(tmp)
+            Files.move(tmp, path, StandardCopyOption.ATOMIC_MOVE, StandardCopyOption.REPLACE_EXISTING)
+        } finally {
+            Files.deleteIfExists(tmp)
+        }
+    }
+
+    private fun leafPath(leafHash: String): Path = directory.resolve("leaves").resolve(leafHash.substring(0, 2)).resolve("$leafHash.cbor")
+
+    private fun batchPath(txHash: String): Path = directory.resolve("batches").resolve("$txHash.json")
+
+    private fun hex(bytes: ByteArray): String = bytes.joinToString("") { "%02x".format(it) }
+}
@@ -0,0 +1,101 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service
+
+import com.fasterxml.jackson.databind.ObjectMapper
+import org.cardanofoundation.lob.app.organisation.domain.entity.Organisation
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.stereotype.Service
+import org.springframework.transaction.event.TransactionalEventListener
+import org.springframework.transaction.support.TransactionSynchronization
+import org.springframework.transaction.support.TransactionSynchronizationManager
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.Consignment
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.event.ConsignmentsLedgerUpdatedEvent
+import tech.edgx.cms_demo_app.util.LruTtlCache
+import java.security.MessageDigest
+import java.time.Clock
+import java.time.Duration
+
+/**
+ * Read-through cache behind GET /api/consignments/{id} and GET /api/organisations/{id}. Consignments
+ * are cached by idControl, each entry holding the latest ver with the ETag of its JSON; any new
+ * version or status update of an idControl evicts it once the writing transaction completes.
+ * A max_entries of 0 disables caching.
+ */
+@Service
+class ApiReadCache(
+    private val objectMapper: ObjectMapper,
+    clock: Clock,
+    @Value("\${lob.api.cache.max_entries:10000}") maxEntries: Int,
+    @Value("\${lob.api.cache.ttl:PT30S}") ttl: Duration
+) {
+
+    data class Cached<T>(val body: T, val etag: String)
+
+    private val log = LoggerFactory.getLogger(ApiReadCache::class.java)
+
+    private val consignments = LruTtlCache<String, Cached<Consignment>>(maxEntries, ttl, clock)
+    private val organisations = LruTtlCache<String, Cached<Organisation>>(maxEntries, ttl, clock)
+
+    fun consignment(idControl: String, loader: (String) -> Consignment?): Pair<Cached<Consignment>?, Boolean> {
+        return consignments.getOrLoad(idControl) { key -> loader(key)?.let(::cached) }
+    }
+
+    fun organisation(id: String, loader: (String) -> Organisation?): Pair<Cached<Organisation>?, Boolean> {
+        return organisations.getOrLoad(id) { key -> loader(key)?.let(::cached) }
+    }
+
+    fun evictConsignments(idControls: Collection<String>) {
+        if (idControls.isEmpty()) {
+            return
+        }
+        val keys = idControls.toSet()
+        afterCompletion { keys.forEach(consignments::invalidate) }
+    }
+
+    fun evictConsignmentVersions(consignmentIds: Collection<String>) {
+        if (consignmentIds.isEmpty()) {
+            return
+        }
+        val ids = consignmentIds.toSet()
+        afterCompletion { consignments.invalidateIf { _, cached -> cached.body.id in ids } }
+    }
+
+    fun evictOrganisation(id: String) {
+        afterCompletion { organisations.invalidate(id) }
+    }
+
+    fun evictAll() {
+        afterCompletion {
+            consignments.clear()
+            organisations.clear()
+        }
+    }
+
+    fun consignmentStats(): LruTtlCache.Stats = consignments.stats()
+
+    fun organisationStats(): LruTtlCache.Stats = organisations.stats()
+
+    @TransactionalEventListener(fallbackExecution = true)
+    fun onConsignmentsLedgerUpdated(event: ConsignmentsLedgerUpdatedEvent) {
+        log.debug("Evicting {} updated consignments of organisation {}", event.statusUpdates.size, event.organisationId)
+        evictConsignmentVersions(event.statusUpdates.map { it.consignmentId })
+    }
+
+    private fun <T : Any> cached(body: T): Cached<T> {
+        val digest = MessageDigest.getInstance("SHA-256").digest(objectMapper.writeValueAsBytes(body))
+        return Cached(body, "\"" + digest.joinToString("") { "%02x".format(it) }.take(32) + "\"")
+    }
+
+    // Evicting before the commit would let a concurrent read cache the old row again
+    private fun afterCompletion(eviction: () -> Unit) {
+        if (!TransactionSynchronizationManager.isSynchronizationActive()) {
+            eviction()
+            return
+        }
+        TransactionSynchronizationManager.registerSynchronization(object : TransactionSynchronization {
+            override fun afterCompletion(status: Int) {
+                eviction()
+            }
+        })
+    }
+}
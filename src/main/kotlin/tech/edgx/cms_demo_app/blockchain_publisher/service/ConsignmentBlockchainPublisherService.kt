@@ -5,6 +5,7 @@ import org.springframework.beans.factory.annotation.Qualifier
 import org.springframework.stereotype.Service
 import org.springframework.transaction.annotation.Transactional
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.Consignment
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
 import tech.edgx.cms_demo_app.blockchain_publisher.service.event_publish.ConsignmentLedgerUpdatedEventPublisher
 
@@ -18,7 +19,7 @@ class ConsignmentBlockchainPublisherService(
     private val logger = LoggerFactory.getLogger(ConsignmentBlockchainPublisherService::class.java)
 
     @Transactional
-    fun storeConsignmentsForDispatchLater(organisationId: String, consignments: MutableSet<Consignment>) {
+    fun storeConsignmentsForDispatchLater(organisationId: String, consignments: MutableSet<Consignment>): Set<ConsignmentEntity> {
         logger.info("storeConsignmentsForDispatchLater..., orgId:{}", organisationId)
 
         val consignmentEntities = consignments.map { consignment ->
@@ -28,6 +29,19 @@ class ConsignmentBlockchainPublisherService(
         val storedConsignments = consignmentEntityRepositoryGateway.storeOnlyNew(consignmentEntities)
 
         ledgerUpdatedEventPublisher.sendConsignmentLedgerUpdatedEvents(organisationId, storedConsignments)
+
+        return storedConsignments
+    }
+
+    @Transactional
+    fun storeConsignmentBatchForDispatchLater(consignmentsByOrganisation: Map<String, Set<Consignment>>): Set<ConsignmentEntity> {
+        logger.info("storeConsignmentBatchForDispatchLater..., orgs:{}, consignments:{}",
+            consignmentsByOrganisation.size, consignmentsByOrganisation.values.sumOf { it.size })
+
+        // One transaction for the whole batch, inserts are flushed in JDBC batches (hibernate.jdbc.batch_size)
+        return consignmentsByOrganisation.flatMap { (organisationId, consignments) ->
+            storeConsignmentsForDispatchLater(organisationId, consignments.toMutableSet())
+        }.toSet()
     }
 
 }
\ No newline at end of file
@@ -49,6 +49,7 @@ class ConsignmentConverter(
         log.debug("Converting ConsignmentEntity to canonical Consignment: id={}", entity.consignmentId)
         return Consignment(
             id = entity.consignmentId,
+            idControl = entity.idControl,
             ver = entity.ver,
             goods = entity.goods,
             sender = organisationConverter.convertToCoreOrganisation(entity.sender),
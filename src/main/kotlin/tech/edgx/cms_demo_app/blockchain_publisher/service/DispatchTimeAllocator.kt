@@ -0,0 +1,40 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service
+
+import org.springframework.stereotype.Service
+import java.time.Clock
+import java.time.LocalDateTime
+import java.time.temporal.ChronoUnit
+import java.util.concurrent.ConcurrentHashMap
+
+/**
+ * Hands out the dispatchedAt of new consignments. A consignment's idControl is derived from its
+ * sender, receiver and dispatchedAt, and readers derive it again from what is on chain, so two
+ * consignments of one pair must never share a millisecond. Each pair reserves its milliseconds
+ * atomically: a range never overlaps one handed out before, however many single and bulk creates
+ * run at once, and only runs ahead of the clock while a pair creates faster than one per ms.
+ */
+@Service
+class DispatchTimeAllocator(private val clock: Clock) {
+
+    companion object {
+        // Pairs whose last reservation the clock has passed no longer constrain anything
+        private const val PRUNE_ABOVE_PAIRS = 10_000
+    }
+
+    private val lastReserved = ConcurrentHashMap<Pair<String, String>, LocalDateTime>()
+
+    /** Reserves [count] consecutive milliseconds for the pair and returns the first one. */
+    fun reserve(senderId: String, receiverId: String, count: Int = 1): LocalDateTime {
+        require(count > 0) { "count must be positive: $count" }
+        val now = LocalDateTime.now(clock).truncatedTo(ChronoUnit.MILLIS)
+        if (lastReserved.size > PRUNE_ABOVE_PAIRS) {
+            lastReserved.values.removeIf { it.isBefore(now) }
+        }
+        var first = now
+        lastReserved.compute(senderId to receiverId) { _, last ->
+            first = if (last == null || last.isBefore(now)) now else last.plus(1, ChronoUnit.MILLIS)
+            first.plus(count - 1L, ChronoUnit.MILLIS)
+        }
+        return first
+    }
+}
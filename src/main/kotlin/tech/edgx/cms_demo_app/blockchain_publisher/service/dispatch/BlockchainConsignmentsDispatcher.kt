@@ -1,22 +1,46 @@
 package tech.edgx.cms_demo_app.blockchain_publisher.service.dispatch
 
 import com.bloxbean.cardano.client.api.exception.ApiException
+import com.bloxbean.cardano.client.backend.api.BackendService
 import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.BlockchainPublishStatus
 import org.cardanofoundation.lob.app.blockchain_publisher.domain.entity.txs.L1SubmissionData
 import org.cardanofoundation.lob.app.blockchain_publisher.service.dispatch.DispatchingStrategy
 import org.cardanofoundation.lob.app.blockchain_publisher.service.dispatch.ImmediateDispatchingStrategy
-import org.cardanofoundation.lob.app.blockchain_publisher.service.transation_submit.TransactionSubmissionService
 import org.cardanofoundation.lob.app.organisation.OrganisationPublicApi
+import io.micrometer.core.instrument.DistributionSummary
+import io.micrometer.core.instrument.MeterRegistry
+import io.micrometer.core.instrument.Timer
+import jakarta.annotation.PreDestroy
 import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Qualifier
 import org.springframework.beans.factory.annotation.Value
+import org.springframework.scheduling.concurrent.CustomizableThreadFactory
 import org.springframework.stereotype.Service
+import org.springframework.transaction.PlatformTransactionManager
 import org.springframework.transaction.annotation.Transactional
+import org.springframework.transaction.support.TransactionTemplate
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.AnchoredBatch
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentBlockchainTransactions
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+import tech.edgx.cms_demo_app.blockchain_publisher.service.AnchoredBatchStore
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ChainingUtxoSupplier
 import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentL1TransactionCreator
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentTxPacker
 import tech.edgx.cms_demo_app.blockchain_publisher.service.event_publish.ConsignmentLedgerUpdatedEventPublisher
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import tech.edgx.cms_demo_app.util.JobProfiler
+import java.io.IOException
+import java.time.Clock
+import java.time.Duration
+import java.time.LocalDateTime
 import java.util.Optional
+import java.util.concurrent.ConcurrentHashMap
+import java.util.concurrent.ExecutorService
+import java.util.concurrent.Executors
+import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicInteger
+import java.util.concurrent.locks.ReentrantLock
+import kotlin.concurrent.withLock
 
 @Service
 class BlockchainConsignmentsDispatcher(
@@ -24,96 +48,279 @@ class BlockchainConsignmentsDispatcher(
     private val consignmentEntityRepositoryGateway: ConsignmentEntityRepositoryGateway,
     private val dispatchingStrategy: DispatchingStrategy<ConsignmentEntity> = ImmediateDispatchingStrategy(),
     private val consignmentL1TransactionCreator: ConsignmentL1TransactionCreator,
-    private val transactionSubmissionService: TransactionSubmissionService,
+    @Qualifier("yaci_blockfrost") private val backendService: BackendService,
+    private val chainingUtxoSupplier: ChainingUtxoSupplier,
     private val ledgerUpdatedEventPublisher: ConsignmentLedgerUpdatedEventPublisher,
-    @Value("\${lob.blockchain_publisher.dispatcher.consignment.pullBatchSize:50}") private val pullConsignmentsBatchSize: Int = 50
+    private val consignmentTxPacker: ConsignmentTxPacker,
+    private val anchoredBatchStore: AnchoredBatchStore,
+    private val clock: Clock,
+    private val meterRegistry: MeterRegistry,
+    private val jobProfiler: JobProfiler,
+    transactionManager: PlatformTransactionManager,
+    @Value("\${lob.blockchain_publisher.dispatcher.consignment.pullBatchSize:50}") private val pullConsignmentsBatchSize: Int = 50,
+    @Value("\${lob.blockchain_publisher.dispatcher.consignment.max_wait:PT0S}") private val maxWait: Duration = Duration.ZERO,
+    @Value("\${lob.blockchain_publisher.dispatcher.consignment.parallelism:4}") private val parallelism: Int = 4,
+    @Value("\${lob.blockchain_publisher.dispatcher.consignment.pipelined:true}") private val pipelined: Boolean = true,
+    @Value("\${lob.blockchain_publisher.dispatcher.consignment.max_in_flight_txs:8}") private val maxInFlightTxs: Int = 8,
+    @Value("\${lob.l1.transaction.merkle.enabled:false}") private val merkleEnabled: Boolean = false,
+    @Value("\${lob.l1.transaction.merkle.max_leaves:4096}") private val merkleMaxLeaves: Int = 4096,
+    @Value("\${lob.transaction.submission.timeout.in.seconds:300}") private val confirmationTimeoutSeconds: Long = 300,
+    @Value("\${lob.transaction.submission.sleep.seconds:5}") private val confirmationPollSeconds: Long = 5
 ) {
 
     private val log = LoggerFactory.getLogger(BlockchainConsignmentsDispatcher::class.java)
 
-    @Transactional
-    fun dispatchConsignments() {
-        log.info("Polling for blockchain consignments to be sent to the blockchain...")
+    private val transactionTemplate = TransactionTemplate(transactionManager)
+    private val dispatchExecutor: ExecutorService =
+        Executors.newFixedThreadPool(parallelism, CustomizableThreadFactory("consignment-dispatch-"))
+    private val inFlightOrganisations: MutableSet<String> = ConcurrentHashMap.newKeySet()
+    private val roundRobinOffset = AtomicInteger()
+    // All organisation workers pay from the one owner wallet: building and submitting a transaction is
+    // serialised so no two transactions pick the same inputs. Every submission is chained, so neither an
+    // unpipelined confirmation wait nor recording it in the database holds the lock
+    private val submitLock = ReentrantLock()
 
-        for (organisation in organisationPublicApi.listAll()) {
-            val organisationId = organisation.id.trim()
-            val consignments = consignmentEntityRepositoryGateway.findConsignmentsByStatus(organisationId, pullConsignmentsBatchSize)
-            val consignmentsCount = consignments.size
+    private val submitTimer = Timer.builder("cms.publisher.submit.duration")
+        .description("Building and submitting a consignment transaction, until accepted or, unpipelined, confirmed")
+        .tag("mode", if (pipelined) "pipelined" else "confirmed")
+        .register(meterRegistry)
+    private val consignmentsPerTransaction = DistributionSummary.builder("cms.publisher.transaction.consignments")
+        .description("Consignments carried by each submitted transaction")
+        .register(meterRegistry)
 
-            log.debug("Dispatching consignments for organisationId: {}, consignment count: {}", organisationId, consignmentsCount)
+    @PreDestroy
+    fun shutdown() {
+        dispatchExecutor.shutdown()
+        if (!dispatchExecutor.awaitTermination(30, TimeUnit.SECONDS)) {
+            log.warn("Consignment dispatch workers did not finish in time, interrupting")
+            dispatchExecutor.shutdownNow()
+        }
+    }
+
+    /**
+     * Hands every organisation to the bounded dispatch pool and returns without waiting, so a slow
+     * organisation (e.g. blocked waiting for a confirmation) only delays its own queue. Each
+     * organisation runs in its own transaction and is never dispatched twice concurrently; one
+     * still in flight from an earlier poll is skipped. The starting organisation rotates per poll
+     * so no organisation is always queued last when the pool is saturated.
+     */
+    fun dispatchConsignments() {
+        log.info("Polling for blockchain consignments to be sent to the blockchain...")
 
-            if (consignmentsCount > 0) {
-                val toDispatch = dispatchingStrategy.apply(organisationId, consignments)
-                dispatchConsignments(organisationId, toDispatch)
+        val organisationIds = organisationPublicApi.listAll().map { it.id.trim() }
+        if (organisationIds.isEmpty()) {
+            return
+        }
+        val offset = Math.floorMod(roundRobinOffset.getAndIncrement(), organisationIds.size)
+        for (organisationId in organisationIds.drop(offset) + organisationIds.take(offset)) {
+            if (!inFlightOrganisations.add(organisationId)) {
+                log.info("Dispatch still in progress for organisationId: {}, skipping this poll", organisationId)
+                continue
+            }
+            dispatchExecutor.execute {
+                val sample = Timer.start(meterRegistry)
+                try {
+                    jobProfiler.span("dispatcher.organisation") {
+                        transactionTemplate.executeWithoutResult { dispatchOrganisation(organisationId) }
+                    }
+                } catch (e: Exception) {
+                    log.error("Error dispatching consignments for organisationId: {}", organisationId, e)
+                } finally {
+                    sample.stop(Timer.builder("cms.publisher.dispatch.duration")
+                        .description("Dispatching one organisation's pulled consignments")
+                        .tag("organisation", organisationId)
+                        .register(meterRegistry))
+                    inFlightOrganisations.remove(organisationId)
+                }
             }
         }
 
-        log.info("Polling for blockchain consignments to be sent to the blockchain...done")
+        log.info("Polling for blockchain consignments to be sent to the blockchain...done, queued organisations: {}", organisationIds.size)
+    }
+
+    // An anchored batch is one transaction whatever its size, pull as many versions as one Merkle tree takes
+    private fun pullBatchSize(): Int = if (merkleEnabled) merkleMaxLeaves else pullConsignmentsBatchSize
+
+    private fun dispatchOrganisation(organisationId: String) {
+        val consignments = consignmentEntityRepositoryGateway.findConsignmentsByStatus(organisationId, pullBatchSize())
+        val consignmentsCount = consignments.size
+
+        log.debug("Dispatching consignments for organisationId: {}, consignment count: {}", organisationId, consignmentsCount)
+
+        if (consignmentsCount > 0) {
+            val toDispatch = dispatchingStrategy.apply(organisationId, consignments)
+            dispatchConsignments(organisationId, toDispatch)
+        }
     }
 
     @Transactional
     fun dispatchConsignments(organisationId: String, consignmentEntities: MutableSet<ConsignmentEntity>) {
         log.info("Dispatching consignments for organisation: {}", organisationId)
 
-        for (consignmentEntity in consignmentEntities) {
-            dispatchConsignment(organisationId, consignmentEntity)
+        if (shouldWaitForMore(organisationId, consignmentEntities)) {
+            return
         }
-    }
 
-    @Transactional
-    fun dispatchConsignment(organisationId: String, consignmentEntity: ConsignmentEntity) {
-        log.info("Dispatching consignment for organisation: {}", organisationId)
+        // Each transaction carries as many consignments as fit, loop until the pulled set is used up
+        var remaining: Set<ConsignmentEntity> = consignmentEntities
+        while (remaining.isNotEmpty()) {
+            if (pipelined && chainingUtxoSupplier.inFlight() >= maxInFlightTxs) {
+                log.info("{} transactions awaiting confirmation, leaving {} consignments for organisationId: {} to a later poll",
+                    maxInFlightTxs, remaining.size, organisationId)
+                return
+            }
+            val consignmentBlockchainTransactionE = createAndSendBlockchainTransactions(organisationId, remaining)
+            if (consignmentBlockchainTransactionE.isEmpty) {
+                log.info("No more consignments to dispatch for organisationId, success or error?, organisationId: {}", organisationId)
+                return
+            }
+            remaining = consignmentBlockchainTransactionE.get().remainingConsignments
+        }
+    }
 
-        val consignmentBlockchainTransactionE = createAndSendBlockchainTransactions(consignmentEntity)
-        if (consignmentBlockchainTransactionE.isEmpty) {
-            log.info("No more consignments to dispatch for organisationId, success or error?, organisationId: {}", organisationId)
+    /**
+     * With a max wait configured, a batch that would not fill a transaction is held back until its
+     * oldest consignment has waited max_wait, trading latency for fewer transactions and fees. An
+     * anchored batch is full at merkle.max_leaves.
+     */
+    private fun shouldWaitForMore(organisationId: String, consignmentEntities: Set<ConsignmentEntity>): Boolean {
+        if (maxWait.isZero || consignmentEntities.size >= pullBatchSize()) {
+            return false
+        }
+        val oldestCreatedAt = consignmentEntities.mapNotNull { it.createdAt }.minOrNull() ?: return false
+        if (!oldestCreatedAt.plus(maxWait).isAfter(LocalDateTime.now(clock))) {
+            return false
+        }
+        if (merkleEnabled) {
+            log.info("Holding back {} consignments for organisation: {}, anchored batch not full and oldest is younger than {}",
+                consignmentEntities.size, organisationId, maxWait)
+            return true
         }
+        // No chain tip lookup just to decide whether to wait, Long.MAX_VALUE is the largest creation slot encoding
+        val bases = consignmentEntityRepositoryGateway.findDeltaBases(consignmentEntities)
+        if (consignmentTxPacker.pack(organisationId, consignmentEntities, Long.MAX_VALUE, bases).full) {
+            return false
+        }
+        log.info("Holding back {} consignments for organisation: {}, transaction not full and oldest is younger than {}",
+            consignmentEntities.size, organisationId, maxWait)
+        return true
     }
 
     @Transactional
-    fun createAndSendBlockchainTransactions(consignmentEntity: ConsignmentEntity): Optional<ConsignmentBlockchainTransactions> {
-        log.info("Creating and sending blockchain transactions for consignment: {}", consignmentEntity.consignmentId)
+    fun createAndSendBlockchainTransactions(
+        organisationId: String,
+        consignmentEntities: Set<ConsignmentEntity>
+    ): Optional<ConsignmentBlockchainTransactions> {
+        log.info("Creating and sending blockchain transaction for {} consignments", consignmentEntities.size)
 
-        val serialisedTxE = consignmentL1TransactionCreator.pullBlockchainTransaction(
-            consignmentEntity.sender.id, setOf(consignmentEntity)
-        )
+        val submitStarted = System.nanoTime()
+        val (serialisedTx, txHash) = submitLock.withLock {
+            // Anchored: only the Merkle root of the batch goes on chain, the leaves are served from the anchored batch store
+            val serialisedTxE = if (merkleEnabled) {
+                consignmentL1TransactionCreator.pullAnchorTransaction(organisationId, consignmentEntities)
+            } else {
+                consignmentL1TransactionCreator.pullBlockchainTransaction(organisationId, consignmentEntities)
+            }
 
-        if (serialisedTxE.isLeft) {
-            log.error("Error pulling blockchain transaction, problem: {}", serialisedTxE.left.detail)
-            return Optional.empty()
+            if (serialisedTxE.isLeft) {
+                log.error("Error pulling blockchain transaction, problem: {}", serialisedTxE.left.detail)
+                return Optional.empty()
+            }
+
+            val serialisedTx = serialisedTxE.get().orElse(null) ?: return Optional.empty()
+            val txHash = try {
+                submitWithoutConfirmation(serialisedTx.txBytes)
+            } catch (e: ApiException) {
+                log.error("Error sending transaction on chain", e)
+                return Optional.empty()
+            }
+            // Only a submitted anchor is published as anchored, before its consignments can be the base of a delta
+            serialisedTx.anchoredBatch?.let(::storeAnchoredBatch)
+            serialisedTx to txHash
         }
+        // The change is chained, other organisations build and submit while this one waits for its confirmation
+        val txAbsoluteSlotM = if (pipelined) Optional.empty() else awaitConfirmation(txHash)
+        submitTimer.record(System.nanoTime() - submitStarted, TimeUnit.NANOSECONDS)
+        recordSubmission(serialisedTx, txHash, txAbsoluteSlotM)
+        return Optional.of(serialisedTx)
+    }
 
-        val serialisedTx = serialisedTxE.get().orElse(null) ?: return Optional.empty()
+    private fun storeAnchoredBatch(batch: AnchoredBatch) {
         try {
-            sendTransactionOnChainAndUpdateDb(serialisedTx)
-            return	Optional.of(serialisedTx)
-        } catch (e: ApiException) {
-            log.error("Error sending transaction on chain and/or updating db", e)
+            anchoredBatchStore.putBatch(batch)
+        } catch (e: IOException) {
+            // The root is on its way on chain regardless, without the manifest its leaves cannot be proven
+            log.error("Error storing the anchored batch of txHash: {}, root: {}", batch.txHash, batch.root, e)
         }
-
-        return Optional.empty()
     }
 
-    @Transactional
-    @Throws(ApiException::class)
-    fun sendTransactionOnChainAndUpdateDb(consignmentBlockchainTransaction: ConsignmentBlockchainTransactions) {
-        val consignmentTxData = consignmentBlockchainTransaction.txBytes
-        val l1SubmissionData = transactionSubmissionService.submitTransactionWithPossibleConfirmation(
-            consignmentTxData, consignmentBlockchainTransaction.organiserAddress
-        )
-
-        val txHash = l1SubmissionData.txHash
-        val txAbsoluteSlotM = l1SubmissionData.absoluteSlot
+    private fun recordSubmission(
+        consignmentBlockchainTransaction: ConsignmentBlockchainTransactions,
+        txHash: String,
+        txAbsoluteSlotM: Optional<Long>
+    ) {
         val creationSlot = consignmentBlockchainTransaction.creationSlot
 
-        consignmentBlockchainTransaction.processedConsignments.forEach { consignment ->
+        val processedConsignments = consignmentBlockchainTransaction.processedConsignments
+        meterRegistry.counter("cms.publisher.transactions", "organisation", consignmentBlockchainTransaction.organisationId).increment()
+        consignmentsPerTransaction.record(processedConsignments.size.toDouble())
+        processedConsignments.forEach { consignment ->
             updateTransactionStatuses(txHash, txAbsoluteSlotM, creationSlot, consignment)
-            ledgerUpdatedEventPublisher.sendConsignmentLedgerUpdatedEvents(
-                consignment.sender.id, setOf(consignment)
-            )
         }
+        consignmentEntityRepositoryGateway.storeConsignments(processedConsignments)
+        // One ledger updated event per transaction rather than per consignment
+        ledgerUpdatedEventPublisher.sendConsignmentLedgerUpdatedEvents(
+            consignmentBlockchainTransaction.organisationId, processedConsignments
+        )
 
-        log.info("Blockchain transaction submitted (consignment), l1SubmissionData: {}", l1SubmissionData)
+        log.info("Blockchain transaction submitted ({} consignments), txHash: {}, absoluteSlot: {}",
+            processedConsignments.size, txHash, txAbsoluteSlotM)
+    }
+
+    /**
+     * Unpipelined, waits up to the submission timeout for the transaction to show up on chain and
+     * returns its slot, or empty if it has not by then. The submission is recorded either way, the
+     * watchdog's confirmation tracker takes it from there.
+     */
+    private fun awaitConfirmation(txHash: String): Optional<Long> {
+        val deadline = System.nanoTime() + TimeUnit.SECONDS.toNanos(confirmationTimeoutSeconds)
+        try {
+            while (System.nanoTime() < deadline) {
+                val result = try {
+                    backendService.transactionService.getTransaction(txHash)
+                } catch (e: ApiException) {
+                    log.debug("Looking up submitted tx {} failed, retrying: {}", txHash, e.message)
+                    null
+                }
+                if (result != null && result.isSuccessful && result.value != null) {
+                    return Optional.ofNullable(result.value.slot)
+                }
+                Thread.sleep(TimeUnit.SECONDS.toMillis(confirmationPollSeconds))
+            }
+        } catch (e: InterruptedException) {
+            // Shutting down, the transaction is submitted and must still be recorded
+            Thread.currentThread().interrupt()
+            return Optional.empty()
+        }
+        log.warn("Transaction {} not on chain after {}s, leaving it to the confirmation tracker", txHash, confirmationTimeoutSeconds)
+        return Optional.empty()
+    }
+
+    /**
+     * Hands the transaction to the node and returns as soon as it is accepted into the mempool, the
+     * watchdog's confirmation tracker moves it on from SUBMITTED. The transaction is added to the
+     * chaining UTxO overlay so the next one can spend its change straight away.
+     */
+    @Throws(ApiException::class)
+    private fun submitWithoutConfirmation(txBytes: ByteArray): String {
+        val result = backendService.transactionService.submitTransaction(txBytes)
+        if (!result.isSuccessful) {
+            // A rejected input usually means the overlay and the node disagree, fall back to the backend's view
+            chainingUtxoSupplier.reset()
+            throw ApiException("Transaction submission failed: ${result.response}")
+        }
+        chainingUtxoSupplier.register(txBytes)
+        return result.value
     }
 
     @Transactional
@@ -133,7 +340,5 @@ class BlockchainConsignmentsDispatcher(
                     .build()
             )
         )
-
-        consignmentEntityRepositoryGateway.storeConsignment(consignmentEntity)
     }
 }
\ No newline at end of file
@@ -0,0 +1,139 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service.tx
+
+import com.bloxbean.cardano.client.api.UtxoSupplier
+import com.bloxbean.cardano.client.api.common.OrderEnum
+import com.bloxbean.cardano.client.api.model.Amount
+import com.bloxbean.cardano.client.api.model.Utxo
+import com.bloxbean.cardano.client.transaction.spec.Transaction
+import com.bloxbean.cardano.client.transaction.spec.TransactionOutput
+import com.bloxbean.cardano.client.transaction.util.TransactionUtil
+import org.slf4j.LoggerFactory
+import java.time.Clock
+import java.time.Duration
+import java.time.Instant
+import java.util.Optional
+
+/**
+ * Overlays transactions that were submitted but are not yet on chain onto the backend's UTxO view,
+ * so the next transaction can spend the change of the previous one instead of waiting for it to be
+ * confirmed. Inputs spent by a pending transaction are hidden and its outputs are offered on the
+ * first page, which lets several transactions from the owner address be in flight at once.
+ *
+ * Entries leave the overlay when the confirmation tracker sees the transaction on chain, when it is
+ * rolled back (together with any pending transaction spending its outputs), or after the pending TTL.
+ */
+class ChainingUtxoSupplier(
+    private val delegate: UtxoSupplier,
+    private val clock: Clock,
+    private val pendingTtl: Duration
+) : UtxoSupplier {
+
+    private val log = LoggerFactory.getLogger(ChainingUtxoSupplier::class.java)
+
+    private class PendingTx(
+        val spent: Set<String>,
+        val outputs: List<Utxo>,
+        val registeredAt: Instant
+    )
+
+    private val pending = LinkedHashMap<String, PendingTx>()
+
+    override fun getPage(address: String, nrOfItems: Int?, page: Int?, order: OrderEnum?): List<Utxo> {
+        val utxos = delegate.getPage(address, nrOfItems, page, order)
+        synchronized(this) {
+            expire()
+            if (pending.isEmpty()) {
+                return utxos
+            }
+            val spent = pending.values.flatMap { it.spent }.toSet()
+            val available = utxos.filterNot { key(it.txHash, it.outputIndex) in spent }.toMutableList()
+            // Pending outputs go on the first page only, so paging through getAll does not repeat them
+            if (page == null || page == 0) {
+                val known = utxos.map { key(it.txHash, it.outputIndex) }.toSet()
+                pending.values.flatMap { it.outputs }
+                    .filter { it.address == address && key(it.txHash, it.outputIndex) !in spent && key(it.txHash, it.outputIndex) !in known }
+                    .forEach { available.add(it) }
+            }
+            return available
+        }
+    }
+
+    override fun getTxOutput(txHash: String, outputIndex: Int): Optional<Utxo> {
+        synchronized(this) {
+            pending[txHash]?.outputs?.firstOrNull { it.outputIndex == outputIndex }?.let {
+                return Optional.of(it)
+            }
+        }
+        return delegate.getTxOutput(txHash, outputIndex)
+    }
+
+    @Synchronized
+    fun register(txBytes: ByteArray): String {
+        val txHash = TransactionUtil.getTxHash(txBytes)
+        val body = Transaction.deserialize(txBytes).body
+        val spent = body.inputs.map { key(it.transactionId, it.index) }.toSet()
+        val outputs = body.outputs.mapIndexed { index, output -> toUtxo(txHash, index, output) }
+        pending[txHash] = PendingTx(spent, outputs, Instant.now(clock))
+        log.debug("Registered pending tx: {}, inputs: {}, outputs: {}, in flight: {}", txHash, spent.size, outputs.size, pending.size)
+        return txHash
+    }
+
+    /** The transaction is visible on chain, the backend now reports its outputs itself. */
+    @Synchronized
+    fun confirm(txHash: String) {
+        if (pending.remove(txHash) != null) {
+            log.debug("Pending tx confirmed: {}, in flight: {}", txHash, pending.size)
+        }
+    }
+
+    /** The transaction will not make it on chain, neither will any pending transaction spending its outputs. */
+    @Synchronized
+    fun rollback(txHash: String) {
+        val dropped = pending.remove(txHash) ?: return
+        log.info("Pending tx rolled back: {}, in flight: {}", txHash, pending.size)
+        val orphanedInputs = dropped.outputs.map { key(it.txHash, it.outputIndex) }.toSet()
+        pending.filterValues { tx -> tx.spent.any { it in orphanedInputs } }.keys.forEach { rollback(it) }
+    }
+
+    /** Forget every pending transaction, e.g. after a submit was rejected and the overlay can no longer be trusted. */
+    @Synchronized
+    fun reset() {
+        if (pending.isNotEmpty()) {
+            log.warn("Dropping {} pending txs from the UTxO overlay", pending.size)
+            pending.clear()
+        }
+    }
+
+    @Synchronized
+    fun inFlight(): Int {
+        expire()
+        return pending.size
+    }
+
+    private fun expire() {
+        val cutoff = Instant.now(clock).minus(pendingTtl)
+        val expired = pending.filterValues { it.registeredAt.isBefore(cutoff) }.keys
+        expired.forEach {
+            log.warn("Pending tx {} not confirmed within {}, dropping it from the UTxO overlay", it, pendingTtl)
+            pending.remove(it)
+        }
+    }
+
+    private fun toUtxo(txHash: String, index: Int, output: TransactionOutput): Utxo {
+        val value = output.value
+        val amounts = mutableListOf(Amount.lovelace(value.coin))
+        value.multiAssets?.forEach { multiAsset ->
+            multiAsset.assets.forEach { asset ->
+                amounts.add(Amount(multiAsset.policyId + asset.nameAsHex.removePrefix("0x"), asset.value))
+            }
+        }
+        return Utxo.builder()
+            .txHash(txHash)
+            .outputIndex(index)
+            .address(output.address)
+            .amount(amounts)
+            .build()
+    }
+
+    private fun key(txHash: String, index: Int) = "$txHash#$index"
+}
@@ -0,0 +1,88 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service.tx
+
+import java.math.BigDecimal
+import java.math.RoundingMode
+import java.time.LocalDateTime
+import java.time.ZoneOffset
+
+/**
+ * Keys and codes of the compact consignment metadata schema (version 2), shared by the serialiser
+ * and the reader's deserialiser; scripts/consignment_metadata.py implements the same codec.
+ *
+ * Top level: v (2), t (type code), c (creation slot), e (serialisation time, epoch seconds),
+ * o (organisation dictionary, the batch organisation first) and d (the consignments). An
+ * organisation is {i: id, n: name, t: tax id, c: currency, k: country}, absent fields omitted. A
+ * consignment is {i: id as 32 bytes, g: goods, s: sender index (omitted for 0), r: receiver
+ * index, k: tracking status code or the status itself when it has no code, y/x: latitude and
+ * longitude in 1e-7 degrees, t: dispatchedAt as UTC epoch millis minus e * 1000}.
+ *
+ * A later version of a consignment whose previous version is already on chain may instead be a
+ * delta item: {i: the first 4 bytes of its id, p: index into h, b: the first 4 bytes of the
+ * previous version's id, n: ver, and only those of g, k, y, x that changed}, where the optional
+ * top level h lists the transaction hashes (32 bytes) the batch's deltas build on. Sender,
+ * receiver and dispatchedAt never change between versions, the id follows from the previous
+ * version's and n. Every checkpoint_interval-th version is a full item again, so rebuilding a
+ * version never replays more than checkpoint_interval - 1 earlier transactions.
+ *
+ * Codes are only ever appended, a code once published must keep its meaning.
+ */
+object CompactConsignmentMetadata {
+    const val VERSION = 2
+    const val TYPE_CONSIGNMENTS = 1
+    const val TYPE_MERKLE_ROOT = 2
+    const val COORDINATE_SCALE = 10_000_000L
+    const val ID_PREFIX_BYTES = 4
+
+    private val TRACKING_STATUS_CODES = listOf("CREATED", "IN_TRANSIT", "DELIVERED", "DISPATCHED", "RETURNED", "CANCELLED")
+        .withIndex()
+        .associate { (index, status) -> status to index + 1L }
+    private val TRACKING_STATUSES = TRACKING_STATUS_CODES.entries.associate { (status, code) -> code to status }
+
+    fun isCompact(payload: Map<*, *>): Boolean = (payload["v"] as? Number)?.toInt() == VERSION
+
+    fun isMerkleRoot(payload: Map<*, *>): Boolean = isCompact(payload) && (payload["t"] as? Number)?.toInt() == TYPE_MERKLE_ROOT
+
+    fun isDelta(item: Map<*, *>): Boolean = item.containsKey("p")
+
+    fun trackingStatusCode(status: String): Long? = TRACKING_STATUS_CODES[status]
+
+    fun trackingStatus(value: Any?): String? = when (value) {
+        null -> null
+        is Number -> TRACKING_STATUSES[value.toLong()]
+            ?: throw IllegalArgumentException("Unknown tracking status code: $value")
+        is String -> value
+        else -> throw IllegalArgumentException("Unsupported tracking status type: ${value.javaClass}")
+    }
+
+    fun fixedPoint(degrees: Double): Long =
+        BigDecimal.valueOf(degrees).movePointRight(7).setScale(0, RoundingMode.HALF_EVEN).longValueExact()
+
+    fun degrees(fixedPoint: Number): Double = BigDecimal.valueOf(fixedPoint.toLong()).movePointLeft(7).toDouble()
+
+    fun epochMillis(dateTime: LocalDateTime): Long = dateTime.toInstant(ZoneOffset.UTC).toEpochMilli()
+
+    fun dateTime(epochMillis: Long): LocalDateTime =
+        LocalDateTime.ofEpochSecond(Math.floorDiv(epochMillis, 1000L), (Math.floorMod(epochMillis, 1000L) * 1_000_000).toInt(), ZoneOffset.UTC)
+
+    fun idBytes(id: String): ByteArray {
+        require(id.length == 64) { "Consignment ID is not a SHA-256 hex digest: $id" }
+        return hexBytes(id)
+    }
+
+    fun txHashBytes(txHash: String): ByteArray {
+        require(txHash.length == 64) { "Not a transaction hash: $txHash" }
+        return hexBytes(txHash)
+    }
+
+    fun hexBytes(hex: String): ByteArray = ByteArray(hex.length / 2) { hex.substring(it * 2, it * 2 + 2).toInt(16).toByte() }
+
+    /** What delta items identify a consignment version by, within one transaction. */
+    fun idPrefix(id: String): ByteArray = idBytes(id).copyOf(ID_PREFIX_BYTES)
+
+    /** The hex of an id, id prefix or hash from the CBOR bytes, or from the "0x" prefixed hex the JSON rendering of metadata uses for bytes. */
+    fun idHex(value: Any?): String = when (value) {
+        is ByteArray -> value.joinToString("") { "%02x".format(it) }
+        is String -> value.removePrefix("0x").lowercase()
+        else -> throw IllegalArgumentException("Unsupported consignment id type: ${value?.javaClass ?: "null"}")
+    }
+}
@@ -3,6 +3,8 @@ package tech.edgx.cms_demo_app.blockchain_publisher.service.tx
 import com.bloxbean.cardano.client.account.Account
 import com.bloxbean.cardano.client.api.model.Amount
 import com.bloxbean.cardano.client.backend.api.BackendService
+import com.bloxbean.cardano.client.backend.api.DefaultProtocolParamsSupplier
+import com.bloxbean.cardano.client.backend.api.DefaultTransactionProcessor
 import com.bloxbean.cardano.client.common.cbor.CborSerializationUtil
 import com.bloxbean.cardano.client.exception.CborSerializationException
 import com.bloxbean.cardano.client.function.helper.SignerProviders
@@ -13,10 +15,8 @@ import com.bloxbean.cardano.client.metadata.helper.MetadataToJsonNoSchemaConvert
 import com.bloxbean.cardano.client.quicktx.QuickTxBuilder
 import com.bloxbean.cardano.client.quicktx.Tx
 import com.bloxbean.cardano.client.transaction.util.TransactionUtil
-import com.google.common.collect.Sets
 import io.vavr.control.Either
 import jakarta.annotation.PostConstruct
-import org.apache.commons.collections4.iterators.PeekingIterator
 import org.cardanofoundation.lob.app.blockchain_publisher.domain.core.SerializedCardanoL1Transaction
 import org.cardanofoundation.lob.app.blockchain_reader.BlockchainReaderPublicApiIF
 import org.slf4j.LoggerFactory
@@ -25,21 +25,28 @@ import org.springframework.beans.factory.annotation.Value
 import org.springframework.stereotype.Component
 import org.zalando.problem.Problem
 import org.zalando.problem.Status
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.AnchoredBatch
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.AnchoredLeaf
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentBlockchainTransactions
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+import tech.edgx.cms_demo_app.blockchain_publisher.service.AnchoredBatchStore
 import java.io.IOException
 import java.math.BigInteger
 import java.nio.file.Files
 import java.time.Instant
+import java.time.ZoneOffset
 import java.time.format.DateTimeFormatter
 import java.util.*
-import java.util.stream.Collectors
-import java.util.stream.Stream
 
 @Component
 class ConsignmentL1TransactionCreator(
     @Qualifier("yaci_blockfrost") private val backendService: BackendService,
     private val consignmentMetadataSerialiser: ConsignmentMetadataSerialiser,
+    private val consignmentTxPacker: ConsignmentTxPacker,
+    private val consignmentEntityRepositoryGateway: ConsignmentEntityRepositoryGateway,
+    private val anchoredBatchStore: AnchoredBatchStore,
+    private val chainingUtxoSupplier: ChainingUtxoSupplier,
     private val blockchainReaderPublicApi: BlockchainReaderPublicApiIF,
     @Qualifier("lob_owner_account") private val organiserAccount: Account, // Changed to lob_owner_account
     @Value("\${lob.l1.transaction.metadata_label:1448}") private val metadataLabel: Int,
@@ -48,10 +55,6 @@ class ConsignmentL1TransactionCreator(
     private val log = LoggerFactory.getLogger(ConsignmentL1TransactionCreator::class.java)
     private lateinit var runId: String
 
-    companion object {
-        private const val CARDANO_MAX_TRANSACTION_SIZE_BYTES = 16000
-    }
-
     @PostConstruct
     fun init() {
         log.info("ConsignmentL1TransactionCreator::metadata label: {}", metadataLabel)
@@ -66,6 +69,72 @@ class ConsignmentL1TransactionCreator(
             .flatMap { chainTip -> handleTransactionCreation(organisationId, consignments, chainTip.absoluteSlot) }
     }
 
+    /**
+     * One transaction for all of [consignments]: the Merkle root of their leaves goes on chain, the
+     * leaves and the batch manifest go to the anchored batch store before the transaction is
+     * handed out for submission.
+     */
+    fun pullAnchorTransaction(organisationId: String, consignments: Set<ConsignmentEntity>): Either<Problem, Optional<ConsignmentBlockchainTransactions>> {
+        if (consignments.isEmpty()) {
+            return Either.right(Optional.empty())
+        }
+        return blockchainReaderPublicApi.getChainTip()
+            .flatMap { chainTip -> createAnchorTransaction(organisationId, consignments, chainTip.absoluteSlot) }
+    }
+
+    private fun createAnchorTransaction(
+        organisationId: String,
+        consignments: Set<ConsignmentEntity>,
+        creationSlot: Long
+    ): Either<Problem, Optional<ConsignmentBlockchainTransactions>> {
+        try {
+            val leafHashes = ArrayList<ByteArray>(consignments.size)
+            val leaves = consignments.map { consignment ->
+                val leaf = CborSerializationUtil.serialize(consignmentMetadataSerialiser.serializeLeaf(consignment, creationSlot).map)
+                leafHashes.add(ConsignmentMerkleTree.leafHash(leaf))
+                AnchoredLeaf(consignment.consignmentId, anchoredBatchStore.putLeaf(leaf))
+            }
+            val root = ConsignmentMerkleTree.root(leafHashes)
+            val createdAt = consignments.mapNotNull { it.createdAt?.toEpochSecond(ZoneOffset.UTC) }
+            val now = Instant.now().epochSecond
+            val window = Pair(createdAt.minOrNull() ?: now, createdAt.maxOrNull() ?: now)
+
+            val data = consignmentMetadataSerialiser.serializeMerkleRoot(organisationId, root, leaves.size, window, creationSlot).map
+            val metadata = MetadataBuilder.createMetadata()
+            metadata.put(BigInteger.valueOf(metadataLabel.toLong()), CBORMetadataMap(data))
+            val txBytes = serializeTransaction(metadata)
+            val txHash = TransactionUtil.getTxHash(txBytes)
+
+            val rootHex = CompactConsignmentMetadata.idHex(root)
+            log.info("Anchor transaction created, id: {}, consignments: {}, root: {}, size: {} bytes",
+                txHash, leaves.size, rootHex, txBytes.size)
+
+            return Either.right(
+                Optional.of(
+                    ConsignmentBlockchainTransactions(
+                        organisationId,
+                        consignments,
+                        emptySet(),
+                        creationSlot,
+                        txBytes,
+                        organiserAccount.baseAddress(),
+                        // Leaves are content addressed and harmless early, the manifest waits for the submission
+                        AnchoredBatch(txHash, organisationId, rootHex, creationSlot, window.toList(), leaves)
+                    )
+                )
+            )
+        } catch (e: Exception) {
+            log.error("Error creating anchor transaction: ", e)
+            return Either.left(
+                Problem.builder()
+                    .withTitle("ERROR_CREATING_ANCHOR_TRANSACTION")
+                    .withDetail("Exception encountered: ${e.message}")
+                    .withStatus(Status.INTERNAL_SERVER_ERROR)
+                    .build()
+            )
+        }
+    }
+
     private fun handleTransactionCreation(
         organisationId: String,
         consignments: Set<ConsignmentEntity>,
@@ -90,101 +159,50 @@ class ConsignmentL1TransactionCreator(
         consignments: Set<ConsignmentEntity>,
         creationSlot: Long
     ): Either<Problem, Optional<ConsignmentBlockchainTransactions>> {
-        log.info("Splitting {} consignments into blockchain transactions", consignments.size)
-
-        val consignmentsBatch = LinkedHashSet<ConsignmentEntity>()
-        val iterator = PeekingIterator.peekingIterator(consignments.iterator())
+        log.info("Packing {} consignments into a blockchain transaction", consignments.size)
 
-        while (iterator.hasNext()) {
-            val consignment = iterator.next()
-            consignmentsBatch.add(consignment)
+        if (consignments.isEmpty()) {
+            return Either.right(Optional.empty())
+        }
 
-            val serializedTransactionsE = serializeTransactionChunk(organisationId, consignmentsBatch, creationSlot)
-            if (serializedTransactionsE.isLeft) {
-                log.error("Error serializing transaction, abort processing, issue: {}", serializedTransactionsE.getLeft().getDetail())
-                return Either.left(serializedTransactionsE.getLeft())
+        // Looked up once per transaction, the packer serialises many candidate batches. A version
+        // published in an anchored batch is not in any transaction's metadata, nothing can build on it
+        val bases = consignmentEntityRepositoryGateway.findDeltaBases(consignments).filterValues { base ->
+            base.getL1SubmissionData().flatMap { it.transactionHash }.map { !anchoredBatchStore.isAnchored(it) }.orElse(false)
+        }
+        val pack = consignmentTxPacker.pack(organisationId, consignments, creationSlot, bases)
+        val consignmentsBatch = pack.batch
+        val remaining = pack.remaining.toMutableList()
+
+        while (true) {
+            val serializedTransactionE = serializeTransactionChunk(organisationId, consignmentsBatch, creationSlot, bases)
+            if (serializedTransactionE.isLeft) {
+                log.error("Error serializing transaction, abort processing, issue: {}", serializedTransactionE.getLeft().getDetail())
+                return Either.left(serializedTransactionE.getLeft())
             }
 
-            val serializedTransaction = serializedTransactionsE.get()
+            val serializedTransaction = serializedTransactionE.get()
             val txBytes = serializedTransaction.txBytes()
 
-            if (!iterator.hasNext()) {
-                log.info("Processing final batch of size: {}", consignmentsBatch.size)
-                log.info("Blockchain transaction created, id: {}, debugTxOutput: {}", TransactionUtil.getTxHash(txBytes), debugStoreOutputTx)
-                potentiallyStoreTxs(creationSlot, serializedTransaction)
-
-                val remaining = Sets.difference(consignments, consignmentsBatch)
-
-                return Either.right(
-                    Optional.of(
-                        ConsignmentBlockchainTransactions(
-                            organisationId,
-                            consignmentsBatch,
-                            remaining,
-                            creationSlot,
-                            txBytes,
-                            organiserAccount.baseAddress()
-                        )
-                    )
-                )
+            // The packer only estimates the non-metadata part of the tx, back off one consignment at a time if it was off
+            if (txBytes.size >= consignmentTxPacker.maxTransactionSizeBytes && consignmentsBatch.size > 1) {
+                val last = consignmentsBatch.last()
+                consignmentsBatch.remove(last)
+                remaining.add(0, last)
+                log.info("Transaction size {} over limit, retrying with {} consignments", txBytes.size, consignmentsBatch.size)
+                continue
             }
 
-            val consignmentPeek = iterator.peek()
-            val newChunkTxBytesE = serializeTransactionChunk(
-                organisationId,
-                Stream.concat(consignmentsBatch.stream(), Stream.of(consignmentPeek)).collect(Collectors.toSet()),
-                creationSlot
-            )
-
-            if (newChunkTxBytesE.isLeft) {
-                log.error("Error serializing transaction, abort processing, issue: {}", newChunkTxBytesE.getLeft().getDetail())
-                return Either.left(newChunkTxBytesE.getLeft())
-            }
-
-            val newChunkTxBytes = newChunkTxBytesE.get().txBytes()
-            if (newChunkTxBytes.size >= CARDANO_MAX_TRANSACTION_SIZE_BYTES) {
-                log.info("Blockchain transaction created, id: {}, debugTxOutput: {}", TransactionUtil.getTxHash(txBytes), debugStoreOutputTx)
-                potentiallyStoreTxs(creationSlot, serializedTransaction)
-
-                val remainingConsignments = Sets.difference(consignments, consignmentsBatch)
-
-                return Either.right(
-                    Optional.of(
-                        ConsignmentBlockchainTransactions(
-                            organisationId,
-                            consignmentsBatch,
-                            remainingConsignments,
-                            creationSlot,
-                            txBytes,
-                            organiserAccount.baseAddress()
-                        )
-                    )
-                )
-            }
-        }
-
-        if (consignmentsBatch.isNotEmpty()) {
-            log.info("Leftovers batch size: {}", consignmentsBatch.size)
-            val serializedTxE = serializeTransactionChunk(organisationId, consignmentsBatch, creationSlot)
-
-            if (serializedTxE.isLeft) {
-                log.error("Error serializing transaction, abort processing, issue: {}", serializedTxE.getLeft().getDetail())
-                return Either.left(serializedTxE.getLeft())
-            }
-
-            val serializedTx = serializedTxE.get()
-            val txBytes = serializedTx.txBytes()
-            log.info("Blockchain transaction created, id: {}, debugTxOutput: {}", TransactionUtil.getTxHash(txBytes), debugStoreOutputTx)
-            potentiallyStoreTxs(creationSlot, serializedTx)
-
-            val remaining = Sets.difference(consignments, consignmentsBatch)
+            log.info("Blockchain transaction created, id: {}, consignments: {}, size: {} bytes, debugTxOutput: {}",
+                TransactionUtil.getTxHash(txBytes), consignmentsBatch.size, txBytes.size, debugStoreOutputTx)
+            potentiallyStoreTxs(creationSlot, serializedTransaction)
 
             return Either.right(
                 Optional.of(
                     ConsignmentBlockchainTransactions(
                         organisationId,
                         consignmentsBatch,
-                        remaining,
+                        LinkedHashSet(remaining),
                         creationSlot,
                         txBytes,
                         organiserAccount.baseAddress()
@@ -192,8 +210,6 @@ class ConsignmentL1TransactionCreator(
                 )
             )
         }
-
-        return Either.right(Optional.empty())
     }
 
     private fun potentiallyStoreTxs(creationSlot: Long, tx: SerializedCardanoL1Transaction) {
@@ -213,10 +229,11 @@ class ConsignmentL1TransactionCreator(
     private fun serializeTransactionChunk(
         organisationId: String,
         consignmentsBatch: Set<ConsignmentEntity>,
-        creationSlot: Long
+        creationSlot: Long,
+        bases: Map<String, ConsignmentEntity>
     ): Either<Problem, SerializedCardanoL1Transaction> {
         try {
-            val metadataMap = consignmentMetadataSerialiser.serializeToMetadataMap(organisationId, consignmentsBatch, creationSlot)
+            val metadataMap = consignmentMetadataSerialiser.serializeToMetadataMap(organisationId, consignmentsBatch, creationSlot, bases)
             val data = metadataMap.map
             log.info("Metadata map contents: {}", data) // Log the map to inspect its contents
             val bytes = CborSerializationUtil.serialize(data)
@@ -244,7 +261,12 @@ class ConsignmentL1TransactionCreator(
 
     @Throws(CborSerializationException::class)
     protected fun serializeTransaction(metadata: Metadata): ByteArray {
-        val quickTxBuilder = QuickTxBuilder(backendService)
+        // Inputs come from the chaining supplier so change from txs still in flight can be spent
+        val quickTxBuilder = QuickTxBuilder(
+            chainingUtxoSupplier,
+            DefaultProtocolParamsSupplier(backendService.epochService),
+            DefaultTransactionProcessor(backendService.transactionService)
+        )
         val tx = Tx()
             .payToAddress(organiserAccount.baseAddress(), Amount.ada(2.0))
             .attachMetadata(metadata)
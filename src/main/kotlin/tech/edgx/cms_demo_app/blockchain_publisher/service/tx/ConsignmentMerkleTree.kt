@@ -0,0 +1,76 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service.tx
+
+import java.security.MessageDigest
+
+/**
+ * The Merkle tree of an anchored batch, over SHA-256 with RFC 6962 style domain separation: a leaf
+ * hashes to H(0x00 || leaf CBOR), a node to H(0x01 || left || right). The last node of a level
+ * with an odd count is promoted unchanged. A proof is the sibling hashes from the leaf up; which
+ * side each one is on, and where a level has none, follows from the leaf index and the leaf count
+ * published on chain. scripts/verify_merkle_proof.py implements the same verification.
+ */
+object ConsignmentMerkleTree {
+    private const val LEAF_PREFIX: Byte = 0x00
+    private const val NODE_PREFIX: Byte = 0x01
+
+    fun leafHash(leaf: ByteArray): ByteArray = sha256(LEAF_PREFIX, leaf)
+
+    fun nodeHash(left: ByteArray, right: ByteArray): ByteArray = sha256(NODE_PREFIX, left, right)
+
+    fun root(leafHashes: List<ByteArray>): ByteArray {
+        require(leafHashes.isNotEmpty()) { "A Merkle tree needs at least one leaf" }
+        var level = leafHashes
+        while (level.size > 1) {
+            level = nextLevel(level)
+        }
+        return level.single()
+    }
+
+    /** The sibling hashes of the leaf at [index], from the leaf level up. */
+    fun proof(leafHashes: List<ByteArray>, index: Int): List<ByteArray> {
+        require(index in leafHashes.indices) { "Leaf index $index out of ${leafHashes.size} leaves" }
+        val path = mutableListOf<ByteArray>()
+        var level = leafHashes
+        var position = index
+        while (level.size > 1) {
+            val sibling = position xor 1
+            if (sibling < level.size) {
+                path.add(level[sibling])
+            }
+            level = nextLevel(level)
+            position /= 2
+        }
+        return path
+    }
+
+    /** The root [path] leads to from the leaf hash at [index] of [count] leaves, or null when the path does not fit the tree. */
+    fun rootFromProof(leafHash: ByteArray, index: Long, count: Long, path: List<ByteArray>): ByteArray? {
+        if (count < 1 || index !in 0 until count) {
+            return null
+        }
+        var hash = leafHash
+        var position = index
+        var size = count
+        var step = 0
+        while (size > 1) {
+            val sibling = position xor 1
+            if (sibling < size) {
+                val siblingHash = path.getOrNull(step++) ?: return null
+                hash = if (position % 2 == 0L) nodeHash(hash, siblingHash) else nodeHash(siblingHash, hash)
+            }
+            position /= 2
+            size = (size + 1) / 2
+        }
+        return hash.takeIf { step == path.size }
+    }
+
+    private fun nextLevel(level: List<ByteArray>): List<ByteArray> =
+        level.chunked(2).map { pair -> if (pair.size == 2) nodeHash(pair[0], pair[1]) else pair[0] }
+
+    private fun sha256(prefix: Byte, vararg parts: ByteArray): ByteArray {
+        val digest = MessageDigest.getInstance("SHA-256")
+        digest.update(prefix)
+        parts.forEach(digest::update)
+        return digest.digest()
+    }
+}
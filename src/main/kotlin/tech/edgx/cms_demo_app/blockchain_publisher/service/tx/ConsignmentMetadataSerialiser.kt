@@ -4,6 +4,7 @@ import com.bloxbean.cardano.client.metadata.MetadataBuilder
 import com.bloxbean.cardano.client.metadata.MetadataMap
 import org.cardanofoundation.lob.app.blockchain_publisher.domain.entity.txs.Organisation
 import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
 import org.springframework.stereotype.Component
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
 import java.math.BigInteger
@@ -12,9 +13,19 @@ import java.time.Instant
 import java.time.format.DateTimeFormatter
 import java.time.temporal.ChronoUnit
 
+/**
+ * Writes a batch of consignments as label metadata, in the compact schema 2 (see
+ * CompactConsignmentMetadata) or, with lob.l1.transaction.metadata_schema: 1, in the original
+ * "1.0" schema for counterparts whose reader predates schema 2. Readers decode both. In schema 2 a
+ * consignment whose previous version is given in bases is written as a delta of it, except every
+ * lob.l1.transaction.delta.checkpoint_interval-th version (1 turns deltas off). Anchored batches
+ * are always schema 2: a leaf per consignment and the root payload that goes on chain.
+ */
 @Component
 class ConsignmentMetadataSerialiser(
-    private val clock: Clock
+    private val clock: Clock,
+    @Value("\${lob.l1.transaction.metadata_schema:2}") private val schema: Int = CompactConsignmentMetadata.VERSION,
+    @Value("\${lob.l1.transaction.delta.checkpoint_interval:8}") private val checkpointInterval: Int = 8
 ) {
     private val log = LoggerFactory.getLogger(ConsignmentMetadataSerialiser::class.java)
 
@@ -22,7 +33,16 @@ class ConsignmentMetadataSerialiser(
         const val VERSION = "1.0"
     }
 
-    fun serializeToMetadataMap(organisationId: String, consignments: Set<ConsignmentEntity>, creationSlot: Long): MetadataMap {
+    /** [bases] maps a consignment id to its previous version, published and visible on chain. */
+    fun serializeToMetadataMap(
+        organisationId: String,
+        consignments: Set<ConsignmentEntity>,
+        creationSlot: Long,
+        bases: Map<String, ConsignmentEntity> = emptyMap()
+    ): MetadataMap {
+        if (schema == CompactConsignmentMetadata.VERSION) {
+            return serializeCompact(organisationId, consignments, creationSlot, bases)
+        }
         val globalMetadataMap = MetadataBuilder.createMap()
         globalMetadataMap.put("metadata", createMetadataSection(creationSlot))
 
@@ -43,6 +63,42 @@ class ConsignmentMetadataSerialiser(
         return globalMetadataMap
     }
 
+    /** The off chain leaf of an anchored batch, the consignment as the only, full item of a schema 2 payload. */
+    fun serializeLeaf(consignment: ConsignmentEntity, creationSlot: Long): MetadataMap {
+        val organisationId = consignment.sender.id ?: throw IllegalArgumentException("Organisation ID cannot be null")
+        return serializeCompact(organisationId, setOf(consignment), creationSlot, emptyMap())
+    }
+
+    /** The on chain part of an anchored batch, [window] is the first and last creation of its versions in epoch seconds. */
+    fun serializeMerkleRoot(
+        organisationId: String,
+        root: ByteArray,
+        count: Int,
+        window: Pair<Long, Long>,
+        creationSlot: Long
+    ): MetadataMap {
+        val organisation = MetadataBuilder.createMap()
+        organisation.put("i", organisationId)
+        val organisations = MetadataBuilder.createList()
+        organisations.add(organisation)
+        val windowList = MetadataBuilder.createList()
+        windowList.add(BigInteger.valueOf(window.first))
+        windowList.add(BigInteger.valueOf(window.second))
+
+        val globalMetadataMap = MetadataBuilder.createMap()
+        globalMetadataMap.put("v", BigInteger.valueOf(CompactConsignmentMetadata.VERSION.toLong()))
+        globalMetadataMap.put("t", BigInteger.valueOf(CompactConsignmentMetadata.TYPE_MERKLE_ROOT.toLong()))
+        globalMetadataMap.put("c", BigInteger.valueOf(creationSlot))
+        globalMetadataMap.put("e", BigInteger.valueOf(Instant.now(clock).epochSecond))
+        globalMetadataMap.put("o", organisations)
+        globalMetadataMap.put("r", root)
+        globalMetadataMap.put("n", BigInteger.valueOf(count.toLong()))
+        globalMetadataMap.put("w", windowList)
+
+        log.info("Serialized Merkle root metadata for organisationId={}, leaves={}", organisationId, count)
+        return globalMetadataMap
+    }
+
     private fun createMetadataSection(creationSlot: Long): MetadataMap {
         val metadataMap = MetadataBuilder.createMap()
         val now = Instant.now(clock)
@@ -94,6 +150,123 @@ class ConsignmentMetadataSerialiser(
         return metadataMap
     }
 
+    private fun serializeCompact(
+        organisationId: String,
+        consignments: Set<ConsignmentEntity>,
+        creationSlot: Long,
+        bases: Map<String, ConsignmentEntity>
+    ): MetadataMap {
+        val epochSecond = Instant.now(clock).epochSecond
+        val baseTxHashes = MetadataBuilder.createList()
+        val baseTxIndexes = HashMap<String, Long>()
+        val organisations = MetadataBuilder.createList()
+        val organisationIndexes = HashMap<String, Long>()
+        fun organisationIndex(org: Organisation): Long {
+            val id = org.id ?: throw IllegalArgumentException("Organisation ID cannot be null")
+            return organisationIndexes.getOrPut(id) {
+                organisations.add(serializeOrganisationCompact(org))
+                organisationIndexes.size.toLong()
+            }
+        }
+        // The batch organisation goes first, it is the default sender and the organisation indexers record
+        (consignments.firstOrNull { it.sender.id == organisationId } ?: consignments.firstOrNull())
+            ?.let { organisationIndex(it.sender) }
+
+        val consignmentList = MetadataBuilder.createList()
+        consignments.forEach { consignment ->
+            val metadataMap = MetadataBuilder.createMap()
+            val id = consignment.consignmentId ?: throw IllegalArgumentException("Consignment ID cannot be null")
+            val base = deltaBase(consignment, bases[id])
+            if (base != null) {
+                val baseTxHash = base.getL1SubmissionData().flatMap { it.transactionHash }.get()
+                metadataMap.put("i", CompactConsignmentMetadata.idPrefix(id))
+                metadataMap.put("p", BigInteger.valueOf(baseTxIndexes.getOrPut(baseTxHash) {
+                    baseTxHashes.add(CompactConsignmentMetadata.txHashBytes(baseTxHash))
+                    baseTxIndexes.size.toLong()
+                }))
+                metadataMap.put("b", CompactConsignmentMetadata.idPrefix(base.consignmentId))
+                metadataMap.put("n", BigInteger.valueOf(consignment.ver))
+                if (consignment.goods != base.goods) {
+                    metadataMap.put("g", serializeGoods(consignment.goods))
+                }
+                consignment.trackingStatus?.takeIf { it.isNotBlank() && it != base.trackingStatus }
+                    ?.let { putTrackingStatus(metadataMap, it) }
+                consignment.latitude?.let(CompactConsignmentMetadata::fixedPoint)
+                    ?.takeIf { it != base.latitude?.let(CompactConsignmentMetadata::fixedPoint) }
+                    ?.let { metadataMap.put("y", BigInteger.valueOf(it)) }
+                consignment.longitude?.let(CompactConsignmentMetadata::fixedPoint)
+                    ?.takeIf { it != base.longitude?.let(CompactConsignmentMetadata::fixedPoint) }
+                    ?.let { metadataMap.put("x", BigInteger.valueOf(it)) }
+                consignmentList.add(metadataMap)
+                return@forEach
+            }
+            metadataMap.put("i", CompactConsignmentMetadata.idBytes(id))
+            metadataMap.put("g", serializeGoods(consignment.goods))
+            organisationIndex(consignment.sender).takeIf { it != 0L }?.let { metadataMap.put("s", BigInteger.valueOf(it)) }
+            metadataMap.put("r", BigInteger.valueOf(organisationIndex(consignment.receiver)))
+            consignment.trackingStatus?.takeIf { it.isNotBlank() }?.let { putTrackingStatus(metadataMap, it) }
+            consignment.latitude?.let { metadataMap.put("y", BigInteger.valueOf(CompactConsignmentMetadata.fixedPoint(it))) }
+            consignment.longitude?.let { metadataMap.put("x", BigInteger.valueOf(CompactConsignmentMetadata.fixedPoint(it))) }
+            val dispatchedAt = consignment.dispatchedAt ?: throw IllegalArgumentException("dispatchedAt cannot be null for consignment: $id")
+            // Relative to e, a dispatch within ~24 days of the transaction fits a 5 byte integer instead of 9
+            val dispatchedAtMillis = CompactConsignmentMetadata.epochMillis(dispatchedAt.truncatedTo(ChronoUnit.MILLIS))
+            metadataMap.put("t", BigInteger.valueOf(dispatchedAtMillis - epochSecond * 1000))
+            consignmentList.add(metadataMap)
+        }
+
+        val globalMetadataMap = MetadataBuilder.createMap()
+        globalMetadataMap.put("v", BigInteger.valueOf(CompactConsignmentMetadata.VERSION.toLong()))
+        globalMetadataMap.put("t", BigInteger.valueOf(CompactConsignmentMetadata.TYPE_CONSIGNMENTS.toLong()))
+        globalMetadataMap.put("c", BigInteger.valueOf(creationSlot))
+        globalMetadataMap.put("e", BigInteger.valueOf(epochSecond))
+        globalMetadataMap.put("o", organisations)
+        if (baseTxIndexes.isNotEmpty()) {
+            globalMetadataMap.put("h", baseTxHashes)
+        }
+        globalMetadataMap.put("d", consignmentList)
+
+        log.info("Serialized compact metadata map for organisationId={}, consignmentCount={}, organisations={}, deltas on {} transactions",
+            organisationId, consignments.size, organisationIndexes.size, baseTxIndexes.size)
+        return globalMetadataMap
+    }
+
+    /**
+     * The previous version [consignment] is written as a delta of, or null for a full item: a
+     * checkpoint version, no previous version on chain, or a field cleared since, which a delta
+     * cannot express.
+     */
+    private fun deltaBase(consignment: ConsignmentEntity, base: ConsignmentEntity?): ConsignmentEntity? {
+        if (base == null || checkpointInterval <= 1 || (consignment.ver - 1) % checkpointInterval == 0L) {
+            return null
+        }
+        if (base.idControl != consignment.idControl || base.ver != consignment.ver - 1
+            || base.getL1SubmissionData().flatMap { it.transactionHash }.isEmpty) {
+            return null
+        }
+        if ((consignment.trackingStatus.isNullOrBlank() && !base.trackingStatus.isNullOrBlank())
+            || (consignment.latitude == null && base.latitude != null)
+            || (consignment.longitude == null && base.longitude != null)) {
+            return null
+        }
+        return base
+    }
+
+    private fun putTrackingStatus(metadataMap: MetadataMap, status: String) {
+        CompactConsignmentMetadata.trackingStatusCode(status)
+            ?.let { metadataMap.put("k", BigInteger.valueOf(it)) }
+            ?: metadataMap.put("k", status)
+    }
+
+    private fun serializeOrganisationCompact(org: Organisation): MetadataMap {
+        val metadataMap = MetadataBuilder.createMap()
+        metadataMap.put("i", org.id ?: throw IllegalArgumentException("Organisation ID cannot be null"))
+        org.name?.takeIf { it.isNotBlank() }?.let { metadataMap.put("n", it) }
+        org.taxIdNumber?.takeIf { it.isNotBlank() }?.let { metadataMap.put("t", it) }
+        org.currencyId?.takeIf { it.isNotBlank() }?.let { metadataMap.put("c", it) }
+        org.countryCode?.takeIf { it.isNotBlank() }?.let { metadataMap.put("k", it) }
+        return metadataMap
+    }
+
     private fun serializeGoods(goods: Map<String, Int>): MetadataMap {
         val goodsMap = MetadataBuilder.createMap()
         goods.forEach { (item, quantity) ->
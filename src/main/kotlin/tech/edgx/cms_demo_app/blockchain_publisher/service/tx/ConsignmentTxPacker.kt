@@ -0,0 +1,83 @@
+package tech.edgx.cms_demo_app.blockchain_publisher.service.tx
+
+import com.bloxbean.cardano.client.common.cbor.CborSerializationUtil
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.stereotype.Component
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+
+/**
+ * Chooses how many consignments go into one L1 transaction by serialising only the metadata,
+ * which is cheap, instead of building and signing a full transaction per candidate batch.
+ * The rest of the transaction (inputs, outputs, witnesses) is accounted for by a fixed overhead.
+ */
+@Component
+class ConsignmentTxPacker(
+    private val consignmentMetadataSerialiser: ConsignmentMetadataSerialiser,
+    @Value("\${lob.l1.transaction.max_size_bytes:16000}") val maxTransactionSizeBytes: Int = 16000,
+    @Value("\${lob.l1.transaction.overhead_bytes:1200}") private val transactionOverheadBytes: Int = 1200
+) {
+    private val log = LoggerFactory.getLogger(ConsignmentTxPacker::class.java)
+
+    data class Pack(
+        val batch: LinkedHashSet<ConsignmentEntity>,
+        val remaining: List<ConsignmentEntity>,
+        val metadataSizeBytes: Int,
+        // True when consignments were left out for lack of space, so waiting for more gains nothing.
+        // Later versions deferred to the next transaction do not count, they could not have joined anyway
+        val full: Boolean
+    )
+
+    val metadataBudgetBytes: Int get() = maxTransactionSizeBytes - transactionOverheadBytes
+
+    fun pack(
+        organisationId: String,
+        consignments: Collection<ConsignmentEntity>,
+        creationSlot: Long,
+        bases: Map<String, ConsignmentEntity> = emptyMap()
+    ): Pack {
+        val ordered = consignments.sortedWith(compareBy({ it.createdAt }, { it.idControl }, { it.ver }))
+        // The reader derives ver from what it has stored so far, so one tx carries at most one version per idControl
+        val seenIdControls = HashSet<String>()
+        val (candidates, laterVersions) = ordered.partition { seenIdControls.add(it.idControl) }
+        var metadataSize = 0
+
+        // Metadata grows roughly linearly, so binary search the largest prefix that fits the budget
+        var low = 0
+        var high = candidates.size
+        while (low < high) {
+            val mid = (low + high + 1) / 2
+            val size = metadataSize(organisationId, candidates.subList(0, mid), creationSlot, bases)
+            if (size <= metadataBudgetBytes) {
+                low = mid
+                metadataSize = size
+            } else {
+                high = mid - 1
+            }
+        }
+        if (low == 0 && candidates.isNotEmpty()) {
+            // A single consignment larger than the budget still gets its own transaction attempt
+            low = 1
+            metadataSize = metadataSize(organisationId, candidates.subList(0, 1), creationSlot, bases)
+        }
+        val batch = LinkedHashSet(candidates.subList(0, low))
+        val remaining = candidates.subList(low, candidates.size) + laterVersions
+
+        log.info("Packed {} of {} consignments, metadata size: {} bytes, budget: {} bytes",
+            batch.size, ordered.size, metadataSize, metadataBudgetBytes)
+        return Pack(batch, remaining, metadataSize, low < candidates.size)
+    }
+
+    fun metadataSize(
+        organisationId: String,
+        consignments: Collection<ConsignmentEntity>,
+        creationSlot: Long,
+        bases: Map<String, ConsignmentEntity> = emptyMap()
+    ): Int {
+        if (consignments.isEmpty()) {
+            return 0
+        }
+        val metadataMap = consignmentMetadataSerialiser.serializeToMetadataMap(organisationId, LinkedHashSet(consignments), creationSlot, bases)
+        return CborSerializationUtil.serialize(metadataMap.map).size
+    }
+}
@@ -0,0 +1,10 @@
+package tech.edgx.cms_demo_app.blockchain_reader.domain
+
+import com.fasterxml.jackson.annotation.JsonIgnoreProperties
+
+@JsonIgnoreProperties(ignoreUnknown = true)
+data class IndexerRollback(
+    val id: Long,
+    val rollbackSlot: Long,
+    val consignmentIds: List<String>
+)
@@ -0,0 +1,43 @@
+package tech.edgx.cms_demo_app.blockchain_reader.domain
+
+import jakarta.persistence.Column
+import jakarta.persistence.Entity
+import jakarta.persistence.EntityListeners
+import jakarta.persistence.Id
+import jakarta.persistence.Table
+import org.cardanofoundation.lob.app.support.spring_audit.CommonDateOnlyEntity
+import org.springframework.data.domain.Persistable
+import org.springframework.data.jpa.domain.support.AuditingEntityListener
+
+/**
+ * Position of the reader in the indexer's (slot, transaction hash) ordered consignment feed.
+ * Everything up to and including this transaction has been ingested; consignmentId is the last
+ * row read and is used to notice the indexer dropping it on a rollback. lastRollbackId is the last
+ * entry of the indexer's rollback feed that has been reverted.
+ */
+@Entity
+@Table(name = "blockchain_reader_cursor")
+@EntityListeners(AuditingEntityListener::class)
+data class ReaderCursorEntity(
+    @Id
+    @Column(name = "name", nullable = false, length = 64)
+    val name: String,
+
+    @Column(name = "l1_absolute_slot", nullable = false)
+    var absoluteSlot: Long,
+
+    @Column(name = "l1_transaction_hash", nullable = false, length = 64)
+    var transactionHash: String,
+
+    @Column(name = "consignment_id", length = 64)
+    var consignmentId: String? = null,
+
+    @Column(name = "last_rollback_id")
+    var lastRollbackId: Long? = null
+) : CommonDateOnlyEntity(), Persistable<String> {
+
+    constructor() : this(name = "", absoluteSlot = 0L, transactionHash = "")
+
+    override fun getId(): String = name
+    override fun isNew(): Boolean = createdAt == null
+}
@@ -7,10 +7,12 @@ import org.springframework.beans.factory.annotation.Value
 import org.springframework.scheduling.annotation.Scheduled
 import org.springframework.stereotype.Service
 import tech.edgx.cms_demo_app.blockchain_reader.service.WatchDogService
+import tech.edgx.cms_demo_app.util.JobProfiler
 
 @Service
 class WatchDogJob(
-    @Qualifier("cms_demo_app.watchDogService") private val watchDogService: WatchDogService
+    @Qualifier("cms_demo_app.watchDogService") private val watchDogService: WatchDogService,
+    private val jobProfiler: JobProfiler
 ) {
     private val log = LoggerFactory.getLogger(WatchDogJob::class.java)
 
@@ -28,6 +30,20 @@ class WatchDogJob(
     )
     fun executeConsignmentStatusCheck() {
         log.info("Inspecting all organisations for on chain transaction status changes...")
-        watchDogService.checkConsignmentStatusForOrganisations(txStatusInspectionLimitPerOrgPullSize)
+        jobProfiler.span("watchdog.status") {
+            watchDogService.checkConsignmentStatusForOrganisations(txStatusInspectionLimitPerOrgPullSize)
+        }
+    }
+
+    // Submission no longer waits for confirmation, this picks SUBMITTED transactions up well before the finality check does
+    @Scheduled(
+        fixedDelayString = "\${lob.blockchain_publisher.watchdog.confirmation.fixed_delay:PT10S}",
+        initialDelayString = "\${lob.blockchain_publisher.watchdog.confirmation.initial_delay:PT30S}"
+    )
+    fun executeSubmittedTransactionTracking() {
+        log.debug("Tracking submitted transactions awaiting confirmation...")
+        jobProfiler.span("watchdog.confirmation") {
+            watchDogService.trackSubmittedTransactions(txStatusInspectionLimitPerOrgPullSize)
+        }
     }
 }
\ No newline at end of file
@@ -0,0 +1,6 @@
+package tech.edgx.cms_demo_app.blockchain_reader.repository
+
+import org.springframework.data.jpa.repository.JpaRepository
+import tech.edgx.cms_demo_app.blockchain_reader.domain.ReaderCursorEntity
+
+interface ReaderCursorRepository : JpaRepository<ReaderCursorEntity, String>
@@ -1,80 +1,370 @@
 package tech.edgx.cms_demo_app.blockchain_reader.service
 
+import io.micrometer.core.instrument.MeterRegistry
+import io.micrometer.core.instrument.Timer
+import jakarta.annotation.PreDestroy
+import org.cardanofoundation.lob.app.blockchain_reader.BlockchainReaderPublicApiIF
 import org.slf4j.LoggerFactory
 import org.springframework.beans.factory.annotation.Value
 import org.springframework.core.ParameterizedTypeReference
-import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.scheduling.concurrent.CustomizableThreadFactory
 import org.springframework.stereotype.Service
 import org.springframework.transaction.annotation.Transactional
+import org.springframework.web.client.HttpClientErrorException
 import org.springframework.web.client.RestClient
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
 import tech.edgx.cms_demo_app.blockchain_reader.domain.IndexerConsignmentEntity
+import tech.edgx.cms_demo_app.blockchain_reader.domain.IndexerRollback
+import tech.edgx.cms_demo_app.blockchain_reader.domain.ReaderCursorEntity
+import tech.edgx.cms_demo_app.blockchain_reader.repository.ReaderCursorRepository
+import java.util.concurrent.CompletableFuture
+import java.util.concurrent.ConcurrentHashMap
+import java.util.concurrent.ExecutorService
+import java.util.concurrent.Executors
+import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicLong
 
 @Service
 class ConsignmentBlockchainReaderService(
     private val consignmentRepositoryGateway: ConsignmentEntityRepositoryGateway,
     private val consignmentMetadataDeserialiserService: ConsignmentMetadataDeserialiserService,
+    private val txMetadataCache: TxMetadataCache,
+    private val readerCursorRepository: ReaderCursorRepository,
     private val restClient: RestClient,
+    private val blockchainReaderPublicApi: BlockchainReaderPublicApiIF,
+    private val meterRegistry: MeterRegistry,
     @Value("\${lob.l1.transaction.metadata_label:1448}") private val metadataLabel: Int,
     @Value("\${lob.blockchain_reader.lob_follower_base_url:http://localhost:9090/api/v1/}") private val followerBaseUrl: String,
     @Value("\${lob.blockchain_reader.lob_follower_indexer_url:http://localhost:9090/yaci-api/}") private val indexerBaseUrl: String,
-    @Value("\${lob.blockchain_reader.consignment_batch_size:1000}") private val batchSize: Int
+    @Value("\${lob.blockchain_reader.consignment_batch_size:1000}") private val batchSize: Int,
+    @Value("\${lob.blockchain_reader.metadata_fetch_parallelism:8}") metadataFetchParallelism: Int,
+    @Value("\${lob.blockchain_reader.cursor.rollback_rewind_slots:2160}") private val rollbackRewindSlots: Long,
+    @Value("\${lob.blockchain_reader.rollback.retention_slots:43200}") private val rollbackRetentionSlots: Long,
+    @Value("\${lob.blockchain_reader.max_stops_per_transaction:10}") private val maxStopsPerTransaction: Int
 ) {
     private val log = LoggerFactory.getLogger(this::class.java)
 
-    @Scheduled(fixedRateString = "\${lob.blockchain_reader.rate.ms:60000}")
+    companion object {
+        private const val CURSOR_NAME = "indexer_consignments"
+    }
+
+    /** How a reader cycle ended: caught up with the indexer, a full page read, or stopped at a transaction to retry. */
+    enum class CycleResult { CAUGHT_UP, BEHIND, STOPPED }
+
+    private val metadataFetchExecutor: ExecutorService =
+        Executors.newFixedThreadPool(metadataFetchParallelism, CustomizableThreadFactory("consignment-metadata-"))
+
+    private val lagSlots: AtomicLong = meterRegistry.gauge("cms.reader.lag.slots", AtomicLong(0))!!
+    private val metadataFetchTimer = Timer.builder("cms.reader.metadata.fetch")
+        .description("Fetching one transaction's metadata from the indexer")
+        .register(meterRegistry)
+    private val ingestedCounter = meterRegistry.counter("cms.reader.consignments.ingested")
+    private val revertedCounter = meterRegistry.counter("cms.reader.consignments.reverted")
+    private val skippedCounter = meterRegistry.counter("cms.reader.transactions.skipped")
+    // Consecutive cycles that stopped at a transaction, it is skipped once they reach max_stops_per_transaction
+    private val stopsByTxHash = ConcurrentHashMap<String, Int>()
+
+    @PreDestroy
+    fun shutdown() {
+        metadataFetchExecutor.shutdownNow()
+    }
+
+    /**
+     * Reads the indexer's consignment feed from the persisted cursor onwards, one page per tick,
+     * so each cycle only sees what was indexed since the last one. Already stored consignments are
+     * filtered out with a single IN query, metadata is fetched once per transaction (concurrently,
+     * through TxMetadataCache so a transaction read before is not fetched again), and all new consignments are written with one batched insert in the same database
+     * transaction as the cursor. Transactions are decoded in feed order so a later version of a
+     * consignment sees the earlier one, even when both arrive in the same page. Run by
+     * IndexerFeedSubscriber, on feed events or every rate.ms while the feed is down, and again
+     * straight away while a cycle ends BEHIND.
+     */
     @Transactional
-    fun processNewConsignments() {
+    fun processNewConsignments(): CycleResult {
         log.info("Polling for consignment blockchain transactions to be read from the blockchain...")
-        val indexedConsignments = fetchIndexedConsignments()
-        log.info("Found ${indexedConsignments.size} consignments waiting ingestion")
-
-        for (indexedConsignment in indexedConsignments) {
-            val consignmentId = indexedConsignment.consignmentId
-            val transactionHash = indexedConsignment.l1TransactionHash
-            log.debug("Processing consignmentId: {}, transactionHash: {}", consignmentId, transactionHash)
-
-            // Skip if already processed
-            if (consignmentRepositoryGateway.findById(consignmentId).isPresent) {
-                log.debug("Consignment {} already exists, skipping", consignmentId)
-                continue
-            }
+        val cursor = currentCursor()
+        val page = fetchIndexedConsignments(cursor)
+        // A short page means the reader has caught up with the indexer, whose own lag is cms.indexer.sync.lag
+        val caughtUp = page.size < batchSize
+        val indexedConsignments = wholeTransactions(page)
+        log.info("Found {} consignments waiting ingestion after cursor: {}", indexedConsignments.size, cursor)
 
-            val metadata = fetchMetadata(transactionHash) ?: continue
-            log.info("Onchain state for consignment from metadata: {}", metadata)
+        val existingIds = consignmentRepositoryGateway.findExistingIds(indexedConsignments.map { it.consignmentId })
+        // Feed order is (slot, tx hash), groupBy keeps it
+        val consignmentsByTxHash = indexedConsignments.groupBy { it.l1TransactionHash }
+        val newConsignmentsByTxHash = consignmentsByTxHash
+            .mapValues { (_, consignments) -> consignments.filterNot { it.consignmentId in existingIds } }
+            .filterValues { it.isNotEmpty() }
+        log.info("{} new consignments in {} transactions, {} already stored",
+            indexedConsignments.size - existingIds.size, newConsignmentsByTxHash.size, existingIds.size)
 
-            // Extract type directly from the JSON metadata
-            val type = metadata["type"] as? String
-            if (type != "CONSIGNMENTS") {
-                log.warn("Skipping non-consignment metadata for transactionHash: $transactionHash, type: $type")
-                continue
-            }
+        val metadataByTxHash = fetchMetadata(newConsignmentsByTxHash.keys.toList())
+        val latestVersions = HashMap<String, Long>()
+        val toStore = mutableListOf<ConsignmentEntity>()
+        var lastRead: IndexerConsignmentEntity? = null
+        var stopped = false
 
-            try {
-                val consignments = consignmentMetadataDeserialiserService.decodeConsignments(
-                    metadata,
-                    transactionHash,
-                    indexedConsignment.l1AbsoluteSlot
-                )
-                log.debug("Decoded consignments: {}", consignments)
-                val consignment = consignments.find { it.consignmentId == consignmentId }
-                    ?: continue
-
-                consignmentRepositoryGateway.storeConsignment(consignment)
-                log.info("Stored consignment: $consignmentId")
-            } catch (e: Exception) {
-                log.warn("Failed to deserialize consignment id: {}, transactionHash: {}. Reason: {}. Skipping this consignment.",
-                    consignmentId, transactionHash, e.message)
-                continue
+        for ((transactionHash, consignments) in consignmentsByTxHash) {
+            val indexed = newConsignmentsByTxHash[transactionHash]
+            if (indexed != null) {
+                val metadataResult = metadataByTxHash.getValue(transactionHash)
+                val fetchError = metadataResult.exceptionOrNull()
+                // Retried next cycle, the cursor must not move past a transaction that was not read
+                if (fetchError != null && fetchError !is HttpClientErrorException.NotFound &&
+                    stopAt(transactionHash, "metadata could not be fetched: ${fetchError.message}")) {
+                    stopped = true
+                    break
+                }
+                val decoded = if (fetchError != null) {
+                    skip(transactionHash, "metadata could not be fetched: ${fetchError.message}")
+                } else try {
+                    decodeTransaction(transactionHash, indexed, metadataResult.getOrNull(), latestVersions, existingIds)
+                } catch (e: BaseMetadataUnavailableException) {
+                    // Not a decoding problem, the transaction is read again next cycle like one whose own metadata failed
+                    if (stopAt(transactionHash, e.message)) {
+                        stopped = true
+                        break
+                    }
+                    skip(transactionHash, e.message)
+                }
+                stopsByTxHash.remove(transactionHash)
+                decoded?.let { toStore.addAll(it) }
             }
+            lastRead = consignments.last()
         }
+
+        val stored = consignmentRepositoryGateway.insertOnlyNew(toStore)
+        ingestedCounter.increment(stored.toDouble())
+        consignmentRepositoryGateway.recordReadFromChain(toStore)
+        lastRead?.let {
+            advanceCursor(cursor, it)
+            consignmentRepositoryGateway.pruneReadFromChain(it.l1AbsoluteSlot - rollbackRetentionSlots)
+        }
+        recordLag(if (caughtUp) null else lastRead?.l1AbsoluteSlot ?: cursor?.absoluteSlot)
+        log.info("Stored {} consignments, cursor now at: {}", stored, lastRead?.let { "${it.l1AbsoluteSlot}/${it.l1TransactionHash}" } ?: "unchanged")
         log.info("Polling for consignment blockchain transactions to be read from the blockchain...done")
+        return when {
+            stopped -> CycleResult.STOPPED
+            caughtUp -> CycleResult.CAUGHT_UP
+            else -> CycleResult.BEHIND
+        }
+    }
+
+    private fun recordLag(readSlot: Long?) {
+        if (readSlot == null) {
+            lagSlots.set(0)
+            return
+        }
+        // Only looked up while behind, the tip is not needed to know the reader is caught up
+        blockchainReaderPublicApi.chainTip
+            .peek { lagSlots.set(maxOf(0L, it.absoluteSlot - readSlot)) }
+            .peekLeft { log.debug("Chain tip unavailable, reader lag not updated: {}", it) }
+    }
+
+    /**
+     * True to stop the cycle at [transactionHash] and read it again next cycle, false once cycles
+     * have stopped at it max_stops_per_transaction times in a row, so a miss that retrying does
+     * not cure cannot hold back every later consignment.
+     */
+    private fun stopAt(transactionHash: String, reason: String?): Boolean {
+        val stops = stopsByTxHash.merge(transactionHash, 1) { previous, _ -> previous + 1 }!!
+        if (stops >= maxStopsPerTransaction) {
+            stopsByTxHash.remove(transactionHash)
+            return false
+        }
+        log.warn("Stopping at transactionHash: {} ({} of {} attempts), {}", transactionHash, stops, maxStopsPerTransaction, reason)
+        return true
+    }
+
+    private fun skip(transactionHash: String, reason: String?): List<ConsignmentEntity>? {
+        skippedCounter.increment()
+        log.error("Skipping transactionHash: {}, {}", transactionHash, reason)
+        return null
     }
 
-    private fun fetchIndexedConsignments(): List<IndexerConsignmentEntity> {
+    /** Fetching the metadata of a transaction that delta items build on failed, as opposed to the items not decoding. */
+    private class BaseMetadataUnavailableException(baseTxHash: String, cause: Throwable) :
+        RuntimeException("metadata of base transaction $baseTxHash could not be fetched: ${cause.message}", cause)
+
+    private fun decodeTransaction(
+        transactionHash: String,
+        indexed: List<IndexerConsignmentEntity>,
+        metadata: Map<String, Any>?,
+        latestVersions: MutableMap<String, Long>,
+        existingIds: Set<String>
+    ): List<ConsignmentEntity>? {
+        if (metadata == null) {
+            log.warn("No metadata with label {} for transactionHash: {}, skipping", metadataLabel, transactionHash)
+            return null
+        }
+        log.debug("Onchain state for transaction {} from metadata: {}", transactionHash, metadata)
+
+        if (!consignmentMetadataDeserialiserService.isConsignmentMetadata(metadata)) {
+            log.warn("Skipping non-consignment metadata for transactionHash: $transactionHash, type: ${metadata["type"] ?: metadata["t"]}")
+            return null
+        }
+
+        val wantedIds = indexed.map { it.consignmentId }.toSet()
+        return try {
+            // Versions only become visible to later transactions once this one decoded completely
+            val txVersions = HashMap(latestVersions)
+            val consignments = consignmentMetadataDeserialiserService.decodeConsignments(
+                metadata,
+                transactionHash,
+                indexed.first().l1AbsoluteSlot,
+                txVersions,
+                existingIds,
+                // Delta items are rebuilt from the transactions they build on, mostly cached from when those were read
+                { baseTxHash ->
+                    try {
+                        txMetadataCache.getOrLoad(baseTxHash, ::fetchMetadata)
+                    } catch (e: HttpClientErrorException.NotFound) {
+                        // Rolled back or never indexed, no retry brings it back: the items do not decode
+                        null
+                    } catch (e: Exception) {
+                        throw BaseMetadataUnavailableException(baseTxHash, e)
+                    }
+                }
+            )
+            log.debug("Decoded consignments: {}", consignments)
+            latestVersions.putAll(txVersions)
+            consignments.filter { it.consignmentId in wantedIds }
+        } catch (e: BaseMetadataUnavailableException) {
+            throw e
+        } catch (e: Exception) {
+            skippedCounter.increment()
+            log.warn("Failed to deserialize consignments of transactionHash: {}, consignments: {}. Reason: {}. Skipping this transaction.",
+                transactionHash, wantedIds.size, e.message)
+            null
+        }
+    }
+
+    /**
+     * The stored cursor after applying the indexer's new rollbacks, rewound by rollback_rewind_slots
+     * when the indexer no longer has the last consignment read, i.e. the chain rolled back past it
+     * without a rollback in the feed. Re-reading the window is cheap since stored consignments are
+     * skipped.
+     */
+    private fun currentCursor(): ReaderCursorEntity? {
+        val cursor = readerCursorRepository.findById(CURSOR_NAME).orElse(null)?.let(::applyRollbacks) ?: return null
+        val lastConsignmentId = cursor.consignmentId ?: return cursor
+        if (indexerHasConsignment(lastConsignmentId)) {
+            return cursor
+        }
+        val safeSlot = maxOf(0L, cursor.absoluteSlot - rollbackRewindSlots)
+        log.warn("Consignment {} at cursor slot {} is gone from the indexer, rolling the cursor back to slot {}",
+            lastConsignmentId, cursor.absoluteSlot, safeSlot)
+        cursor.absoluteSlot = safeSlot
+        cursor.transactionHash = ""
+        cursor.consignmentId = null
+        return readerCursorRepository.save(cursor)
+    }
+
+    /**
+     * Reverts the consignments read from chain that the indexer's rollbacks since lastRollbackId
+     * removed, and moves the cursor back to the earliest rollback slot so the blocks that replaced
+     * them are read. A cursor without lastRollbackId starts following the feed from its latest entry.
+     */
+    private fun applyRollbacks(cursor: ReaderCursorEntity): ReaderCursorEntity {
+        val afterId = cursor.lastRollbackId ?: run {
+            cursor.lastRollbackId = latestRollbackId() ?: return cursor
+            return readerCursorRepository.save(cursor)
+        }
+        val rollbacks = fetchRollbacks(afterId)
+        if (rollbacks.isEmpty()) {
+            return cursor
+        }
+        val reverted = consignmentRepositoryGateway.revertReadFromChain(rollbacks.flatMap { it.consignmentIds })
+        val revertedIdControls = reverted.map { it.idControl }.distinct()
+        // A rolled back transaction may never be included again
+        txMetadataCache.evict(reverted.mapNotNull { it.transactionHash }.distinct())
+        val rollbackSlot = rollbacks.minOf { it.rollbackSlot }
+        revertedCounter.increment(revertedIdControls.size.toDouble())
+        log.warn("Indexer rolled back to slot {} ({} rollbacks), reverted {} consignments", rollbackSlot, rollbacks.size, revertedIdControls.size)
+        if (rollbackSlot < cursor.absoluteSlot) {
+            cursor.absoluteSlot = rollbackSlot
+            cursor.transactionHash = ""
+            cursor.consignmentId = null
+        }
+        cursor.lastRollbackId = rollbacks.last().id
+        return readerCursorRepository.save(cursor)
+    }
+
+    private fun advanceCursor(cursor: ReaderCursorEntity?, lastRead: IndexerConsignmentEntity) {
+        val updated = cursor ?: ReaderCursorEntity(CURSOR_NAME, lastRead.l1AbsoluteSlot, lastRead.l1TransactionHash,
+            lastRollbackId = latestRollbackId())
+        updated.absoluteSlot = lastRead.l1AbsoluteSlot
+        updated.transactionHash = lastRead.l1TransactionHash
+        updated.consignmentId = lastRead.consignmentId
+        readerCursorRepository.save(updated)
+    }
+
+    // A full page may end part way through a transaction, leave that one for the next page
+    private fun wholeTransactions(page: List<IndexerConsignmentEntity>): List<IndexerConsignmentEntity> {
+        if (page.size < batchSize) {
+            return page
+        }
+        val lastTxHash = page.last().l1TransactionHash
+        val trimmed = page.dropLastWhile { it.l1TransactionHash == lastTxHash }
+        if (trimmed.isEmpty()) {
+            log.warn("Transaction {} has more consignments than the batch size {}, reading a partial transaction", lastTxHash, batchSize)
+            return page
+        }
+        return trimmed
+    }
+
+    private fun indexerHasConsignment(consignmentId: String): Boolean {
         return try {
             restClient.get()
-                .uri("$followerBaseUrl/consignments?limit=$batchSize")
+                .uri("$followerBaseUrl/consignments/$consignmentId")
+                .retrieve()
+                .toBodilessEntity()
+            true
+        } catch (e: HttpClientErrorException.NotFound) {
+            false
+        } catch (e: Exception) {
+            // Keep the cursor when the indexer cannot tell, a real rollback is noticed next cycle
+            log.error("Failed to check cursor consignment {} at the indexer", consignmentId, e)
+            true
+        }
+    }
+
+    private fun fetchRollbacks(afterId: Long): List<IndexerRollback> {
+        return try {
+            restClient.get()
+                .uri("$followerBaseUrl/rollbacks?afterId=$afterId&limit=$batchSize")
+                .retrieve()
+                .body(Array<IndexerRollback>::class.java)
+                ?.toList() ?: emptyList()
+        } catch (e: Exception) {
+            // Applied next cycle; an indexer without the feed still has the cursor check
+            log.error("Failed to fetch rollbacks from indexer", e)
+            emptyList()
+        }
+    }
+
+    // 0 when the indexer has recorded no rollback yet, null when it cannot tell
+    private fun latestRollbackId(): Long? {
+        return try {
+            restClient.get()
+                .uri("$followerBaseUrl/rollbacks/latest")
+                .retrieve()
+                .body(IndexerRollback::class.java)
+                ?.id
+        } catch (e: HttpClientErrorException.NotFound) {
+            0L
+        } catch (e: Exception) {
+            log.error("Failed to fetch the latest rollback from indexer", e)
+            null
+        }
+    }
+
+    private fun fetchIndexedConsignments(cursor: ReaderCursorEntity?): List<IndexerConsignmentEntity> {
+        val cursorParams = cursor?.let { "&afterSlot=${it.absoluteSlot}&afterTxHash=${it.transactionHash}" } ?: ""
+        return try {
+            restClient.get()
+                .uri("$followerBaseUrl/consignments?limit=$batchSize$cursorParams")
                 .retrieve()
                 .body(Array<IndexerConsignmentEntity>::class.java)
                 ?.toList() ?: emptyList()
@@ -84,8 +374,24 @@ class ConsignmentBlockchainReaderService(
         }
     }
 
+    private fun fetchMetadata(transactionHashes: List<String>): Map<String, Result<Map<String, Any>?>> {
+        val futures = transactionHashes.associateWith { transactionHash ->
+            CompletableFuture.supplyAsync({
+                runCatching { txMetadataCache.getOrLoad(transactionHash, ::fetchMetadata) }
+            }, metadataFetchExecutor)
+        }
+        return futures.mapValues { (_, future) -> future.join() }
+    }
+
+    /**
+     * The label metadata of [transactionHash] as the indexer has it now, bypassing the metadata
+     * cache: the transaction may not be indexed yet or be rolled back since.
+     */
+    fun fetchLabelMetadata(transactionHash: String): Map<String, Any>? = fetchMetadata(transactionHash)
+
     private fun fetchMetadata(transactionHash: String): Map<String, Any>? {
-        return try {
+        val started = System.nanoTime()
+        try {
             val responseType = object : ParameterizedTypeReference<Array<Map<String, Any>>>() {}
             val response = restClient.get()
                 .uri("$indexerBaseUrl/txs/$transactionHash/metadata")
@@ -93,10 +399,12 @@ class ConsignmentBlockchainReaderService(
                 .body(responseType)
             log.debug("Fetch metadata response: {}", response)
             val metadata = response?.find { it["label"] == metadataLabel.toString() }
-            metadata?.get("json_metadata") as? Map<String, Any>
+            return metadata?.get("json_metadata") as? Map<String, Any>
         } catch (e: Exception) {
             log.error("Failed to fetch metadata for transactionHash: $transactionHash", e)
-            null
+            throw e
+        } finally {
+            metadataFetchTimer.record(System.nanoTime() - started, TimeUnit.NANOSECONDS)
         }
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,111 @@
+package tech.edgx.cms_demo_app.blockchain_reader.service
+
+import com.bloxbean.cardano.client.metadata.helper.MetadataToJsonNoSchemaConverter
+import com.fasterxml.jackson.databind.ObjectMapper
+import org.slf4j.LoggerFactory
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentMerkleProof
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.MerkleProofVerification
+import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+import tech.edgx.cms_demo_app.blockchain_publisher.service.AnchoredBatchStore
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.CompactConsignmentMetadata
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentMerkleTree
+
+/**
+ * Inclusion proofs of consignment versions published in anchored batches, built from the anchored
+ * batch store, and their verification against the Merkle root the indexer has on chain.
+ */
+@Service
+class ConsignmentMerkleProofService(
+    private val anchoredBatchStore: AnchoredBatchStore,
+    private val consignmentRepositoryGateway: ConsignmentEntityRepositoryGateway,
+    private val consignmentBlockchainReaderService: ConsignmentBlockchainReaderService,
+    private val objectMapper: ObjectMapper
+) {
+    private val log = LoggerFactory.getLogger(ConsignmentMerkleProofService::class.java)
+
+    /**
+     * The proof of [consignmentId] in the anchored batch of [txHash], by default the transaction
+     * the version was submitted in. Null when that is not an anchored batch holding the version
+     * or the leaf is missing from the store.
+     */
+    fun proof(consignmentId: String, txHash: String? = null): ConsignmentMerkleProof? {
+        val batchTxHash = txHash
+            ?: consignmentRepositoryGateway.findById(consignmentId)
+                .flatMap { consignment -> consignment.getL1SubmissionData().flatMap { it.transactionHash } }
+                .orElse(null)
+            ?: return null
+        val batch = anchoredBatchStore.findBatch(batchTxHash) ?: return null
+        val index = batch.leaves.indexOfFirst { it.consignmentId == consignmentId }
+        if (index < 0) {
+            return null
+        }
+        val leafHash = batch.leaves[index].leafHash
+        val leaf = anchoredBatchStore.getLeaf(leafHash) ?: run {
+            log.warn("Leaf {} of consignment {} is missing from the anchored batch store", leafHash, consignmentId)
+            return null
+        }
+        // Rebuilt per request, hashing a few thousand leaves costs less than keeping every tree around
+        val path = ConsignmentMerkleTree.proof(batch.leaves.map { CompactConsignmentMetadata.hexBytes(it.leafHash) }, index)
+        return ConsignmentMerkleProof(
+            consignmentId = consignmentId,
+            txHash = batch.txHash,
+            root = batch.root,
+            index = index.toLong(),
+            count = batch.leaves.size.toLong(),
+            leafHash = leafHash,
+            leaf = CompactConsignmentMetadata.idHex(leaf),
+            path = path.map(CompactConsignmentMetadata::idHex)
+        )
+    }
+
+    /**
+     * Checks that the leaf hashes to leafHash and holds consignmentId, that the path leads from it
+     * to a root, and that the transaction carries that root and leaf count under the label. Only
+     * what is on chain is trusted, the root in the proof is merely compared.
+     */
+    fun verify(proof: ConsignmentMerkleProof): MerkleProofVerification {
+        val computedRoot = try {
+            val leaf = CompactConsignmentMetadata.hexBytes(proof.leaf)
+            if (CompactConsignmentMetadata.idHex(ConsignmentMerkleTree.leafHash(leaf)) != proof.leafHash.lowercase()) {
+                return invalid("Leaf does not hash to leafHash")
+            }
+            if (leafConsignmentId(leaf) != proof.consignmentId.lowercase()) {
+                return invalid("Leaf is not consignment ${proof.consignmentId}")
+            }
+            ConsignmentMerkleTree.rootFromProof(ConsignmentMerkleTree.leafHash(leaf), proof.index, proof.count,
+                proof.path.map(CompactConsignmentMetadata::hexBytes))
+                ?.let(CompactConsignmentMetadata::idHex)
+                ?: return invalid("Path does not fit leaf ${proof.index} of ${proof.count}")
+        } catch (e: Exception) {
+            return invalid("Malformed proof: ${e.message}")
+        }
+
+        val metadata = try {
+            consignmentBlockchainReaderService.fetchLabelMetadata(proof.txHash)
+        } catch (e: Exception) {
+            return invalid("Could not fetch the metadata of ${proof.txHash}: ${e.message}", computedRoot)
+        }
+        if (metadata == null || !CompactConsignmentMetadata.isMerkleRoot(metadata)) {
+            return invalid("Transaction ${proof.txHash} carries no Merkle root", computedRoot)
+        }
+        val onChainRoot = CompactConsignmentMetadata.idHex(metadata["r"])
+        val onChainCount = (metadata["n"] as Number).toLong()
+        val reason = when {
+            onChainCount != proof.count -> "Proof is for ${proof.count} leaves, the batch on chain has $onChainCount"
+            onChainRoot != computedRoot -> "Path leads to $computedRoot, the root on chain is $onChainRoot"
+            proof.root.lowercase() != onChainRoot -> "Proof states root ${proof.root}, the root on chain is $onChainRoot"
+            else -> null
+        }
+        return MerkleProofVerification(reason == null, reason, computedRoot, onChainRoot, onChainCount)
+    }
+
+    private fun leafConsignmentId(leaf: ByteArray): String? {
+        val payload = objectMapper.readValue(MetadataToJsonNoSchemaConverter.cborBytesToJson(leaf), Map::class.java)
+        val item = (payload["d"] as? List<*>)?.singleOrNull() as? Map<*, *> ?: return null
+        return CompactConsignmentMetadata.idHex(item["i"])
+    }
+
+    private fun invalid(reason: String, computedRoot: String? = null) =
+        MerkleProofVerification(false, reason, computedRoot, null, null)
+}
@@ -8,6 +8,7 @@ import org.springframework.beans.factory.annotation.Value
 import org.springframework.stereotype.Service
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.CompactConsignmentMetadata
 import java.time.LocalDateTime
 import java.time.format.DateTimeFormatter
 
@@ -18,7 +19,36 @@ class ConsignmentMetadataDeserialiserService(
 ) {
     private val log = LoggerFactory.getLogger(ConsignmentMetadataDeserialiserService::class.java)
 
-    fun decodeConsignments(payload: Map<String, Any>, txHash: String, slot: Long): Set<ConsignmentEntity> {
+    companion object {
+        private const val MAX_DELTA_DEPTH = 64
+    }
+
+    /** True for consignment metadata in either schema, "1.0" or the compact schema 2. */
+    fun isConsignmentMetadata(payload: Map<String, Any>): Boolean {
+        if (CompactConsignmentMetadata.isCompact(payload)) {
+            return (payload["t"] as? Number)?.toInt() == CompactConsignmentMetadata.TYPE_CONSIGNMENTS
+        }
+        return payload["type"] == "CONSIGNMENTS"
+    }
+
+    /**
+     * Decodes every consignment in a transaction's metadata, written in schema "1.0" or 2. The version of each consignment is the
+     * latest stored version of its idControl plus one; [latestVersions] carries versions decoded
+     * earlier in the same read cycle, which are not stored yet. Items in [skipIds] are stored
+     * already and are neither versioned nor returned. Delta items are rebuilt from the metadata of
+     * the transactions they build on, looked up through [baseMetadata].
+     */
+    fun decodeConsignments(
+        payload: Map<String, Any>,
+        txHash: String,
+        slot: Long,
+        latestVersions: MutableMap<String, Long> = HashMap(),
+        skipIds: Set<String> = emptySet(),
+        baseMetadata: (String) -> Map<String, Any>? = { null }
+    ): Set<ConsignmentEntity> {
+        if (CompactConsignmentMetadata.isCompact(payload)) {
+            return decodeCompactConsignments(payload, txHash, slot, latestVersions, skipIds, baseMetadata)
+        }
         val consignments = mutableSetOf<ConsignmentEntity>()
         val orgMap = payload["org"] as? Map<String, Any>
             ?: throw IllegalArgumentException("Missing 'org' in metadata")
@@ -41,21 +71,162 @@ class ConsignmentMetadataDeserialiserService(
             val id = consignmentMap["id"] as? String
                 ?: throw IllegalArgumentException("Missing 'id' in consignment")
             log.debug("Consignment id: {}, txhash: {}, creation slot: {}", id, txHash, creationSlot)
-            val consignment = deserialiseConsignment(consignmentMap, orgId, txHash, slot, creationSlot, orgMap)
-            consignments.add(consignment)
+            if (id in skipIds) {
+                continue
+            }
+            val published = deserialiseConsignment(consignmentMap, orgId, orgMap)
+            consignments.add(versioned(id, published, txHash, slot, creationSlot, latestVersions))
+        }
+
+        return consignments
+    }
+
+    private fun decodeCompactConsignments(
+        payload: Map<String, Any>,
+        txHash: String,
+        slot: Long,
+        latestVersions: MutableMap<String, Long>,
+        skipIds: Set<String>,
+        baseMetadata: (String) -> Map<String, Any>?
+    ): Set<ConsignmentEntity> {
+        if ((payload["t"] as? Number)?.toInt() != CompactConsignmentMetadata.TYPE_CONSIGNMENTS) {
+            log.warn("Skipping non-consignment metadata: type code={}", payload["t"])
+            return emptySet()
         }
+        val dataList = payload["d"] as? List<Map<String, Any>>
+            ?: throw IllegalArgumentException("Missing 'd' in metadata")
+        val creationSlot = (payload["c"] as? Number)?.toLong()
+            ?: throw IllegalArgumentException("Missing 'c' in metadata")
 
+        val consignments = mutableSetOf<ConsignmentEntity>()
+        for (consignmentMap in dataList) {
+            val published = compactConsignment(payload, consignmentMap, baseMetadata, 0)
+            val id = if (CompactConsignmentMetadata.isDelta(consignmentMap)) {
+                val ver = (consignmentMap["n"] as? Number)?.toLong()
+                    ?: throw IllegalArgumentException("Missing 'n' in delta consignment")
+                ConsignmentEntity.Companion.id(published.sender.id, published.receiver.id, published.dispatchedAt, ver).also {
+                    if (!it.startsWith(published.id)) {
+                        log.error("Delta id prefix (${published.id}) does not match rebuilt consignmentId ($it)")
+                        throw IllegalStateException("Consignment ID mismatch detected")
+                    }
+                }
+            } else {
+                published.id
+            }
+            log.debug("Consignment id: {}, txhash: {}, creation slot: {}", id, txHash, creationSlot)
+            if (id in skipIds) {
+                continue
+            }
+            consignments.add(versioned(id, published, txHash, slot, creationSlot, latestVersions))
+        }
         return consignments
     }
 
+    /**
+     * The consignment as [item] of the schema 2 [payload] publishes it, a delta item applied to its
+     * previous version, which is rebuilt the same way from the transaction it was published in.
+     */
+    private fun compactConsignment(
+        payload: Map<String, Any>,
+        item: Map<String, Any>,
+        baseMetadata: (String) -> Map<String, Any>?,
+        depth: Int
+    ): PublishedConsignment {
+        val goods = (item["g"] as? Map<String, Any>)?.let(::goods)
+        val trackingStatus = CompactConsignmentMetadata.trackingStatus(item["k"])
+        val latitude = (item["y"] as? Number)?.let(CompactConsignmentMetadata::degrees)
+        val longitude = (item["x"] as? Number)?.let(CompactConsignmentMetadata::degrees)
+        if (CompactConsignmentMetadata.isDelta(item)) {
+            val baseTxHashes = payload["h"] as? List<Any>
+                ?: throw IllegalArgumentException("Missing 'h' in metadata with delta consignments")
+            val baseTxHash = (item["p"] as? Number)?.toInt()?.let(baseTxHashes::getOrNull)?.let(CompactConsignmentMetadata::idHex)
+                ?: throw IllegalArgumentException("Invalid base transaction index: ${item["p"]}")
+            val base = publishedConsignment(baseTxHash, CompactConsignmentMetadata.idHex(item["b"]), baseMetadata, depth + 1)
+            return base.copy(
+                id = CompactConsignmentMetadata.idHex(item["i"]),
+                goods = goods ?: base.goods,
+                trackingStatus = trackingStatus ?: base.trackingStatus,
+                latitude = latitude ?: base.latitude,
+                longitude = longitude ?: base.longitude
+            )
+        }
+        val organisations = (payload["o"] as? List<Map<String, Any>>)?.map(::compactOrganisation)
+            ?: throw IllegalArgumentException("Missing 'o' in metadata")
+        val epochMillis = (payload["e"] as? Number)?.toLong()?.times(1000)
+            ?: throw IllegalArgumentException("Missing 'e' in metadata")
+        fun organisation(index: Any?): Organisation {
+            val i = (index as? Number)?.toInt() ?: throw IllegalArgumentException("Invalid organisation index: $index")
+            return organisations.getOrNull(i) ?: throw IllegalArgumentException("Organisation index $i out of range")
+        }
+        return PublishedConsignment(
+            id = CompactConsignmentMetadata.idHex(item["i"]),
+            goods = goods ?: throw IllegalArgumentException("Missing 'g' in consignment"),
+            sender = organisation(item["s"] ?: 0),
+            receiver = organisation(item["r"]),
+            trackingStatus = trackingStatus,
+            latitude = latitude,
+            longitude = longitude,
+            dispatchedAt = (item["t"] as? Number)?.let { CompactConsignmentMetadata.dateTime(epochMillis + it.toLong()) }
+                ?: throw IllegalArgumentException("Missing 't' in consignment")
+        )
+    }
+
+    /** The consignment version published in [txHash] whose id starts with [idPrefix], in either schema. */
+    private fun publishedConsignment(
+        txHash: String,
+        idPrefix: String,
+        baseMetadata: (String) -> Map<String, Any>?,
+        depth: Int
+    ): PublishedConsignment {
+        // Publishers write a full item every checkpoint_interval versions, a longer chain is not theirs
+        check(depth <= MAX_DELTA_DEPTH) { "Delta chain longer than $MAX_DELTA_DEPTH at transaction $txHash" }
+        val payload = baseMetadata(txHash)
+            ?: throw IllegalStateException("No consignment metadata for base transaction $txHash")
+        if (CompactConsignmentMetadata.isCompact(payload)) {
+            val item = single(txHash, idPrefix, (payload["d"] as? List<Map<String, Any>>).orEmpty()) {
+                CompactConsignmentMetadata.idHex(it["i"])
+            }
+            return compactConsignment(payload, item, baseMetadata, depth)
+        }
+        val orgMap = payload["org"] as? Map<String, Any>
+            ?: throw IllegalArgumentException("Missing 'org' in metadata")
+        val orgId = orgMap["id"] as? String
+            ?: throw IllegalArgumentException("Missing 'org.id' in metadata")
+        val item = single(txHash, idPrefix, (payload["data"] as? List<Map<String, Any>>).orEmpty()) { it["id"] as? String ?: "" }
+        return deserialiseConsignment(item, orgId, orgMap)
+    }
+
+    private fun single(txHash: String, idPrefix: String, items: List<Map<String, Any>>, id: (Map<String, Any>) -> String): Map<String, Any> {
+        val matches = items.filter { id(it).startsWith(idPrefix) }
+        return matches.singleOrNull()
+            ?: throw IllegalStateException("${matches.size} consignments with id prefix $idPrefix in base transaction $txHash")
+    }
+
+    private fun goods(goodsMap: Map<String, Any>): Map<String, Int> = goodsMap.mapValues { (key, value) ->
+        (value as? Number)?.toInt() ?: throw IllegalArgumentException("Unsupported goods value type for key $key: ${value.javaClass}")
+    }
+
+    private fun compactOrganisation(orgMap: Map<String, Any>): Organisation = Organisation().apply {
+        id = orgMap["i"] as? String ?: throw IllegalArgumentException("Missing organisation 'i' in metadata")
+        name = (orgMap["n"] as? String) ?: ""
+        taxIdNumber = (orgMap["t"] as? String) ?: ""
+        currencyId = (orgMap["c"] as? String) ?: ""
+        countryCode = (orgMap["k"] as? String) ?: ""
+    }
+
+    private fun copyOf(org: Organisation): Organisation = Organisation().apply {
+        id = org.id
+        name = org.name
+        taxIdNumber = org.taxIdNumber
+        currencyId = org.currencyId
+        countryCode = org.countryCode
+    }
+
     private fun deserialiseConsignment(
         consignmentMap: Map<String, Any>,
         orgId: String,
-        txHash: String,
-        absoluteSlot: Long,
-        creationSlot: Long,
         orgMap: Map<String, Any>
-    ): ConsignmentEntity {
+    ): PublishedConsignment {
         val id = consignmentMap["id"] as? String
             ?: throw IllegalArgumentException("Missing 'id' in consignment")
         val goodsMap = consignmentMap["goods"] as? Map<String, Any>
@@ -108,24 +279,41 @@ class ConsignmentMetadataDeserialiserService(
             currencyId = (receiverMap["currency_id"] as? String) ?: ""
         }
 
+        return PublishedConsignment(id, goods, sender, receiver, trackingStatus, latitude, longitude, dispatchedAt)
+    }
+
+    /** The entity at the next version of its idControl, checked against the id published on chain. */
+    private fun versioned(
+        id: String,
+        published: PublishedConsignment,
+        txHash: String,
+        absoluteSlot: Long,
+        creationSlot: Long,
+        latestVersions: MutableMap<String, Long>
+    ): ConsignmentEntity {
+        val sender = published.sender
+        val receiver = published.receiver
+        val dispatchedAt = published.dispatchedAt
         val idControl = ConsignmentEntity.Companion.idControl(sender.id, receiver.id, dispatchedAt)
-        val latestConsignment = consignmentRepository.findLatestByIdControl(idControl)
-        val ver = latestConsignment?.let { it.ver + 1 } ?: 1L
+        val latestVer = latestVersions[idControl] ?: consignmentRepository.findLatestByIdControl(idControl)?.ver ?: 0L
+        val ver = latestVer + 1
         val consignmentId = ConsignmentEntity.Companion.id(sender.id, receiver.id, dispatchedAt, ver)
-        log.debug("idControl: {}, latestConsignment: {}, next ver: {}, computedId: {}, onchain Id: {}", idControl, latestConsignment, ver, consignmentId, id)
+        log.debug("idControl: {}, latest ver: {}, next ver: {}, computedId: {}, onchain Id: {}", idControl, latestVer, ver, consignmentId, id)
 
         if (id != consignmentId) {
             log.error("Metadata id ($id) does not match computed consignmentId ($consignmentId) for idControl: $idControl")
             throw IllegalStateException("Consignment ID mismatch detected")
         }
+        latestVersions[idControl] = ver
 
         return ConsignmentEntity(
             consignmentId = consignmentId,
             idControl = idControl,
             ver = ver,
-            goods = goods,
-            sender = sender,
-            receiver = receiver,
+            goods = published.goods,
+            // Fresh copies, entities must not share their embedded organisations
+            sender = copyOf(sender),
+            receiver = copyOf(receiver),
             l1SubmissionData = L1SubmissionData.builder()
                 .transactionHash(txHash)
                 .absoluteSlot(absoluteSlot)
@@ -133,10 +321,22 @@ class ConsignmentMetadataDeserialiserService(
                 .publishStatus(BlockchainPublishStatus.SUBMITTED)
                 .finalityScore(null)
                 .build(),
-            trackingStatus = trackingStatus,
-            latitude = latitude,
-            longitude = longitude,
+            trackingStatus = published.trackingStatus,
+            latitude = published.latitude,
+            longitude = published.longitude,
             dispatchedAt = dispatchedAt
         )
     }
+
+    /** A consignment version as its metadata item publishes it; id is only a prefix for delta items. */
+    private data class PublishedConsignment(
+        val id: String,
+        val goods: Map<String, Int>,
+        val sender: Organisation,
+        val receiver: Organisation,
+        val trackingStatus: String?,
+        val latitude: Double?,
+        val longitude: Double?,
+        val dispatchedAt: LocalDateTime
+    )
 }
\ No newline at end of file
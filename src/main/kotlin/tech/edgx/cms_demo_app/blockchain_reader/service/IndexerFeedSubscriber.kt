@@ -0,0 +1,163 @@
+package tech.edgx.cms_demo_app.blockchain_reader.service
+
+import io.micrometer.core.instrument.MeterRegistry
+import io.micrometer.core.instrument.Timer
+import jakarta.annotation.PostConstruct
+import jakarta.annotation.PreDestroy
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.scheduling.annotation.Scheduled
+import org.springframework.scheduling.concurrent.CustomizableThreadFactory
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.blockchain_reader.service.ConsignmentBlockchainReaderService.CycleResult
+import tech.edgx.cms_demo_app.util.JobProfiler
+import java.net.URI
+import java.net.http.HttpClient
+import java.net.http.HttpRequest
+import java.net.http.HttpResponse
+import java.time.Duration
+import java.util.concurrent.Executors
+import java.util.concurrent.ScheduledExecutorService
+import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicBoolean
+import java.util.function.Supplier
+import java.util.stream.Stream
+
+/**
+ * Runs the reader cycle whenever the indexer's consignment feed (GET consignments/stream) reports
+ * a stored transaction or a rollback, so new consignments are ingested within a second of being
+ * indexed. The feed only wakes the reader up, which still reads from its persisted cursor; while
+ * the feed is down, or with feed.enabled=false, the reader polls every rate.ms as before, and
+ * every feed.idle_poll while it is up in case an event was missed. A cycle reads one page, so
+ * one that ends behind the indexer (a first start, a restart after downtime) is followed straight
+ * away by the next, and one that stopped at a transaction it could not read is retried every
+ * rate.ms. Cycles run one at a time and events arriving during one coalesce into the next.
+ */
+@Service
+class IndexerFeedSubscriber(
+    private val consignmentBlockchainReaderService: ConsignmentBlockchainReaderService,
+    meterRegistry: MeterRegistry,
+    private val jobProfiler: JobProfiler,
+    @Value("\${lob.blockchain_reader.lob_follower_base_url:http://localhost:9090/api/v1/}") private val followerBaseUrl: String,
+    @Value("\${lob.blockchain_reader.feed.enabled:true}") private val enabled: Boolean,
+    @Value("\${lob.blockchain_reader.feed.reconnect_delay:PT5S}") private val reconnectDelay: Duration,
+    @Value("\${lob.blockchain_reader.feed.debounce:PT0.2S}") private val debounce: Duration,
+    @Value("\${lob.blockchain_reader.feed.idle_poll:PT10M}") private val idlePoll: Duration
+) {
+    private val log = LoggerFactory.getLogger(this::class.java)
+
+    private val readerExecutor: ScheduledExecutorService =
+        Executors.newSingleThreadScheduledExecutor(CustomizableThreadFactory("consignment-reader-"))
+    private val httpClient = HttpClient.newBuilder().connectTimeout(Duration.ofSeconds(5)).build()
+    private val cycleTimer = Timer.builder("cms.reader.cycle.duration")
+        .description("One reader cycle, including its database commit")
+        .register(meterRegistry)
+    private val cycleRequested = AtomicBoolean(false)
+    private val running = AtomicBoolean(false)
+    @Volatile
+    private var connected = false
+    @Volatile
+    private var lines: Stream<String>? = null
+    @Volatile
+    private var lastCycleNanos = 0L
+    // The last cycle stopped short or failed, polling retries it even while the feed is connected
+    @Volatile
+    private var retryDue = false
+
+    @PostConstruct
+    fun init() {
+        if (!enabled) {
+            log.info("Indexer feed disabled, the reader polls every cycle.")
+            return
+        }
+        running.set(true)
+        Thread(::subscribe, "consignment-feed").apply { isDaemon = true }.start()
+    }
+
+    @PreDestroy
+    fun shutdown() {
+        running.set(false)
+        lines?.close()
+        readerExecutor.shutdownNow()
+    }
+
+    @Scheduled(fixedRateString = "\${lob.blockchain_reader.rate.ms:60000}")
+    fun poll() {
+        if (connected && !retryDue && System.nanoTime() - lastCycleNanos < idlePoll.toNanos()) {
+            log.debug("Indexer feed connected, skipping the polling cycle")
+            return
+        }
+        requestCycle(Duration.ZERO)
+    }
+
+    private fun requestCycle(delay: Duration) {
+        if (!cycleRequested.compareAndSet(false, true)) {
+            return
+        }
+        readerExecutor.schedule({
+            // Cleared first, so an event arriving during the cycle requests another one
+            cycleRequested.set(false)
+            lastCycleNanos = System.nanoTime()
+            val result = try {
+                cycleTimer.record(Supplier {
+                    jobProfiler.span("reader.cycle") { consignmentBlockchainReaderService.processNewConsignments() }
+                })
+            } catch (e: Exception) {
+                log.error("Consignment reader cycle failed", e)
+                null
+            }
+            retryDue = result == null || result == CycleResult.STOPPED
+            if (result == CycleResult.BEHIND) {
+                // More than a page is waiting, drain it rather than wait for the next event
+                requestCycle(Duration.ZERO)
+            }
+        }, delay.toMillis(), TimeUnit.MILLISECONDS)
+    }
+
+    private fun subscribe() {
+        val request = HttpRequest.newBuilder(URI.create("${followerBaseUrl.trimEnd('/')}/consignments/stream"))
+            .header("Accept", "text/event-stream")
+            .GET()
+            .build()
+        while (running.get()) {
+            try {
+                val response = httpClient.send(request, HttpResponse.BodyHandlers.ofLines())
+                if (response.statusCode() != 200) {
+                    response.body().close()
+                    throw IllegalStateException("status ${response.statusCode()}")
+                }
+                response.body().use { body ->
+                    lines = body
+                    connected = true
+                    log.info("Subscribed to the indexer consignment feed at {}", request.uri())
+                    // Whatever was indexed while disconnected
+                    requestCycle(Duration.ZERO)
+                    var data = false
+                    for (line in body.iterator()) {
+                        when {
+                            line.startsWith("data:") -> data = true
+                            line.isEmpty() && data -> {
+                                data = false
+                                requestCycle(debounce)
+                            }
+                        }
+                    }
+                }
+            } catch (e: Exception) {
+                if (running.get()) {
+                    log.warn("Indexer consignment feed failed: {}, polling until it reconnects", e.message)
+                }
+            } finally {
+                connected = false
+                lines = null
+            }
+            if (running.get()) {
+                try {
+                    Thread.sleep(reconnectDelay.toMillis())
+                } catch (e: InterruptedException) {
+                    return
+                }
+            }
+        }
+    }
+}
@@ -0,0 +1,126 @@
+package tech.edgx.cms_demo_app.blockchain_reader.service
+
+import com.fasterxml.jackson.annotation.JsonIgnoreProperties
+import com.fasterxml.jackson.databind.ObjectMapper
+import io.micrometer.core.instrument.Counter
+import io.micrometer.core.instrument.MeterRegistry
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.stereotype.Service
+import tech.edgx.cms_demo_app.util.LruTtlCache
+import java.io.IOException
+import java.nio.file.Files
+import java.nio.file.Path
+import java.nio.file.StandardCopyOption
+import java.time.Clock
+import java.time.Duration
+
+/**
+ * The reader's label metadata by tx hash, in an in-memory LRU of max_entries backed by one JSON
+ * file per transaction under dir (<dir>/<first two hex>/<tx hash>.json, the format
+ * scripts/metadata_cache.py reads). A transaction's metadata cannot change, so entries only leave
+ * by LRU or when a rollback removes their transaction; a transaction without metadata under the
+ * label is cached as such. An empty dir keeps the cache in memory only. Disk errors are logged
+ * and the metadata is fetched as if uncached.
+ */
+@Service
+class TxMetadataCache(
+    private val objectMapper: ObjectMapper,
+    clock: Clock,
+    meterRegistry: MeterRegistry,
+    @Value("\${lob.l1.transaction.metadata_label:1448}") private val metadataLabel: Int,
+    @Value("\${lob.blockchain_reader.metadata_cache.max_entries:10000}") maxEntries: Int,
+    @Value("\${lob.blockchain_reader.metadata_cache.dir:}") dir: String
+) {
+    private val log = LoggerFactory.getLogger(TxMetadataCache::class.java)
+
+    companion object {
+        // Entries are immutable, the TTL only has to outlive the process
+        private val NEVER_EXPIRES = Duration.ofDays(36500)
+        private val TX_HASH = Regex("[0-9a-f]{64}")
+    }
+
+    @JsonIgnoreProperties(ignoreUnknown = true)
+    data class Entry(val txHash: String, val label: Int, val metadata: Map<String, Any>?)
+
+    private val memory = LruTtlCache<String, Entry>(maxEntries, NEVER_EXPIRES, clock)
+    private val directory: Path? = dir.takeIf { it.isNotBlank() }?.let { Path.of(it) }
+    private val memoryHits = lookupCounter(meterRegistry, "memory")
+    private val diskHits = lookupCounter(meterRegistry, "disk")
+    private val misses = lookupCounter(meterRegistry, "miss")
+    private val evictedCounter = meterRegistry.counter("cms.reader.metadata.cache.evicted")
+
+    init {
+        log.info("Tx metadata cache: {} entries in memory, {}", maxEntries, directory?.let { "on disk at ${it.toAbsolutePath()}" } ?: "not on disk")
+    }
+
+    /** The cached metadata of the transaction, or loads it and caches it unless the loader throws. */
+    fun getOrLoad(txHash: String, loader: (String) -> Map<String, Any>?): Map<String, Any>? {
+        val (entry, fromMemory) = memory.getOrLoad(txHash) { key ->
+            read(key)?.also { diskHits.increment() }
+                ?: Entry(key, metadataLabel, loader(key)).also {
+                    misses.increment()
+                    write(it)
+                }
+        }
+        if (fromMemory) {
+            memoryHits.increment()
+        }
+        return entry?.metadata
+    }
+
+    fun evict(txHashes: Collection<String>) {
+        if (txHashes.isEmpty()) {
+            return
+        }
+        txHashes.forEach { txHash ->
+            memory.invalidate(txHash)
+            path(txHash)?.let { path ->
+                try {
+                    Files.deleteIfExists(path)
+                } catch (e: IOException) {
+                    log.warn("Failed to evict cached metadata of rolled back transaction {}: {}", txHash, e.message)
+                }
+            }
+        }
+        evictedCounter.increment(txHashes.size.toDouble())
+        log.info("Evicted the cached metadata of {} rolled back transactions", txHashes.size)
+    }
+
+    private fun read(txHash: String): Entry? {
+        val path = path(txHash)?.takeIf { Files.exists(it) } ?: return null
+        return try {
+            objectMapper.readValue(path.toFile(), Entry::class.java)
+                .takeIf { it.txHash == txHash && it.label == metadataLabel }
+        } catch (e: IOException) {
+            log.warn("Ignoring unreadable cached metadata {}: {}", path, e.message)
+            null
+        }
+    }
+
+    private fun write(entry: Entry) {
+        val path = path(entry.txHash) ?: return
+        try {
+            Files.createDirectories(path.parent)
+            // Renamed into place, a reader never sees a partly written file
+            val tmp = Files.createTempFile(path.parent, entry.txHash, ".tmp")
+            objectMapper.writeValue(tmp.toFile(), entry)
+            Files.move(tmp, path, StandardCopyOption.ATOMIC_MOVE, StandardCopyOption.REPLACE_EXISTING)
+        } catch (e: IOException) {
+            log.warn("Failed to cache metadata of transaction {} on disk: {}", entry.txHash, e.message)
+        }
+    }
+
+    private fun path(txHash: String): Path? {
+        if (directory == null || !TX_HASH.matches(txHash)) {
+            return null
+        }
+        return directory.resolve(txHash.substring(0, 2)).resolve("$txHash.json")
+    }
+
+    private fun lookupCounter(meterRegistry: MeterRegistry, result: String): Counter =
+        Counter.builder("cms.reader.metadata.cache")
+            .description("Transaction metadata lookups of the reader, by where they were answered")
+            .tag("result", result)
+            .register(meterRegistry)
+}
@@ -1,7 +1,10 @@
 package tech.edgx.cms_demo_app.blockchain_reader.service
 
+import io.micrometer.core.instrument.MeterRegistry
+import io.micrometer.core.instrument.Timer
 import io.vavr.control.Either
 import jakarta.annotation.PostConstruct
+import jakarta.annotation.PreDestroy
 import org.cardanofoundation.lob.app.blockchain_common.domain.ChainTip
 import org.cardanofoundation.lob.app.blockchain_common.domain.FinalityScore
 import org.cardanofoundation.lob.app.blockchain_common.domain.OnChainTxDetails
@@ -13,70 +16,232 @@ import org.cardanofoundation.lob.app.blockchain_reader.BlockchainReaderPublicApi
 import org.slf4j.LoggerFactory
 import org.springframework.beans.factory.annotation.Value
 import org.springframework.data.domain.Limit
+import org.springframework.scheduling.concurrent.CustomizableThreadFactory
 import org.springframework.stereotype.Service
 import org.springframework.transaction.annotation.Transactional
 import org.zalando.problem.Problem
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+import tech.edgx.cms_demo_app.blockchain_publisher.service.AnchoredBatchStore
 import tech.edgx.cms_demo_app.blockchain_publisher.service.event_publish.ConsignmentLedgerUpdatedEventPublisher
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ChainingUtxoSupplier
+import java.io.IOException
+import java.time.Duration
 import java.util.Optional
+import java.util.concurrent.CompletableFuture
+import java.util.concurrent.ConcurrentHashMap
+import java.util.concurrent.ExecutorService
+import java.util.concurrent.Executors
 
 @Service("cms_demo_app.watchDogService")
 class WatchDogService(
     private val blockchainPublishStatusMapper: BlockchainPublishStatusMapper,
     private val blockchainReaderPublicApi: BlockchainReaderPublicApiIF,
     private val consignmentEntityRepositoryGateway: ConsignmentEntityRepositoryGateway,
-    private val ledgerUpdatedEventPublisher: ConsignmentLedgerUpdatedEventPublisher
+    private val ledgerUpdatedEventPublisher: ConsignmentLedgerUpdatedEventPublisher,
+    private val chainingUtxoSupplier: ChainingUtxoSupplier,
+    private val anchoredBatchStore: AnchoredBatchStore,
+    private val meterRegistry: MeterRegistry,
+    @Value("\${lob.blockchain_publisher.watchdog.lookup_parallelism:8}") lookupParallelism: Int
 ) {
     private val log = LoggerFactory.getLogger(WatchDogService::class.java)
 
+    companion object {
+        // Transactions remembered by checkedAtTipSlot, beyond that it starts over
+        private const val MAX_CHECKED_TRANSACTIONS = 100_000
+    }
+
     @Value("\${lob.blockchain_publisher.watchdog.rollback.grace.period.minutes:15}")
     private val rollbackGracePeriodMinutes = 15
 
+    private class TransactionConsignments(val txHash: String, val creationSlot: Long, val consignments: List<ConsignmentEntity>)
+
+    private val lookupExecutor: ExecutorService =
+        Executors.newFixedThreadPool(lookupParallelism, CustomizableThreadFactory("watchdog-lookup-"))
+    // The tip slot each transaction was last looked up at: with no new block its status cannot have changed
+    private val checkedAtTipSlot = ConcurrentHashMap<String, Long>()
+
     @PostConstruct
     fun init() {
         log.info("ConsignmentWatchDogService configuration: rollbackGracePeriodMinutes={}", rollbackGracePeriodMinutes)
         log.info("ConsignmentWatchDogService started")
     }
 
+    @PreDestroy
+    fun shutdown() {
+        lookupExecutor.shutdownNow()
+    }
+
     @Transactional
     fun checkConsignmentStatusForOrganisations(txStatusInspectionLimitPerOrgPullSize: Int) {
-        val chainTip: ChainTip = this.chainTip
+        val chainTip: ChainTip = fetchChainTip()
         if (!chainTip.isSynced()) {
             log.info("Chain is not synced, skipping consignment status check")
             return
         }
 
-        val successfullyUpdatedConsignmentEntities =
+        val notFinalizedConsignments =
             consignmentEntityRepositoryGateway.findAllDispatchedConsignmentsThatAreNotFinalizedYet(
                 Limit.of(txStatusInspectionLimitPerOrgPullSize)
             )
+        val updatedConsignments = updateOnChainStatuses(notFinalizedConsignments, chainTip)
+        if (updatedConsignments.isEmpty()) {
+            log.debug("No status change for {} consignments", notFinalizedConsignments.size)
+            return
+        }
 
-        successfullyUpdatedConsignmentEntities.forEach { consignment ->
-            log.debug("Checking consignment status for consignment: {}", consignment.consignmentId)
-            val l1SubmissionData = consignment.getL1SubmissionData()
-                .orElseThrow { RuntimeException("Failed to get L1 submission data") }
-            consignment.setL1SubmissionData(
-                Optional.of(
-                    updateL1SubmissionData(
-                        l1SubmissionData,
-                        chainTip
-                    )
-                )
-            )
+        consignmentEntityRepositoryGateway.storeConsignments(updatedConsignments)
+
+        log.info("Status updated for {} of {} consignments", updatedConsignments.size, notFinalizedConsignments.size)
+
+        publishLedgerUpdatedEvents(updatedConsignments)
+    }
+
+    /**
+     * Confirmation tracking for pipelined submission: moves SUBMITTED consignments on as soon as their
+     * transaction shows up. Runs more often than the finality check, which takes over once a
+     * transaction is visible on chain.
+     */
+    @Transactional
+    fun trackSubmittedTransactions(txStatusInspectionLimit: Int) {
+        val chainTip: ChainTip = fetchChainTip()
+        if (!chainTip.isSynced()) {
+            log.info("Chain is not synced, skipping submitted transaction tracking")
+            return
         }
 
-        consignmentEntityRepositoryGateway.storeConsignments(successfullyUpdatedConsignmentEntities)
+        val submittedConsignments = consignmentEntityRepositoryGateway.findAllSubmittedConsignments(Limit.of(txStatusInspectionLimit))
+        val updatedConsignments = updateOnChainStatuses(submittedConsignments, chainTip)
+        if (updatedConsignments.isEmpty()) {
+            log.debug("No status change for {} submitted consignments", submittedConsignments.size)
+            return
+        }
+        consignmentEntityRepositoryGateway.storeConsignments(updatedConsignments)
+
+        log.info("Submitted consignments checked: {}, moved on: {}", submittedConsignments.size, updatedConsignments.size)
 
-        log.info("Status updated for {} consignments", successfullyUpdatedConsignmentEntities.size)
+        publishLedgerUpdatedEvents(updatedConsignments)
+    }
 
+    /**
+     * Applies the on-chain status of each transaction to all of its consignments against the one
+     * chain tip of the pass, looking each transaction up once, concurrently, and only if the tip
+     * moved since it was last looked up. Returns the consignments whose status or finality changed.
+     */
+    private fun updateOnChainStatuses(consignments: Set<ConsignmentEntity>, chainTip: ChainTip): Set<ConsignmentEntity> {
+        val transactions = groupByTransaction(consignments)
+        val (unchanged, toLookUp) = transactions.partition { checkedAtTipSlot[it.txHash] == chainTip.absoluteSlot }
+        val txDetails = lookUpTxDetails(toLookUp.map { it.txHash })
+        if (checkedAtTipSlot.size > MAX_CHECKED_TRANSACTIONS) {
+            checkedAtTipSlot.clear()
+        }
+
+        val updatedConsignments = mutableSetOf<ConsignmentEntity>()
+        for (transaction in toLookUp) {
+            val onChainTxDetails = txDetails[transaction.txHash] ?: continue
+            val onChainStatus = getOnChainStatus(onChainTxDetails, transaction.creationSlot, chainTip)
+            val status = onChainStatus.status()
+            if (status == BlockchainPublishStatus.FINALIZED || status == BlockchainPublishStatus.ROLLBACKED) {
+                checkedAtTipSlot.remove(transaction.txHash)
+            } else {
+                checkedAtTipSlot[transaction.txHash] = chainTip.absoluteSlot
+            }
+            val wasSubmitted = transaction.consignments.first().getL1SubmissionData()
+                .flatMap { it.publishStatus }.orElse(null) == BlockchainPublishStatus.SUBMITTED
+            if (wasSubmitted && status != BlockchainPublishStatus.SUBMITTED) {
+                recordConfirmDuration(chainTip.absoluteSlot - transaction.creationSlot, status)
+            }
+            releasePendingTx(transaction.txHash, status)
+            transaction.consignments.forEach { consignment ->
+                val l1SubmissionData = consignment.getL1SubmissionData().get()
+                val before = l1SubmissionData.publishStatus to l1SubmissionData.finalityScore
+                consignment.setL1SubmissionData(Optional.of(applyOnChainStatus(l1SubmissionData, onChainStatus)))
+                if (before != (l1SubmissionData.publishStatus to l1SubmissionData.finalityScore)) {
+                    updatedConsignments.add(consignment)
+                }
+            }
+        }
+
+        meterRegistry.counter("cms.publisher.watchdog.transactions", "outcome", "skipped").increment(unchanged.size.toDouble())
+        log.debug("Watchdog pass at slot {}: {} transactions, {} looked up, {} skipped with the tip unchanged, {} lookups failed",
+            chainTip.absoluteSlot, transactions.size, toLookUp.size, unchanged.size, toLookUp.size - txDetails.size)
+        return updatedConsignments
+    }
+
+    private fun groupByTransaction(consignments: Set<ConsignmentEntity>): List<TransactionConsignments> {
+        return consignments
+            .groupBy { consignment -> consignment.getL1SubmissionData().flatMap { it.transactionHash }.orElse(null) }
+            .mapNotNull { (txHash, txConsignments) ->
+                if (txHash == null) {
+                    return@mapNotNull null
+                }
+                val creationSlot = txConsignments.first().getL1SubmissionData().flatMap { it.creationSlot }.orElse(null)
+                if (creationSlot == null) {
+                    log.warn("Skipping transaction {}, its consignments have no creation slot", txHash)
+                    return@mapNotNull null
+                }
+                TransactionConsignments(txHash, creationSlot, txConsignments)
+            }
+    }
+
+    // A failed lookup leaves that transaction to the next pass rather than failing the others
+    private fun lookUpTxDetails(txHashes: List<String>): Map<String, Optional<OnChainTxDetails>> {
+        val futures = txHashes.associateWith { txHash ->
+            CompletableFuture.supplyAsync({ runCatching { getOnChainTxDetails(txHash) } }, lookupExecutor)
+        }
+        val txDetails = HashMap<String, Optional<OnChainTxDetails>>()
+        futures.forEach { (txHash, future) ->
+            val details = future.join().getOrNull()
+            details?.let { txDetails[txHash] = it }
+            val outcome = when {
+                details == null -> "failed"
+                details.isPresent -> "found"
+                else -> "missing"
+            }
+            meterRegistry.counter("cms.publisher.watchdog.transactions", "outcome", outcome).increment()
+        }
+        return txDetails
+    }
+
+    private fun publishLedgerUpdatedEvents(consignmentEntities: Set<ConsignmentEntity>) {
         // Group consignments by organisationId for event publishing
-        val consignmentsByOrg = successfullyUpdatedConsignmentEntities.groupBy { it.sender.id }
+        val consignmentsByOrg = consignmentEntities.groupBy { it.sender.id }
         consignmentsByOrg.forEach { (orgId, consignments) ->
             log.debug("Publishing ledger updated events for organisation: {}", orgId)
             ledgerUpdatedEventPublisher.sendConsignmentLedgerUpdatedEvents(orgId, consignments.toSet())
         }
     }
 
+    // Once a tx is on chain, or known to be lost, the UTxO overlay no longer needs to stand in for it. A lost
+    // anchor takes its manifest along, its consignments are dispatched again under another root
+    private fun releasePendingTx(txHash: String, status: BlockchainPublishStatus) {
+        when (status) {
+            BlockchainPublishStatus.SUBMITTED -> Unit
+            BlockchainPublishStatus.ROLLBACKED -> {
+                chainingUtxoSupplier.rollback(txHash)
+                removeAnchoredBatch(txHash)
+            }
+            else -> chainingUtxoSupplier.confirm(txHash)
+        }
+    }
+
+    private fun removeAnchoredBatch(txHash: String) {
+        try {
+            anchoredBatchStore.removeBatch(txHash)
+        } catch (e: IOException) {
+            log.error("Error removing the anchored batch of rolled back txHash: {}", txHash, e)
+        }
+    }
+
+    // A slot is a second, so the age of the transaction at the tip is how long it took to show up (or be given up on)
+    private fun recordConfirmDuration(txAgeInSlots: Long, status: BlockchainPublishStatus) {
+        Timer.builder("cms.publisher.confirm.duration")
+            .description("Submission to the watchdog seeing a transaction on chain, or rolled back")
+            .tag("status", status.name)
+            .register(meterRegistry)
+            .record(Duration.ofSeconds(maxOf(0L, txAgeInSlots)))
+    }
+
     private fun getOnChainStatus(
         onChainTxDetails: Optional<OnChainTxDetails>,
         txCreationSlot: Long,
@@ -103,12 +268,7 @@ class WatchDogService(
         }
     }
 
-    private fun updateL1SubmissionData(submissionData: L1SubmissionData, chainTip: ChainTip): L1SubmissionData {
-        val txCreationSlot = submissionData.creationSlot
-            .orElseThrow { RuntimeException("Failed to get consignment creation slot") }
-        val txHash = submissionData.transactionHash
-            .orElseThrow { RuntimeException("Failed to get consignment hash") }
-        log.debug("Checking consignment status changes for txHash:{}", txHash)
+    private fun getOnChainTxDetails(txHash: String): Optional<OnChainTxDetails> {
         val txDetails: Either<Problem?, Optional<OnChainTxDetails?>> = blockchainReaderPublicApi.getTxDetails(txHash)
 
         val onChainTxDetails: Optional<OnChainTxDetails> = txDetails.fold(
@@ -125,8 +285,10 @@ class WatchDogService(
             }
         )
         log.debug("Onchain Tx Details: {}", onChainTxDetails)
-        val onChainStatus = getOnChainStatus(onChainTxDetails, txCreationSlot, chainTip)
+        return onChainTxDetails
+    }
 
+    private fun applyOnChainStatus(submissionData: L1SubmissionData, onChainStatus: OnChainStatus): L1SubmissionData {
         if (onChainStatus.status() == BlockchainPublishStatus.ROLLBACKED) {
             submissionData.setPublishStatus(BlockchainPublishStatus.ROLLBACKED)
             submissionData.setCreationSlot(null)
@@ -140,10 +302,12 @@ class WatchDogService(
         return submissionData
     }
 
-    private val chainTip: ChainTip
-        get() = blockchainReaderPublicApi.chainTip
+    // Once per pass, every transaction of the pass is judged against the same tip
+    private fun fetchChainTip(): ChainTip {
+        return blockchainReaderPublicApi.chainTip
             .getOrElseThrow { it ->
                 log.error("Failed to get chain tip")
                 RuntimeException("Failed to get chain tip")
             }
+    }
 }
\ No newline at end of file
@@ -11,7 +11,10 @@ import org.springframework.beans.factory.annotation.Qualifier
 import org.springframework.beans.factory.annotation.Value
 import org.springframework.context.annotation.Bean
 import org.springframework.context.annotation.Configuration
+import org.springframework.context.annotation.Primary
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ChainingUtxoSupplier
 import java.time.Clock
+import java.time.Duration
 
 @Configuration
 class BlockchainConfig {
@@ -24,12 +27,23 @@ class BlockchainConfig {
     }
 
     @Bean
+    @Primary
     fun utxoSupplier(
         @Qualifier("yaci_blockfrost") backendService: BackendService
     ): UtxoSupplier {
         return DefaultUtxoSupplier(backendService.getUtxoService())
     }
 
+    // Used for building consignment transactions only, confirmation checks must see the backend's own view
+    @Bean
+    fun chainingUtxoSupplier(
+        utxoSupplier: UtxoSupplier,
+        clock: Clock,
+        @Value("\${lob.blockchain_publisher.dispatcher.consignment.pending_tx_ttl:PT15M}") pendingTxTtl: Duration
+    ): ChainingUtxoSupplier {
+        return ChainingUtxoSupplier(utxoSupplier, clock, pendingTxTtl)
+    }
+
     @Bean
     fun transactionSubmissionService(
         blockchainTransactionSubmissionService: BlockchainTransactionSubmissionService,
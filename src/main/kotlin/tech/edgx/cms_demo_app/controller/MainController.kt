@@ -1,22 +1,37 @@
 package tech.edgx.cms_demo_app.controller
 
+import com.fasterxml.jackson.core.JsonProcessingException
+import com.fasterxml.jackson.databind.JsonNode
+import com.fasterxml.jackson.databind.ObjectMapper
+import jakarta.servlet.http.HttpServletRequest
 import jakarta.transaction.Transactional
 import org.cardanofoundation.lob.app.organisation.domain.entity.Organisation
 import org.cardanofoundation.lob.app.organisation.domain.entity.OrganisationCurrency
 import org.cardanofoundation.lob.app.organisation.repository.OrganisationCurrencyRepository
 import org.cardanofoundation.lob.app.support.modulith.EventMetadata
 import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.format.annotation.DateTimeFormat
 import org.springframework.context.ApplicationEventPublisher
+import org.springframework.http.HttpHeaders
 import org.springframework.http.HttpStatus
 import org.springframework.http.MediaType
 import org.springframework.http.ResponseEntity
 import org.springframework.web.bind.annotation.*
+import org.springframework.web.servlet.mvc.method.annotation.StreamingResponseBody
 import tech.edgx.cms_demo_app.blockchain.domain.event.ConsignmentLedgerUpdateCommand
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentFilter
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.BulkConsignmentResult
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.Consignment
 import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentPage
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
 import tech.edgx.cms_demo_app.blockchain_publisher.repository.CustomOrganisationRepository
+import tech.edgx.cms_demo_app.blockchain_publisher.service.ApiReadCache
+import tech.edgx.cms_demo_app.blockchain_publisher.service.ConsignmentBlockchainPublisherService
 import tech.edgx.cms_demo_app.blockchain_publisher.service.ConsignmentConverter
+import tech.edgx.cms_demo_app.blockchain_publisher.service.DispatchTimeAllocator
+import java.io.BufferedOutputStream
 import java.time.LocalDateTime
 import java.time.temporal.ChronoUnit
 import org.cardanofoundation.lob.app.organisation.domain.entity.OrganisationCurrency.Id as OrganisationCurrencyId
@@ -28,11 +43,21 @@ class MainController(
     private val consignmentConverter: ConsignmentConverter,
     private val organisationCurrencyRepository: OrganisationCurrencyRepository,
     private val organisationRepository: CustomOrganisationRepository,
-    private val applicationEventPublisher: ApplicationEventPublisher
+    private val applicationEventPublisher: ApplicationEventPublisher,
+    private val blockchainPublisherService: ConsignmentBlockchainPublisherService,
+    private val apiReadCache: ApiReadCache,
+    private val objectMapper: ObjectMapper,
+    private val dispatchTimeAllocator: DispatchTimeAllocator,
+    @Value("\${lob.consignments.bulk.max_items:1000}") private val bulkMaxItems: Int = 1000,
+    @Value("\${lob.consignments.page.max_limit:1000}") private val pageMaxLimit: Int = 1000
 ) {
 
     private val log = LoggerFactory.getLogger(MainController::class.java)
 
+    companion object {
+        const val CACHE_HEADER = "X-Cache"
+    }
+
     @GetMapping("/hello")
     fun hello(): String {
         return "Hello"
@@ -71,11 +96,14 @@ class MainController(
     }
 
     @GetMapping("/organisations/{id}")
-    fun getOrganisationById(@PathVariable id: String): ResponseEntity<Organisation> {
+    fun getOrganisationById(
+        @PathVariable id: String,
+        @RequestHeader(HttpHeaders.IF_NONE_MATCH, required = false) ifNoneMatch: String?
+    ): ResponseEntity<Organisation> {
         log.info("Fetching organisation by ID: $id")
-        val org = organisationRepository.findById(id)
-        return if (org.isPresent) {
-            ResponseEntity.ok(org.get())
+        val (org, hit) = apiReadCache.organisation(id) { organisationRepository.findById(it).orElse(null) }
+        return if (org != null) {
+            cachedResponse(org, hit, ifNoneMatch)
         } else {
             ResponseEntity.status(HttpStatus.NOT_FOUND).body(null)
         }
@@ -123,6 +151,7 @@ class MainController(
         currentOrg.logo = org.logo
 
         val updatedOrg = organisationRepository.save(currentOrg)
+        apiReadCache.evictOrganisation(id)
         organisationCurrencyRepository.save(
             OrganisationCurrency(
                 OrganisationCurrencyId(updatedOrg.id, "CUST_${updatedOrg.name}"),
@@ -141,6 +170,7 @@ class MainController(
         }
         organisationCurrencyRepository.deleteById(OrganisationCurrencyId(id, "CUST_${org.get().name}"))
         organisationRepository.deleteById(id)
+        apiReadCache.evictOrganisation(id)
         return ResponseEntity.noContent().build()
     }
 
@@ -156,7 +186,8 @@ class MainController(
         if (consignment.receiver?.id == null) {
             throw IllegalArgumentException("Receiver ID cannot be null")
         }
-        val dispatchedAt = LocalDateTime.now().truncatedTo(ChronoUnit.MILLIS) // Ensure millisecond precision
+        // Millisecond precision, and never a millisecond another consignment of the pair already has
+        val dispatchedAt = dispatchTimeAllocator.reserve(consignment.sender.id, consignment.receiver.id)
         log.info("Controller dispatchedAt: {}", dispatchedAt)
         val ver = 1L
         val consignmentId = ConsignmentEntity.id(
@@ -188,6 +219,79 @@ class MainController(
         return ResponseEntity.ok(updatedConsignment)
     }
 
+    /**
+     * Creates a batch of consignments given as a JSON array or as NDJSON (one consignment per line).
+     * Unlike the single create, the batch is stored synchronously in one transaction so the response
+     * can report the outcome of every item: an item that does not bind to a consignment is rejected
+     * on its own. Each sender/receiver pair reserves one dispatchedAt millisecond per item, so every
+     * item gets its own idControl however many creates for the pair run at once.
+     */
+    @PostMapping("/consignments/bulk", consumes = [MediaType.APPLICATION_JSON_VALUE, MediaType.APPLICATION_NDJSON_VALUE])
+    fun createConsignmentsBulk(request: HttpServletRequest): ResponseEntity<List<BulkConsignmentResult>> {
+        val items = mutableListOf<JsonNode>()
+        try {
+            objectMapper.readerFor(JsonNode::class.java).readValues<JsonNode>(request.inputStream).use { nodes ->
+                while (nodes.hasNextValue()) {
+                    if (items.size >= bulkMaxItems) {
+                        log.error("Bulk consignment request exceeds {} items", bulkMaxItems)
+                        return ResponseEntity.status(HttpStatus.PAYLOAD_TOO_LARGE).body(null)
+                    }
+                    items.add(nodes.nextValue())
+                }
+            }
+        } catch (e: JsonProcessingException) {
+            log.error("Malformed bulk consignment request after {} items: {}", items.size, e.originalMessage)
+            return ResponseEntity.status(HttpStatus.BAD_REQUEST).body(null)
+        }
+        log.info("Creating {} consignments in bulk", items.size)
+
+        val results = arrayOfNulls<BulkConsignmentResult>(items.size)
+        val valid = mutableMapOf<Int, Consignment>()
+        items.forEachIndexed { index, item ->
+            val consignment = try {
+                objectMapper.treeToValue(item, Consignment::class.java)
+            } catch (e: JsonProcessingException) {
+                results[index] = BulkConsignmentResult(index, BulkConsignmentResult.Status.REJECTED,
+                    error = "Not a consignment: ${e.originalMessage}")
+                return@forEachIndexed
+            }
+            if (consignment?.sender?.id == null || consignment.receiver?.id == null) {
+                results[index] = BulkConsignmentResult(index, BulkConsignmentResult.Status.REJECTED,
+                    error = "Sender ID and Receiver ID cannot be null")
+                return@forEachIndexed
+            }
+            valid[index] = consignment
+        }
+
+        val ver = 1L
+        val accepted = mutableMapOf<Int, Consignment>()
+        valid.entries.groupBy { (_, consignment) -> consignment.sender!!.id to consignment.receiver!!.id }
+            .forEach { (pair, entries) ->
+                val firstDispatchedAt = dispatchTimeAllocator.reserve(pair.first, pair.second, entries.size)
+                entries.forEachIndexed { occurrence, (index, consignment) ->
+                    val dispatchedAt = firstDispatchedAt.plus(occurrence.toLong(), ChronoUnit.MILLIS)
+                    accepted[index] = consignment.copy(
+                        id = ConsignmentEntity.id(pair.first, pair.second, dispatchedAt, ver),
+                        ver = ver,
+                        idControl = ConsignmentEntity.idControl(pair.first, pair.second, dispatchedAt),
+                        dispatchedAt = dispatchedAt
+                    )
+                }
+            }
+
+        val byOrganisation = accepted.values.groupBy { it.sender!!.id }.mapValues { it.value.toSet() }
+        val storedIds = blockchainPublisherService.storeConsignmentBatchForDispatchLater(byOrganisation)
+            .map { it.consignmentId }
+            .toSet()
+        accepted.forEach { (index, consignment) ->
+            val status = if (consignment.id in storedIds) BulkConsignmentResult.Status.ACCEPTED
+                else BulkConsignmentResult.Status.DUPLICATE
+            results[index] = BulkConsignmentResult(index, status, consignment.id, consignment.idControl, consignment.ver)
+        }
+        log.info("Bulk created consignments: stored={}, not stored={}", storedIds.size, items.size - storedIds.size)
+        return ResponseEntity.ok(results.filterNotNull())
+    }
+
     @PutMapping("/consignments/{id}")
     @Transactional
     fun updateConsignment(
@@ -245,12 +349,60 @@ class MainController(
         return ResponseEntity.ok(consignments)
     }
 
+    /**
+     * Current versions matching the filter in (updatedAt, id) order, keyset paginated: pass the
+     * page's nextAfterUpdatedAt and nextAfterId to get the next one, they are null on the last page.
+     * A consignment updated while paging moves to the end and is listed again.
+     */
+    @GetMapping("/consignments/page")
+    fun getConsignmentsPage(
+        @ModelAttribute filter: ConsignmentFilter,
+        @RequestParam(required = false) @DateTimeFormat(iso = DateTimeFormat.ISO.DATE_TIME) afterUpdatedAt: LocalDateTime?,
+        @RequestParam(required = false) afterId: String?,
+        @RequestParam(defaultValue = "100") limit: Int
+    ): ResponseEntity<ConsignmentPage> {
+        log.debug("Fetching consignments page: {}, after {}/{}, limit {}", filter, afterUpdatedAt, afterId, limit)
+        val pageSize = limit.coerceIn(1, pageMaxLimit)
+        val entities = consignmentEntityRepositoryGateway.findCurrentPage(filter, afterUpdatedAt, afterId ?: "", pageSize)
+        val last = entities.lastOrNull()?.takeIf { entities.size == pageSize }
+        return ResponseEntity.ok(ConsignmentPage(
+            entities.map(consignmentConverter::convertToCanonical),
+            last?.updatedAt,
+            last?.consignmentId
+        ))
+    }
+
+    /**
+     * Every current version matching the filter as NDJSON, one consignment per line in
+     * (updatedAt, id) order. Rows are read through a database cursor and written as they come,
+     * so server memory does not grow with the export.
+     */
+    @GetMapping("/consignments/export", produces = [MediaType.APPLICATION_NDJSON_VALUE])
+    fun exportConsignments(@ModelAttribute filter: ConsignmentFilter): ResponseEntity<StreamingResponseBody> {
+        log.info("Exporting consignments: {}", filter)
+        val body = StreamingResponseBody { out ->
+            val buffered = BufferedOutputStream(out, 64 * 1024)
+            val exported = consignmentEntityRepositoryGateway.forEachCurrent(filter) { entity ->
+                buffered.write(objectMapper.writeValueAsBytes(consignmentConverter.convertToCanonical(entity)))
+                buffered.write('\n'.code)
+            }
+            buffered.flush()
+            log.info("Exported {} consignments", exported)
+        }
+        return ResponseEntity.ok().contentType(MediaType.APPLICATION_NDJSON).body(body)
+    }
+
     @GetMapping("/consignments/{id}")
-    fun getConsignmentById(@PathVariable id: String): ResponseEntity<Consignment> {
+    fun getConsignmentById(
+        @PathVariable id: String,
+        @RequestHeader(HttpHeaders.IF_NONE_MATCH, required = false) ifNoneMatch: String?
+    ): ResponseEntity<Consignment> {
         log.debug("Fetching consignment by ID: {}", id)
-        val consignment = consignmentEntityRepositoryGateway.findLatestByIdControl(id)
+        val (consignment, hit) = apiReadCache.consignment(id) { idControl ->
+            consignmentEntityRepositoryGateway.findLatestByIdControl(idControl)?.let(consignmentConverter::convertToCanonical)
+        }
         return if (consignment != null) {
-            ResponseEntity.ok(consignmentConverter.convertToCanonical(consignment))
+            cachedResponse(consignment, hit, ifNoneMatch)
         } else {
             ResponseEntity.status(HttpStatus.NOT_FOUND).body(null)
         }
@@ -271,4 +423,18 @@ class MainController(
         }
         return ResponseEntity.ok("Deleted ${consignments.size}")
     }
+
+    /**
+     * 304 without a body when If-None-Match already names the cached ETag, otherwise the cached
+     * body. X-Cache tells whether the response was served without a database read.
+     */
+    private fun <T> cachedResponse(cached: ApiReadCache.Cached<T>, hit: Boolean, ifNoneMatch: String?): ResponseEntity<T> {
+        val notModified = ifNoneMatch?.split(",")
+            ?.map { it.trim().removePrefix("W/") }
+            ?.any { it == cached.etag || it == "*" } ?: false
+        val response = ResponseEntity.status(if (notModified) HttpStatus.NOT_MODIFIED else HttpStatus.OK)
+            .eTag(cached.etag)
+            .header(CACHE_HEADER, if (hit) "HIT" else "MISS")
+        return if (notModified) response.build() else response.body(cached.body)
+    }
 }
\ No newline at end of file
@@ -0,0 +1,58 @@
+package tech.edgx.cms_demo_app.controller
+
+import org.springframework.http.HttpStatus
+import org.springframework.http.MediaType
+import org.springframework.http.ResponseEntity
+import org.springframework.web.bind.annotation.GetMapping
+import org.springframework.web.bind.annotation.PathVariable
+import org.springframework.web.bind.annotation.PostMapping
+import org.springframework.web.bind.annotation.RequestBody
+import org.springframework.web.bind.annotation.RequestMapping
+import org.springframework.web.bind.annotation.RequestParam
+import org.springframework.web.bind.annotation.RestController
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.ConsignmentMerkleProof
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.core.MerkleProofVerification
+import tech.edgx.cms_demo_app.blockchain_publisher.service.AnchoredBatchStore
+import tech.edgx.cms_demo_app.blockchain_reader.service.ConsignmentMerkleProofService
+
+/**
+ * Inclusion proofs of consignment versions published in anchored batches, their verification
+ * against the root on chain, and the leaves themselves for counterparts without the shared store.
+ * scripts/verify_merkle_proof.py checks the same proofs independently of this application.
+ */
+@RestController
+@RequestMapping("/api/merkle", produces = [MediaType.APPLICATION_JSON_VALUE])
+class MerkleProofController(
+    private val consignmentMerkleProofService: ConsignmentMerkleProofService,
+    private val anchoredBatchStore: AnchoredBatchStore
+) {
+
+    /** The proof of a consignment version, by default in the transaction it was submitted in. */
+    @GetMapping("/proofs/{consignmentId}")
+    fun getProof(
+        @PathVariable consignmentId: String,
+        @RequestParam(required = false) txHash: String?
+    ): ResponseEntity<ConsignmentMerkleProof> {
+        val proof = consignmentMerkleProofService.proof(consignmentId, txHash)
+        return if (proof != null) {
+            ResponseEntity.ok(proof)
+        } else {
+            ResponseEntity.status(HttpStatus.NOT_FOUND).body(null)
+        }
+    }
+
+    @PostMapping("/verify", consumes = [MediaType.APPLICATION_JSON_VALUE])
+    fun verify(@RequestBody proof: ConsignmentMerkleProof): ResponseEntity<MerkleProofVerification> {
+        return ResponseEntity.ok(consignmentMerkleProofService.verify(proof))
+    }
+
+    @GetMapping("/leaves/{leafHash}", produces = [MediaType.APPLICATION_OCTET_STREAM_VALUE])
+    fun getLeaf(@PathVariable leafHash: String): ResponseEntity<ByteArray> {
+        val leaf = anchoredBatchStore.getLeaf(leafHash.lowercase())
+        return if (leaf != null) {
+            ResponseEntity.ok(leaf)
+        } else {
+            ResponseEntity.status(HttpStatus.NOT_FOUND).body(null)
+        }
+    }
+}
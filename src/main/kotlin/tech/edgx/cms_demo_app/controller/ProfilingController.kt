@@ -0,0 +1,33 @@
+package tech.edgx.cms_demo_app.controller
+
+import org.springframework.boot.autoconfigure.condition.ConditionalOnProperty
+import org.springframework.http.MediaType
+import org.springframework.http.ResponseEntity
+import org.springframework.web.bind.annotation.DeleteMapping
+import org.springframework.web.bind.annotation.GetMapping
+import org.springframework.web.bind.annotation.RequestMapping
+import org.springframework.web.bind.annotation.RestController
+import tech.edgx.cms_demo_app.util.JobProfiler
+
+/**
+ * The job profiler's spans and slow cycle stack samples, for scripts/profile_jobs.py. Only
+ * registered with lob.profiling.enabled=true; stacks name internals, so it stays behind /api auth.
+ */
+@RestController
+@RequestMapping("/api/profiling", produces = [MediaType.APPLICATION_JSON_VALUE])
+@ConditionalOnProperty(name = ["lob.profiling.enabled"], havingValue = "true")
+class ProfilingController(
+    private val jobProfiler: JobProfiler
+) {
+
+    @GetMapping("/dump")
+    fun dump(): ResponseEntity<JobProfiler.Dump> {
+        return ResponseEntity.ok(jobProfiler.dump())
+    }
+
+    @DeleteMapping("/dump")
+    fun clear(): ResponseEntity<Void> {
+        jobProfiler.clear()
+        return ResponseEntity.noContent().build()
+    }
+}
@@ -4,8 +4,10 @@ import org.slf4j.LoggerFactory
 import org.springframework.http.HttpStatus
 import org.springframework.http.ResponseEntity
 import org.springframework.security.authentication.InsufficientAuthenticationException
+import org.springframework.validation.BindException
 import org.springframework.web.bind.annotation.ExceptionHandler
 import org.springframework.web.bind.annotation.RestControllerAdvice
+import org.springframework.web.method.annotation.MethodArgumentTypeMismatchException
 import java.util.NoSuchElementException
 
 @RestControllerAdvice
@@ -27,6 +29,13 @@ class GlobalExceptionHandler {
             .body(mapOf("error" to "Not Found", "message" to (ex.message ?: "Resource not found")))
     }
 
+    @ExceptionHandler(BindException::class, MethodArgumentTypeMismatchException::class)
+    fun handleBadRequestParameter(ex: Exception): ResponseEntity<Map<String, Any>> {
+        logger.debug("Invalid request parameter: ${ex.message}")
+        return ResponseEntity.status(HttpStatus.BAD_REQUEST)
+            .body(mapOf("error" to "Bad Request", "message" to (ex.message ?: "Invalid request parameter")))
+    }
+
     @ExceptionHandler(Exception::class)
     fun handleAllExceptions(ex: Exception): ResponseEntity<Map<String, Any>> {
         logger.error("Unhandled exception", ex)
@@ -0,0 +1,155 @@
+package tech.edgx.cms_demo_app.util
+
+import jakarta.annotation.PreDestroy
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.scheduling.concurrent.CustomizableThreadFactory
+import org.springframework.stereotype.Component
+import java.lang.management.ManagementFactory
+import java.time.Duration
+import java.time.Instant
+import java.util.concurrent.Executors
+import java.util.concurrent.RejectedExecutionException
+import java.util.concurrent.ScheduledExecutorService
+import java.util.concurrent.TimeUnit
+
+/**
+ * Opt-in profiling of the scheduled jobs (lob.profiling.enabled). Every span records the wall and
+ * CPU time of the job thread; while a span runs its thread's stack is sampled every
+ * sample_interval, and the samples of spans slower than slow_threshold are kept as folded stacks
+ * (root first, frames joined by ';') for scripts/profile_jobs.py to render. Only the job thread
+ * is sampled, work it hands to a pool shows up as the frame it waits in. Disabled, a span is a
+ * plain call.
+ */
+@Component
+class JobProfiler(
+    @Value("\${lob.profiling.enabled:false}") private val enabled: Boolean,
+    @Value("\${lob.profiling.slow_threshold:PT5S}") private val slowThreshold: Duration,
+    @Value("\${lob.profiling.sample_interval:PT0.01S}") private val sampleInterval: Duration,
+    @Value("\${lob.profiling.max_captures:20}") private val maxCaptures: Int,
+    @Value("\${lob.profiling.max_depth:128}") private val maxDepth: Int,
+    @Value("\${lob.profiling.recent_spans:500}") private val recentSpans: Int
+) {
+    private val log = LoggerFactory.getLogger(JobProfiler::class.java)
+
+    data class JobStats(
+        val job: String,
+        val spans: Long,
+        val slowSpans: Long,
+        val wallMsTotal: Double,
+        val cpuMsTotal: Double,
+        val wallMsMax: Double,
+        // Wall and CPU of the most recent spans, oldest first
+        val recentWallMs: List<Double>,
+        val recentCpuMs: List<Double>
+    )
+
+    data class SlowCapture(
+        val job: String,
+        val startedAt: Instant,
+        val wallMs: Double,
+        val cpuMs: Double,
+        val sampleIntervalMs: Double,
+        val samples: Map<String, Int>
+    )
+
+    data class Dump(val enabled: Boolean, val slowThresholdMs: Long, val jobs: List<JobStats>, val captures: List<SlowCapture>)
+
+    private class Accumulator(val job: String) {
+        var spans = 0L
+        var slowSpans = 0L
+        var wallNanos = 0L
+        var cpuNanos = 0L
+        var maxWallNanos = 0L
+        val recent = ArrayDeque<Pair<Long, Long>>()
+    }
+
+    private val threadMXBean = ManagementFactory.getThreadMXBean()
+    private val cpuTimeSupported = threadMXBean.isCurrentThreadCpuTimeSupported
+    // One thread samples every running span and records finished ones, so a span's samples are never read while written
+    private val sampler: ScheduledExecutorService by lazy {
+        Executors.newSingleThreadScheduledExecutor(CustomizableThreadFactory("job-profiler-"))
+    }
+    private val accumulators = LinkedHashMap<String, Accumulator>()
+    private val captures = ArrayDeque<SlowCapture>()
+
+    @PreDestroy
+    fun shutdown() {
+        if (enabled) {
+            sampler.shutdownNow()
+        }
+    }
+
+    fun <T> span(job: String, block: () -> T): T {
+        if (!enabled) {
+            return block()
+        }
+        val thread = Thread.currentThread()
+        val samples = HashMap<String, Int>()
+        val sampling = sampler.scheduleAtFixedRate({ sample(thread, job, samples) },
+            sampleInterval.toNanos(), sampleInterval.toNanos(), TimeUnit.NANOSECONDS)
+        val startedAt = Instant.now()
+        val cpuStarted = if (cpuTimeSupported) threadMXBean.currentThreadCpuTime else 0L
+        val started = System.nanoTime()
+        try {
+            return block()
+        } finally {
+            val wallNanos = System.nanoTime() - started
+            val cpuNanos = if (cpuTimeSupported) threadMXBean.currentThreadCpuTime - cpuStarted else 0L
+            sampling.cancel(false)
+            try {
+                sampler.execute { record(job, startedAt, wallNanos, cpuNanos, samples) }
+            } catch (e: RejectedExecutionException) {
+                // Shutting down
+            }
+        }
+    }
+
+    @Synchronized
+    fun dump(): Dump {
+        val jobs = accumulators.values.map { a ->
+            JobStats(a.job, a.spans, a.slowSpans, a.wallNanos / 1e6, a.cpuNanos / 1e6, a.maxWallNanos / 1e6,
+                a.recent.map { it.first / 1e6 }, a.recent.map { it.second / 1e6 })
+        }
+        return Dump(enabled, slowThreshold.toMillis(), jobs, captures.toList())
+    }
+
+    @Synchronized
+    fun clear() {
+        accumulators.clear()
+        captures.clear()
+    }
+
+    private fun sample(thread: Thread, job: String, samples: MutableMap<String, Int>) {
+        val stack = thread.stackTrace
+        if (stack.isEmpty()) {
+            return
+        }
+        // Leaf frames are the ones that matter when a deep stack is cut, the job name stands in for the root
+        val folded = stack.take(maxDepth).asReversed().joinToString(";", prefix = "$job;") { "${it.className}.${it.methodName}" }
+        samples.merge(folded, 1, Int::plus)
+    }
+
+    @Synchronized
+    private fun record(job: String, startedAt: Instant, wallNanos: Long, cpuNanos: Long, samples: Map<String, Int>) {
+        val accumulator = accumulators.getOrPut(job) { Accumulator(job) }
+        accumulator.spans++
+        accumulator.wallNanos += wallNanos
+        accumulator.cpuNanos += cpuNanos
+        accumulator.maxWallNanos = maxOf(accumulator.maxWallNanos, wallNanos)
+        accumulator.recent.addLast(wallNanos to cpuNanos)
+        if (accumulator.recent.size > recentSpans) {
+            accumulator.recent.removeFirst()
+        }
+        if (wallNanos < slowThreshold.toNanos()) {
+            return
+        }
+        accumulator.slowSpans++
+        captures.addLast(SlowCapture(job, startedAt, wallNanos / 1e6, cpuNanos / 1e6, sampleInterval.toNanos() / 1e6, samples))
+        if (captures.size > maxCaptures) {
+            captures.removeFirst()
+        }
+        log.info("Slow {} cycle: {} ms wall, {} ms CPU, {} stack samples kept", job, wallNanos / 1_000_000,
+            cpuNanos / 1_000_000, samples.values.sum())
+    }
+}
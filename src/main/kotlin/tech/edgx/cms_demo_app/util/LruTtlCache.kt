@@ -0,0 +1,87 @@
+package tech.edgx.cms_demo_app.util
+
+import java.time.Clock
+import java.time.Duration
+import java.time.Instant
+import java.util.concurrent.atomic.AtomicLong
+
+/**
+ * Bounded in-process cache: least recently used entries are dropped beyond maxEntries and every
+ * entry expires ttl after it was stored. Thread safe, loads run outside the lock.
+ */
+class LruTtlCache<K : Any, V : Any>(
+    private val maxEntries: Int,
+    private val ttl: Duration,
+    private val clock: Clock
+) {
+
+    data class Stats(val size: Int, val hits: Long, val misses: Long, val invalidations: Long)
+
+    private class Entry<V>(val value: V, val expiresAt: Instant)
+
+    private val entries = object : LinkedHashMap<K, Entry<V>>(16, 0.75f, true) {
+        override fun removeEldestEntry(eldest: MutableMap.MutableEntry<K, Entry<V>>): Boolean = size > maxEntries
+    }
+    private val hits = AtomicLong()
+    private val misses = AtomicLong()
+    // Bumped by every invalidation, a load that overlaps one is not stored as it may have read the old state
+    private val invalidations = AtomicLong()
+
+    fun get(key: K): V? {
+        val now = clock.instant()
+        synchronized(entries) {
+            val entry = entries[key]
+            if (entry != null && entry.expiresAt.isAfter(now)) {
+                hits.incrementAndGet()
+                return entry.value
+            }
+            if (entry != null) {
+                entries.remove(key)
+            }
+        }
+        misses.incrementAndGet()
+        return null
+    }
+
+    /**
+     * Returns the cached value and true, or loads, stores and returns the value and false. Null
+     * loads are not cached.
+     */
+    fun getOrLoad(key: K, loader: (K) -> V?): Pair<V?, Boolean> {
+        get(key)?.let { return it to true }
+        val invalidationsBefore = invalidations.get()
+        val value = loader(key) ?: return null to false
+        synchronized(entries) {
+            if (invalidations.get() == invalidationsBefore) {
+                entries[key] = Entry(value, clock.instant().plus(ttl))
+            }
+        }
+        return value to false
+    }
+
+    fun invalidate(key: K) {
+        synchronized(entries) {
+            invalidations.incrementAndGet()
+            entries.remove(key)
+        }
+    }
+
+    fun invalidateIf(predicate: (K, V) -> Boolean) {
+        synchronized(entries) {
+            invalidations.incrementAndGet()
+            entries.entries.removeIf { predicate(it.key, it.value.value) }
+        }
+    }
+
+    fun clear() {
+        synchronized(entries) {
+            invalidations.incrementAndGet()
+            entries.clear()
+        }
+    }
+
+    fun stats(): Stats {
+        val size = synchronized(entries) { entries.size }
+        return Stats(size, hits.get(), misses.get(), invalidations.get())
+    }
+}
@@ -0,0 +1,18 @@
+-- Since V1_7 the primary key is (consignment_id, created_at), so nothing in the schema kept two rows
+-- from sharing a consignment id. Every insert now takes a transaction advisory lock on its id and
+-- fails like a primary key would when the id is already stored. Writers that skip stored ids take
+-- the same locks up front (ConsignmentJdbcRepository.lockConsignmentIds), so their check sees any
+-- concurrent insert of the id once it commits. Key: (1448, hashtext(consignment_id)).
+CREATE FUNCTION blockchain_publisher_consignment_unique_id() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(1448, hashtext(NEW.consignment_id));
+    IF EXISTS (SELECT 1 FROM blockchain_publisher_consignment WHERE consignment_id = NEW.consignment_id) THEN
+        RAISE unique_violation USING MESSAGE = format('consignment_id %s already exists', NEW.consignment_id);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blockchain_publisher_consignment_unique_id
+    BEFORE INSERT ON blockchain_publisher_consignment
+    FOR EACH ROW EXECUTE FUNCTION blockchain_publisher_consignment_unique_id();
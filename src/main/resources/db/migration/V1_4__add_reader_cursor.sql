@@ -0,0 +1,10 @@
+-- High-water mark of what the reader has ingested from the indexer, one row per feed
+CREATE TABLE blockchain_reader_cursor (
+    name VARCHAR(64) NOT NULL,
+    l1_absolute_slot BIGINT NOT NULL,
+    l1_transaction_hash VARCHAR(64) NOT NULL,
+    consignment_id VARCHAR(64),
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (name)
+);
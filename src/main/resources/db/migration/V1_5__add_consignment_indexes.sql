@@ -0,0 +1,22 @@
+-- Indexes for the hot queries of ConsignmentEntityRepository, which otherwise scan the whole table
+
+-- findLatestByIdControl: latest version of a consignment, read for every decoded and updated consignment
+CREATE INDEX idx_blockchain_publisher_consignment_id_control_ver
+    ON blockchain_publisher_consignment (id_control, ver DESC);
+
+-- findConsignmentsByStatus: the dispatcher tick, per org. Only consignments waiting dispatch
+-- (BlockchainPublishStatus.toDispatchStatuses) are indexed, so it stays as small as the backlog
+CREATE INDEX idx_blockchain_publisher_consignment_ready_to_dispatch
+    ON blockchain_publisher_consignment (sender_id, created_at, consignment_id)
+    WHERE l1_publish_status IN ('STORED', 'ROLLBACKED');
+
+-- findAllDispatchedConsignmentsThatAreNotFinalizedYet / findAllSubmittedConsignments: WatchDog passes
+-- across all orgs, over consignments on their way to finality
+CREATE INDEX idx_blockchain_publisher_consignment_not_finalized
+    ON blockchain_publisher_consignment (created_at, consignment_id)
+    WHERE l1_publish_status IN ('SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED');
+
+-- findDispatchedConsignmentsThatAreNotFinalizedYet: the same, per org
+CREATE INDEX idx_blockchain_publisher_consignment_sender_not_finalized
+    ON blockchain_publisher_consignment (sender_id, created_at, consignment_id)
+    WHERE l1_publish_status IN ('SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED');
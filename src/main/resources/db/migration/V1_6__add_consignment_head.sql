@@ -0,0 +1,59 @@
+-- Current version of every consignment, so reading one does not sort through its history.
+-- Maintained by triggers on blockchain_publisher_consignment, which stays the append-only history
+CREATE TABLE blockchain_publisher_consignment_head (
+    id_control VARCHAR(64) NOT NULL,
+    consignment_id VARCHAR(64) NOT NULL,
+    ver BIGINT NOT NULL,
+    PRIMARY KEY (id_control)
+);
+
+INSERT INTO blockchain_publisher_consignment_head (id_control, consignment_id, ver)
+SELECT DISTINCT ON (id_control) id_control, consignment_id, ver
+FROM blockchain_publisher_consignment
+ORDER BY id_control, ver DESC;
+
+CREATE FUNCTION blockchain_publisher_consignment_head_on_insert() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO blockchain_publisher_consignment_head (id_control, consignment_id, ver)
+    VALUES (NEW.id_control, NEW.consignment_id, NEW.ver)
+    ON CONFLICT (id_control) DO UPDATE
+        SET consignment_id = EXCLUDED.consignment_id, ver = EXCLUDED.ver
+        WHERE blockchain_publisher_consignment_head.ver < EXCLUDED.ver;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deleting the current version (e.g. a rolled back update) makes the previous one current again
+CREATE FUNCTION blockchain_publisher_consignment_head_on_delete() RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM blockchain_publisher_consignment_head
+    WHERE id_control = OLD.id_control AND consignment_id = OLD.consignment_id;
+    IF FOUND THEN
+        INSERT INTO blockchain_publisher_consignment_head (id_control, consignment_id, ver)
+        SELECT id_control, consignment_id, ver
+        FROM blockchain_publisher_consignment
+        WHERE id_control = OLD.id_control
+        ORDER BY ver DESC
+        LIMIT 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blockchain_publisher_consignment_head_insert
+    AFTER INSERT ON blockchain_publisher_consignment
+    FOR EACH ROW EXECUTE FUNCTION blockchain_publisher_consignment_head_on_insert();
+
+CREATE TRIGGER blockchain_publisher_consignment_head_delete
+    AFTER DELETE ON blockchain_publisher_consignment
+    FOR EACH ROW EXECUTE FUNCTION blockchain_publisher_consignment_head_on_delete();
+
+-- Versions moved out of the history by the optional compaction job, see ConsignmentHistoryCompactionJob
+CREATE TABLE blockchain_publisher_consignment_archive (
+    LIKE blockchain_publisher_consignment INCLUDING DEFAULTS,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (consignment_id)
+);
+
+CREATE INDEX idx_blockchain_publisher_consignment_archive_id_control_ver
+    ON blockchain_publisher_consignment_archive (id_control, ver DESC);
@@ -0,0 +1,58 @@
+-- Monthly range partitions on created_at, so old history is detached and archived a month at a time
+-- (ConsignmentPartitionMaintenanceJob, scripts/archive_partitions.py) instead of deleted row by row.
+-- The primary key has to include the partition key; consignment_id stays the entity id.
+ALTER TABLE blockchain_publisher_consignment RENAME TO blockchain_publisher_consignment_unpartitioned;
+
+CREATE TABLE blockchain_publisher_consignment (
+    LIKE blockchain_publisher_consignment_unpartitioned INCLUDING DEFAULTS,
+    PRIMARY KEY (consignment_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside the monthly partitions, the maintenance job keeps it empty by creating months ahead
+CREATE TABLE blockchain_publisher_consignment_default PARTITION OF blockchain_publisher_consignment DEFAULT;
+
+DO $$
+DECLARE
+    partition_month TIMESTAMP;
+BEGIN
+    FOR partition_month IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(oldest, now()), now())),
+            date_trunc('month', now()) + INTERVAL '2 months',
+            INTERVAL '1 month')
+        FROM (SELECT MIN(created_at) AS oldest FROM blockchain_publisher_consignment_unpartitioned) AS existing
+    LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF blockchain_publisher_consignment FOR VALUES FROM (%L) TO (%L)',
+            'blockchain_publisher_consignment_p' || to_char(partition_month, 'YYYY_MM'),
+            partition_month, partition_month + INTERVAL '1 month');
+    END LOOP;
+END;
+$$;
+
+INSERT INTO blockchain_publisher_consignment SELECT * FROM blockchain_publisher_consignment_unpartitioned;
+
+-- Takes the V1_5 indexes and V1_6 head triggers with it, they are recreated on the partitioned table
+DROP TABLE blockchain_publisher_consignment_unpartitioned;
+
+CREATE INDEX idx_blockchain_publisher_consignment_id_control_ver
+    ON blockchain_publisher_consignment (id_control, ver DESC);
+
+CREATE INDEX idx_blockchain_publisher_consignment_ready_to_dispatch
+    ON blockchain_publisher_consignment (sender_id, created_at, consignment_id)
+    WHERE l1_publish_status IN ('STORED', 'ROLLBACKED');
+
+CREATE INDEX idx_blockchain_publisher_consignment_not_finalized
+    ON blockchain_publisher_consignment (created_at, consignment_id)
+    WHERE l1_publish_status IN ('SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED');
+
+CREATE INDEX idx_blockchain_publisher_consignment_sender_not_finalized
+    ON blockchain_publisher_consignment (sender_id, created_at, consignment_id)
+    WHERE l1_publish_status IN ('SUBMITTED', 'VISIBLE_ON_CHAIN', 'COMPLETED');
+
+CREATE TRIGGER blockchain_publisher_consignment_head_insert
+    AFTER INSERT ON blockchain_publisher_consignment
+    FOR EACH ROW EXECUTE FUNCTION blockchain_publisher_consignment_head_on_insert();
+
+CREATE TRIGGER blockchain_publisher_consignment_head_delete
+    AFTER DELETE ON blockchain_publisher_consignment
+    FOR EACH ROW EXECUTE FUNCTION blockchain_publisher_consignment_head_on_delete();
@@ -0,0 +1,11 @@
+-- Keyset listing of current consignment versions in (updated_at, consignment_id) order,
+-- GET /api/consignments/page and /api/consignments/export
+CREATE INDEX idx_blockchain_publisher_consignment_updated_at
+    ON blockchain_publisher_consignment (updated_at, consignment_id);
+
+-- The same, filtered by sender or receiver organisation
+CREATE INDEX idx_blockchain_publisher_consignment_sender_updated_at
+    ON blockchain_publisher_consignment (sender_id, updated_at, consignment_id);
+
+CREATE INDEX idx_blockchain_publisher_consignment_receiver_updated_at
+    ON blockchain_publisher_consignment (receiver_id, updated_at, consignment_id);
@@ -0,0 +1,14 @@
+-- Last indexer rollback (GET /api/v1/rollbacks) the reader has reverted
+ALTER TABLE blockchain_reader_cursor ADD COLUMN last_rollback_id BIGINT;
+
+-- Consignments the reader inserted from chain, so a rollback reverts those and never one this
+-- instance published itself. Pruned once older than the rollback retention
+CREATE TABLE blockchain_reader_ingested (
+    consignment_id VARCHAR(64) NOT NULL,
+    id_control VARCHAR(64) NOT NULL,
+    l1_absolute_slot BIGINT NOT NULL,
+    PRIMARY KEY (consignment_id)
+);
+
+CREATE INDEX idx_blockchain_reader_ingested_l1_absolute_slot
+    ON blockchain_reader_ingested (l1_absolute_slot);
@@ -0,0 +1,127 @@
+package tech.edgx.cms_demo_app
+
+import com.bloxbean.cardano.client.api.UtxoSupplier
+import com.bloxbean.cardano.client.api.common.OrderEnum
+import com.bloxbean.cardano.client.api.model.Amount
+import com.bloxbean.cardano.client.api.model.Utxo
+import com.bloxbean.cardano.client.transaction.spec.Transaction
+import com.bloxbean.cardano.client.transaction.spec.TransactionBody
+import com.bloxbean.cardano.client.transaction.spec.TransactionInput
+import com.bloxbean.cardano.client.transaction.spec.TransactionOutput
+import com.bloxbean.cardano.client.transaction.spec.TransactionWitnessSet
+import com.bloxbean.cardano.client.transaction.spec.Value
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertFalse
+import org.junit.jupiter.api.Assertions.assertTrue
+import org.junit.jupiter.api.Test
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ChainingUtxoSupplier
+import java.math.BigInteger
+import java.time.Duration
+import java.util.Optional
+
+class ChainingUtxoSupplierTest {
+
+    companion object {
+        private const val OWNER = "addr_test1vqqsyqcyq5rqwzqfpg9scrgwpugpzysnzs23v9ccrydpk8qxyywge"
+        private const val OTHER = "addr_test1vpjkvemgd94xkmrddehhqutjwd682anh0puh57mu04l8lqqwgn62j"
+        private val GENESIS = "ab".repeat(32)
+    }
+
+    /** The backend's view: only what is on chain. */
+    private class ChainUtxos(val utxos: MutableList<Utxo> = mutableListOf()) : UtxoSupplier {
+        override fun getPage(address: String, nrOfItems: Int?, page: Int?, order: OrderEnum?): List<Utxo> =
+            if (page == null || page == 0) utxos.filter { it.address == address } else emptyList()
+
+        override fun getTxOutput(txHash: String, outputIndex: Int): Optional<Utxo> =
+            Optional.ofNullable(utxos.firstOrNull { it.txHash == txHash && it.outputIndex == outputIndex })
+    }
+
+    private val clock = MutableClock()
+    private val chain = ChainUtxos(mutableListOf(utxo(GENESIS, 0, OWNER, 100_000_000L)))
+    private val supplier = ChainingUtxoSupplier(chain, clock, Duration.ofMinutes(15))
+
+    private fun utxo(txHash: String, index: Int, address: String, lovelace: Long): Utxo = Utxo.builder()
+        .txHash(txHash)
+        .outputIndex(index)
+        .address(address)
+        .amount(listOf(Amount.lovelace(BigInteger.valueOf(lovelace))))
+        .build()
+
+    private fun txSpending(txHash: String, index: Int, vararg outputs: Pair<String, Long>): ByteArray {
+        val body = TransactionBody.builder()
+            .inputs(listOf(TransactionInput.builder().transactionId(txHash).index(index).build()))
+            .outputs(outputs.map { (address, lovelace) ->
+                TransactionOutput.builder().address(address).value(Value.builder().coin(BigInteger.valueOf(lovelace)).build()).build()
+            })
+            .fee(BigInteger.valueOf(200_000L))
+            .build()
+        return Transaction.builder().body(body).witnessSet(TransactionWitnessSet()).build().serialize()
+    }
+
+    private fun ownerUtxos() = supplier.getPage(OWNER, 100, 0, OrderEnum.asc).map { "${it.txHash}#${it.outputIndex}" }
+
+    @Test
+    fun `test a registered tx hides its inputs and offers its change on the first page`() {
+        // When
+        val txHash = supplier.register(txSpending(GENESIS, 0, OTHER to 2_000_000L, OWNER to 97_800_000L))
+
+        // Then
+        assertEquals(listOf("$txHash#1"), ownerUtxos())
+        assertTrue(supplier.getPage(OWNER, 100, 1, OrderEnum.asc).isEmpty())
+        assertEquals(OTHER, supplier.getTxOutput(txHash, 0).get().address)
+        assertEquals(1, supplier.inFlight())
+    }
+
+    @Test
+    fun `test a confirmed tx leaves the overlay to the backend`() {
+        // Given
+        val txHash = supplier.register(txSpending(GENESIS, 0, OWNER to 99_800_000L))
+        chain.utxos.clear()
+        chain.utxos.add(utxo(txHash, 0, OWNER, 99_800_000L))
+
+        // When
+        supplier.confirm(txHash)
+
+        // Then
+        assertEquals(listOf("$txHash#0"), ownerUtxos())
+        assertEquals(0, supplier.inFlight())
+    }
+
+    @Test
+    fun `test a rollback takes the txs chained on it along`() {
+        // Given
+        val first = supplier.register(txSpending(GENESIS, 0, OWNER to 99_800_000L))
+        val second = supplier.register(txSpending(first, 0, OWNER to 99_600_000L))
+        assertEquals(listOf("$second#0"), ownerUtxos())
+
+        // When
+        supplier.rollback(first)
+
+        // Then
+        assertEquals(listOf("$GENESIS#0"), ownerUtxos())
+        assertFalse(supplier.getTxOutput(second, 0).isPresent)
+        assertEquals(0, supplier.inFlight())
+    }
+
+    @Test
+    fun `test reset and the pending TTL drop every pending tx`() {
+        // Given
+        supplier.register(txSpending(GENESIS, 0, OWNER to 99_800_000L))
+
+        // When
+        supplier.reset()
+
+        // Then
+        assertEquals(listOf("$GENESIS#0"), ownerUtxos())
+
+        // Given
+        supplier.register(txSpending(GENESIS, 0, OWNER to 99_800_000L))
+
+        // When
+        clock.advance(Duration.ofMinutes(16))
+
+        // Then
+        assertEquals(listOf("$GENESIS#0"), ownerUtxos())
+        assertEquals(0, supplier.inFlight())
+    }
+}
@@ -0,0 +1,62 @@
+package tech.edgx.cms_demo_app
+
+import org.junit.jupiter.api.Assertions.assertArrayEquals
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertFalse
+import org.junit.jupiter.api.Assertions.assertNull
+import org.junit.jupiter.api.Test
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentMerkleTree
+
+class ConsignmentMerkleTreeTest {
+
+    private fun leafHashes(count: Int) = (0 until count).map { ConsignmentMerkleTree.leafHash("leaf $it".toByteArray()) }
+
+    @Test
+    fun `test every proof leads to the root, odd levels included`() {
+        for (count in 1..33) {
+            // Given
+            val hashes = leafHashes(count)
+            val root = ConsignmentMerkleTree.root(hashes)
+
+            hashes.indices.forEach { index ->
+                // When
+                val path = ConsignmentMerkleTree.proof(hashes, index)
+
+                // Then
+                assertArrayEquals(root, ConsignmentMerkleTree.rootFromProof(hashes[index], index.toLong(), count.toLong(), path),
+                    "leaf $index of $count")
+            }
+        }
+    }
+
+    @Test
+    fun `test a proof does not hold for another leaf or position`() {
+        // Given
+        val hashes = leafHashes(11)
+        val root = ConsignmentMerkleTree.root(hashes)
+        val path = ConsignmentMerkleTree.proof(hashes, 4)
+
+        // When
+        val otherLeaf = ConsignmentMerkleTree.rootFromProof(hashes[5], 4, 11, path)
+        val otherPosition = ConsignmentMerkleTree.rootFromProof(hashes[4], 5, 11, path)
+
+        // Then
+        assertFalse(root.contentEquals(otherLeaf))
+        assertFalse(root.contentEquals(otherPosition))
+        assertNull(ConsignmentMerkleTree.rootFromProof(hashes[4], 4, 11, path.dropLast(1)))
+        assertNull(ConsignmentMerkleTree.rootFromProof(hashes[4], 11, 11, path))
+    }
+
+    @Test
+    fun `test a leaf is not a node`() {
+        // Given
+        val hashes = leafHashes(2)
+
+        // When
+        val root = ConsignmentMerkleTree.root(hashes)
+
+        // Then
+        assertEquals(32, root.size)
+        assertFalse(root.contentEquals(ConsignmentMerkleTree.leafHash(hashes[0] + hashes[1])))
+    }
+}
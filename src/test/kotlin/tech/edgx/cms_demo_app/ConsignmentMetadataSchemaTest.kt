@@ -0,0 +1,160 @@
+package tech.edgx.cms_demo_app
+
+import com.bloxbean.cardano.client.common.cbor.CborSerializationUtil
+import com.bloxbean.cardano.client.metadata.helper.MetadataToJsonNoSchemaConverter
+import com.fasterxml.jackson.databind.ObjectMapper
+import org.cardanofoundation.lob.app.blockchain_publisher.domain.entity.txs.L1SubmissionData
+import org.cardanofoundation.lob.app.blockchain_publisher.domain.entity.txs.Organisation
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertTrue
+import org.junit.jupiter.api.Test
+import org.mockito.Mockito
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import tech.edgx.cms_demo_app.blockchain_publisher.repository.ConsignmentEntityRepositoryGateway
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentMetadataSerialiser
+import tech.edgx.cms_demo_app.blockchain_reader.service.ConsignmentMetadataDeserialiserService
+import java.time.Clock
+import java.time.Instant
+import java.time.LocalDateTime
+import java.time.ZoneOffset
+import java.util.Optional
+
+class ConsignmentMetadataSchemaTest {
+
+    private val clock = Clock.fixed(Instant.parse("2025-07-31T12:00:00Z"), ZoneOffset.UTC)
+    // No stored versions, every decoded consignment is ver 1
+    private val deserialiser = ConsignmentMetadataDeserialiserService(Mockito.mock(ConsignmentEntityRepositoryGateway::class.java), 1448)
+    private val creationSlot = 80_000_000L
+
+    private fun organisation(orgId: String) = Organisation().apply {
+        id = orgId
+        name = "Org $orgId"
+        countryCode = "AU"
+        taxIdNumber = "TAX-$orgId"
+        currencyId = "ISO_4217:AUD"
+    }
+
+    private fun consignment(
+        index: Int,
+        senderId: String = "org1",
+        receiverId: String = "org2",
+        trackingStatus: String? = "IN_TRANSIT",
+        ver: Long = 1L,
+        latitude: Double = 51.5074123
+    ): ConsignmentEntity {
+        val dispatchedAt = LocalDateTime.parse("2025-07-31T11:00:00").plusNanos(index * 1_000_000L)
+        return ConsignmentEntity(
+            consignmentId = ConsignmentEntity.id(senderId, receiverId, dispatchedAt, ver),
+            idControl = ConsignmentEntity.idControl(senderId, receiverId, dispatchedAt),
+            ver = ver,
+            goods = mapOf("item1" to index, "item2" to 20),
+            sender = organisation(senderId),
+            receiver = organisation(receiverId),
+            trackingStatus = trackingStatus,
+            latitude = latitude,
+            longitude = -0.1278456,
+            dispatchedAt = dispatchedAt
+        )
+    }
+
+    // What the reader gets from the indexer: the label's metadata rendered as JSON, bytes as 0x hex
+    private fun asIndexedJson(
+        serialiser: ConsignmentMetadataSerialiser,
+        consignments: Set<ConsignmentEntity>,
+        bases: Map<String, ConsignmentEntity> = emptyMap()
+    ): Map<String, Any> {
+        val metadataMap = serialiser.serializeToMetadataMap("org1", consignments, creationSlot, bases)
+        val json = MetadataToJsonNoSchemaConverter.cborBytesToJson(CborSerializationUtil.serialize(metadataMap.map))
+        @Suppress("UNCHECKED_CAST")
+        return ObjectMapper().readValue(json, Map::class.java) as Map<String, Any>
+    }
+
+    @Test
+    fun `test compact schema decodes to the published consignments`() {
+        // Given
+        val consignments = linkedSetOf(consignment(1), consignment(2, receiverId = "org3", trackingStatus = "AT_PORT"),
+            consignment(3, senderId = "org4", trackingStatus = null))
+        val payload = asIndexedJson(ConsignmentMetadataSerialiser(clock, 2), consignments)
+
+        // When
+        val decoded = deserialiser.decodeConsignments(payload, "ab".repeat(32), creationSlot + 20).associateBy { it.consignmentId }
+
+        // Then
+        assertEquals(2, (payload["v"] as Number).toInt())
+        assertEquals(consignments.map { it.consignmentId }.toSet(), decoded.keys)
+        consignments.forEach { expected ->
+            val actual = decoded.getValue(expected.consignmentId)
+            assertEquals(expected.goods, actual.goods)
+            assertEquals(expected.sender.id, actual.sender.id)
+            assertEquals(expected.receiver.id, actual.receiver.id)
+            assertEquals(expected.receiver.name, actual.receiver.name)
+            assertEquals(expected.trackingStatus, actual.trackingStatus)
+            assertEquals(expected.latitude, actual.latitude)
+            assertEquals(expected.longitude, actual.longitude)
+            assertEquals(expected.dispatchedAt, actual.dispatchedAt)
+            assertEquals(creationSlot, actual.getL1SubmissionData().flatMap { it.creationSlot }.orElse(null))
+        }
+    }
+
+    @Test
+    fun `test schema 1_0 metadata is still decoded`() {
+        // Given
+        val consignments = linkedSetOf(consignment(1), consignment(2))
+        val payload = asIndexedJson(ConsignmentMetadataSerialiser(clock, 1), consignments)
+
+        // When
+        val decoded = deserialiser.decodeConsignments(payload, "ab".repeat(32), creationSlot + 20)
+
+        // Then
+        assertTrue(deserialiser.isConsignmentMetadata(payload))
+        assertEquals(consignments.map { it.consignmentId }.toSet(), decoded.map { it.consignmentId }.toSet())
+    }
+
+    @Test
+    fun `test delta items decode to the versions they update`() {
+        // Given
+        val baseTxHash = "cd".repeat(32)
+        val published = (1..3).map { consignment(it) }
+        published.forEach { it.setL1SubmissionData(Optional.of(L1SubmissionData.builder().transactionHash(baseTxHash).build())) }
+        val updated = linkedSetOf(consignment(1, ver = 2L, latitude = 51.6), consignment(2, ver = 2L, trackingStatus = "DELIVERED"),
+            consignment(3, ver = 2L))
+        val bases = updated.associate { update -> update.consignmentId to published.single { it.idControl == update.idControl } }
+        val serialiser = ConsignmentMetadataSerialiser(clock, 2)
+        val basePayload = asIndexedJson(serialiser, published.toCollection(LinkedHashSet()))
+        val payload = asIndexedJson(serialiser, updated, bases)
+
+        // When
+        val decoded = deserialiser.decodeConsignments(payload, "ef".repeat(32), creationSlot + 40,
+            published.associate { it.idControl to 1L }.toMutableMap(),
+            baseMetadata = { txHash -> mapOf(baseTxHash to basePayload)[txHash] }
+        ).associateBy { it.consignmentId }
+
+        // Then
+        @Suppress("UNCHECKED_CAST")
+        assertTrue((payload["d"] as List<Map<String, Any>>).all { "p" in it && "r" !in it })
+        assertEquals(updated.map { it.consignmentId }.toSet(), decoded.keys)
+        updated.forEach { expected ->
+            val actual = decoded.getValue(expected.consignmentId)
+            assertEquals(2L, actual.ver)
+            assertEquals(expected.goods, actual.goods)
+            assertEquals(expected.receiver.name, actual.receiver.name)
+            assertEquals(expected.trackingStatus, actual.trackingStatus)
+            assertEquals(expected.latitude, actual.latitude)
+            assertEquals(expected.longitude, actual.longitude)
+            assertEquals(expected.dispatchedAt, actual.dispatchedAt)
+        }
+    }
+
+    @Test
+    fun `test compact schema takes at most half the bytes per consignment`() {
+        // Given
+        val consignments = (1..50).map { consignment(it) }.toCollection(LinkedHashSet())
+
+        // When
+        val v1 = CborSerializationUtil.serialize(ConsignmentMetadataSerialiser(clock, 1).serializeToMetadataMap("org1", consignments, creationSlot).map).size
+        val v2 = CborSerializationUtil.serialize(ConsignmentMetadataSerialiser(clock, 2).serializeToMetadataMap("org1", consignments, creationSlot).map).size
+
+        // Then
+        assertTrue(v2 * 2 <= v1, "Compact metadata should be at most half of 1.0, was $v2 vs $v1 bytes")
+    }
+}
@@ -0,0 +1,92 @@
+package tech.edgx.cms_demo_app
+
+import org.cardanofoundation.lob.app.blockchain_publisher.domain.entity.txs.Organisation
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertFalse
+import org.junit.jupiter.api.Assertions.assertTrue
+import org.junit.jupiter.api.Test
+import tech.edgx.cms_demo_app.blockchain_publisher.domain.entity.consignments.ConsignmentEntity
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentMetadataSerialiser
+import tech.edgx.cms_demo_app.blockchain_publisher.service.tx.ConsignmentTxPacker
+import java.time.Clock
+import java.time.Instant
+import java.time.LocalDateTime
+import java.time.ZoneOffset
+
+class ConsignmentTxPackerTest {
+
+    private val serialiser = ConsignmentMetadataSerialiser(Clock.fixed(Instant.parse("2025-07-31T12:00:00Z"), ZoneOffset.UTC))
+    private val creationSlot = 80_000_000L
+
+    private fun organisation(orgId: String) = Organisation().apply {
+        id = orgId
+        name = "Org $orgId"
+        countryCode = "AU"
+        taxIdNumber = "TAX-$orgId"
+        currencyId = "ISO_4217:AUD"
+    }
+
+    private fun consignment(index: Int, ver: Long = 1L): ConsignmentEntity {
+        val dispatchedAt = LocalDateTime.parse("2025-07-31T12:00:00").plusNanos(index * 1_000_000L)
+        return ConsignmentEntity(
+            consignmentId = ConsignmentEntity.id("org1", "org2", dispatchedAt, ver),
+            idControl = ConsignmentEntity.idControl("org1", "org2", dispatchedAt),
+            ver = ver,
+            goods = mapOf("item1" to index, "item2" to 20),
+            sender = organisation("org1"),
+            receiver = organisation("org2"),
+            trackingStatus = "IN_TRANSIT",
+            latitude = 51.5074,
+            longitude = -0.1278,
+            dispatchedAt = dispatchedAt
+        )
+    }
+
+    @Test
+    fun `test all consignments packed when they fit`() {
+        // Given
+        val packer = ConsignmentTxPacker(serialiser)
+        val consignments = (1..5).map { consignment(it) }
+
+        // When
+        val pack = packer.pack("org1", consignments, creationSlot)
+
+        // Then
+        assertEquals(5, pack.batch.size)
+        assertTrue(pack.remaining.isEmpty())
+        assertFalse(pack.full)
+    }
+
+    @Test
+    fun `test largest batch under the metadata budget is packed`() {
+        // Given
+        val packer = ConsignmentTxPacker(serialiser, maxTransactionSizeBytes = 3000, transactionOverheadBytes = 1000)
+        val consignments = (1..50).map { consignment(it) }
+
+        // When
+        val pack = packer.pack("org1", consignments, creationSlot)
+
+        // Then
+        assertTrue(pack.full, "50 consignments should not fit into 2000 bytes of metadata")
+        assertTrue(pack.metadataSizeBytes <= packer.metadataBudgetBytes)
+        assertEquals(50, pack.batch.size + pack.remaining.size)
+        val withNext = pack.batch + pack.remaining.first()
+        assertTrue(packer.metadataSize("org1", withNext, creationSlot) > packer.metadataBudgetBytes,
+            "Adding one more consignment should exceed the budget")
+    }
+
+    @Test
+    fun `test later versions of a consignment are deferred to the next transaction`() {
+        // Given
+        val packer = ConsignmentTxPacker(serialiser)
+        val consignments = listOf(consignment(1, 1L), consignment(1, 2L), consignment(2, 1L))
+
+        // When
+        val pack = packer.pack("org1", consignments, creationSlot)
+
+        // Then
+        assertEquals(listOf(1L, 1L), pack.batch.map { it.ver })
+        assertEquals(listOf(2L), pack.remaining.map { it.ver })
+        assertFalse(pack.full, "Deferred versions are not left out for lack of space")
+    }
+}
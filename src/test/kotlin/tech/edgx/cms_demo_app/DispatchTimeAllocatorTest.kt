@@ -0,0 +1,63 @@
+package tech.edgx.cms_demo_app
+
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Test
+import tech.edgx.cms_demo_app.blockchain_publisher.service.DispatchTimeAllocator
+import java.time.Duration
+import java.time.LocalDateTime
+import java.util.concurrent.Callable
+import java.util.concurrent.Executors
+
+class DispatchTimeAllocatorTest {
+
+    private val start = LocalDateTime.parse("2025-07-31T12:00:00")
+
+    @Test
+    fun `test ranges of one pair never overlap within a millisecond`() {
+        // Given
+        val allocator = DispatchTimeAllocator(MutableClock())
+
+        // When
+        val bulk = allocator.reserve("org1", "org2", 500)
+        val single = allocator.reserve("org1", "org2")
+        val otherPair = allocator.reserve("org1", "org3")
+
+        // Then
+        assertEquals(start, bulk)
+        assertEquals(start.plusNanos(500 * 1_000_000L), single)
+        assertEquals(start, otherPair)
+    }
+
+    @Test
+    fun `test the clock catches up with a reservation`() {
+        // Given
+        val clock = MutableClock()
+        val allocator = DispatchTimeAllocator(clock)
+        allocator.reserve("org1", "org2", 10)
+
+        // When
+        clock.advance(Duration.ofSeconds(1))
+        val next = allocator.reserve("org1", "org2")
+
+        // Then
+        assertEquals(start.plusSeconds(1), next)
+    }
+
+    @Test
+    fun `test concurrent reservations get distinct milliseconds`() {
+        // Given
+        val allocator = DispatchTimeAllocator(MutableClock())
+        val executor = Executors.newFixedThreadPool(8)
+
+        // When
+        val reserved = try {
+            executor.invokeAll((1..200).map { Callable { allocator.reserve("org1", "org2", 3) } }).map { it.get() }
+        } finally {
+            executor.shutdown()
+        }
+
+        // Then
+        val milliseconds = reserved.flatMap { first -> (0L until 3L).map { first.plusNanos(it * 1_000_000L) } }
+        assertEquals(600, milliseconds.toSet().size)
+    }
+}
@@ -0,0 +1,131 @@
+package tech.edgx.cms_demo_app
+
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertFalse
+import org.junit.jupiter.api.Assertions.assertNull
+import org.junit.jupiter.api.Assertions.assertTrue
+import org.junit.jupiter.api.Test
+import tech.edgx.cms_demo_app.util.LruTtlCache
+import java.time.Duration
+
+class LruTtlCacheTest {
+
+    private val clock = MutableClock()
+
+    private fun cache(maxEntries: Int = 3) = LruTtlCache<String, String>(maxEntries, Duration.ofSeconds(30), clock)
+
+    @Test
+    fun `test a load is stored and then served`() {
+        // Given
+        val cache = cache()
+        var loads = 0
+
+        // When
+        val first = cache.getOrLoad("a") { loads++; "A" }
+        val second = cache.getOrLoad("a") { loads++; "A2" }
+
+        // Then
+        assertEquals("A" to false, first)
+        assertEquals("A" to true, second)
+        assertEquals(1, loads)
+    }
+
+    @Test
+    fun `test the least recently used entry is dropped`() {
+        // Given
+        val cache = cache()
+        listOf("a", "b", "c").forEach { key -> cache.getOrLoad(key) { key.uppercase() } }
+        cache.get("a")
+
+        // When
+        cache.getOrLoad("d") { "D" }
+
+        // Then
+        assertEquals("A", cache.get("a"))
+        assertNull(cache.get("b"))
+        assertEquals(3, cache.stats().size)
+    }
+
+    @Test
+    fun `test an entry expires ttl after it was stored`() {
+        // Given
+        val cache = cache()
+        cache.getOrLoad("a") { "A" }
+
+        // When
+        clock.advance(Duration.ofSeconds(29))
+        val beforeTtl = cache.get("a")
+        clock.advance(Duration.ofSeconds(1))
+        val atTtl = cache.get("a")
+
+        // Then
+        assertEquals("A", beforeTtl)
+        assertNull(atTtl)
+        assertEquals(0, cache.stats().size)
+    }
+
+    @Test
+    fun `test a load overlapping an invalidation is returned but not stored`() {
+        // Given
+        val cache = cache()
+
+        // When
+        val loaded = cache.getOrLoad("a") { key ->
+            // The writer commits and invalidates while the read is in progress
+            cache.invalidate(key)
+            "stale"
+        }
+
+        // Then
+        assertEquals("stale" to false, loaded)
+        assertNull(cache.get("a"))
+        assertEquals("fresh" to false, cache.getOrLoad("a") { "fresh" })
+        assertEquals("fresh", cache.get("a"))
+    }
+
+    @Test
+    fun `test null loads are not cached`() {
+        // Given
+        val cache = cache()
+        var loads = 0
+
+        // When
+        cache.getOrLoad("a") { loads++; null }
+        val second = cache.getOrLoad("a") { loads++; null }
+
+        // Then
+        assertEquals(null to false, second)
+        assertEquals(2, loads)
+    }
+
+    @Test
+    fun `test invalidateIf and clear remove matching entries`() {
+        // Given
+        val cache = cache()
+        listOf("a", "b", "c").forEach { key -> cache.getOrLoad(key) { key.uppercase() } }
+
+        // When
+        cache.invalidateIf { key, _ -> key != "b" }
+
+        // Then
+        assertNull(cache.get("a"))
+        assertEquals("B", cache.get("b"))
+        cache.clear()
+        assertNull(cache.get("b"))
+        assertEquals(2, cache.stats().invalidations)
+    }
+
+    @Test
+    fun `test zero max entries caches nothing`() {
+        // Given
+        val cache = cache(maxEntries = 0)
+
+        // When
+        cache.getOrLoad("a") { "A" }
+
+        // Then
+        assertNull(cache.get("a"))
+        assertFalse(cache.stats().size > 0)
+        assertTrue(cache.stats().misses >= 2)
+    }
+}
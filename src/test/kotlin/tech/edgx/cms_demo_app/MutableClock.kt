@@ -0,0 +1,21 @@
+package tech.edgx.cms_demo_app
+
+import java.time.Clock
+import java.time.Duration
+import java.time.Instant
+import java.time.ZoneId
+import java.time.ZoneOffset
+
+/** A clock the test moves by hand. */
+class MutableClock(@Volatile var instant: Instant = Instant.parse("2025-07-31T12:00:00Z")) : Clock() {
+
+    fun advance(duration: Duration) {
+        instant = instant.plus(duration)
+    }
+
+    override fun getZone(): ZoneId = ZoneOffset.UTC
+
+    override fun withZone(zone: ZoneId): Clock = this
+
+    override fun instant(): Instant = instant
+}